@@ -0,0 +1,203 @@
+"""
+Archivos estáticos con huella de contenido, cache de larga duración y
+respuestas comprimidas.
+
+Al arrancar se recorre la carpeta static/ una sola vez:
+- cada archivo recibe un nombre con el hash de su contenido
+  (formulario.css -> formulario.3f2a9c1b7d.css), que url_for('static', ...)
+  devuelve automáticamente; esos nombres se sirven con Cache-Control
+  inmutable de un año, porque si el archivo cambia cambia también su nombre.
+- los archivos de texto (CSS, JS, SVG...) se comprimen en gzip y, si está
+  instalado el paquete brotli, en brotli; se entrega la variante que acepte
+  el navegador sin volver a comprimir en cada petición. Las variantes se
+  guardan en disco por hash de contenido (ESTATICOS_CACHE_DIR), así que solo
+  el primer arranque tras un cambio paga la compresión.
+
+Los nombres originales siguen funcionando con el servicio normal de Flask.
+Si se modifica un archivo de static/ con la app corriendo hay que
+reiniciarla, igual que al cambiar el código.
+
+Además, las respuestas dinámicas de texto (HTML, JSON, CSV) se comprimen al
+vuelo cuando el navegador lo acepta.
+"""
+import gzip
+import hashlib
+import mimetypes
+import os
+import posixpath
+import tempfile
+import uuid
+
+from flask import current_app, request, send_file
+
+try:
+    import brotli
+except ImportError:  # Sin brotli se sirve solo gzip
+    brotli = None
+
+LONGITUD_HUELLA = 10
+CACHE_INMUTABLE = 'public, max-age=31536000, immutable'
+CARPETA_CACHE = os.environ.get('ESTATICOS_CACHE_DIR', os.path.join(tempfile.gettempdir(), 'seguros_uib_estaticos'))
+
+EXTENSIONES_COMPRIMIBLES = {'.css', '.js', '.svg', '.json', '.txt', '.html', '.map'}
+TIPOS_COMPRIMIBLES = {
+    'text/html', 'text/css', 'text/plain', 'text/csv', 'text/javascript',
+    'application/javascript', 'application/json', 'image/svg+xml',
+}
+# Por debajo de este tamaño la compresión no compensa
+TAMANO_MINIMO_COMPRESION = 500
+
+# Los estáticos se comprimen una vez con el máximo nivel; las respuestas
+# dinámicas con un nivel intermedio, que es mucho más rápido
+NIVEL_GZIP_ESTATICO = 9
+CALIDAD_BROTLI_ESTATICO = 11
+NIVEL_GZIP_DINAMICO = 6
+CALIDAD_BROTLI_DINAMICO = 4
+
+
+def _comprimir(datos, codificacion, estatico=False):
+    if codificacion == 'br':
+        return brotli.compress(datos, quality=CALIDAD_BROTLI_ESTATICO if estatico else CALIDAD_BROTLI_DINAMICO)
+    return gzip.compress(datos, NIVEL_GZIP_ESTATICO if estatico else NIVEL_GZIP_DINAMICO, mtime=0)
+
+
+def _variante_estatica(contenido, huella, codificacion):
+    """Variante comprimida de un estático, leída de la cache en disco o creada y guardada."""
+    ruta = os.path.join(CARPETA_CACHE, f'{huella}.{codificacion}')
+    try:
+        with open(ruta, 'rb') as f:
+            return f.read()
+    except OSError:
+        pass
+    comprimido = _comprimir(contenido, codificacion, estatico=True)
+    try:
+        os.makedirs(CARPETA_CACHE, exist_ok=True)
+        ruta_temporal = f'{ruta}.{uuid.uuid4().hex[:8]}.tmp'
+        with open(ruta_temporal, 'wb') as f:
+            f.write(comprimido)
+        os.replace(ruta_temporal, ruta)
+    except OSError as e:
+        print(f"No se pudo guardar la variante comprimida de un estático en {CARPETA_CACHE}: {e}")
+    return comprimido
+
+
+def _codificaciones_disponibles():
+    return ('br', 'gzip') if brotli is not None else ('gzip',)
+
+
+def _elegir_codificacion(disponibles):
+    """La mejor codificación de `disponibles` que acepta el navegador, o None."""
+    for codificacion in ('br', 'gzip'):
+        if codificacion in disponibles and request.accept_encodings[codificacion] > 0:
+            return codificacion
+    return None
+
+
+class ActivoEstatico:
+    """Un archivo de static/ con su huella y sus variantes comprimidas."""
+
+    __slots__ = ('ruta', 'huella', 'mimetype', 'variantes')
+
+    def __init__(self, ruta, huella, mimetype, variantes):
+        self.ruta = ruta
+        self.huella = huella
+        self.mimetype = mimetype
+        self.variantes = variantes
+
+
+class ActivosEstaticos:
+    """Huellas de contenido y compresión para los estáticos y las respuestas de la app."""
+
+    def __init__(self, app=None):
+        self._manifiesto = {}  # nombre original -> nombre con huella
+        self._activos = {}     # nombre con huella -> ActivoEstatico
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.construir(app.static_folder)
+        app.url_defaults(self._reescribir_url)
+        app.view_functions['static'] = self.servir
+        app.after_request(self._comprimir_respuesta)
+        app.extensions['activos_estaticos'] = self
+
+    def construir(self, carpeta):
+        """Calcula las huellas y precomprime los archivos de texto de `carpeta`."""
+        manifiesto, activos = {}, {}
+        for raiz, _carpetas, archivos in os.walk(carpeta):
+            for archivo in archivos:
+                ruta = os.path.join(raiz, archivo)
+                nombre = os.path.relpath(ruta, carpeta).replace(os.sep, '/')
+                with open(ruta, 'rb') as f:
+                    contenido = f.read()
+                huella = hashlib.sha256(contenido).hexdigest()[:LONGITUD_HUELLA]
+                base, extension = posixpath.splitext(nombre)
+                nombre_huella = f'{base}.{huella}{extension}'
+
+                variantes = {}
+                if extension.lower() in EXTENSIONES_COMPRIMIBLES and len(contenido) >= TAMANO_MINIMO_COMPRESION:
+                    for codificacion in _codificaciones_disponibles():
+                        comprimido = _variante_estatica(contenido, huella, codificacion)
+                        if len(comprimido) < len(contenido):
+                            variantes[codificacion] = comprimido
+
+                mimetype = mimetypes.guess_type(nombre)[0] or 'application/octet-stream'
+                manifiesto[nombre] = nombre_huella
+                activos[nombre_huella] = ActivoEstatico(ruta, huella, mimetype, variantes)
+        self._manifiesto, self._activos = manifiesto, activos
+
+    def manifiesto(self):
+        return dict(self._manifiesto)
+
+    def _reescribir_url(self, endpoint, values):
+        if endpoint == 'static' and 'filename' in values:
+            values['filename'] = self._manifiesto.get(values['filename'], values['filename'])
+
+    def servir(self, filename):
+        """Vista de los estáticos: nombres con huella desde memoria/disco, el resto como Flask."""
+        activo = self._activos.get(filename)
+        if activo is None:
+            return current_app.send_static_file(filename)
+
+        codificacion = _elegir_codificacion(activo.variantes)
+        if codificacion is None:
+            respuesta = send_file(activo.ruta, mimetype=activo.mimetype, etag=activo.huella, conditional=True)
+        else:
+            respuesta = current_app.response_class(activo.variantes[codificacion], mimetype=activo.mimetype)
+            respuesta.headers['Content-Encoding'] = codificacion
+            respuesta.set_etag(f'{activo.huella}-{codificacion}')
+            respuesta = respuesta.make_conditional(request)
+        respuesta.headers['Cache-Control'] = CACHE_INMUTABLE
+        if activo.variantes:
+            respuesta.vary.add('Accept-Encoding')
+        return respuesta
+
+    def _comprimir_respuesta(self, respuesta):
+        """Comprime las respuestas dinámicas de texto si el navegador lo acepta."""
+        if (request.endpoint == 'static'
+                or respuesta.direct_passthrough
+                or respuesta.is_streamed
+                or respuesta.status_code < 200
+                or respuesta.status_code in (204, 206, 304)
+                or 'Content-Encoding' in respuesta.headers
+                or respuesta.mimetype not in TIPOS_COMPRIMIBLES):
+            return respuesta
+
+        respuesta.vary.add('Accept-Encoding')
+        codificacion = _elegir_codificacion(_codificaciones_disponibles())
+        if codificacion is None:
+            return respuesta
+        datos = respuesta.get_data()
+        if len(datos) < TAMANO_MINIMO_COMPRESION:
+            return respuesta
+
+        respuesta.set_data(_comprimir(datos, codificacion))
+        respuesta.headers['Content-Encoding'] = codificacion
+        # El contenido comprimido ya no es idéntico byte a byte: el ETag pasa a ser débil
+        etag, debil = respuesta.get_etag()
+        if etag and not debil:
+            respuesta.set_etag(etag, weak=True)
+        return respuesta
+
+
+activos_estaticos = ActivosEstaticos()
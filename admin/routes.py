@@ -2,6 +2,10 @@ import os
 from functools import wraps
 from flask import Blueprint, render_template, request, redirect, url_for, session, flash
 import config_manager
+from comisiones import motor_comisiones, tasas_vendedores
+from correo_masivo import bandeja_correo
+from perfilado import LIMITES_HISTOGRAMA_MS, perfilador
+from programador import INTERVALO_S, programador
 
 # Definir el Blueprint para el panel de administración
 admin_bp = Blueprint(
@@ -68,6 +72,7 @@ def edit_list_item(list_name):
     if request.method == 'POST':
         # Guardar los datos
         if list_name == 'vendedores':
+            tasas_anteriores = tasas_vendedores()
             items = []
             nombres = request.form.getlist('item_nombre')
             comisiones = request.form.getlist('item_comision')
@@ -84,6 +89,18 @@ def edit_list_item(list_name):
             flash(f"Lista '{list_name}' guardada con éxito.", 'success')
         else:
             flash(f"Error al guardar la lista '{list_name}'.", 'danger')
+            return redirect(url_for('admin.edit_list_item', list_name=list_name))
+
+        if list_name == 'vendedores':
+            # Vendedores nuevos o con otra comisión: sus remisiones y prospectos se recalculan
+            tasas = tasas_vendedores()
+            cambiados = sorted(nombre for nombre, tasa in tasas.items() if tasas_anteriores.get(nombre) != tasa)
+            if cambiados:
+                # La tasa anterior distingue los % que venían de la lista de los escritos a mano
+                anteriores = {nombre: tasas_anteriores[nombre] for nombre in cambiados if nombre in tasas_anteriores}
+                if 'recalcular_comisiones' in request.form:
+                    return _aplicar_recalculo(cambiados, anteriores)
+                return redirect(url_for('admin.comisiones', **_parametros_recalculo(cambiados, anteriores)))
 
         return redirect(url_for('admin.edit_list_item', list_name=list_name))
 
@@ -98,4 +115,135 @@ def edit_list_item(list_name):
         return render_template('admin/editar_vendedores.html', list_name=list_name, items=items)
     else:
         # Renderizar la plantilla genérica para listas simples
-        return render_template('admin/editar_lista_simple.html', list_name=list_name, items=items)
\ No newline at end of file
+        return render_template('admin/editar_lista_simple.html', list_name=list_name, items=items)
+
+# --- Recálculo de comisiones ---
+def _parametros_recalculo(vendedores, anteriores):
+    """Parámetros de /admin/comisiones: los vendedores y la tasa anterior de cada uno ('' si no tenía)."""
+    vendedores = vendedores or []
+    return {'vendedor': vendedores, 'anterior': [anteriores.get(nombre, '') for nombre in vendedores]}
+
+def _leer_recalculo(parametros):
+    """(vendedores o None, {vendedor: tasa anterior}) de la petición."""
+    vendedores = parametros.getlist('vendedor') or None
+    anteriores = {}
+    for nombre, tasa in zip(vendedores or [], parametros.getlist('anterior')):
+        try:
+            anteriores[nombre] = float(tasa)
+        except ValueError:
+            pass  # Vendedor nuevo: sin tasa anterior
+    return vendedores, anteriores
+
+def _aplicar_recalculo(vendedores, anteriores):
+    try:
+        resultado = motor_comisiones.aplicar(vendedores, anteriores)
+    except Exception as e:
+        flash(f'Error al recalcular las comisiones: {e}', 'danger')
+        return redirect(url_for('admin.comisiones', **_parametros_recalculo(vendedores, anteriores)))
+    resumen = ', '.join(f"{entidad}: {datos['filas']}" for entidad, datos in resultado.items())
+    flash(f'Comisiones recalculadas ({resumen} fila(s) actualizadas).', 'success')
+    manuales = sum(datos['manuales'] for datos in resultado.values())
+    if manuales:
+        flash(f'{manuales} fila(s) con % escrito a mano conservaron su porcentaje.', 'info')
+    return redirect(url_for('admin.comisiones', **_parametros_recalculo(vendedores, anteriores)))
+
+@admin_bp.route('/comisiones')
+@admin_required
+def comisiones():
+    """Vista previa (sin guardar) de las comisiones que cambian con las tasas actuales de los vendedores."""
+    vendedores, anteriores = _leer_recalculo(request.args)
+    try:
+        resultado = motor_comisiones.vista_previa(vendedores, anteriores)
+    except Exception as e:
+        flash(f'Error al calcular la vista previa de comisiones: {e}', 'danger')
+        resultado = {}
+    return render_template('admin/comisiones.html', vendedores=vendedores, anteriores=anteriores,
+                           resultado=resultado, tasas=tasas_vendedores())
+
+@admin_bp.route('/comisiones/aplicar', methods=['POST'])
+@admin_required
+def comisiones_aplicar():
+    return _aplicar_recalculo(*_leer_recalculo(request.form))
+
+# --- Rendimiento ---
+@admin_bp.route('/rendimiento')
+@admin_required
+def rendimiento():
+    return render_template('admin/rendimiento.html',
+                           endpoints=perfilador.resumen_endpoints(),
+                           peticiones=perfilador.mas_lentas(),
+                           limites_histograma=LIMITES_HISTOGRAMA_MS,
+                           muestreo_cprofile=perfilador.muestreo_cprofile)
+
+@admin_bp.route('/rendimiento/peticion/<id_peticion>')
+@admin_required
+def rendimiento_peticion(id_peticion):
+    peticion = perfilador.obtener(id_peticion)
+    if peticion is None:
+        flash('La petición ya no está entre las recientes.', 'warning')
+        return redirect(url_for('admin.rendimiento'))
+    return render_template('admin/rendimiento_peticion.html', peticion=peticion)
+
+@admin_bp.route('/rendimiento/reiniciar', methods=['POST'])
+@admin_required
+def rendimiento_reiniciar():
+    perfilador.reiniciar()
+    flash('Estadísticas de rendimiento reiniciadas.', 'info')
+    return redirect(url_for('admin.rendimiento'))
+
+# --- Bandeja de correo ---
+@admin_bp.route('/correo')
+@admin_required
+def correo():
+    enviador = bandeja_correo.enviador
+    return render_template('admin/correo.html',
+                           conteos=bandeja_correo.conteos(),
+                           errores=bandeja_correo.errores(),
+                           enviador=enviador,
+                           en_curso=enviador.en_curso())
+
+@admin_bp.route('/correo/enviar', methods=['POST'])
+@admin_required
+def correo_enviar():
+    if bandeja_correo.enviador.drenar_en_segundo_plano():
+        flash('Envío de la bandeja de salida iniciado en segundo plano.', 'success')
+    else:
+        flash('Ya hay un envío en curso.', 'info')
+    return redirect(url_for('admin.correo'))
+
+@admin_bp.route('/correo/reintentar', methods=['POST'])
+@admin_required
+def correo_reintentar():
+    movidos = bandeja_correo.reintentar_fallidos()
+    flash(f'{movidos} correo(s) fallidos devueltos a pendientes.', 'info')
+    return redirect(url_for('admin.correo'))
+
+# --- Programador de tareas ---
+@admin_bp.route('/programador')
+@admin_required
+def programador_tareas():
+    return render_template('admin/programador.html',
+                           tareas=programador.estado(),
+                           lider=programador.lider(),
+                           activo=programador.activo,
+                           pid=os.getpid(),
+                           intervalo_s=INTERVALO_S,
+                           historial=programador.historial())
+
+@admin_bp.route('/programador/ejecutar/<nombre>', methods=['POST'])
+@admin_required
+def programador_ejecutar(nombre):
+    if nombre not in programador.tareas:
+        flash(f"La tarea '{nombre}' no existe.", 'danger')
+    elif not programador.activo:
+        # Sin hilos del programador la tarea se ejecuta en esta petición
+        entrada = programador.ejecutar(nombre, 'manual')
+        if entrada is None:
+            flash(f"La tarea '{nombre}' ya está en curso.", 'info')
+        else:
+            flash(f"Tarea '{nombre}' ejecutada: {entrada['resultado']} {entrada['detalle']}",
+                  'success' if entrada['resultado'] == 'ok' else 'danger')
+    else:
+        programador.solicitar(nombre)
+        flash(f"Tarea '{nombre}' solicitada: se ejecutará en los próximos {INTERVALO_S:g} segundos.", 'success')
+    return redirect(url_for('admin.programador_tareas'))
@@ -1,14 +1,37 @@
-from flask import Flask, render_template, request, redirect, url_for, jsonify, flash, send_file
+from flask import Flask, render_template, request, redirect, url_for, jsonify, flash, send_file, Response, stream_with_context
 from flask_login import LoginManager, UserMixin, login_user, logout_user, login_required, current_user
-from werkzeug.security import generate_password_hash, check_password_hash
+from werkzeug.security import check_password_hash
 import os
-import pandas as pd
+import re
+import time
 from werkzeug.utils import secure_filename
 from datetime import datetime, timedelta
 from dateutil.relativedelta import relativedelta
 import uuid
 import config_manager
+import excel_io
+import esquemas
+import comisiones
+import importacion_prospectos
+import correspondencia
+from correo_masivo import bandeja_correo, MAXIMO_CORREOS_LOTE
+from cobros_index import CobrosIndex, normalizar_tipo_movimiento
+from vencimientos_index import CalendarioVencimientos, GENERAL_ACTIVAS, kpis_ventana
+from recaudo_index import RollupRecaudo, rango_meses, texto_mes
+from cubo_produccion import CuboProduccion, DIMENSIONES as DIMENSIONES_CUBO, MEDIDAS as MEDIDAS_CUBO
+from prospectos_index import IndiceProspectos, FILTROS as FILTROS_PROSPECTOS, ORDENES as ORDENES_PROSPECTOS
+from siniestros_store import RegistroSiniestros, carpeta_documentos, COLUMNAS as COLUMNAS_SINIESTROS
+from instantaneas import InstantaneaExcel
+from indice_polizas import IndicePolizas, normalizar_poliza
+from perfilado import perfilador
+from programador import programador
+from activos_estaticos import activos_estaticos
+import metricas
 from admin.routes import admin_bp
+from carga_diferida import modulo_diferido, precargar
+
+# pandas se carga en la primera petición que lo usa, no al importar app.py
+pd = modulo_diferido('pandas')
 
 def limpiar_valor_moneda(valor_str):
     """
@@ -59,7 +82,6 @@ app.config['SECRET_KEY'] = os.environ.get('FLASK_SECRET_KEY', 'dev_super_secret_
 
 # --- Login Manager Configuration ---
 login_manager = LoginManager()
-login_manager.init_app(app)
 login_manager.login_view = 'login' # The name of the view to redirect to when login is required.
 login_manager.login_message = "Por favor, inicie sesión para acceder a esta página."
 login_manager.login_message_category = "info"
@@ -71,9 +93,14 @@ class User(UserMixin):
         self.username = username
         self.password_hash = password_hash
 
+# Hash de la contraseña por defecto ("1234"), calculado una sola vez con
+# generate_password_hash: calcularlo al importar el módulo (scrypt es lento
+# a propósito) retrasaba cada arranque de worker.
+HASH_CLAVE_POR_DEFECTO = 'scrypt:32768:8:1$LDxulWeb1bhl8li8$1336abd4b46c80e976e7251faf05b37c9127b8e58583bdae1c61f73cf300343f98005d005ad021f98e016172d59933fa91b360b6ce86b55213c344facd7bbdbd'
+
 # In-memory user database
 users = {
-    "1": User(id="1", username="admin", password_hash=generate_password_hash("1234"))
+    "1": User(id="1", username="admin", password_hash=HASH_CLAVE_POR_DEFECTO)
 }
 
 @login_manager.user_loader
@@ -82,13 +109,19 @@ def load_user(user_id):
 
 # Rutas BASE_DIR debe estar al nivel de donde corre app.py
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
-UPLOAD_FOLDER = os.path.join(BASE_DIR, 'archivos_subidos')
-CONSECUTIVO_FILE = os.path.join(BASE_DIR, 'consecutivo.txt')
-EXCEL_FILE = os.path.join(BASE_DIR, 'remisiones.xlsx')
-CLIENT_FOLDERS_BASE_DIR = os.path.join(BASE_DIR, 'CLIENTES_CARPETAS')
-VENDEDOR_FOLDERS_BASE_DIR = os.path.join(BASE_DIR, 'VENDEDORES_CARPETAS')
+# Carpeta de los archivos de datos (Excel, adjuntos, consecutivo). Por defecto
+# la del código; SEGUROS_UIB_DATA_DIR permite apuntar a otra (p. ej. benchmarks).
+DATA_DIR = os.environ.get('SEGUROS_UIB_DATA_DIR', BASE_DIR)
+UPLOAD_FOLDER = os.path.join(DATA_DIR, 'archivos_subidos')
+CONSECUTIVO_FILE = os.path.join(DATA_DIR, 'consecutivo.txt')
+EXCEL_FILE = os.path.join(DATA_DIR, 'remisiones.xlsx')
+# Siniestros: los nuevos se agregan al diario .jsonl; el .xlsx guarda los registrados antes
+SINIESTROS_DIARIO = os.path.join(DATA_DIR, 'siniestros.jsonl')
+SINIESTROS_FILE = os.path.join(DATA_DIR, 'siniestros.xlsx')
+CLIENT_FOLDERS_BASE_DIR = os.path.join(DATA_DIR, 'CLIENTES_CARPETAS')
+VENDEDOR_FOLDERS_BASE_DIR = os.path.join(DATA_DIR, 'VENDEDORES_CARPETAS')
 CARTERA_DATA_DIR_NAME = 'DATOS_CARTERA' # Folder name
-CARTERA_DATA_DIR = os.path.join(BASE_DIR, CARTERA_DATA_DIR_NAME)
+CARTERA_DATA_DIR = os.path.join(DATA_DIR, CARTERA_DATA_DIR_NAME)
 CARTERA_PROCESADA_FILENAME = 'cartera_procesada.xlsx'
 # Define column name constants (using names exactly as they appear in the uploaded Excel for extraction)
 COLUMNAS_A_EXTRAER_CARTERA = ['NÚMERO PÓLIZA', 'ASEGURADORA', 'NOMBRES CLIENTE', 'PRIMA NETA', 'COMISIÓN', 'PORCENTAJE DE COMISIÓN', 'FECHA CREACIÓN', 'VENDEDOR']
@@ -120,12 +153,12 @@ ORDEN_COLUMNAS_EXCEL_CARTERA = [
 
 # --- Vencimientos Module Constants & Config ---
 VENCIMIENTOS_DATA_DIR_NAME = 'DATOS_VENCIMIENTOS'
-VENCIMIENTOS_DATA_DIR = os.path.join(BASE_DIR, VENCIMIENTOS_DATA_DIR_NAME)
+VENCIMIENTOS_DATA_DIR = os.path.join(DATA_DIR, VENCIMIENTOS_DATA_DIR_NAME)
 VENCIMIENTOS_PROCESADOS_FILENAME = 'vencimientos_procesados.xlsx'
 
 # --- Prospectos Module Constants & Config ---
 PROSPECTOS_DATA_DIR_NAME = 'DATOS_PROSPECTOS'
-PROSPECTOS_DATA_DIR = os.path.join(BASE_DIR, PROSPECTOS_DATA_DIR_NAME)
+PROSPECTOS_DATA_DIR = os.path.join(DATA_DIR, PROSPECTOS_DATA_DIR_NAME)
 PROSPECTOS_FILENAME = 'prospectos.xlsx'
 
 OPCIONES_RESPONSABLE_TECNICO = ['Luisa', 'Valentina', 'Jairo', 'Jose', 'William']
@@ -174,13 +207,15 @@ ORDEN_COLUMNAS_VENCIMIENTOS = [
 
 # --- Cobros Module Constants & Config ---
 COBROS_FILENAME = 'cobros.xlsx'
-COBROS_FILE = os.path.join(BASE_DIR, COBROS_FILENAME)
+COBROS_FILE = os.path.join(DATA_DIR, COBROS_FILENAME)
 ORDEN_COLUMNAS_COBROS = [
     'ID_COBRO', 'CONSECUTIVO_REMISION', 'Tomador', 'NIT_CC', 'Aseguradora', 'Ramo',
     'N_Poliza', 'N_Cuota', 'Total_Cuotas', 'Fecha_Vencimiento_Cuota',
     'Fecha_Inicio_Vigencia', 'Fecha_Fin_Vigencia', 'Estado', 'Tipo_Movimiento',
     'Periodicidad'
 ]
+# Índice en memoria de cobros.xlsx para KPIs y tablas del panel de cobros
+indice_cobros = CobrosIndex(COBROS_FILE)
 
 # This is the definitive column order for remisiones.xlsx
 # It includes all fields from the form, including calculated ones.
@@ -214,13 +249,24 @@ ORDEN_COLUMNAS_EXCEL_REMISIONES = [
     'numero_remision_manual'
 ]
 
-# Configurar carpeta de carga
-os.makedirs(UPLOAD_FOLDER, exist_ok=True) # For remision attachments
-os.makedirs(CLIENT_FOLDERS_BASE_DIR, exist_ok=True) # For client folders
-os.makedirs(VENDEDOR_FOLDERS_BASE_DIR, exist_ok=True) # For vendor folders
-os.makedirs(CARTERA_DATA_DIR, exist_ok=True) # For cartera data
-os.makedirs(VENCIMIENTOS_DATA_DIR, exist_ok=True) # For vencimientos data
-os.makedirs(PROSPECTOS_DATA_DIR, exist_ok=True) # For prospectos data
+# Tipo de cada columna numérica de los Excel de datos (formato y ancho al guardar).
+# Las columnas no listadas se escriben como texto.
+TIPOS_COLUMNAS_EXCEL = {
+    # Remisiones
+    'prima_neta': 'moneda', 'Comision$': 'moneda', 'ComisionTPP': 'moneda', 'ComisionUIB': 'moneda', 'uib': 'moneda',
+    'porcentaje_comision_valor': 'porcentaje', 'porcentaje_vendedor': 'porcentaje', 'co_corretaje_porcentaje': 'porcentaje',
+    # Cartera
+    'ID_CARTERA': 'entero', 'PRIMA NETA': 'moneda', 'COMISIÓN': 'moneda', 'PORCENTAJE DE COMISIÓN': 'porcentaje',
+    'Retencion_Calc': 'decimal', 'Reteica_Calc': 'decimal', 'Valor_Comision_UIB_Neto_Calc': 'moneda',
+    'Porc_Com_Intermediario_Original': 'porcentaje', 'Valor_Comision_Intermediario_Calc': 'moneda',
+    # Vencimientos
+    'ID_VENCIMIENTO': 'entero',
+    # Cobros
+    'N_Cuota': 'entero', 'Total_Cuotas': 'entero',
+    # Prospectos
+    'Prima': 'moneda', 'Comision %': 'porcentaje', 'Comision $': 'moneda', 'Porcentaje_comision_TPP': 'porcentaje',
+}
+
 app.config['UPLOAD_FOLDER'] = UPLOAD_FOLDER
 app.config['CLIENT_FOLDERS_BASE_DIR'] = CLIENT_FOLDERS_BASE_DIR
 app.config['VENDEDOR_FOLDERS_BASE_DIR'] = VENDEDOR_FOLDERS_BASE_DIR
@@ -230,9 +276,129 @@ app.config['VENCIMIENTOS_DATA_DIR'] = VENCIMIENTOS_DATA_DIR
 app.config['VENCIMIENTOS_PROCESADA_FILE_PATH'] = os.path.join(VENCIMIENTOS_DATA_DIR, VENCIMIENTOS_PROCESADOS_FILENAME)
 app.config['PROSPECTOS_DATA_DIR'] = PROSPECTOS_DATA_DIR
 app.config['PROSPECTOS_FILE_PATH'] = os.path.join(PROSPECTOS_DATA_DIR, PROSPECTOS_FILENAME)
+app.config['PLANTILLA_CORREO_FILE'] = os.path.join(BASE_DIR, 'plantillas', 'plantilla_correo.txt')
+app.config['BANDEJA_CORREO_DIR'] = os.path.join(DATA_DIR, 'BANDEJA_CORREO')
+# Lock de líder, historial y solicitudes del programador de tareas (compartidos por los workers)
+app.config['PROGRAMADOR_DIR'] = DATA_DIR
+app.config['PROGRAMADOR_ACTIVO'] = os.environ.get('PROGRAMADOR_ACTIVO', '1') != '0'
+
+# Copias en memoria de la cartera y los vencimientos procesados, de las
+# remisiones (correspondencia) y de los prospectos: se releen solo cuando cambia el archivo (ver
+# instantaneas.py), con los tipos de esquemas.ESQUEMAS
+instantanea_cartera = InstantaneaExcel('cartera', app.config['CARTERA_PROCESADA_FILE_PATH'], esquema='cartera')
+instantanea_vencimientos = InstantaneaExcel('vencimientos', app.config['VENCIMIENTOS_PROCESADA_FILE_PATH'],
+                                            esquema='vencimientos')
+instantanea_remisiones = InstantaneaExcel('remisiones', EXCEL_FILE, esquema='remisiones')
+instantanea_prospectos = InstantaneaExcel('prospectos', app.config['PROSPECTOS_FILE_PATH'], esquema='prospectos')
+# Orden, filtros y KPIs del listado de prospectos (ver prospectos_index.py)
+indice_prospectos = IndiceProspectos(instantanea_prospectos)
+# Siniestros por NIT/CC, cliente, ramo y fecha (ver siniestros_store.py)
+registro_siniestros = RegistroSiniestros(SINIESTROS_DIARIO, SINIESTROS_FILE)
+# Vencimientos por día de FECHA FIN para los KPIs y el panel (ver vencimientos_index.py)
+calendario_vencimientos = CalendarioVencimientos(instantanea_vencimientos)
+# Número de póliza normalizado -> filas de remisiones, vencimientos, cartera y cobros (ver indice_polizas.py)
+indice_polizas = IndicePolizas(indice_cobros)
+indice_polizas.agregar('remisiones', instantanea_remisiones, ['poliza', 'old_policy_number'])
+indice_polizas.agregar('vencimientos', instantanea_vencimientos, ['NÚMERO PÓLIZA'])
+indice_polizas.agregar('cartera', instantanea_cartera, ['NÚMERO PÓLIZA'])
+# Totales mensuales de producción para el panel de recaudo (ver recaudo_index.py)
+rollup_recaudo = RollupRecaudo(instantanea_remisiones, limpiar_valor_moneda)
+# Aciertos de la copia en memoria de las listas de configuración (ver config_manager.py)
+config_manager.observar_consultas(lambda acierto: metricas.registrar_cache('config', acierto))
+# Recálculo de comisiones al cambiar las tasas de los vendedores (ver comisiones.py y /admin/comisiones)
+comisiones.motor_comisiones.configurar(TIPOS_COLUMNAS_EXCEL, limpiar_valor_moneda, remisiones=instantanea_remisiones,
+                                       prospectos=instantanea_prospectos, cartera=instantanea_cartera)
+# Producción por mes, ramo, aseguradora, vendedor y analista (ver cubo_produccion.py)
+cubo_produccion = CuboProduccion(limpiar_valor_moneda)
+cubo_produccion.agregar(
+    'remisiones', instantanea_remisiones, clave='consecutivo', fecha='fecha_registro',
+    dimensiones={'ramo': 'ramo', 'aseguradora': 'aseguradora', 'vendedor': 'vendedor', 'analista': 'analista_responsable'},
+    medidas={'prima_neta': 'prima_neta', 'comision': 'Comision$', 'comision_uib': 'ComisionUIB',
+             'comision_tpp': 'ComisionTPP', 'uib': 'uib'},
+    filtro=('estado', 'Creado'))
+cubo_produccion.agregar(
+    'cartera', instantanea_cartera, clave='ID_CARTERA', fecha='FECHA CREACIÓN', formato_fecha='%d/%m/%Y',
+    dimensiones={'aseguradora': 'ASEGURADORA', 'vendedor': 'VENDEDOR'},
+    medidas={'prima_neta': 'PRIMA NETA', 'comision': 'COMISIÓN', 'comision_uib': 'Valor_Comision_UIB_Neto_Calc',
+             'comision_tpp': 'Valor_Comision_Intermediario_Calc'})
+
+# --- Listas de opciones de los formularios ---
+# Las plantillas no incluyen las opciones de los selects: las piden a
+# /api/opciones (static/opciones.js) con la huella de las listas en la URL,
+# de modo que el navegador las guarda en cache hasta que cambie alguna.
+@app.context_processor
+def inyectar_url_opciones():
+    def url_opciones():
+        return url_for('opciones_formularios', v=config_manager.huella())
+    return {'url_opciones': url_opciones}
+
+@app.route('/api/opciones')
+@login_required
+def opciones_formularios():
+    huella, listas = config_manager.snapshot()
+    respuesta = jsonify({'version': huella, 'listas': listas})
+    respuesta.set_etag(huella)
+    if request.args.get('v') == huella:
+        # URL versionada: su contenido no cambia nunca
+        respuesta.headers['Cache-Control'] = 'private, max-age=31536000, immutable'
+    else:
+        # Sin versión (o desactualizada): revalidar siempre con el ETag
+        respuesta.headers['Cache-Control'] = 'private, no-cache'
+    return respuesta.make_conditional(request)
 
-# Registrar el Blueprint de administración
-app.register_blueprint(admin_bp)
+@app.route('/api/poliza/<path:numero>')
+@login_required
+def consultar_poliza(numero):
+    """Remisiones, vencimientos, cartera y cuotas de cobro de una póliza."""
+    poliza = normalizar_poliza(numero)
+    if not poliza:
+        return jsonify({'success': False, 'message': 'Número de póliza no válido.'}), 400
+    try:
+        return jsonify({'success': True, 'poliza': poliza, **indice_polizas.buscar(poliza)})
+    except Exception as e:
+        print(f"Error al consultar la póliza {poliza}: {type(e).__name__} - {e}")
+        return jsonify({'success': False, 'message': f'Error al consultar la póliza: {e}'}), 500
+
+@app.route('/api/cubo')
+@login_required
+def consultar_cubo():
+    """
+    Producción agregada del cubo. Parámetros: origen (remisiones o cartera),
+    por (dimensiones separadas por comas), desde/hasta (AAAA-MM), orden (una
+    medida o una dimensión de `por`), limite y un filtro por cada dimensión
+    (p. ej. ramo=...&aseguradora=...; vacío filtra las celdas sin valor).
+    `siguiente` es la dimensión por la que seguir bajando al elegir una fila.
+    """
+    origen = request.args.get('origen', 'remisiones')
+    por = [d.strip() for d in request.args.get('por', 'ramo').split(',') if d.strip()]
+    orden = request.args.get('orden', 'comision_uib')
+    filtros = {d: (request.args[d].strip() or None) for d in DIMENSIONES_CUBO if d in request.args}
+    desde, hasta = request.args.get('desde', ''), request.args.get('hasta', '')
+
+    if origen not in cubo_produccion.origenes:
+        return jsonify({'success': False, 'message': f"Origen no válido. Use: {', '.join(cubo_produccion.origenes)}."}), 400
+    invalidas = [d for d in por if d not in DIMENSIONES_CUBO]
+    if invalidas or len(por) > 2:
+        return jsonify({'success': False, 'message': f"Agrupe por una o dos dimensiones de: {', '.join(DIMENSIONES_CUBO)}."}), 400
+    if orden not in MEDIDAS_CUBO and orden not in por:
+        return jsonify({'success': False, 'message': f"Orden no válido. Use una medida ({', '.join(MEDIDAS_CUBO)}) o una dimensión agrupada."}), 400
+    for mes in (desde, hasta):
+        if mes and not re.fullmatch(r'\d{4}-(0[1-9]|1[0-2])', mes):
+            return jsonify({'success': False, 'message': f"Mes inválido: '{mes}'. Use el formato AAAA-MM."}), 400
+    try:
+        limite = min(max(int(request.args.get('limite', 100)), 1), 500)
+    except ValueError:
+        return jsonify({'success': False, 'message': 'El límite debe ser un número.'}), 400
+
+    try:
+        resultado = cubo_produccion.consultar(origen, por, filtros, desde or None, hasta or None, orden, limite)
+    except Exception as e:
+        print(f"Error al consultar el cubo de producción: {type(e).__name__} - {e}")
+        return jsonify({'success': False, 'message': f'Error al consultar el cubo: {e}'}), 500
+    usadas = set(por) | set(filtros)
+    siguiente = next((d for d in DIMENSIONES_CUBO[1:] if d not in usadas), None)
+    return jsonify({'success': True, 'origen': origen, 'por': por, 'filtros': filtros,
+                    'desde': desde or None, 'hasta': hasta or None, 'siguiente': siguiente, **resultado})
 
 # Obtener el consecutivo
 def obtener_consecutivo():
@@ -260,7 +426,7 @@ def guardar_remision(datos):
     df = pd.DataFrame([datos])
     try:
         if os.path.exists(EXCEL_FILE):
-            df_existente = pd.read_excel(EXCEL_FILE)
+            df_existente = excel_io.leer_excel(EXCEL_FILE)
             df_final = pd.concat([df_existente, df], ignore_index=True)
         else:
             df_final = df
@@ -283,7 +449,7 @@ def guardar_remision(datos):
         else:
             print("ADVERTENCIA: ORDEN_COLUMNAS_EXCEL_REMISIONES no está definida o no es una lista. remisiones.xlsx se guardará con el orden actual del DataFrame.")
 
-        df_final.to_excel(EXCEL_FILE, index=False)
+        excel_io.guardar_excel(df_final, EXCEL_FILE, TIPOS_COLUMNAS_EXCEL)
         return True
     except Exception as e:
         print(f"Error al guardar en Excel: {e}")
@@ -291,9 +457,10 @@ def guardar_remision(datos):
 
 def guardar_cobros(nuevos_cobros):
     df = pd.DataFrame(nuevos_cobros)
+    firma_previa = indice_cobros.firma_archivo()
     try:
         if os.path.exists(COBROS_FILE):
-            df_existente = pd.read_excel(COBROS_FILE)
+            df_existente = excel_io.leer_excel(COBROS_FILE)
             df_final = pd.concat([df_existente, df], ignore_index=True)
         else:
             df_final = df
@@ -304,7 +471,8 @@ def guardar_cobros(nuevos_cobros):
                 df_final[col] = ""
         df_final = df_final[ORDEN_COLUMNAS_COBROS]
 
-        df_final.to_excel(COBROS_FILE, index=False)
+        excel_io.guardar_excel(df_final, COBROS_FILE, TIPOS_COLUMNAS_EXCEL)
+        indice_cobros.agregar(nuevos_cobros, firma_previa)
         return True
     except Exception as e:
         print(f"Error al guardar en {COBROS_FILENAME}: {e}")
@@ -313,12 +481,20 @@ def guardar_cobros(nuevos_cobros):
 def cargar_remisiones():
     if os.path.exists(EXCEL_FILE):
         try:
-            return pd.read_excel(EXCEL_FILE).to_dict(orient='records')
+            return excel_io.leer_excel(EXCEL_FILE).to_dict(orient='records')
         except Exception as e:
             print(f"Error al cargar desde Excel: {e}")
             return []
     return []
 
+def buscar_remision(consecutivo):
+    """Registro de la remisión con ese consecutivo (índice de la instantánea), o None."""
+    try:
+        df, _ = instantanea_remisiones.buscar('consecutivo', [consecutivo.strip()])
+    except FileNotFoundError:
+        return None
+    return df.to_dict(orient='records')[0] if not df.empty else None
+
 @app.route('/login', methods=['GET', 'POST'])
 def login():
     if request.method == 'POST':
@@ -366,52 +542,23 @@ def index():
     ruta_vencimientos = app.config.get('VENCIMIENTOS_PROCESADA_FILE_PATH')
     if ruta_vencimientos and os.path.exists(ruta_vencimientos):
         try:
-            df_venc = pd.read_excel(ruta_vencimientos)
-            df_venc['FECHA FIN_dt'] = pd.to_datetime(df_venc['FECHA FIN'], errors='coerce')
-            df_venc.dropna(subset=['FECHA FIN_dt'], inplace=True)
-            df_venc['Dias_Para_Vencer'] = (df_venc['FECHA FIN_dt'] - hoy).dt.days
-
-            # Aplicar el mismo filtro de ventana de 100 días que en el panel de vencimientos
-            df_filtrado_venc = df_venc[df_venc['Dias_Para_Vencer'].between(-100, 100)]
-            
-            # Filtrar por pólizas que no están en estado final
-            df_venc_activas = df_filtrado_venc[~df_filtrado_venc['Estado'].astype(str).str.lower().isin(['renovado', 'no renovado'])]
-
-            # Excluir ramos especiales para alinear con el panel de vencimientos
-            ramos_a_excluir = ['CUMPLIMIENTO', 'SERIEDAD DE OFERTA']
-            df_venc_kpi = df_venc_activas[~df_venc_activas['RAMO PRINCIPAL'].isin(ramos_a_excluir)]
-
-            kpis['vencimientos_15_dias'] = len(df_venc_kpi[df_venc_kpi['Dias_Para_Vencer'].between(0, 15)])
+            # Pólizas activas (sin estado final ni ramos especiales) que vencen en los próximos 15 días
+            kpis['vencimientos_15_dias'] = calendario_vencimientos.contar(GENERAL_ACTIVAS, 0, 15, hoy)
         except Exception as e:
             print(f"Error al calcular KPIs de vencimientos: {e}")
 
     # --- 2. Cobros Pendientes Mes KPI ---
-    if os.path.exists(COBROS_FILE):
-        try:
-            df_cobros = pd.read_excel(COBROS_FILE)
-            df_cobros['Fecha_Vencimiento_Cuota'] = pd.to_datetime(df_cobros['Fecha_Vencimiento_Cuota'], errors='coerce')
-            df_cobros.dropna(subset=['Fecha_Vencimiento_Cuota'], inplace=True)
-
-            # Replicar lógica de compatibilidad de panel_cobros para alinear los KPIs
-            if 'Tipo_Movimiento' not in df_cobros.columns:
-                df_cobros['Tipo_Movimiento'] = 'Cobro'
-            df_cobros['Tipo_Movimiento'].fillna('Cobro', inplace=True)
-
-            cobros_pendientes_mes = df_cobros[
-                (df_cobros['Estado'] == 'Pendiente') &
-                (df_cobros['Tipo_Movimiento'].str.contains('Cobro', case=False, na=False)) &
-                (df_cobros['Fecha_Vencimiento_Cuota'].dt.month == hoy.month) &
-                (df_cobros['Fecha_Vencimiento_Cuota'].dt.year == hoy.year)
-            ]
-            kpis['cobros_pendientes_mes'] = len(cobros_pendientes_mes)
-        except Exception as e:
-            print(f"Error al calcular KPIs de cobros: {e}")
+    try:
+        indice_cobros.sincronizar(hoy)
+        kpis['cobros_pendientes_mes'] = indice_cobros.kpis('Cobro')['Mensual']
+    except Exception as e:
+        print(f"Error al calcular KPIs de cobros: {e}")
 
     # --- 3. Prospectos KPIs & Chart ---
     prospectos_file_path = app.config.get('PROSPECTOS_FILE_PATH')
     if prospectos_file_path and os.path.exists(prospectos_file_path):
         try:
-            df_prospectos = pd.read_excel(prospectos_file_path)
+            df_prospectos = excel_io.leer_excel(prospectos_file_path)
             kpis['prospectos_en_gestion'] = len(df_prospectos[df_prospectos['Estado'] == 'En gestión'])
             
             # Prospectos por estado chart data
@@ -424,24 +571,20 @@ def index():
     # --- 4. Producción & Remisiones Recientes ---
     if os.path.exists(EXCEL_FILE):
         try:
-            df_remisiones = pd.read_excel(EXCEL_FILE)
-            df_remisiones['fecha_registro_dt'] = pd.to_datetime(df_remisiones['fecha_registro'], dayfirst=True, errors='coerce')
-            
-            # Producción del mes KPI y Chart
-            produccion_mes_df = df_remisiones[
-                (df_remisiones['estado'] == 'Creado') &
-                (df_remisiones['fecha_registro_dt'].dt.month == hoy.month) &
-                (df_remisiones['fecha_registro_dt'].dt.year == hoy.year)
-            ]
-            kpis['produccion_mes'] = produccion_mes_df['uib'].apply(limpiar_valor_moneda).sum()
-            
-            if not produccion_mes_df.empty:
-                ramos_data = produccion_mes_df.groupby('ramo')['uib'].sum().sort_values(ascending=False).head(10)
-                produccion_por_ramo_chart['labels'] = ramos_data.index.tolist()
-                produccion_por_ramo_chart['data'] = ramos_data.values.tolist()
+            # Producción del mes KPI y Chart, desde el cubo de producción (remisiones creadas)
+            mes_actual = hoy.strftime('%Y-%m')
+            produccion_mes = cubo_produccion.consultar('remisiones', ['ramo'], desde=mes_actual, hasta=mes_actual,
+                                                       orden='uib', limite=11)
+            kpis['produccion_mes'] = produccion_mes['totales']['uib']
+            ramos_data = [fila for fila in produccion_mes['filas'] if fila['ramo'] is not None][:10]
+            produccion_por_ramo_chart['labels'] = [fila['ramo'] for fila in ramos_data]
+            produccion_por_ramo_chart['data'] = [fila['uib'] for fila in ramos_data]
+
+            df_remisiones = instantanea_remisiones.vista()
+            fecha_registro = pd.to_datetime(df_remisiones['fecha_registro'], dayfirst=True, errors='coerce')
 
             # Remisiones recientes
-            remisiones_recientes_df = df_remisiones.sort_values(by='fecha_registro_dt', ascending=False).head(5)
+            remisiones_recientes_df = df_remisiones.loc[fecha_registro.sort_values(ascending=False).index[:5]]
             remisiones_recientes = remisiones_recientes_df.to_dict(orient='records')
 
             # KPI de Remisiones Pendientes
@@ -473,16 +616,7 @@ def formulario_remision():
     }
 
     # These global lists should be defined at the top of app.py
-    return render_template('formulario.html',
-                           opciones_aseguradora=config_manager.get_list('aseguradoras'),
-                           opciones_ramo=config_manager.get_list('ramos'),
-                           opciones_tipo_moneda=config_manager.get_list('tipo_moneda'),
-                           opciones_vendedor=config_manager.get_list('vendedores'),
-                           opciones_forma_pago=config_manager.get_list('forma_pago'),
-                           opciones_periodicidad_pago=config_manager.get_list('periodicidad_pago'),
-                           opciones_analista=config_manager.get_list('analistas'),
-                           prospecto=prospecto_data
-                          )
+    return render_template('formulario.html', prospecto=prospecto_data)
 
 @app.route('/registrar', methods=['POST'])
 @login_required
@@ -502,7 +636,7 @@ def registrar():
 
         # Collect all other text/select form fields
         form_fields_to_collect = [
-            'fecha_recepcion', 'tomador', 'nit', 'aseguradora', 'ramo', 'poliza', 'old_policy_number', 'anexo',
+            'fecha_recepcion', 'tomador', 'nit', 'correo', 'aseguradora', 'ramo', 'poliza', 'old_policy_number', 'anexo',
             'categorias_grupo', 'categorias_grupo_otro',
             'fecha_inicio', 'fecha_fin', 'fecha_limite_pago',
             'tipo_moneda',
@@ -531,17 +665,9 @@ def registrar():
 
         # --- 2. Backend Calculations (Corrected Logic) ---
 
-        # Calculate Comision$
-        comision_dolar = (prima_neta * porcentaje_comision) / 100.0
-
-        # Calculate ComisionTPP based on the seller's participation
-        comision_tpp = 0
-        # If the seller is UIB, their commission is not TPP.
-        if datos.get('vendedor') != 'UIB CORREDORES DE SEGUROS S.A.' and porcentaje_vendedor > 0 and datos.get('co_corretaje_opcion') == 'si':
-             comision_tpp = comision_dolar * (porcentaje_vendedor / 100.0)
-
-        # Calculate ComisionUIB, which is the remainder
-        comision_uib = comision_dolar - comision_tpp
+        # Comision$, ComisionTPP (co-corretaje con un vendedor distinto de UIB) y ComisionUIB (ver comisiones.py)
+        calculo = comisiones.comisiones_remision(prima_neta, porcentaje_comision, porcentaje_vendedor,
+                                                 datos.get('vendedor'), datos.get('co_corretaje_opcion'))
 
         # --- 3. Populate 'datos' dictionary for saving ---
 
@@ -551,10 +677,10 @@ def registrar():
         datos['porcentaje_vendedor'] = porcentaje_vendedor
         datos['co_corretaje_porcentaje'] = porcentaje_co_corretaje
         
-        datos['Comision$'] = comision_dolar
-        datos['ComisionTPP'] = comision_tpp
-        datos['ComisionUIB'] = comision_uib
-        datos['uib'] = comision_uib # This is the final UIB value
+        datos['Comision$'] = float(calculo['Comision$'])
+        datos['ComisionTPP'] = float(calculo['ComisionTPP'])
+        datos['ComisionUIB'] = float(calculo['ComisionUIB'])
+        datos['uib'] = float(calculo['uib']) # This is the final UIB value
 
         # Add automatic and placeholder fields
         datos['consecutivo'] = obtener_consecutivo()
@@ -747,16 +873,12 @@ def control():
         'has_next': page < total_pages,
     }
 
-    opciones_aseguradora = sorted(config_manager.get_list('aseguradoras'))
-    opciones_ramo = sorted(config_manager.get_list('ramos'))
     opciones_estado = ['Pendiente', 'Creado']
 
     return render_template('control.html', 
                            remisiones=remisiones_paginadas,
                            pagination=pagination,
                            kpis=kpis,
-                           opciones_aseguradora=opciones_aseguradora,
-                           opciones_ramo=opciones_ramo,
                            opciones_estado=opciones_estado,
                            filtros_activos={
                                'aseguradora': aseguradora_filtro,
@@ -784,7 +906,7 @@ def marcar_creado():
         df.loc[idx, 'estado'] = 'Creado'
         
         try:
-            df.to_excel(EXCEL_FILE, index=False)
+            excel_io.guardar_excel(df, EXCEL_FILE, TIPOS_COLUMNAS_EXCEL)
             flash(f'La remisión {consecutivo_a_marcar} ha sido marcada como "Creado".', 'success')
         except Exception as e:
             flash(f'Error al guardar los cambios: {e}', 'danger')
@@ -803,12 +925,7 @@ def plantilla():
 @app.route('/resumen/<string:consecutivo_id>')
 @login_required
 def mostrar_resumen(consecutivo_id):
-    remisiones = cargar_remisiones()
-    remision_encontrada = None
-    for r in remisiones:
-        if str(r.get('consecutivo')) == str(consecutivo_id):
-            remision_encontrada = r
-            break
+    remision_encontrada = buscar_remision(consecutivo_id)
     if remision_encontrada:
         return render_template('resumen.html', datos=remision_encontrada)
     else:
@@ -817,12 +934,7 @@ def mostrar_resumen(consecutivo_id):
 @app.route('/editar_remision_numero/<string:consecutivo_id>', methods=['GET'])
 @login_required
 def editar_remision(consecutivo_id):
-    remisiones = cargar_remisiones()
-    remision_a_editar = None
-    for r in remisiones:
-        if str(r.get('consecutivo')).strip() == str(consecutivo_id).strip():
-            remision_a_editar = r
-            break
+    remision_a_editar = buscar_remision(consecutivo_id)
 
     if remision_a_editar:
         # Ensure all expected fields are present in the dictionary passed to the template
@@ -831,24 +943,8 @@ def editar_remision(consecutivo_id):
             if campo not in remision_a_editar:
                 remision_a_editar[campo] = ''
 
-        # Cargar las listas de opciones para los dropdowns
-        opciones_aseguradora = config_manager.get_list('aseguradoras')
-        opciones_ramo = config_manager.get_list('ramos')
-        opciones_tipo_moneda = config_manager.get_list('tipo_moneda')
-        opciones_vendedor = config_manager.get_list('vendedores')
-        opciones_forma_pago = config_manager.get_list('forma_pago')
-        opciones_periodicidad_pago = config_manager.get_list('periodicidad_pago')
-        opciones_analista = config_manager.get_list('analistas')
-
-        return render_template('editar_remision.html', 
-                               datos=remision_a_editar,
-                               opciones_aseguradora=opciones_aseguradora,
-                               opciones_ramo=opciones_ramo,
-                               opciones_tipo_moneda=opciones_tipo_moneda,
-                               opciones_vendedor=opciones_vendedor,
-                               opciones_forma_pago=opciones_forma_pago,
-                               opciones_periodicidad_pago=opciones_periodicidad_pago,
-                               opciones_analista=opciones_analista)
+        # Las opciones de los dropdowns las carga la página desde /api/opciones
+        return render_template('editar_remision.html', datos=remision_a_editar)
     else:
         return f"Error: Remisión con consecutivo {consecutivo_id} no encontrada. Verifique el número o contacte soporte.", 404
 
@@ -863,7 +959,7 @@ def guardar_numero_remision():
     remisiones_actualizadas_df_list = []
     actualizacion_realizada = False
     for remision_data in remisiones:
-        if str(remision_data.get('consecutivo')).strip() == str(consecutivo_a_actualizar).strip():
+        if remision_data.get('consecutivo') == consecutivo_a_actualizar.strip():
             remision_data['numero_remision_manual'] = nuevo_numero_remision
             actualizacion_realizada = True
         remisiones_actualizadas_df_list.append(remision_data)
@@ -882,7 +978,7 @@ def guardar_numero_remision():
             else:
                 print("ADVERTENCIA en guardar_numero_remision: ORDEN_COLUMNAS_EXCEL_REMISIONES no definida. Remisiones se guardará con orden actual.")
 
-            df.to_excel(EXCEL_FILE, index=False)
+            excel_io.guardar_excel(df, EXCEL_FILE, TIPOS_COLUMNAS_EXCEL)
             # flash(f'Número de remisión para {consecutivo_a_actualizar} guardado.', 'success') # Example original flash
         except Exception as e:
             print(f"Error al guardar Excel en /guardar_numero_remision: {e}")
@@ -895,50 +991,35 @@ def guardar_numero_remision():
         # 'consecutivo_a_actualizar' is also available.
 
         if actualizacion_realizada and nuevo_numero_remision.strip() : # Only proceed if a non-empty numero_remision_manual was set
-            numero_poliza_a_buscar = None
             remision_actualizada_data = df[df['consecutivo'] == consecutivo_a_actualizar].iloc[0]
 
             # Check if the policy number was modified and use the old one if available
             policy_modified_flag = remision_actualizada_data.get('policy_number_modified')
-            old_policy_number = remision_actualizada_data.get('old_policy_number')
+            numero_poliza_a_buscar = normalizar_poliza(remision_actualizada_data.get('old_policy_number')) \
+                if policy_modified_flag == 'si' else ''
+            if not numero_poliza_a_buscar:
+                numero_poliza_a_buscar = normalizar_poliza(remision_actualizada_data.get('poliza'))
 
-            if policy_modified_flag == 'si' and pd.notna(old_policy_number) and str(old_policy_number).strip():
-                # Convert to int to remove decimals, then to string for matching.
-                try:
-                    numero_poliza_a_buscar = str(int(float(old_policy_number))).strip()
-                except (ValueError, TypeError):
-                    # Fallback if conversion fails for some reason
-                    numero_poliza_a_buscar = str(old_policy_number).strip()
-            else:
-                numero_poliza_a_buscar = str(remision_actualizada_data.get('poliza', '')).strip()
-
-            if numero_poliza_a_buscar and numero_poliza_a_buscar not in ['N/A', 'None', '', 'nan', 'NaN']:
+            if numero_poliza_a_buscar:
                 ruta_vencimientos = app.config.get('VENCIMIENTOS_PROCESADA_FILE_PATH')
                 if ruta_vencimientos and os.path.exists(ruta_vencimientos):
                     try:
-                        df_vencimientos = pd.read_excel(ruta_vencimientos)
-                        vencimientos_modificados_count = 0
-
-                        if 'NÚMERO PÓLIZA' in df_vencimientos.columns:
-                            # Ensure consistent string comparison
-                            df_vencimientos['NÚMERO PÓLIZA_str_comp'] = df_vencimientos['NÚMERO PÓLIZA'].astype(str).str.strip().fillna('')
-
-                            filas_afectadas_mask = df_vencimientos['NÚMERO PÓLIZA_str_comp'] == numero_poliza_a_buscar
-
-                            if filas_afectadas_mask.any():
-                                if 'Estado' not in df_vencimientos.columns: df_vencimientos['Estado'] = ''
-                                if 'Remision_Asociada' not in df_vencimientos.columns: df_vencimientos['Remision_Asociada'] = ''
-                                if 'Observaciones_adicionales' not in df_vencimientos.columns: df_vencimientos['Observaciones_adicionales'] = ''
+                        # Filas de la póliza por el índice de pólizas, sin comparar todo el archivo
+                        df_vencimientos, posiciones = indice_polizas.para_actualizar('vencimientos', numero_poliza_a_buscar)
+                        vencimientos_modificados_count = len(posiciones)
 
-                                df_vencimientos.loc[filas_afectadas_mask, 'Estado'] = "Renovado"
-                                df_vencimientos.loc[filas_afectadas_mask, 'Remision_Asociada'] = nuevo_numero_remision
-                                df_vencimientos.loc[filas_afectadas_mask, 'Observaciones_adicionales'] = f"Remisión: {nuevo_numero_remision}"
-                                vencimientos_modificados_count = filas_afectadas_mask.sum()
-
-                            if 'NÚMERO PÓLIZA_str_comp' in df_vencimientos.columns: # Drop helper column
-                                df_vencimientos = df_vencimientos.drop(columns=['NÚMERO PÓLIZA_str_comp'])
-                        else:
+                        if 'NÚMERO PÓLIZA' not in df_vencimientos.columns:
                             print(f"Advertencia: Columna 'NÚMERO PÓLIZA' no encontrada en {ruta_vencimientos} al intentar actualizar vencimientos.")
+                        elif posiciones:
+                            for columna_texto in ('Estado', 'Remision_Asociada', 'Observaciones_adicionales'):
+                                # Columnas vacías se leen como float: pasarlas a texto antes de asignar
+                                df_vencimientos[columna_texto] = df_vencimientos[columna_texto].astype(object) \
+                                    if columna_texto in df_vencimientos.columns else ''
+
+                            filas_afectadas = df_vencimientos.index[posiciones]
+                            df_vencimientos.loc[filas_afectadas, 'Estado'] = "Renovado"
+                            df_vencimientos.loc[filas_afectadas, 'Remision_Asociada'] = nuevo_numero_remision
+                            df_vencimientos.loc[filas_afectadas, 'Observaciones_adicionales'] = f"Remisión: {nuevo_numero_remision}"
 
                         if vencimientos_modificados_count > 0:
                             if 'ORDEN_COLUMNAS_VENCIMIENTOS' in globals() and isinstance(ORDEN_COLUMNAS_VENCIMIENTOS, list):
@@ -950,7 +1031,7 @@ def guardar_numero_remision():
                             else:
                                 print("ADVERTENCIA: ORDEN_COLUMNAS_VENCIMIENTOS no definida. Vencimientos se guardará con orden actual.")
 
-                            df_vencimientos.to_excel(ruta_vencimientos, index=False)
+                            excel_io.guardar_excel(df_vencimientos, ruta_vencimientos, TIPOS_COLUMNAS_EXCEL)
                             flash(f'{vencimientos_modificados_count} registro(s) de vencimiento para póliza "{numero_poliza_a_buscar}" actualizados a "Renovado" (Remisión: {nuevo_numero_remision}).', 'info')
 
                     except Exception as e_venc:
@@ -958,8 +1039,8 @@ def guardar_numero_remision():
                         flash(f'N° Remisión guardado, pero ocurrió un error al intentar actualizar vencimientos asociados: {str(e_venc)}', 'warning')
                 elif ruta_vencimientos and not os.path.exists(ruta_vencimientos):
                     flash('Archivo de vencimientos no encontrado. No se pudieron actualizar estados de vencimiento.', 'info')
-                elif not (numero_poliza_a_buscar and numero_poliza_a_buscar not in ['N/A', 'None', '', 'nan', 'NaN']):
-                     flash('No se proporcionó un número de póliza válido en la remisión, no se actualizaron vencimientos.', 'info')
+            else:
+                flash('No se proporcionó un número de póliza válido en la remisión, no se actualizaron vencimientos.', 'info')
 
         elif actualizacion_realizada and not nuevo_numero_remision.strip():
             flash('Número de remisión manual está vacío, no se intentó actualizar vencimientos.', 'info')
@@ -1046,13 +1127,7 @@ def ejecutar_crear_carpeta():
 @login_required
 def crear_prospecto():
     if request.method == 'GET':
-        return render_template('prospectos_crear.html',
-                               opciones_responsable_tecnico=config_manager.get_list('responsable_tecnico'),
-                               opciones_responsable_comercial=config_manager.get_list('responsable_comercial'),
-                               opciones_estado=config_manager.get_list('estado_prospecto'),
-                               opciones_ramo=config_manager.get_list('ramos'),
-                               opciones_aseguradora=config_manager.get_list('aseguradoras'),
-                               opciones_vendedor=config_manager.get_list('vendedores'))
+        return render_template('prospectos_crear.html')
 
     if request.method == 'POST':
         try:
@@ -1064,18 +1139,14 @@ def crear_prospecto():
             datos_formulario['Prima'] = prima # Store the cleaned numeric value
 
             comision_porcentaje = float(datos_formulario.get('Comision %', 0))
-            comision_calculada = prima * (comision_porcentaje / 100)
-
-            if datos_formulario.get('es_TPP') == 'si':
-                porcentaje_tpp = float(datos_formulario.get('Porcentaje_comision_TPP', 0))
-                comision_calculada -= comision_calculada * (porcentaje_tpp / 100)
-
-            datos_formulario['Comision $'] = comision_calculada
+            es_tpp = datos_formulario.get('es_TPP') == 'si'
+            porcentaje_tpp = float(datos_formulario.get('Porcentaje_comision_TPP', 0)) if es_tpp else 0.0
+            datos_formulario['Comision $'] = float(comisiones.comision_prospecto(prima, comision_porcentaje, es_tpp, porcentaje_tpp))
 
             PROSPECTOS_FILE = app.config['PROSPECTOS_FILE_PATH']
 
             if os.path.exists(PROSPECTOS_FILE):
-                df_prospectos = pd.read_excel(PROSPECTOS_FILE)
+                df_prospectos = excel_io.leer_excel(PROSPECTOS_FILE)
             else:
                 df_prospectos = pd.DataFrame(columns=ORDEN_COLUMNAS_PROSPECTOS)
 
@@ -1088,67 +1159,125 @@ def crear_prospecto():
 
             df_prospectos = df_prospectos[ORDEN_COLUMNAS_PROSPECTOS]
 
-            df_prospectos.to_excel(PROSPECTOS_FILE, index=False)
+            excel_io.guardar_excel(df_prospectos, PROSPECTOS_FILE, TIPOS_COLUMNAS_EXCEL)
 
             return jsonify({'status': 'success', 'message': 'Prospecto guardado exitosamente'})
 
         except Exception as e:
             return jsonify({'status': 'error', 'message': str(e)})
 
-@app.route('/prospectos/visualizar', methods=['GET'])
+@app.route('/prospectos/importar', methods=['GET', 'POST'])
 @login_required
-def prospectos_vista():
+def importar_prospectos():
+    """
+    Importa un Excel o CSV de prospectos: valida todas las filas, calcula la
+    Comision $ y guarda el lote en una sola escritura de prospectos.xlsx (ver
+    importacion_prospectos.py). Si hay errores no se guarda nada, salvo que
+    se pida importar solo las filas válidas; con solo_validar no se guarda.
+    """
+    if request.method == 'GET':
+        return render_template('prospectos_importar.html', columnas=[
+            columna for columna in ORDEN_COLUMNAS_PROSPECTOS if columna not in importacion_prospectos.GENERADAS],
+            obligatorias=importacion_prospectos.OBLIGATORIAS, maximo_filas=importacion_prospectos.MAXIMO_FILAS)
+
+    archivo = request.files.get('archivo')
+    if archivo is None or archivo.filename == '':
+        return jsonify({'status': 'error', 'message': 'No se seleccionó ningún archivo.'}), 400
+    if not archivo.filename.lower().endswith(importacion_prospectos.EXTENSIONES):
+        return jsonify({'status': 'error', 'message': 'Formato de archivo no válido. Suba un Excel (.xlsx o .xls) o un CSV.'}), 400
+    try:
+        df_archivo = importacion_prospectos.leer_archivo(archivo)
+    except Exception as e:
+        return jsonify({'status': 'error', 'message': f'Error al leer el archivo: {e}'}), 400
+    if len(df_archivo) > importacion_prospectos.MAXIMO_FILAS:
+        return jsonify({'status': 'error', 'message': f'El archivo tiene {len(df_archivo)} filas; el máximo por importación es '
+                                                       f'{importacion_prospectos.MAXIMO_FILAS}.'}), 400
+
     try:
+        listas = {nombre: esquemas.valores_lista(nombre) for nombre in set(importacion_prospectos.LISTAS.values())}
+        resultado = importacion_prospectos.validar(df_archivo, ORDEN_COLUMNAS_PROSPECTOS, listas,
+                                                   comisiones.tasas_vendedores())
+        respuesta = {clave: valor for clave, valor in resultado.items() if clave != 'prospectos'}
+        respuesta['importados'] = 0
+        if resultado['faltantes']:
+            respuesta.update(status='error', message='Faltan columnas obligatorias: ' + ', '.join(resultado['faltantes']) + '.')
+            return jsonify(respuesta), 400
+        if not resultado['filas']:
+            respuesta.update(status='error', message='El archivo no tiene filas.')
+            return jsonify(respuesta), 400
+
+        solo_validas = request.form.get('solo_validas') == 'si'
+        nuevos = resultado['prospectos']
+        if request.form.get('solo_validar') == 'si' or (resultado['total_errores'] and not solo_validas) or nuevos.empty:
+            estado = 'error' if resultado['total_errores'] else 'success'
+            respuesta.update(status=estado, message=f"{resultado['filas_validas']} de {resultado['filas']} fila(s) válidas, "
+                                                    f"{resultado['total_errores']} error(es). No se guardó ningún prospecto.")
+            return jsonify(respuesta)
+
         PROSPECTOS_FILE = app.config['PROSPECTOS_FILE_PATH']
-        kpi_recaudo_mes = 0
-        kpi_top_ramos = []
-
-        if os.path.exists(PROSPECTOS_FILE):
-            df = pd.read_excel(PROSPECTOS_FILE)
-
-            # --- Data Cleaning and Preparation ---
-            df['Fecha inicio poliza'] = pd.to_datetime(df['Fecha inicio poliza'], errors='coerce')
-            if 'Fecha Creacion' in df.columns:
-                df['Fecha Creacion'] = pd.to_datetime(df['Fecha Creacion'], errors='coerce')
-
-            currency_cols = ['Prima', 'Comision $']
-            for col in currency_cols:
-                if col in df.columns:
-                    df[col] = pd.to_numeric(df[col], errors='coerce').fillna(0).astype(int)
-
-            # --- KPI Calculation (Ganado en el mes actual) ---
-            hoy = datetime.now()
-            df_ganado_mes_actual = df[
-                (df['Estado'] == 'Ganado') &
-                (df['Fecha inicio poliza'].dt.month == hoy.month) &
-                (df['Fecha inicio poliza'].dt.year == hoy.year)
-            ]
-
-            kpi_recaudo_mes = df_ganado_mes_actual['Comision $'].sum()
-
-            top_ramos = df_ganado_mes_actual.groupby('Ramo')['Comision $'].sum().nlargest(3).reset_index()
-            kpi_top_ramos = top_ramos.to_dict(orient='records')
-
-            # --- Sorting (más reciente primero) ---
-            if 'Fecha Creacion' in df.columns:
-                df.sort_values(by='Fecha Creacion', ascending=False, inplace=True)
-            else:
-                # Fallback to ID if Fecha Creacion doesn't exist yet
-                df.sort_values(by='ID_PROSPECTO', ascending=False, inplace=True)
+        try:
+            existentes = instantanea_prospectos.vista()
+        except FileNotFoundError:
+            # Primera importación: prospectos.xlsx se crea con este lote
+            existentes = pd.DataFrame(columns=ORDEN_COLUMNAS_PROSPECTOS)
+        df_prospectos = importacion_prospectos.agregar_prospectos(existentes, nuevos, ORDEN_COLUMNAS_PROSPECTOS)
+        excel_io.guardar_excel(df_prospectos, PROSPECTOS_FILE, TIPOS_COLUMNAS_EXCEL)
+        respuesta.update(status='success', importados=len(nuevos),
+                         message=f'{len(nuevos)} prospecto(s) importados'
+                                 + (f" ({resultado['filas'] - len(nuevos)} fila(s) con errores omitidas)." if resultado['total_errores'] else '.'))
+        return jsonify(respuesta)
+    except Exception as e:
+        return jsonify({'status': 'error', 'message': f'Error al importar los prospectos: {e}'}), 500
 
-            prospectos_data = df.head(20).to_dict(orient='records')
-        else:
-            prospectos_data = []
+@app.route('/prospectos/importar/plantilla', methods=['GET'])
+@login_required
+def plantilla_importar_prospectos():
+    """Excel vacío con los encabezados que espera la importación de prospectos."""
+    columnas = [columna for columna in ORDEN_COLUMNAS_PROSPECTOS if columna not in importacion_prospectos.GENERADAS]
+    return Response(
+        stream_with_context(excel_io.generar_xlsx(pd.DataFrame(columns=columnas), nombre_hoja='Prospectos')),
+        mimetype='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
+        headers={'Content-Disposition': 'attachment; filename="Plantilla_Prospectos.xlsx"'}
+    )
 
+@app.route('/prospectos/visualizar', methods=['GET'])
+@login_required
+def prospectos_vista():
+    page = request.args.get('page', 1, type=int)
+    filtros = {parametro: request.args.get(parametro, '').strip() for parametro in FILTROS_PROSPECTOS}
+    busqueda = request.args.get('q', '').strip()
+    orden = request.args.get('orden', 'reciente')
+    fechas = {}
+    for parametro in ('desde', 'hasta'):
+        valor = request.args.get(parametro, '').strip()
+        try:
+            fechas[parametro] = datetime.strptime(valor, '%Y-%m-%d').date() if valor else None
+        except ValueError:
+            flash(f"Fecha inválida en el filtro '{parametro}': {valor}", 'warning')
+            fechas[parametro] = None
+    filtros_activos = {parametro: valor for parametro, valor in filtros.items() if valor}
+    filtros_activos.update({parametro: valor.isoformat() for parametro, valor in fechas.items() if valor})
+    if busqueda:
+        filtros_activos['q'] = busqueda
+    if orden != 'reciente' and orden in ORDENES_PROSPECTOS:
+        filtros_activos['orden'] = orden
+
+    kpi_recaudo_mes = 0
+    kpi_top_ramos = []
+    prospectos_data = []
+    pagination = None
+    try:
+        # Solo la página pedida: el orden, los filtros y los KPIs vienen del índice
+        prospectos_data, pagination = indice_prospectos.pagina(filtros, fechas['desde'], fechas['hasta'], busqueda,
+                                                               orden, page)
+        kpi_recaudo_mes, kpi_top_ramos = indice_prospectos.kpis()
     except Exception as e:
         flash(f'Error al cargar los prospectos: {str(e)}', 'danger')
-        prospectos_data = []
 
     return render_template('prospectos_vista.html',
                            prospectos=prospectos_data,
-                           opciones_responsable_tecnico=config_manager.get_list('responsable_tecnico'),
-                           opciones_responsable_comercial=config_manager.get_list('responsable_comercial'),
-                           opciones_estado=config_manager.get_list('estado_prospecto'),
+                           pagination=pagination,
+                           filtros_activos=filtros_activos,
                            kpi_recaudo_mes=kpi_recaudo_mes,
                            kpi_top_ramos=kpi_top_ramos)
 
@@ -1160,21 +1289,14 @@ def prospecto_editar(prospecto_id):
         flash('El archivo de prospectos no existe.', 'danger')
         return redirect(url_for('prospectos_vista'))
 
-    df = pd.read_excel(PROSPECTOS_FILE, dtype={'ID_PROSPECTO': str})
+    df = excel_io.leer_excel(PROSPECTOS_FILE)
     prospecto_data = df[df['ID_PROSPECTO'] == prospecto_id].to_dict('records')
 
     if not prospecto_data:
         flash('Prospecto no encontrado.', 'danger')
         return redirect(url_for('prospectos_vista'))
 
-    return render_template('prospectos_editar.html',
-                           prospecto=prospecto_data[0],
-                           opciones_responsable_tecnico=config_manager.get_list('responsable_tecnico'),
-                           opciones_responsable_comercial=config_manager.get_list('responsable_comercial'),
-                           opciones_estado=config_manager.get_list('estado_prospecto'),
-                           opciones_ramo=config_manager.get_list('ramos'),
-                           opciones_aseguradora=config_manager.get_list('aseguradoras'),
-                           opciones_vendedor=config_manager.get_list('vendedores'))
+    return render_template('prospectos_editar.html', prospecto=prospecto_data[0])
 
 @app.route('/prospectos/guardar_edicion', methods=['POST'])
 @login_required
@@ -1184,7 +1306,7 @@ def prospecto_guardar_edicion():
         prospecto_id = datos.get('ID_PROSPECTO')
 
         PROSPECTOS_FILE = app.config['PROSPECTOS_FILE_PATH']
-        df = pd.read_excel(PROSPECTOS_FILE, dtype={'ID_PROSPECTO': str})
+        df = excel_io.leer_excel(PROSPECTOS_FILE)
 
         index_list = df[df['ID_PROSPECTO'] == prospecto_id].index
         if not index_list.any():
@@ -1203,15 +1325,11 @@ def prospecto_guardar_edicion():
         df.loc[idx, 'Prima'] = prima # Save cleaned value back
 
         comision_porc = float(df.loc[idx, 'Comision %'])
-        comision_calculada = prima * (comision_porc / 100)
+        es_tpp = str(df.loc[idx, 'es_TPP']) == 'si'
+        porcentaje_tpp = float(df.loc[idx, 'Porcentaje_comision_TPP']) if es_tpp else 0.0
+        df.loc[idx, 'Comision $'] = float(comisiones.comision_prospecto(prima, comision_porc, es_tpp, porcentaje_tpp))
 
-        if str(df.loc[idx, 'es_TPP']) == 'si':
-            porcentaje_tpp = float(df.loc[idx, 'Porcentaje_comision_TPP'])
-            comision_calculada -= comision_calculada * (porcentaje_tpp / 100)
-
-        df.loc[idx, 'Comision $'] = comision_calculada
-
-        df.to_excel(PROSPECTOS_FILE, index=False)
+        excel_io.guardar_excel(df, PROSPECTOS_FILE, TIPOS_COLUMNAS_EXCEL)
         flash('Prospecto actualizado con éxito.', 'success')
 
     except Exception as e:
@@ -1235,7 +1353,7 @@ def actualizar_estado_prospecto():
         if not os.path.exists(PROSPECTOS_FILE):
             return jsonify({'status': 'error', 'message': 'El archivo de prospectos no existe.'}), 404
 
-        df = pd.read_excel(PROSPECTOS_FILE, dtype={'ID_PROSPECTO': str})
+        df = excel_io.leer_excel(PROSPECTOS_FILE)
 
         index = df[df['ID_PROSPECTO'] == str(prospecto_id)].index
 
@@ -1249,7 +1367,7 @@ def actualizar_estado_prospecto():
                     df['Fecha inicio poliza'] = ''
                 df.loc[index, 'Fecha inicio poliza'] = fecha_emision
 
-            df.to_excel(PROSPECTOS_FILE, index=False)
+            excel_io.guardar_excel(df, PROSPECTOS_FILE, TIPOS_COLUMNAS_EXCEL)
 
             response = {'status': 'success', 'message': f'Prospecto marcado como {nuevo_estado}.'}
             if fecha_emision:
@@ -1263,27 +1381,15 @@ def actualizar_estado_prospecto():
 
 import locale
 
-# Set locale to Spanish for month names
-try:
-    locale.setlocale(locale.LC_TIME, 'es_ES.UTF-8')
-except locale.Error:
+def configurar_locale():
+    # Set locale to Spanish for month names
     try:
-        locale.setlocale(locale.LC_TIME, 'es')
+        locale.setlocale(locale.LC_TIME, 'es_ES.UTF-8')
     except locale.Error:
-        print("Locale 'es_ES' or 'es' not found. Month names will be in English.")
-
-def format_date_in_spanish(date_str):
-    if not date_str or pd.isna(date_str):
-        return ""
-    try:
-        # First, try to parse with slashes, then with hyphens
         try:
-            dt = datetime.strptime(str(date_str), '%d/%m/%Y')
-        except ValueError:
-            dt = datetime.strptime(str(date_str), '%Y-%m-%d')
-        return dt.strftime('%d de %B de %Y')
-    except (ValueError, TypeError):
-        return date_str # Return original if format is unexpected
+            locale.setlocale(locale.LC_TIME, 'es')
+        except locale.Error:
+            print("Locale 'es_ES' or 'es' not found. Month names will be in English.")
 
 @app.route('/correspondencia/vista_previa')
 @login_required
@@ -1295,9 +1401,11 @@ def correspondencia_vista_previa():
 
         if not consecutivo or not tipo_plantilla:
             return "Error: Faltan parámetros.", 400
+        if tipo_plantilla not in correspondencia.TIPOS_PLANTILLA:
+            return "Error: Tipo de plantilla no válido.", 400
 
-        remisiones_df = pd.read_excel(EXCEL_FILE, dtype={'consecutivo': str})
-        remision_data = remisiones_df[remisiones_df['consecutivo'] == consecutivo].to_dict('records')
+        remision_df, _ = instantanea_remisiones.buscar('consecutivo', [consecutivo])
+        remision_data = remision_df.to_dict('records')
 
         if not remision_data:
             return "Error: Remisión no encontrada.", 404
@@ -1305,42 +1413,147 @@ def correspondencia_vista_previa():
         contexto = remision_data[0]
         contexto.update(datos)
 
-        # Generar asunto automático
-        ref_asunto_auto = f"{contexto.get('consecutivo', '')} | {contexto.get('tomador', '')} | {contexto.get('ramo', '')} No {contexto.get('poliza', '')}"
-
-        # Limpiar nombres de archivos para la descripción
-        archivos_str = contexto.get('archivos', '')
-        if archivos_str:
-            # Extraer solo el nombre base del archivo sin la ruta y la extensión
-            nombres_limpios = [os.path.splitext(os.path.basename(f))[0].split('_')[-1] for f in archivos_str.split(',')]
-            descripcion_archivos = ' - '.join(nombres_limpios)
-        else:
-            descripcion_archivos = ''
-
-        contexto_plantilla = {
-            'empresa': contexto.get('tomador'),
-            'sr_sra': contexto.get('sr_sra'),
-            'correo': contexto.get('correo'),
-            'fecha': datetime.now().strftime('%d de %B de %Y'),
-            'consecutivo': contexto.get('consecutivo'),
-            'ref_asunto': ref_asunto_auto,
-            'aseguradora': contexto.get('aseguradora'),
-            'fecha_inicio': format_date_in_spanish(contexto.get('fecha_inicio')),
-            'fecha_terminacion': format_date_in_spanish(contexto.get('fecha_fin')),
-            'ramo': contexto.get('ramo'),
-            'poliza': contexto.get('poliza'),
-            'descripcion': descripcion_archivos,
-            'valor_a_pagar': contexto.get('valor_a_pagar'),
-            'garantias': contexto.get('garantias'),
-            'fecha_de_pago': format_date_in_spanish(contexto.get('fecha_limite_pago')),
-            'link_de_pago': contexto.get('link_de_pago')
-        }
-
-        return render_template(f'correspondencia/{tipo_plantilla}.html', **contexto_plantilla)
+        return render_template(f'correspondencia/{tipo_plantilla}.html', **correspondencia.contexto_carta(contexto))
 
     except Exception as e:
         return f"Error al generar la vista previa: {e}", 500
 
+@app.route('/correspondencia/lote')
+@login_required
+def correspondencia_lote():
+    """
+    Descarga un ZIP con las cartas de varias remisiones: las de la lista de
+    consecutivos o, si no se indica ninguno, las que cumplen los filtros
+    (aseguradora, ramo, estado y mes de fin de vigencia 'vence').
+    """
+    tipo_plantilla = request.args.get('tipo_plantilla', '')
+    if tipo_plantilla not in correspondencia.TIPOS_PLANTILLA:
+        flash('Seleccione un tipo de plantilla válido para la correspondencia.', 'warning')
+        return redirect(url_for('control'))
+
+    consecutivos = correspondencia.leer_consecutivos(request.args.get('consecutivos', ''))
+    filtros = {campo: request.args.get(campo, '') for campo in ('aseguradora', 'ramo', 'estado', 'vence')}
+    try:
+        if consecutivos:
+            remisiones_df, faltantes = instantanea_remisiones.buscar('consecutivo', consecutivos)
+        else:
+            remisiones_df = correspondencia.filtrar_remisiones(instantanea_remisiones.vista(), **filtros)
+            faltantes = []
+    except FileNotFoundError:
+        flash('Aún no hay remisiones registradas.', 'warning')
+        return redirect(url_for('control'))
+    except Exception as e:
+        print(f"Error al buscar las remisiones para la correspondencia en lote: {type(e).__name__} - {e}")
+        flash(f'Error al buscar las remisiones: {e}', 'danger')
+        return redirect(url_for('control'))
+
+    if remisiones_df.empty:
+        flash('Ninguna remisión coincide con la selección para generar correspondencia.', 'warning')
+        return redirect(url_for('control', **{k: v for k, v in filtros.items() if v and k != 'vence'}))
+    if len(remisiones_df) > correspondencia.MAXIMO_CARTAS_LOTE:
+        flash(f'La selección tiene {len(remisiones_df)} remisiones; el máximo por lote es '
+              f'{correspondencia.MAXIMO_CARTAS_LOTE}. Acote los filtros.', 'warning')
+        return redirect(url_for('control', **{k: v for k, v in filtros.items() if v and k != 'vence'}))
+
+    plantilla = app.jinja_env.get_template(f'correspondencia/{tipo_plantilla}.html')
+    campos_formulario = {campo: request.args[campo] for campo in correspondencia.CAMPOS_FORMULARIO
+                         if request.args.get(campo)}
+    nombre_zip = f"correspondencia_{tipo_plantilla}_{datetime.now().strftime('%Y%m%d_%H%M%S')}.zip"
+    return Response(
+        stream_with_context(correspondencia.generar_zip(plantilla, remisiones_df, tipo_plantilla,
+                                                        campos_formulario, faltantes)),
+        mimetype='application/zip',
+        headers={'Content-Disposition': f'attachment; filename="{nombre_zip}"'}
+    )
+
+def correos_de_remisiones(df_vencimientos):
+    """
+    Correo del tomador para cada vencimiento: el de su Remision_Asociada o,
+    si no tiene, el de la última remisión con el mismo número de póliza
+    ('' si ninguna lo tiene).
+    """
+    vacios = pd.Series('', index=df_vencimientos.index, dtype=object)
+    try:
+        remisiones, por_poliza = instantanea_remisiones.agrupar(['poliza', 'old_policy_number'], normalizar_poliza)
+        _, por_consecutivo = instantanea_remisiones.agrupar(['consecutivo'], normalizar_poliza)
+    except FileNotFoundError:
+        return vacios
+    if 'correo' not in remisiones.columns:
+        return vacios
+    correos = remisiones['correo'].astype(object).where(remisiones['correo'].notna(), '').astype(str).str.strip().tolist()
+
+    def buscar(grupos, valor):
+        for posicion in reversed(grupos.get(normalizar_poliza(valor), [])):
+            if correos[posicion]:
+                return correos[posicion]
+        return ''
+
+    asociadas = df_vencimientos.get('Remision_Asociada', vacios).tolist()
+    polizas = df_vencimientos.get('NÚMERO PÓLIZA', vacios).tolist()
+    return pd.Series([buscar(por_consecutivo, remision) or buscar(por_poliza, poliza)
+                      for remision, poliza in zip(asociadas, polizas)], index=df_vencimientos.index, dtype=object)
+
+@app.route('/correo/lote', methods=['POST'])
+@login_required
+def correo_lote():
+    """
+    Combina plantillas/plantilla_correo.txt con varias remisiones o
+    vencimientos y deja un .eml por cada uno en la bandeja de salida. El
+    envío lo hace el administrador desde /admin/correo.
+    """
+    origen = request.form.get('origen', 'remisiones')
+    claves = correspondencia.leer_consecutivos(request.form.get('consecutivos', ''))
+    vence = request.form.get('vence', '')
+    destinatario = request.form.get('destinatario', '').strip()
+    filtros = {campo: request.form.get(campo, '') for campo in ('aseguradora', 'ramo', 'estado')}
+    volver = redirect(url_for('control', **{k: v for k, v in filtros.items() if v}))
+    try:
+        if origen == 'remisiones':
+            if claves:
+                df, faltantes = instantanea_remisiones.buscar('consecutivo', claves)
+            else:
+                df = correspondencia.filtrar_remisiones(instantanea_remisiones.vista(), vence=vence, **filtros)
+                faltantes = []
+        elif origen == 'vencimientos':
+            if claves:
+                df, faltantes = indice_polizas.filas('vencimientos', claves)
+            else:
+                df = instantanea_vencimientos.vista()
+                faltantes = []
+                if vence:
+                    df = df[pd.to_datetime(df['FECHA FIN'], errors='coerce').dt.strftime('%Y-%m') == vence]
+                if filtros['aseguradora']:
+                    df = df[df['ASEGURADORA'] == filtros['aseguradora']]
+        else:
+            flash('Origen de datos no válido para el correo masivo.', 'warning')
+            return volver
+
+        if df.empty:
+            flash('Ningún registro coincide con la selección para generar correos.', 'warning')
+            return volver
+        if len(df) > MAXIMO_CORREOS_LOTE:
+            flash(f'La selección tiene {len(df)} registros; el máximo por lote es {MAXIMO_CORREOS_LOTE}. Acote los filtros.', 'warning')
+            return volver
+
+        if origen == 'vencimientos':
+            df = df.assign(correo=correos_de_remisiones(df))
+        escritos, omitidos = bandeja_correo.generar(df, origen, destinatario)
+    except FileNotFoundError:
+        flash(f'Aún no hay {origen} registrados.', 'warning')
+        return volver
+    except Exception as e:
+        print(f"Error al generar los correos en lote: {type(e).__name__} - {e}")
+        flash(f'Error al generar los correos: {e}', 'danger')
+        return volver
+
+    flash(f'{escritos} correo(s) agregados a la bandeja de salida.', 'success')
+    if omitidos:
+        flash(f'{len(omitidos)} registro(s) sin correo de destino: {", ".join(map(str, omitidos[:20]))}'
+              f'{"..." if len(omitidos) > 20 else ""}', 'warning')
+    if faltantes:
+        flash(f'No encontrados: {", ".join(faltantes[:20])}{"..." if len(faltantes) > 20 else ""}', 'warning')
+    return volver
+
 @app.route('/siniestros/registrar', methods=['GET', 'POST'])
 @login_required
 def siniestros_registrar():
@@ -1351,29 +1564,17 @@ def siniestros_registrar():
         try:
             datos = request.form.to_dict()
             archivos = request.files.getlist('documentos')
+            try:
+                datetime.strptime(datos.get('fecha_siniestro', ''), '%Y-%m-%d')
+            except ValueError:
+                return jsonify({'status': 'error', 'message': 'La fecha del siniestro no es válida.'}), 400
 
-            # --- 1. Guardar registro en siniestros.xlsx ---
-            SINIESTROS_FILE = os.path.join(BASE_DIR, 'siniestros.xlsx')
+            # --- 1. Subir archivos a CLIENTES_CARPETAS/<cliente>_<nit>/SINIESTROS/<ramo>/<año> ---
             nombres_archivos = [secure_filename(f.filename) for f in archivos if f.filename]
             datos['archivos_adjuntos'] = ', '.join(nombres_archivos)
-
-            df_siniestros_existente = pd.DataFrame()
-            if os.path.exists(SINIESTROS_FILE):
-                df_siniestros_existente = pd.read_excel(SINIESTROS_FILE)
-
-            nuevo_siniestro_df = pd.DataFrame([datos])
-            df_final = pd.concat([df_siniestros_existente, nuevo_siniestro_df], ignore_index=True)
-            df_final.to_excel(SINIESTROS_FILE, index=False)
-
-            # --- 2. Subir archivos a carpetas ---
-            nombre_cliente = secure_filename(datos['nombre_cliente'])
-            nit_cc = secure_filename(datos['nit_cc'])
-            ramo = secure_filename(datos['ramo'])
-            ano_siniestro = datetime.strptime(datos['fecha_siniestro'], '%Y-%m-%d').strftime('%Y')
-
-            ruta_carpeta_cliente = os.path.join(app.config['CLIENT_FOLDERS_BASE_DIR'], f"{nombre_cliente}_{nit_cc}")
-            ruta_destino = os.path.join(ruta_carpeta_cliente, 'SINIESTROS', ramo, ano_siniestro)
-
+            datos['carpeta'] = carpeta_documentos(datos.get('nombre_cliente', ''), datos.get('nit_cc', ''),
+                                                  datos.get('ramo', ''), datos['fecha_siniestro'])
+            ruta_destino = os.path.join(app.config['CLIENT_FOLDERS_BASE_DIR'], datos['carpeta'])
             os.makedirs(ruta_destino, exist_ok=True)
 
             for archivo in archivos:
@@ -1381,6 +1582,9 @@ def siniestros_registrar():
                     filename = secure_filename(archivo.filename)
                     archivo.save(os.path.join(ruta_destino, filename))
 
+            # --- 2. Registrar el siniestro (una línea al final de siniestros.jsonl) ---
+            registro_siniestros.agregar(datos)
+
             return jsonify({'status': 'success', 'message': 'Siniestro registrado y archivos subidos exitosamente.'})
 
         except Exception as e:
@@ -1388,6 +1592,87 @@ def siniestros_registrar():
             traceback.print_exc()
             return jsonify({'status': 'error', 'message': f'Error interno del servidor: {e}'}), 500
 
+@app.route('/siniestros', methods=['GET'])
+@login_required
+def siniestros_lista():
+    page = request.args.get('page', 1, type=int)
+    filtros_activos = {parametro: request.args.get(parametro, '').strip()
+                       for parametro in ('nit', 'ramo', 'cliente', 'desde', 'hasta')}
+    for parametro in ('desde', 'hasta'):
+        try:
+            if filtros_activos[parametro]:
+                datetime.strptime(filtros_activos[parametro], '%Y-%m-%d')
+        except ValueError:
+            flash(f"Fecha inválida en el filtro '{parametro}': {filtros_activos[parametro]}", 'warning')
+            filtros_activos[parametro] = ''
+    filtros_activos = {parametro: valor for parametro, valor in filtros_activos.items() if valor}
+
+    siniestros, pagination = registro_siniestros.pagina(pagina=page, **filtros_activos)
+    return render_template('siniestros_lista.html', siniestros=siniestros, pagination=pagination,
+                           filtros_activos=filtros_activos, ramos=registro_siniestros.ramos())
+
+@app.route('/siniestros/cliente/<nit_cc>', methods=['GET'])
+@login_required
+def siniestros_cliente(nit_cc):
+    """Historial de siniestros de un cliente con los documentos de cada uno."""
+    siniestros = registro_siniestros.historial_cliente(nit_cc)
+    base = app.config['CLIENT_FOLDERS_BASE_DIR']
+    for siniestro in siniestros:
+        carpeta = os.path.join(base, siniestro['carpeta'])
+        siniestro['documentos'] = sorted(nombre for nombre in os.listdir(carpeta)
+                                         if os.path.isfile(os.path.join(carpeta, nombre))) if os.path.isdir(carpeta) else []
+    nombre_cliente = siniestros[0]['nombre_cliente'] if siniestros else ''
+    return render_template('siniestros_cliente.html', siniestros=siniestros, nit_cc=nit_cc, nombre_cliente=nombre_cliente)
+
+@app.route('/siniestros/documento/<id_siniestro>/<nombre_archivo>')
+@login_required
+def siniestro_documento(id_siniestro, nombre_archivo):
+    siniestro = registro_siniestros.obtener(id_siniestro)
+    if siniestro is None:
+        return "Siniestro no encontrado", 404
+    file_path = os.path.join(app.config['CLIENT_FOLDERS_BASE_DIR'], siniestro['carpeta'], secure_filename(nombre_archivo))
+    if os.path.isfile(file_path):
+        return send_file(file_path)
+    return "Archivo no encontrado", 404
+
+@app.route('/siniestros/exportar')
+@login_required
+def siniestros_exportar():
+    """Todos los siniestros (los del .xlsx anterior y los del diario) en un Excel."""
+    df = pd.DataFrame(registro_siniestros.todos(), columns=COLUMNAS_SINIESTROS)
+    return Response(
+        stream_with_context(excel_io.generar_xlsx(df, nombre_hoja='Siniestros', tipos_columnas=TIPOS_COLUMNAS_EXCEL)),
+        mimetype='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
+        headers={'Content-Disposition': f'attachment; filename="Siniestros_{datetime.now().strftime("%Y%m%d")}.xlsx"'}
+    )
+
+def filtrar_cartera(df, ano_filtro=None, mes_filtro=None, aseguradora_filtro=None):
+    """
+    Aplica los filtros de la vista de cartera: año y mes sobre FECHA CREACIÓN
+    y aseguradora. Devuelve (df_filtrado, ano_int, mes_int) con los filtros
+    de año/mes que resultaron válidos (None si no se aplicaron).
+    """
+    if 'FECHA CREACIÓN' in df.columns and 'FECHA CREACIÓN_dt' not in df.columns:
+        df['FECHA CREACIÓN_dt'] = pd.to_datetime(df['FECHA CREACIÓN'], format='%d/%m/%Y', errors='coerce')
+    tiene_fecha = 'FECHA CREACIÓN_dt' in df.columns and pd.api.types.is_datetime64_any_dtype(df['FECHA CREACIÓN_dt'])
+
+    ano_int = None
+    mes_int = None
+    if ano_filtro and str(ano_filtro).isdigit():
+        ano_int = int(ano_filtro)
+        if tiene_fecha:
+            df = df[df['FECHA CREACIÓN_dt'].dt.year == ano_int]
+
+    if mes_filtro and str(mes_filtro).isdigit() and 1 <= int(mes_filtro) <= 12:
+        mes_int = int(mes_filtro)
+        if tiene_fecha:
+            df = df[df['FECHA CREACIÓN_dt'].dt.month == mes_int]
+
+    if aseguradora_filtro and 'ASEGURADORA' in df.columns:
+        df = df[df['ASEGURADORA'] == aseguradora_filtro]
+
+    return df, ano_int, mes_int
+
 @app.route('/cartera/visualizar', methods=['GET'])
 @login_required
 def visualizar_cartera():
@@ -1398,7 +1683,7 @@ def visualizar_cartera():
         return redirect(url_for('mostrar_formulario_carga_maestra'))
 
     try:
-        df = pd.read_excel(ruta_archivo_procesado)
+        df = instantanea_cartera.vista()
 
         anos_disponibles = []
         if 'FECHA CREACIÓN' in df.columns:
@@ -1419,30 +1704,18 @@ def visualizar_cartera():
         ano_seleccionado_str = request.args.get('ano_filtro')
         mes_seleccionado_str = request.args.get('mes_filtro')
         aseguradora_seleccionada_actual = request.args.get('aseguradora_filtro')
-        ano_seleccionado_int = None
-        mes_seleccionado_int = None
-
-        if ano_seleccionado_str and ano_seleccionado_str.isdigit():
-            ano_seleccionado_int = int(ano_seleccionado_str)
-            if 'FECHA CREACIÓN_dt' in df.columns and pd.api.types.is_datetime64_any_dtype(df['FECHA CREACIÓN_dt']):
-                df = df[df['FECHA CREACIÓN_dt'].dt.year == ano_seleccionado_int]
-            elif 'FECHA CREACIÓN_dt' not in df.columns or not pd.api.types.is_datetime64_any_dtype(df['FECHA CREACIÓN_dt']):
-                 flash('No se pudo filtrar por año debido a problemas con la columna "FECHA CREACIÓN".', 'warning')
-
-        if mes_seleccionado_str and mes_seleccionado_str.isdigit():
-            mes_seleccionado_int = int(mes_seleccionado_str)
-            if 1 <= mes_seleccionado_int <= 12:
-                if 'FECHA CREACIÓN_dt' in df.columns and pd.api.types.is_datetime64_any_dtype(df['FECHA CREACIÓN_dt']):
-                    df = df[df['FECHA CREACIÓN_dt'].dt.month == mes_seleccionado_int]
-                elif 'FECHA CREACIÓN_dt' not in df.columns or not pd.api.types.is_datetime64_any_dtype(df['FECHA CREACIÓN_dt']):
-                    flash(f'No se pudo filtrar por mes. Problemas con "FECHA CREACIÓN".', 'warning')
-            else:
-                mes_seleccionado_int = None
 
-        if aseguradora_seleccionada_actual and 'ASEGURADORA' in df.columns:
-            df = df[df['ASEGURADORA'] == aseguradora_seleccionada_actual]
+        if (ano_seleccionado_str or mes_seleccionado_str) and 'FECHA CREACIÓN_dt' not in df.columns:
+            flash('No se pudo filtrar por año/mes debido a problemas con la columna "FECHA CREACIÓN".', 'warning')
+
+        df, ano_seleccionado_int, mes_seleccionado_int = filtrar_cartera(
+            df, ano_seleccionado_str, mes_seleccionado_str, aseguradora_seleccionada_actual
+        )
+
+        # Filtros activos, para que la descarga respete lo que se está viendo
+        filtros_descarga = {k: v for k, v in request.args.items() if k in ('ano_filtro', 'mes_filtro', 'aseguradora_filtro') and v}
 
-        df_display = df.copy()
+        df_display = df.copy(deep=False)
         columnas_moneda = [
             'PRIMA NETA', 'COMISIÓN',
             'Retencion_Calc', 'Reteica_Calc',
@@ -1491,7 +1764,8 @@ def visualizar_cartera():
                                aseguradoras_disponibles_filtro=aseguradoras_disponibles,
                                mes_seleccionado_actual_int=mes_seleccionado_int,
                                ano_seleccionado_actual_int=ano_seleccionado_int,
-                               aseguradora_seleccionada_actual=aseguradora_seleccionada_actual)
+                               aseguradora_seleccionada_actual=aseguradora_seleccionada_actual,
+                               filtros_descarga=filtros_descarga)
 
     except Exception as e:
         print(f"Error al visualizar el reporte de cartera: {e}")
@@ -1507,7 +1781,7 @@ def mostrar_formulario_editar_cartera(id_registro):
         return redirect(url_for('visualizar_cartera'))
 
     try:
-        df = pd.read_excel(ruta_archivo_procesado)
+        df = instantanea_cartera.vista()
         # ID_CARTERA fue guardado como int, id_registro viene como int de la URL
         registro_para_editar_df = df[df['ID_CARTERA'] == id_registro]
 
@@ -1549,7 +1823,7 @@ def guardar_edicion_cartera():
         return redirect(url_for('visualizar_cartera'))
 
     try:
-        df = pd.read_excel(ruta_archivo_procesado)
+        df = instantanea_cartera.obtener()
 
         columnas_manuales_a_asegurar_str = ['N_FACTURA_Manual', 'Clasificacion_Manual', 'Line_of_Business_Manual']
         for col in columnas_manuales_a_asegurar_str:
@@ -1578,7 +1852,7 @@ def guardar_edicion_cartera():
             df = df[ORDEN_COLUMNAS_EXCEL_CARTERA]
 
             # Guardar el DataFrame modificado
-            df.to_excel(ruta_archivo_procesado, index=False)
+            excel_io.guardar_excel(df, ruta_archivo_procesado, TIPOS_COLUMNAS_EXCEL)
             flash(f'Registro de cartera ID {id_cartera_actualizar} actualizado exitosamente.', 'success')
         else:
             flash(f'No se encontró el registro de cartera con ID {id_cartera_actualizar} para actualizar.', 'warning')
@@ -1615,17 +1889,12 @@ def aplicar_factura_lote():
         if not os.path.exists(ruta_archivo_procesado):
             return jsonify({'success': False, 'message': 'Error crítico: Archivo de cartera procesada no encontrado en el servidor.'}), 500
 
-        df = pd.read_excel(ruta_archivo_procesado)
+        df = instantanea_cartera.obtener()
 
         if 'ID_CARTERA' not in df.columns:
             return jsonify({'success': False, 'message': 'Error de configuración: La columna ID_CARTERA no se encontró en el archivo Excel.'}), 500
 
-        # Asegurar que la columna ID_CARTERA en el DataFrame sea del mismo tipo que los IDs recibidos (int)
-        try:
-            df['ID_CARTERA'] = pd.to_numeric(df['ID_CARTERA'], errors='raise').astype(int)
-        except (ValueError, TypeError):
-            return jsonify({'success': False, 'message': 'Error de datos: La columna ID_CARTERA en el Excel contiene valores no numéricos o no puede ser convertida a entero.'}), 500
-
+        # ID_CARTERA se guarda como entero (ver esquemas.py)
         # Encontrar los índices de las filas a actualizar
         filas_a_actualizar_mask = df['ID_CARTERA'].isin(ids_registros_int)
         indices_filas_a_actualizar = df[filas_a_actualizar_mask].index
@@ -1650,7 +1919,7 @@ def aplicar_factura_lote():
                     df[col_maestra] = pd.Series([''] * len(df), index=df.index, dtype=object)
         df = df[ORDEN_COLUMNAS_EXCEL_CARTERA]
 
-        df.to_excel(ruta_archivo_procesado, index=False)
+        excel_io.guardar_excel(df, ruta_archivo_procesado, TIPOS_COLUMNAS_EXCEL)
 
         return jsonify({'success': True, 'message': f'{len(indices_filas_a_actualizar)} registro(s) fueron actualizados exitosamente con el N° de Factura: {numero_factura}.'}), 200
 
@@ -1662,6 +1931,11 @@ def aplicar_factura_lote():
 @app.route('/cartera/descargar_reporte_final', methods=['GET'])
 @login_required
 def descargar_reporte_cartera_final():
+    """
+    Descarga la cartera procesada. Acepta los mismos filtros que la vista
+    (ano_filtro, mes_filtro, aseguradora_filtro) y formato=xlsx|csv. Las
+    exportaciones filtradas se generan y envían por bloques.
+    """
     try:
         ruta_archivo = app.config['CARTERA_PROCESADA_FILE_PATH']
 
@@ -1669,13 +1943,45 @@ def descargar_reporte_cartera_final():
             flash('No se encontró el archivo de cartera procesada para descargar. Por favor, procese un reporte primero.', 'danger')
             return redirect(url_for('visualizar_cartera'))
 
+        formato = request.args.get('formato', 'xlsx').lower()
+        if formato not in ('xlsx', 'csv'):
+            flash(f'Formato de descarga no válido: {formato}.', 'warning')
+            return redirect(url_for('visualizar_cartera'))
+
+        ano_filtro = request.args.get('ano_filtro')
+        mes_filtro = request.args.get('mes_filtro')
+        aseguradora_filtro = request.args.get('aseguradora_filtro')
+        hay_filtros = any([ano_filtro, mes_filtro, aseguradora_filtro])
+
         download_filename = 'Reporte_Cartera_Final_UIB.xlsx'
 
-        return send_file(
-            ruta_archivo,
-            as_attachment=True,
-            download_name=download_filename,
-            mimetype='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
+        # Sin filtros, el archivo procesado ya es el reporte: se envía tal cual
+        if not hay_filtros and formato == 'xlsx':
+            return send_file(
+                ruta_archivo,
+                as_attachment=True,
+                download_name=download_filename,
+                mimetype='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
+            )
+
+        df = instantanea_cartera.vista()
+        df, ano_int, mes_int = filtrar_cartera(df, ano_filtro, mes_filtro, aseguradora_filtro)
+        df = df.drop(columns=['FECHA CREACIÓN_dt'], errors='ignore')
+
+        sufijo = '_'.join(str(p) for p in [aseguradora_filtro, ano_int, f"{mes_int:02d}" if mes_int else None] if p)
+        nombre_base = secure_filename(f"Reporte_Cartera_Final_UIB_{sufijo}") if sufijo else 'Reporte_Cartera_Final_UIB'
+
+        if formato == 'csv':
+            return Response(
+                stream_with_context(excel_io.generar_csv(df)),
+                mimetype='text/csv; charset=utf-8',
+                headers={'Content-Disposition': f'attachment; filename="{nombre_base}.csv"'}
+            )
+
+        return Response(
+            stream_with_context(excel_io.generar_xlsx(df, nombre_hoja='Cartera', tipos_columnas=TIPOS_COLUMNAS_EXCEL)),
+            mimetype='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
+            headers={'Content-Disposition': f'attachment; filename="{nombre_base}.xlsx"'}
         )
     except Exception as e:
         print(f"Error al intentar descargar el reporte final de cartera: {type(e).__name__} - {e}")
@@ -1692,135 +1998,29 @@ def visualizar_vencimientos():
         return redirect(url_for('mostrar_formulario_carga_maestra'))
 
     try:
-        df_venc = pd.read_excel(ruta_archivo_vencimientos)
-        df_venc.rename(columns={'NOMBRES CLIENTE': 'Tomador'}, inplace=True)
-
-        if 'FECHA FIN' not in df_venc.columns:
-            flash('El archivo de vencimientos no contiene la columna "FECHA FIN".', 'danger')
+        try:
+            vista = calendario_vencimientos.vista()
+        except ValueError as e:
+            flash(str(e), 'danger')
             return render_template('vencimientos_vista.html', registros=[], kpis={}, ramos_kpis=[], search_term='')
+        if vista is None:
+            flash('No hay reporte de vencimientos procesado. Por favor, cargue uno primero.', 'warning')
+            return redirect(url_for('mostrar_formulario_carga_maestra'))
 
-        df_venc['FECHA FIN_dt'] = pd.to_datetime(df_venc['FECHA FIN'], errors='coerce')
-        df_venc.dropna(subset=['FECHA FIN_dt'], inplace=True)
-
-        hoy = datetime.now()
-        df_venc['Dias_Para_Vencer'] = (df_venc['FECHA FIN_dt'] - hoy).dt.days
-
-        # Filtrar por defecto a pólizas vencidas en los últimos 100 días y por vencer en los próximos 100 días.
-        df_filtrado = df_venc[(df_venc['Dias_Para_Vencer'] >= -100) & (df_venc['Dias_Para_Vencer'] <= 100)].copy()
-
-        # Get search term
+        # Pólizas vencidas en los últimos 100 días y por vencer en los próximos 100 días,
+        # con sus alertas y KPIs ya calculados para hoy
         search_term = request.args.get('search_term', '').strip()
         if search_term:
-            df_filtrado = df_filtrado[df_filtrado['Tomador'].str.contains(search_term, case=False, na=False)]
-
-        # Excluir 'CUMPLIMIENTO' y 'SERIEDAD DE OFERTA' de los KPIs generales
-        ramos_a_excluir_kpi_general = ['CUMPLIMIENTO', 'SERIEDAD DE OFERTA']
-        df_para_kpis_generales = df_filtrado[~df_filtrado['RAMO PRINCIPAL'].isin(ramos_a_excluir_kpi_general)]
-
-        # Calcular KPIs
-        kpis = {
-            'vencer_15_dias': len(df_para_kpis_generales[(df_para_kpis_generales['Dias_Para_Vencer'] >= 0) & (df_para_kpis_generales['Dias_Para_Vencer'] <= 15)]),
-            'vencer_30_dias': len(df_para_kpis_generales[(df_para_kpis_generales['Dias_Para_Vencer'] >= 0) & (df_para_kpis_generales['Dias_Para_Vencer'] <= 30)]),
-            'vencer_60_dias': len(df_para_kpis_generales[(df_para_kpis_generales['Dias_Para_Vencer'] >= 0) & (df_para_kpis_generales['Dias_Para_Vencer'] <= 60)]),
-            'vencidas': len(df_para_kpis_generales[df_para_kpis_generales['Dias_Para_Vencer'] < 0]),
-            'cumplimiento': len(df_filtrado[(df_filtrado['RAMO PRINCIPAL'] == 'CUMPLIMIENTO') & (df_filtrado['Dias_Para_Vencer'] >= 0) & (df_filtrado['Dias_Para_Vencer'] <= 45)])
-        }
-
-        # Calcular KPIs por ramo (usando el dataframe ya filtrado)
-        df_vencer_30_dias = df_filtrado[(df_filtrado['Dias_Para_Vencer'] >= 0) & (df_filtrado['Dias_Para_Vencer'] <= 30)]
-        ramos_kpis = [
-            {
-                'ramo': 'AUTOS/VEHÍCULOS',
-                'count': len(df_vencer_30_dias[df_vencer_30_dias['RAMO PRINCIPAL'].str.contains('AUTOS|VEHICULOS', case=False, na=False)])
-            },
-            {
-                'ramo': 'COPROPIEDADES',
-                'count': len(df_vencer_30_dias[df_vencer_30_dias['RAMO PRINCIPAL'].str.contains('COPROPIEDADES', case=False, na=False)])
-            },
-            {
-                'ramo': 'HOGAR',
-                'count': len(df_vencer_30_dias[df_vencer_30_dias['RAMO PRINCIPAL'].str.contains('HOGAR', case=False, na=False)])
-            },
-            {
-                'ramo': 'ARRENDAMIENTO',
-                'count': len(df_vencer_30_dias[df_vencer_30_dias['RAMO PRINCIPAL'].str.contains('ARRENDAMIENTO', case=False, na=False)])
-            }
-        ]
-
-        def determinar_alerta(dias, estado_actual):
-            estado_actual_lower = str(estado_actual).lower()
-
-            # Final states with specific icons
-            if estado_actual_lower == 'renovado':
-                return {'icon': 'fas fa-check-double', 'css_class': 'alerta-renovado', 'text': 'Renovado', 'is_critical': False}
-            elif estado_actual_lower == 'no renovado':
-                return {'icon': 'fas fa-ban', 'css_class': 'alerta-no-renovado', 'text': 'No Renovado', 'is_critical': False}
-
-            if pd.isna(dias):
-                return {'icon': 'fas fa-question-circle', 'css_class': 'alerta-gris', 'text': 'Fecha Fin Inválida', 'is_critical': False}
-
-            dias = int(dias)
-            
-            # Defaults
-            css_class = 'alerta-azul'
-            icon = 'fas fa-info-circle'
-            is_critical = False
-
-            # Critical case
-            if dias <= 5:
-                is_critical = True
-
-            # Semaphore logic for color AND icon
-            if dias <= 10:
-                css_class = 'alerta-rojo'
-                icon = 'fas fa-skull-crossbones'
-            elif dias <= 20: # 11-20 days
-                css_class = 'alerta-amarillo'
-                icon = 'fas fa-exclamation-triangle'
-            elif dias <= 30: # 21-30 days
-                css_class = 'alerta-verde'
-                icon = 'fas fa-calendar-check'
-
-            if dias < 0:
-                text = f'Vencido (Hace {-dias} días)'
-            else:
-                text = f'Vence en {dias} días'
-            
-            return {'icon': icon, 'css_class': css_class, 'text': text, 'is_critical': is_critical}
-
-        if 'Estado' not in df_filtrado.columns:
-            df_filtrado['Estado'] = ''
+            df_filtrado = vista['filas'][vista['filas']['Tomador'].astype(str).str.contains(search_term, case=False, na=False, regex=False)]
+            kpis, ramos_kpis = kpis_ventana(df_filtrado)
+            lista_registros = df_filtrado.to_dict(orient='records')
         else:
-            df_filtrado['Estado'] = df_filtrado['Estado'].astype(str).fillna('')
-
-        # Se aplica la función para determinar la alerta sobre el DataFrame ya filtrado
-        resultados_alerta = df_filtrado.apply(lambda row: determinar_alerta(row.get('Dias_Para_Vencer'), row.get('Estado')), axis=1)
-
-        # Se asignan los resultados al DataFrame filtrado.
-        df_filtrado['Indicador_Vencimiento_CSS_Class'] = [a['css_class'] for a in resultados_alerta]
-        df_filtrado['Indicador_Vencimiento_Icon'] = [a['icon'] for a in resultados_alerta]
-        df_filtrado['Indicador_Vencimiento_Text'] = [a['text'] for a in resultados_alerta]
-        df_filtrado['Indicador_Vencimiento_Is_Critical'] = [a['is_critical'] for a in resultados_alerta]
-
-        df_display = df_filtrado.copy()
-
-        # Ordenar por 'Dias_Para_Vencer' de mayor a menor
-        df_display.sort_values(by='Dias_Para_Vencer', ascending=False, inplace=True)
-
-        # Formatear fechas para mostrar
-        df_display['FECHA FIN'] = df_display['FECHA FIN_dt'].dt.strftime('%Y-%m-%d')
-        if 'Fecha_inicio_seguimiento' in df_display.columns:
-             df_display['Fecha_inicio_seguimiento'] = pd.to_datetime(df_display['Fecha_inicio_seguimiento'], errors='coerce').dt.strftime('%Y-%m-%d')
-
-        df_display = df_display.fillna('')
-        lista_registros = df_display.to_dict(orient='records')
+            kpis, ramos_kpis, lista_registros = vista['kpis'], vista['ramos_kpis'], vista['registros']
 
         return render_template('vencimientos_vista.html',
                                 registros=lista_registros,
                                 kpis=kpis,
                                 ramos_kpis=ramos_kpis,
-                                opciones_responsable_js=config_manager.get_list('responsable_vencimientos'),
-                                opciones_estado_js=config_manager.get_list('estado_vencimientos'),
                                 search_term=search_term
                                )
     except Exception as e:
@@ -1854,16 +2054,13 @@ def actualizar_registro_vencimiento():
         if not os.path.exists(ruta_archivo_vencimientos):
             return jsonify({'success': False, 'message': 'Archivo de datos de vencimientos no encontrado en el servidor.'}), 500
 
-        df = pd.read_excel(ruta_archivo_vencimientos)
+        # Responsable y Estado pueden recibir valores fuera de las categorías cargadas
+        df = esquemas.sin_categorias(instantanea_vencimientos.obtener())
 
         if 'ID_VENCIMIENTO' not in df.columns:
             return jsonify({'success': False, 'message': 'Error crítico: Columna ID_VENCIMIENTO no encontrada en el archivo Excel.'}), 500
 
-        try:
-            df['ID_VENCIMIENTO'] = df['ID_VENCIMIENTO'].astype(int)
-        except ValueError:
-            return jsonify({'success': False, 'message': 'Error de datos: La columna ID_VENCIMIENTO en Excel contiene valores no numéricos.'}), 500
-
+        # ID_VENCIMIENTO se guarda como entero (ver esquemas.py)
         # Encontrar el índice de la fila a actualizar
         indice_fila_arr = df[df['ID_VENCIMIENTO'] == id_vencimiento].index
 
@@ -1892,7 +2089,7 @@ def actualizar_registro_vencimiento():
             else:
                 print("ADVERTENCIA: ORDEN_COLUMNAS_VENCIMIENTOS no está definida o no es una lista. El Excel se guardará con el orden actual del DataFrame.")
 
-            df.to_excel(ruta_archivo_vencimientos, index=False)
+            excel_io.guardar_excel(df, ruta_archivo_vencimientos, TIPOS_COLUMNAS_EXCEL)
             print(f"INFO: Archivo de vencimientos guardado en {ruta_archivo_vencimientos} después de actualizar ID {id_vencimiento}.")
             return jsonify({'success': True, 'message': f'Registro de vencimiento ID {id_vencimiento} actualizado exitosamente.'}), 200
         else:
@@ -1923,10 +2120,12 @@ def procesar_reporte_maestro():
         return redirect(url_for('mostrar_formulario_carga_maestra'))
 
     try:
-        df_maestro = pd.read_excel(archivo)
+        df_maestro = excel_io.leer_carga(archivo)
     except Exception as e:
         flash(f'Error al leer el archivo maestro Excel: {str(e)}', 'danger')
         return redirect(url_for('mostrar_formulario_carga_maestra'))
+    inicio_carga = time.perf_counter()
+    filas_maestro = len(df_maestro)
 
     # --- 2. Cartera Module Logic ---
     try:
@@ -1937,13 +2136,15 @@ def procesar_reporte_maestro():
             flash(f'Columnas de Cartera faltantes en archivo maestro: {cols_str}. No se procesó Cartera.', 'warning')
         else:
             # --- Corrected Unique Key Creation ---
-            df_maestro['CLAVE_UNICA'] = df_maestro['NÚMERO PÓLIZA'].astype(str).str.strip() + "_" + pd.to_datetime(df_maestro['FECHA CREACIÓN'], format='%d/%m/%Y', errors='coerce').dt.strftime('%Y-%m-%d').fillna('NODATE')
+            # NÚMERO PÓLIZA ya viene normalizado de excel_io.leer_excel (ver esquemas.py)
+            df_maestro['CLAVE_UNICA'] = df_maestro['NÚMERO PÓLIZA'] + "_" + pd.to_datetime(df_maestro['FECHA CREACIÓN'], format='%d/%m/%Y', errors='coerce').dt.strftime('%Y-%m-%d').fillna('NODATE')
 
             df_cartera_existente = pd.DataFrame()
             if os.path.exists(ruta_cartera):
-                df_cartera_existente = pd.read_excel(ruta_cartera)
+                # Las filas existentes se actualizan con valores del maestro: sin categorías
+                df_cartera_existente = esquemas.sin_categorias(instantanea_cartera.obtener())
                 if not df_cartera_existente.empty and 'NÚMERO PÓLIZA' in df_cartera_existente.columns and 'FECHA CREACIÓN' in df_cartera_existente.columns:
-                    df_cartera_existente['CLAVE_UNICA'] = df_cartera_existente['NÚMERO PÓLIZA'].astype(str).str.strip() + "_" + df_cartera_existente['FECHA CREACIÓN'].astype(str).str.strip()
+                    df_cartera_existente['CLAVE_UNICA'] = df_cartera_existente['NÚMERO PÓLIZA'] + "_" + df_cartera_existente['FECHA CREACIÓN'].astype(str).str.strip()
 
             # --- Data Processing ---
             df_cartera_procesados_nuevos = df_maestro[COLUMNAS_A_EXTRAER_CARTERA + ['CLAVE_UNICA']].copy()
@@ -1951,12 +2152,14 @@ def procesar_reporte_maestro():
             temp_porc_com = df_cartera_procesados_nuevos['PORCENTAJE DE COMISIÓN'].astype(str).str.replace('%', '', regex=False).str.replace(',', '.', regex=False).str.strip()
             df_cartera_procesados_nuevos['PORCENTAJE DE COMISIÓN_num'] = pd.to_numeric(temp_porc_com, errors='coerce').fillna(0.0)
             df_cartera_procesados_nuevos['COMISIÓN_num'] = pd.to_numeric(df_cartera_procesados_nuevos['COMISIÓN'], errors='coerce').fillna(0.0)
-            df_cartera_procesados_nuevos['Retencion_Calc'] = df_cartera_procesados_nuevos['COMISIÓN_num'] * 0.11
-            df_cartera_procesados_nuevos['Reteica_Calc'] = df_cartera_procesados_nuevos['COMISIÓN_num'] * 0.0014
-            df_cartera_procesados_nuevos['Valor_Comision_UIB_Neto_Calc'] = df_cartera_procesados_nuevos['COMISIÓN_num'] - df_cartera_procesados_nuevos['Retencion_Calc'] - df_cartera_procesados_nuevos['Reteica_Calc']
+            # Retención, reteica, comisión UIB neta y del intermediario (ver comisiones.py)
+            calculo_cartera = comisiones.comisiones_cartera(df_cartera_procesados_nuevos['COMISIÓN_num'],
+                                                            df_cartera_procesados_nuevos['PORCENTAJE DE COMISIÓN_num'])
+            for columna in ('Retencion_Calc', 'Reteica_Calc', 'Valor_Comision_UIB_Neto_Calc'):
+                df_cartera_procesados_nuevos[columna] = calculo_cartera[columna]
             df_cartera_procesados_nuevos['Intermediario_Original'] = df_cartera_procesados_nuevos['VENDEDOR'].astype(str).fillna('')
             df_cartera_procesados_nuevos['Porc_Com_Intermediario_Original'] = df_cartera_procesados_nuevos['PORCENTAJE DE COMISIÓN_num']
-            df_cartera_procesados_nuevos['Valor_Comision_Intermediario_Calc'] = df_cartera_procesados_nuevos['Valor_Comision_UIB_Neto_Calc'] * (df_cartera_procesados_nuevos['Porc_Com_Intermediario_Original'] / 100.0)
+            df_cartera_procesados_nuevos['Valor_Comision_Intermediario_Calc'] = calculo_cartera['Valor_Comision_Intermediario_Calc']
             df_cartera_procesados_nuevos['COMISIÓN'] = df_cartera_procesados_nuevos['COMISIÓN_num']
             df_cartera_procesados_nuevos['PORCENTAJE DE COMISIÓN'] = df_cartera_procesados_nuevos['PORCENTAJE DE COMISIÓN_num']
             df_cartera_procesados_nuevos.drop(columns=[col for col in df_cartera_procesados_nuevos.columns if col.endswith('_num')], inplace=True, errors='ignore')
@@ -1990,7 +2193,8 @@ def procesar_reporte_maestro():
                     df_cartera_final[col] = ''
             df_cartera_final = df_cartera_final[ORDEN_COLUMNAS_EXCEL_CARTERA]
 
-            df_cartera_final.to_excel(ruta_cartera, index=False)
+            excel_io.guardar_excel(df_cartera_final, ruta_cartera, TIPOS_COLUMNAS_EXCEL)
+            metricas.registrar_filas_carga('cartera', len(df_nuevos_para_anadir), len(df_para_actualizar))
             flash(f'Módulo Cartera actualizado: {len(df_nuevos_para_anadir)} registros nuevos añadidos, {len(df_para_actualizar)} registros existentes actualizados.', 'success')
     except Exception as e_cartera:
         flash(f'Error procesando la sección de Cartera del archivo maestro: {str(e_cartera)}', 'danger')
@@ -2010,13 +2214,13 @@ def procesar_reporte_maestro():
         else:
             # --- Unique Key Creation for Vencimientos ---
             df_maestro.drop_duplicates(subset=['NÚMERO PÓLIZA', 'FECHA FIN'], keep='first', inplace=True)
-            df_maestro['CLAVE_UNICA_VENC'] = df_maestro['NÚMERO PÓLIZA'].astype(str).str.strip() + "_" + pd.to_datetime(df_maestro['FECHA FIN'], format='%d/%m/%Y', errors='coerce').dt.strftime('%Y-%m-%d').fillna('NODATE_VENC')
+            df_maestro['CLAVE_UNICA_VENC'] = df_maestro['NÚMERO PÓLIZA'] + "_" + pd.to_datetime(df_maestro['FECHA FIN'], format='%d/%m/%Y', errors='coerce').dt.strftime('%Y-%m-%d').fillna('NODATE_VENC')
 
             df_venc_existente = pd.DataFrame()
             if os.path.exists(ruta_vencimientos):
-                df_venc_existente = pd.read_excel(ruta_vencimientos)
+                df_venc_existente = esquemas.sin_categorias(instantanea_vencimientos.obtener())
                 if not df_venc_existente.empty and 'NÚMERO PÓLIZA' in df_venc_existente.columns and 'FECHA FIN' in df_venc_existente.columns:
-                    df_venc_existente['CLAVE_UNICA_VENC'] = df_venc_existente['NÚMERO PÓLIZA'].astype(str).str.strip() + "_" + pd.to_datetime(df_venc_existente['FECHA FIN'], errors='coerce').dt.strftime('%Y-%m-%d').fillna('NODATE_VENC_EXIST')
+                    df_venc_existente['CLAVE_UNICA_VENC'] = df_venc_existente['NÚMERO PÓLIZA'] + "_" + pd.to_datetime(df_venc_existente['FECHA FIN'], errors='coerce').dt.strftime('%Y-%m-%d').fillna('NODATE_VENC_EXIST')
 
             # --- Data Processing for Vencimientos ---
             df_venc_procesados_nuevos = df_maestro[COLUMNAS_A_EXTRAER_VENCIMIENTOS + ['CLAVE_UNICA_VENC']].copy()
@@ -2054,95 +2258,53 @@ def procesar_reporte_maestro():
                     df_venc_final[col] = ''
             df_venc_final = df_venc_final[ORDEN_COLUMNAS_VENCIMIENTOS]
 
-            df_venc_final.to_excel(ruta_vencimientos, index=False)
+            excel_io.guardar_excel(df_venc_final, ruta_vencimientos, TIPOS_COLUMNAS_EXCEL)
+            calendario_vencimientos.refrescar()
+            metricas.registrar_filas_carga('vencimientos', len(df_nuevos_para_anadir_venc), len(df_para_actualizar_venc))
             flash(f'Módulo Vencimientos actualizado: {len(df_nuevos_para_anadir_venc)} registros nuevos añadidos, {len(df_para_actualizar_venc)} registros existentes actualizados.', 'success')
 
     except Exception as e_venc:
         flash(f'Error procesando la sección de Vencimientos del archivo maestro: {str(e_venc)}', 'danger')
 
+    metricas.registrar_carga_maestra(time.perf_counter() - inicio_carga, filas_maestro)
     return redirect(url_for('index')) # Final redirect
 
 @app.route('/recaudo')
 @login_required
 def recaudo():
-    # Initialize all variables
+    # Rango de meses: por defecto el mes actual (desde/hasta en formato AAAA-MM)
+    desde, hasta, error_rango = rango_meses(request.args.get('desde'), request.args.get('hasta'), hoy=datetime.now())
+    if error_rango:
+        flash(error_rango, 'warning')
+
     total_renovaciones, total_prospectos, total_modificaciones, total_general = 0, 0, 0, 0
     renovaciones_data, prospectos_data, modificaciones_data = [], [], []
-    tpp_por_vendedor = []
+    tpp_por_vendedor, serie_mensual, meses_disponibles = [], [], []
     chart_data = {'labels': [], 'data': []}
 
-    remisiones = cargar_remisiones()
-    if remisiones:
-        df = pd.DataFrame(remisiones)
-
-        # Define all columns that will be used
-        required_cols = [
-            'renovacion', 'negocio_nuevo', 'modificacion', 'estado', 'fecha_registro', 
-            'uib', 'ramo', 'ComisionUIB', 'co_corretaje_opcion', 'ComisionTPP', 'co_corretaje_nombre'
-        ]
-        
-        # Check if all required columns exist
-        missing_cols = [col for col in required_cols if col not in df.columns]
-        if not missing_cols:
-            # Clean and prepare data
-            df['uib'] = df['uib'].apply(limpiar_valor_moneda)
-            df['ComisionUIB'] = df['ComisionUIB'].apply(limpiar_valor_moneda)
-            df['ComisionTPP'] = df['ComisionTPP'].apply(limpiar_valor_moneda)
-            df['fecha_registro_dt'] = pd.to_datetime(df['fecha_registro'], dayfirst=True, errors='coerce')
-            df.dropna(subset=['fecha_registro_dt'], inplace=True)
-
-            hoy = datetime.now()
-
-            # Base filter for remisiones created in the current month
-            base_filter = (
-                (df['estado'].astype(str).str.strip().str.lower() == 'creado') &
-                (df['fecha_registro_dt'].dt.month == hoy.month) &
-                (df['fecha_registro_dt'].dt.year == hoy.year)
-            )
-            df_mes_actual = df[base_filter].copy()
-
-            # --- Calculations for KPI cards (using ComisionUIB as per user feedback) ---
-            df_renovaciones = df_mes_actual[df_mes_actual['renovacion'].astype(str).str.strip().str.lower() == 'si']
-            total_renovaciones = df_renovaciones['ComisionUIB'].sum()
-            renovaciones_data = df_renovaciones.to_dict(orient='records')
-
-            df_prospectos = df_mes_actual[df_mes_actual['negocio_nuevo'].astype(str).str.strip().str.lower() == 'si']
-            total_prospectos = df_prospectos['ComisionUIB'].sum()
-            prospectos_data = df_prospectos.to_dict(orient='records')
-
-            df_modificaciones = df_mes_actual[df_mes_actual['modificacion'].astype(str).str.strip().str.lower() == 'si']
-            total_modificaciones = df_modificaciones['ComisionUIB'].sum()
-            modificaciones_data = df_modificaciones.to_dict(orient='records')
-
-            total_general = total_renovaciones + total_prospectos + total_modificaciones
-
-            # --- TPP per Seller Calculation (Corrected Logic) ---
-            df_tpp = df_mes_actual[df_mes_actual['co_corretaje_opcion'].astype(str).str.strip().str.lower() == 'si'].copy()
-            if not df_tpp.empty:
-                # Fill NaN values, convert to string, and strip whitespace to handle empty/null seller names correctly.
-                df_tpp['co_corretaje_nombre'] = df_tpp['co_corretaje_nombre'].fillna('').astype(str).str.strip()
-                
-                # Replace any resulting empty strings with a descriptive placeholder.
-                df_tpp.loc[df_tpp['co_corretaje_nombre'] == '', 'co_corretaje_nombre'] = 'Vendedor no especificado'
-
-                comisiones_tpp_agrupadas = df_tpp.groupby('co_corretaje_nombre')['ComisionTPP'].sum().reset_index()
-                
-                # Filter out 'UIB' and sellers with zero commission
-                comisiones_tpp_filtradas = comisiones_tpp_agrupadas[
-                    (~comisiones_tpp_agrupadas['co_corretaje_nombre'].str.lower().str.strip().eq('uib')) &
-                    (comisiones_tpp_agrupadas['ComisionTPP'] > 0)
-                ]
-                
-                comisiones_tpp_filtradas = comisiones_tpp_filtradas.rename(columns={'co_corretaje_nombre': 'vendedor', 'ComisionTPP': 'comision'})
-                tpp_por_vendedor = comisiones_tpp_filtradas.to_dict(orient='records')
-
-            # --- Chart Data Calculation (using uib which is equivalent to ComisionUIB) ---
-            if not df_mes_actual.empty:
-                ramos_data = df_mes_actual.groupby('ramo')['uib'].sum().sort_values(ascending=False).head(10)
-                chart_data['labels'] = ramos_data.index.tolist()
-                chart_data['data'] = [round(x) for x in ramos_data.values]
-        else:
-            flash(f'Faltan columnas requeridas en remisiones.xlsx para calcular el recaudo: {", ".join(missing_cols)}.', 'warning')
+    if os.path.exists(EXCEL_FILE):
+        try:
+            missing_cols = rollup_recaudo.columnas_faltantes()
+            if not missing_cols:
+                # Totales desde la tabla mensual (ver recaudo_index.py), sin recorrer las remisiones
+                totales = rollup_recaudo.totales(desde, hasta)
+                total_renovaciones = totales['por_tipo']['renovacion']
+                total_prospectos = totales['por_tipo']['negocio_nuevo']
+                total_modificaciones = totales['por_tipo']['modificacion']
+                total_general = totales['total']
+                tpp_por_vendedor = totales['tpp_por_vendedor']
+                chart_data = totales['ramos']
+                serie_mensual = totales['serie']
+                meses_disponibles = [texto_mes(mes) for mes in rollup_recaudo.meses_disponibles()]
+
+                renovaciones_data = rollup_recaudo.detalle('renovacion', desde, hasta)
+                prospectos_data = rollup_recaudo.detalle('negocio_nuevo', desde, hasta)
+                modificaciones_data = rollup_recaudo.detalle('modificacion', desde, hasta)
+            else:
+                flash(f'Faltan columnas requeridas en remisiones.xlsx para calcular el recaudo: {", ".join(missing_cols)}.', 'warning')
+        except Exception as e:
+            print(f"Error al calcular el recaudo: {e}")
+            flash(f'Error al calcular el recaudo: {e}', 'danger')
 
     return render_template('recaudo.html',
                            total_renovaciones=total_renovaciones,
@@ -2153,7 +2315,11 @@ def recaudo():
                            modificaciones_data=modificaciones_data,
                            total_general=total_general,
                            tpp_por_vendedor=tpp_por_vendedor,
-                           produccion_por_ramo_chart=chart_data)
+                           produccion_por_ramo_chart=chart_data,
+                           serie_mensual=serie_mensual,
+                           desde=texto_mes(desde),
+                           hasta=texto_mes(hasta),
+                           meses_disponibles=meses_disponibles)
 
 @app.route('/visualizar_sarlaft', methods=['GET'])
 @login_required
@@ -2204,8 +2370,7 @@ def editar_cobro(id_cobro):
     cobro_data = None
     if os.path.exists(COBROS_FILE):
         try:
-            df = pd.read_excel(COBROS_FILE)
-            df['ID_COBRO'] = df['ID_COBRO'].astype(str)
+            df = excel_io.leer_excel(COBROS_FILE)
             cobro_data = df[df['ID_COBRO'] == id_cobro].to_dict('records')
             if not cobro_data:
                 flash('Error: No se encontró el cobro especificado.', 'danger')
@@ -2228,83 +2393,27 @@ def panel_cobros():
                                    pagos_data={'records': [], 'kpis': {}, 'pagination': None, 'selected_period': 'Mensual'},
                                    opciones_periodicidad=[])
 
-        df = pd.read_excel(COBROS_FILE)
-        df['Fecha_Vencimiento_Cuota'] = pd.to_datetime(df['Fecha_Vencimiento_Cuota'], errors='coerce')
-        df.dropna(subset=['Fecha_Vencimiento_Cuota'], inplace=True)
-        
-        # --- Compatibilidad para registros antiguos ---
-        if 'Periodicidad' not in df.columns: df['Periodicidad'] = 'Mensual'
-        df['Periodicidad'].fillna('Mensual', inplace=True)
-        if 'Tipo_Movimiento' not in df.columns: df['Tipo_Movimiento'] = 'Cobro'
-        df['Tipo_Movimiento'].fillna('Cobro', inplace=True)
+        # --- 2. Índice de cobros por (tipo, estado, periodo, periodicidad) ---
+        # Solo relee cobros.xlsx si cambió en disco y reagrupa al cambiar de mes.
+        indice_cobros.sincronizar()
 
         opciones_periodicidad = config_manager.get_list('periodicidad_pago')
-        hoy = datetime.now()
-
-        # --- 2. Separar DataFrames ---
-        df_cobros_raw = df[df['Tipo_Movimiento'].str.contains('Cobro', case=False, na=False)].copy()
-        df_pagos_raw = df[df['Tipo_Movimiento'].str.contains('Pago', case=False, na=False)].copy()
 
         # --- 3. Función de procesamiento reutilizable ---
-        def process_section(df_raw, section_name_prefix):
-            kpis = {}
-            primer_dia_mes_actual = hoy.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
-
-            # --- DataFrames para cada categoría de filtro ---
-            df_pendientes = df_raw[df_raw['Estado'] == 'Pendiente'].copy()
-            df_cobrados = df_raw[df_raw['Estado'] == 'Cobrado'].copy()
-
-            # "Cobrados Mes Actual": todos los cobrados del mes actual
-            df_cobrados_mes_actual = df_cobrados[
-                (df_cobrados['Fecha_Vencimiento_Cuota'].dt.month == hoy.month) &
-                (df_cobrados['Fecha_Vencimiento_Cuota'].dt.year == hoy.year)
-            ]
-            
-            # "Mensual": todos los pendientes del mes actual
-            df_mensual_actual = df_pendientes[
-                (df_pendientes['Fecha_Vencimiento_Cuota'].dt.month == hoy.month) & 
-                (df_pendientes['Fecha_Vencimiento_Cuota'].dt.year == hoy.year)
-            ]
-            
-            # "Futuros": todos los pendientes a partir de hoy
-            df_futuro = df_pendientes[df_pendientes['Fecha_Vencimiento_Cuota'] >= hoy]
-            
-            # "Pasados": todos los pendientes antes del mes actual
-            df_pasados = df_pendientes[df_pendientes['Fecha_Vencimiento_Cuota'] < primer_dia_mes_actual]
-
-            # --- Lógica para KPIs ---
-            kpis['Cobrado Mes Actual'] = len(df_cobrados_mes_actual)
-            kpis['Mensual'] = len(df_mensual_actual)
-            # Para Trimestral y Anual, consideramos todos los pendientes desde el inicio del mes actual en adelante.
-            df_pendientes_futuros_del_mes = df_pendientes[df_pendientes['Fecha_Vencimiento_Cuota'] >= primer_dia_mes_actual]
-            kpis['Trimestral'] = len(df_pendientes_futuros_del_mes[df_pendientes_futuros_del_mes['Periodicidad'] == 'Trimestral'].drop_duplicates(subset=['Tomador', 'N_Poliza']))
-            kpis['Anual'] = len(df_pendientes_futuros_del_mes[df_pendientes_futuros_del_mes['Periodicidad'] == 'Anual'].drop_duplicates(subset=['Tomador', 'N_Poliza']))
-            kpis['Pendientes Mes Anterior'] = len(df_pasados)
+        def process_section(tipo_movimiento, section_name_prefix):
+            # KPIs: conteos O(1) sobre los buckets del índice
+            kpis = indice_cobros.kpis(tipo_movimiento)
 
             # --- Lógica para selección de tabla y paginación ---
             periodicidad_seleccionada = request.args.get(f'periodicidad_{section_name_prefix}', 'Mensual')
             page = request.args.get(f'page_{section_name_prefix}', 1, type=int)
             per_page = 15
 
-            if periodicidad_seleccionada == 'Cobrado Mes Actual':
-                registros_filtrados_df = df_cobrados_mes_actual
-            elif periodicidad_seleccionada == 'Mensual':
-                registros_filtrados_df = df_mensual_actual
-            elif periodicidad_seleccionada == 'Pendientes Mes Anterior':
-                registros_filtrados_df = df_pasados
-            else: # Trimestral, Anual, etc.
-                # La lógica de la tabla debe coincidir con la del KPI
-                df_pendientes_futuros_filtrado = df_pendientes_futuros_del_mes[df_pendientes_futuros_del_mes['Periodicidad'] == periodicidad_seleccionada]
-                registros_filtrados_df = df_pendientes_futuros_filtrado.sort_values('Fecha_Vencimiento_Cuota').drop_duplicates(subset=['Tomador', 'N_Poliza'], keep='first')
-
-            total_registros = len(registros_filtrados_df)
-            total_pages = (total_registros + per_page - 1) // per_page if per_page > 0 else 0
-            
             start = (page - 1) * per_page
             end = start + per_page
-            registros_paginados_df = registros_filtrados_df.iloc[start:end]
-
-            records_list = registros_paginados_df.sort_values(by='Fecha_Vencimiento_Cuota').to_dict(orient='records')
+            # Los buckets ya están ordenados por Fecha_Vencimiento_Cuota: se lee solo la página
+            total_registros, records_list = indice_cobros.seleccion(tipo_movimiento, periodicidad_seleccionada, start, end)
+            total_pages = (total_registros + per_page - 1) // per_page if per_page > 0 else 0
 
             pagination_info = {
                 'page': page, 'total_pages': total_pages, 'total_registros': total_registros,
@@ -2319,8 +2428,8 @@ def panel_cobros():
             }
 
         # --- 4. Procesar ambas secciones ---
-        cobros_data = process_section(df_cobros_raw, 'cobros')
-        pagos_data = process_section(df_pagos_raw, 'pagos')
+        cobros_data = process_section('Cobro', 'cobros')
+        pagos_data = process_section('Pago', 'pagos')
 
     except Exception as e:
         flash(f"Error al procesar el panel de cobros: {e}", "danger")
@@ -2338,12 +2447,13 @@ def panel_cobros():
 def marcar_cobrado(id_cobro):
     if os.path.exists(COBROS_FILE):
         try:
-            df = pd.read_excel(COBROS_FILE)
-            df['ID_COBRO'] = df['ID_COBRO'].astype(str)
+            df = excel_io.leer_excel(COBROS_FILE)
 
             if id_cobro in df['ID_COBRO'].values:
                 df.loc[df['ID_COBRO'] == id_cobro, 'Estado'] = 'Cobrado'
-                df.to_excel(COBROS_FILE, index=False)
+                firma_previa = indice_cobros.firma_archivo()
+                excel_io.guardar_excel(df, COBROS_FILE, TIPOS_COLUMNAS_EXCEL)
+                indice_cobros.actualizar_estado([id_cobro], 'Cobrado', firma_previa)
                 flash('Cuota marcada como Cobrada.', 'success')
             else:
                 flash('Error: No se encontró el ID del cobro.', 'danger')
@@ -2354,11 +2464,228 @@ def marcar_cobrado(id_cobro):
 
     return redirect(url_for('panel_cobros'))
 
+@app.route('/cobros/marcar_cobrado_lote', methods=['POST'])
+@login_required
+def marcar_cobrado_lote():
+    """
+    Marca varias cuotas como 'Cobrado' con una sola escritura de cobros.xlsx.
+    Acepta una lista de ID_COBRO y/o un N° de póliza (todas sus cuotas del
+    tipo_movimiento de la sección, 'Cobro' o 'Pago') y devuelve el resultado
+    por cada ID.
+    """
+    try:
+        data = request.get_json(silent=True)
+        if not data:
+            return jsonify({'success': False, 'message': 'Error: No se recibieron datos en la solicitud.'}), 400
+
+        ids_solicitados = data.get('ids_cobro') or []
+        n_poliza = str(data.get('n_poliza') or '').strip()
+        tipo_movimiento = normalizar_tipo_movimiento(data.get('tipo_movimiento'))
+        if not isinstance(ids_solicitados, list):
+            return jsonify({'success': False, 'message': 'Error: ids_cobro debe ser una lista.'}), 400
+        if not ids_solicitados and not n_poliza:
+            return jsonify({'success': False, 'message': 'Error: No se seleccionaron cuotas ni se indicó una póliza.'}), 400
+
+        if not os.path.exists(COBROS_FILE):
+            return jsonify({'success': False, 'message': 'Error: Archivo de cobros no encontrado.'}), 404
+
+        # --- 1. Validar los IDs contra el índice (sin leer el Excel) ---
+        indice_cobros.sincronizar()
+        if n_poliza:
+            if tipo_movimiento is None:
+                return jsonify({'success': False, 'message': 'Error: tipo_movimiento debe ser Cobro o Pago.'}), 400
+            ids_poliza = indice_cobros.ids_por_poliza(n_poliza, tipo_movimiento)
+            if not ids_poliza and not ids_solicitados:
+                return jsonify({'success': False, 'message': f'No se encontraron cuotas de {tipo_movimiento.lower()} para la póliza {n_poliza}.'}), 404
+            ids_solicitados = list(ids_solicitados) + ids_poliza
+
+        resultados = {}
+        ids_a_actualizar = []
+        for id_cobro in dict.fromkeys(str(i).strip() for i in ids_solicitados if str(i).strip()):
+            registro = indice_cobros.obtener(id_cobro)
+            if registro is None:
+                resultados[id_cobro] = {'id_cobro': id_cobro, 'success': False, 'message': 'No se encontró el ID del cobro.'}
+            elif registro.get('Estado') == 'Cobrado':
+                resultados[id_cobro] = {'id_cobro': id_cobro, 'success': True, 'message': 'La cuota ya estaba marcada como Cobrada.'}
+            else:
+                ids_a_actualizar.append(id_cobro)
+                resultados[id_cobro] = {'id_cobro': id_cobro, 'success': True, 'message': 'Cuota marcada como Cobrada.'}
+
+        # --- 2. Aplicar todos los cambios en una única escritura ---
+        actualizados = 0
+        if ids_a_actualizar:
+            firma_previa = indice_cobros.firma_archivo()
+            df = excel_io.leer_excel(COBROS_FILE)
+            mask = df['ID_COBRO'].isin(ids_a_actualizar)
+            encontrados = set(df.loc[mask, 'ID_COBRO'])
+
+            # Un ID puede haber desaparecido si otro proceso reescribió el archivo entre tanto
+            for id_cobro in ids_a_actualizar:
+                if id_cobro not in encontrados:
+                    resultados[id_cobro] = {'id_cobro': id_cobro, 'success': False, 'message': 'No se encontró el ID del cobro.'}
+
+            if encontrados:
+                df.loc[mask, 'Estado'] = 'Cobrado'
+                excel_io.guardar_excel(df, COBROS_FILE, TIPOS_COLUMNAS_EXCEL)
+                indice_cobros.actualizar_estado(list(encontrados), 'Cobrado', firma_previa)
+                actualizados = len(encontrados)
+
+        return jsonify({
+            'success': actualizados > 0,
+            'message': f'{actualizados} cuota(s) marcadas como Cobradas de {len(resultados)} solicitada(s).',
+            'actualizados': actualizados,
+            'resultados': list(resultados.values())
+        }), 200
+
+    except Exception as e:
+        print(f"Error crítico en marcar_cobrado_lote: {type(e).__name__} - {e}")
+        return jsonify({'success': False, 'message': f'Error al actualizar los cobros: {e}'}), 500
+
+# --- Inicialización de la aplicación ---
+_app_inicializada = False
+
+def crear_carpetas_datos():
+    for carpeta in (UPLOAD_FOLDER,              # For remision attachments
+                    CLIENT_FOLDERS_BASE_DIR,    # For client folders
+                    VENDEDOR_FOLDERS_BASE_DIR,  # For vendor folders
+                    CARTERA_DATA_DIR,           # For cartera data
+                    VENCIMIENTOS_DATA_DIR,      # For vencimientos data
+                    PROSPECTOS_DATA_DIR):       # For prospectos data
+        os.makedirs(carpeta, exist_ok=True)
+
+def precalentar_datos():
+    """
+    Carga por adelantado lo que casi todas las peticiones leen: pandas, las
+    listas de configuración, las instantáneas de cartera, vencimientos,
+    remisiones y prospectos, el calendario de vencimientos, los índices de
+    cobros, pólizas y prospectos, los totales mensuales del recaudo, el cubo
+    de producción y el registro de siniestros. Lo que ya está al día no se
+    vuelve a leer.
+
+    create_app() lo llama antes de atender peticiones; con gunicorn en modo
+    preload eso ocurre una vez en el proceso maestro, antes de crear los
+    workers, que comparten estos datos (copy-on-write). Cada worker lo vuelve
+    a llamar al arrancar y cada 5 minutos (tareas del programador) para releer
+    lo que haya cambiado. Devuelve True si se (re)cargó alguna instantánea.
+    """
+    precargar('pandas', 'numpy', 'openpyxl')
+    config_manager.snapshot()
+    recargadas = [instantanea.sincronizar()
+                  for instantanea in (instantanea_cartera, instantanea_vencimientos, instantanea_remisiones,
+                                      instantanea_prospectos)]
+    calendario_vencimientos.refrescar()
+    indice_cobros.sincronizar()
+    indice_polizas.precalentar()
+    rollup_recaudo.sincronizar()
+    cubo_produccion.sincronizar()
+    indice_prospectos.sincronizar()
+    registro_siniestros.sincronizar()
+    return any(recargadas)
+
+def compactar_datos():
+    """
+    Limpieza de la carpeta de datos: temporales de guardados interrumpidos,
+    correos enviados más viejos que la retención y mensajes que quedaron en
+    enviando/ de un proceso que terminó. Los .xlsx se reescriben completos en
+    cada guardado, así que no acumulan espacio que recuperar.
+    """
+    temporales = excel_io.eliminar_temporales([DATA_DIR, CARTERA_DATA_DIR, VENCIMIENTOS_DATA_DIR, PROSPECTOS_DATA_DIR,
+                                               config_manager.CONFIG_DIR, bandeja_correo.ruta('pendientes')])
+    enviados = bandeja_correo.purgar_enviados()
+    bandeja_correo.recuperar_abandonados()
+    return f"{temporales} temporal(es) y {enviados} correo(s) enviados eliminados"
+
+def registrar_tareas_programadas():
+    """Tareas de mantenimiento del programador (ver programador.py y /admin/programador)."""
+    programador.registrar(
+        'precalentar', '@arranque', precalentar_datos,
+        'Relee en el worker recién iniciado los archivos que cambiaron desde que se creó la app '
+        '(p. ej. un worker reemplazado por gunicorn después de varias cargas).')
+    programador.registrar(
+        'sincronizar_datos', '*/5 * * * *', precalentar_datos,
+        'Relee en segundo plano los archivos de datos que cambiaron (cargas o ediciones en otro worker), '
+        'para que no lo haga la siguiente petición.')
+    programador.registrar(
+        'vencimientos_dia', '5 0 * * *', calendario_vencimientos.refrescar,
+        'Días para vencer, alertas y KPIs de vencimientos del nuevo día.')
+    programador.registrar(
+        'cobros_cambio_mes', '1 0 1 * *', indice_cobros.sincronizar,
+        'Reasigna los cobros a los periodos (mensual, trimestral, ...) del nuevo mes.')
+    programador.registrar(
+        'compactar_datos', '30 3 * * *', compactar_datos,
+        'Elimina temporales huérfanos y correos enviados antiguos y recupera envíos abandonados.',
+        unica=True)
+
+def create_app(config=None):
+    """
+    Termina de preparar la aplicación y la devuelve: carga los módulos
+    diferidos (pandas, numpy, openpyxl...), crea las carpetas de datos, fija
+    el locale, registra el panel de administración y las extensiones (login,
+    perfilado, métricas, estáticos, correo, programador de tareas) y
+    precalienta los datos (precalentar_datos). Importar app.py no hace nada de
+    esto, así que usar sus constantes es rápido.
+
+    Todo ocurre aquí, en el hilo que crea la app y antes de que arranque
+    cualquier otro (peticiones, programador): la carga diferida de módulos no
+    es segura entre hilos (ver carga_diferida.py).
+
+    Se puede llamar varias veces; la inicialización se hace solo la primera.
+        gunicorn -c gunicorn.conf.py 'app:create_app()'
+    """
+    global _app_inicializada
+    if config:
+        app.config.update(config)
+    if _app_inicializada:
+        return app
+
+    precargar()
+    # Copy-on-write de pandas: las vistas de las instantáneas (instantaneas.py)
+    # comparten la memoria y una modificación solo copia lo que toca
+    pd.set_option('mode.copy_on_write', True)
+    crear_carpetas_datos()
+    configurar_locale()
+    login_manager.init_app(app)
+
+    # Registrar el Blueprint de administración
+    app.register_blueprint(admin_bp)
+
+    # Perfilado por petición (tiempos de E/S, cómputo y render en /admin/rendimiento)
+    perfilador.init_app(app)
+
+    # Métricas en formato Prometheus en /metrics
+    metricas.metricas.init_app(app, archivos_datos={
+        'remisiones': EXCEL_FILE,
+        'cobros': COBROS_FILE,
+        'cartera': app.config['CARTERA_PROCESADA_FILE_PATH'],
+        'vencimientos': app.config['VENCIMIENTOS_PROCESADA_FILE_PATH'],
+        'prospectos': app.config['PROSPECTOS_FILE_PATH'],
+    })
+
+    # Estáticos con huella de contenido y cache inmutable; compresión gzip/brotli
+    activos_estaticos.init_app(app)
+
+    # Bandeja de salida de correos (.eml) y envío SMTP en segundo plano
+    bandeja_correo.init_app(app)
+
+    # Tareas periódicas de mantenimiento en un hilo de cada worker
+    programador.init_app(app)
+    registrar_tareas_programadas()
+
+    # Antes de la primera petición, que es la que inicia el hilo del programador
+    try:
+        precalentar_datos()
+    except Exception as e:
+        # Un archivo dañado no impide arrancar: cada página lo reintenta y reporta al leerlo
+        print(f"ADVERTENCIA: no se pudieron precalentar los datos: {type(e).__name__} - {e}")
+
+    _app_inicializada = True
+    return app
+
 if __name__ == '__main__':
     try:
-        app.run(host='0.0.0.0', port=5000, debug=True)
+        create_app().run(host='0.0.0.0', port=5000, debug=True)
     except Exception as e:
         import traceback
         with open('server_error.log', 'w') as f:
             f.write(str(e) + '\n')
-            f.write(traceback.format_exc())
\ No newline at end of file
+            f.write(traceback.format_exc())
@@ -0,0 +1,157 @@
+"""
+Benchmark de arranque: mide cuánto tarda un proceso nuevo en importar la
+app, inicializarla (create_app) y responder la primera petición, que es lo
+que paga cada worker de gunicorn al arrancar o recargarse.
+
+Uso:
+    python -m benchmarks.bench_arranque
+    python -m benchmarks.bench_arranque --repeticiones 10
+    python -m benchmarks.bench_arranque --antes HEAD~1
+
+Con --antes se extrae esa revisión de git en una carpeta temporal y se mide
+igual, para comparar antes/después. Las revisiones sin create_app se miden
+usando directamente app.app.
+
+Cada repetición es un intérprete nuevo; se reporta la mediana. La primera
+petición es GET /login (no requiere sesión ni datos).
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tarfile
+import tempfile
+import time
+
+RAIZ_REPO = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DIRECTORIO_RESULTADOS = os.path.join(RAIZ_REPO, 'benchmarks', 'resultados')
+REPETICIONES_POR_DEFECTO = 5
+METRICAS = ('import_ms', 'init_ms', 'primera_respuesta_ms', 'total_ms', 'proceso_ms', 'rss_mb')
+
+
+def _rss_mb():
+    try:
+        import resource
+    except ImportError:  # Windows
+        return None
+    pico = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return round(pico / (1024 ** 2 if sys.platform == 'darwin' else 1024), 1)
+
+
+# --- Medición (proceso hijo) ---
+def medir(arbol):
+    """Importa la app de `arbol`, la inicializa y responde GET /login. Imprime JSON."""
+    sys.path.insert(0, arbol)
+    os.chdir(arbol)
+
+    inicio = time.perf_counter()
+    import app as modulo_app
+    importado = time.perf_counter()
+    fabrica = getattr(modulo_app, 'create_app', None)
+    aplicacion = fabrica() if fabrica is not None else modulo_app.app
+    inicializado = time.perf_counter()
+    respuesta = aplicacion.test_client().get('/login')
+    respuesta.get_data()
+    respondido = time.perf_counter()
+    if respuesta.status_code != 200:
+        raise RuntimeError(f'/login respondió HTTP {respuesta.status_code}')
+
+    print(json.dumps({
+        'import_ms': round((importado - inicio) * 1000, 1),
+        'init_ms': round((inicializado - importado) * 1000, 1),
+        'primera_respuesta_ms': round((respondido - inicializado) * 1000, 1),
+        'total_ms': round((respondido - inicio) * 1000, 1),
+        'pandas_cargado': 'pandas.core' in sys.modules,
+        'rss_mb': _rss_mb(),
+    }))
+
+
+def _medir_arbol(arbol, repeticiones, entorno):
+    muestras = []
+    for _ in range(repeticiones):
+        comando = [sys.executable, '-m', 'benchmarks.bench_arranque', '--medir', arbol]
+        inicio = time.perf_counter()
+        proceso = subprocess.run(comando, cwd=RAIZ_REPO, env=entorno, capture_output=True, text=True)
+        duracion_ms = (time.perf_counter() - inicio) * 1000
+        if proceso.returncode != 0:
+            ultima = proceso.stderr.strip().splitlines()[-1] if proceso.stderr.strip() else 'error desconocido'
+            return {'error': ultima}
+        muestra = json.loads(proceso.stdout.strip().splitlines()[-1])
+        muestra['proceso_ms'] = round(duracion_ms, 1)
+        muestras.append(muestra)
+
+    resultado = {m: round(statistics.median(s[m] for s in muestras), 1)
+                 for m in METRICAS if all(s.get(m) is not None for s in muestras)}
+    resultado['pandas_cargado'] = any(s['pandas_cargado'] for s in muestras)
+    return resultado
+
+
+def _extraer_revision(revision, destino):
+    archivo = os.path.join(destino, 'revision.tar')
+    subprocess.run(['git', 'archive', '--format=tar', '-o', archivo, revision], cwd=RAIZ_REPO, check=True)
+    arbol = os.path.join(destino, 'arbol')
+    with tarfile.open(archivo) as tar:
+        tar.extractall(arbol)
+    return arbol
+
+
+def _imprimir(etiqueta, resultado):
+    if 'error' in resultado:
+        print(f"{etiqueta:<10} ERROR: {resultado['error']}")
+        return
+    print(f"{etiqueta:<10} import {resultado['import_ms']:>7.1f} ms  create_app {resultado['init_ms']:>7.1f} ms  "
+          f"1ª respuesta {resultado['primera_respuesta_ms']:>6.1f} ms  total {resultado['total_ms']:>7.1f} ms  "
+          f"proceso {resultado['proceso_ms']:>7.1f} ms  RSS {resultado.get('rss_mb', '-')} MB  "
+          f"pandas {'sí' if resultado['pandas_cargado'] else 'no'}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--repeticiones', type=int, default=REPETICIONES_POR_DEFECTO)
+    parser.add_argument('--antes', help='Revisión de git con la que comparar (p. ej. HEAD~1)')
+    parser.add_argument('--json', help='Ruta del JSON de resultados (por defecto benchmarks/resultados/arranque_<fecha>.json)')
+    # Uso interno: medición en un proceso hijo
+    parser.add_argument('--medir', help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+
+    if args.medir:
+        medir(args.medir)
+        return 0
+
+    with tempfile.TemporaryDirectory() as temporal:
+        # Datos y cache de estáticos fuera del repositorio
+        entorno = dict(os.environ,
+                       SEGUROS_UIB_DATA_DIR=os.path.join(temporal, 'datos'),
+                       ESTATICOS_CACHE_DIR=os.path.join(temporal, 'estaticos'))
+        resultados = {}
+        if args.antes:
+            arbol_antes = _extraer_revision(args.antes, temporal)
+            resultados['antes'] = _medir_arbol(arbol_antes, args.repeticiones, entorno)
+            resultados['antes']['revision'] = args.antes
+            _imprimir('antes', resultados['antes'])
+        resultados['actual'] = _medir_arbol(RAIZ_REPO, args.repeticiones, entorno)
+        _imprimir('actual', resultados['actual'])
+
+    if 'antes' in resultados and 'error' not in resultados['antes'] and 'error' not in resultados['actual']:
+        antes, actual = resultados['antes']['total_ms'], resultados['actual']['total_ms']
+        print(f"Import → primera respuesta: {antes:.1f} ms -> {actual:.1f} ms ({(actual - antes) / antes:+.0%})")
+
+    informe = {
+        'fecha': time.strftime('%Y-%m-%d %H:%M:%S'),
+        'python': sys.version.split()[0],
+        'plataforma': sys.platform,
+        'repeticiones': args.repeticiones,
+        'resultados': resultados,
+    }
+    ruta_json = args.json or os.path.join(DIRECTORIO_RESULTADOS, f"arranque_{time.strftime('%Y%m%d_%H%M%S')}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(ruta_json)), exist_ok=True)
+    with open(ruta_json, 'w', encoding='utf-8') as f:
+        json.dump(informe, f, indent=4, ensure_ascii=False)
+    print(f"Resultados guardados en {ruta_json}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
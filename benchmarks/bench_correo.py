@@ -0,0 +1,161 @@
+"""
+Benchmark del correo masivo contra un servidor SMTP local (aiosmtpd), sin
+red: genera los .eml de N remisiones sintéticas con la plantilla de correo
+y vacía la bandeja con distinto número de conexiones simultáneas.
+
+Uso:
+    python -m benchmarks.bench_correo
+    python -m benchmarks.bench_correo --mensajes 2000 --conexiones 1 2 4 --fallo-cada 50
+
+Con --fallo-cada N el servidor responde 451 (error temporal) a uno de cada
+N mensajes, para medir los reintentos; --latencia-ms simula un servidor
+lento. Se informa mensajes por segundo, conexiones abiertas (reutilización)
+y reintentos, y se verifica que el servidor recibió cada mensaje una vez.
+
+Necesita el paquete aiosmtpd (pip install aiosmtpd), que la aplicación no usa.
+"""
+import argparse
+import asyncio
+import json
+import os
+import socket
+import sys
+import tempfile
+import threading
+import time
+
+RAIZ_REPO = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, RAIZ_REPO)
+
+DIRECTORIO_RESULTADOS = os.path.join(RAIZ_REPO, 'benchmarks', 'resultados')
+PLANTILLA = os.path.join(RAIZ_REPO, 'plantillas', 'plantilla_correo.txt')
+MENSAJES_POR_DEFECTO = 1000
+CONEXIONES_POR_DEFECTO = [1, 2, 4]
+
+
+class ServidorPrueba:
+    """Handler de aiosmtpd que cuenta mensajes y sesiones y puede fallar o demorar a propósito."""
+
+    def __init__(self, fallo_cada=0, latencia_ms=0):
+        self.fallo_cada = fallo_cada
+        self.latencia_s = latencia_ms / 1000
+        self.lock = threading.Lock()
+        self.intentos = 0
+        self.recibidos = {}
+        self.sesiones = set()
+
+    async def handle_DATA(self, server, session, envelope):
+        if self.latencia_s:
+            await asyncio.sleep(self.latencia_s)
+        with self.lock:
+            self.intentos += 1
+            self.sesiones.add(id(session))
+            if self.fallo_cada and self.intentos % self.fallo_cada == 0:
+                return '451 Error temporal de prueba'
+            id_mensaje = next((linea.split(b':', 1)[1].strip() for linea in envelope.content.splitlines()
+                               if linea.lower().startswith(b'message-id:')), None)
+            self.recibidos[id_mensaje] = self.recibidos.get(id_mensaje, 0) + 1
+        return '250 OK'
+
+
+def puerto_libre():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def medir(remisiones, conexiones, fallo_cada, latencia_ms, mensajes_por_minuto):
+    from aiosmtpd.controller import Controller
+
+    from correo_masivo import BandejaCorreo, EnviadorSMTP
+
+    servidor = ServidorPrueba(fallo_cada, latencia_ms)
+    puerto = puerto_libre()
+    controlador = Controller(servidor, hostname='127.0.0.1', port=puerto)
+    controlador.start()
+    try:
+        with tempfile.TemporaryDirectory() as directorio:
+            bandeja = BandejaCorreo()
+            bandeja.configurar(directorio, PLANTILLA, remitente='benchmark@uiblatam.com')
+
+            inicio = time.perf_counter()
+            escritos, _ = bandeja.generar(remisiones, 'remisiones', 'destino@ejemplo.com')
+            generacion_s = time.perf_counter() - inicio
+
+            enviador = EnviadorSMTP(bandeja, host='127.0.0.1', puerto=puerto, conexiones=conexiones,
+                                    mensajes_por_minuto=mensajes_por_minuto, espera_reintento_s=0.05)
+            resumen = enviador.drenar()
+            conteos = bandeja.conteos()
+    finally:
+        controlador.stop()
+
+    duplicados = sum(1 for veces in servidor.recibidos.values() if veces > 1)
+    return {
+        'conexiones': conexiones,
+        'mensajes': escritos,
+        'generacion_s': round(generacion_s, 2),
+        'generacion_por_s': round(escritos / generacion_s, 1) if generacion_s else None,
+        'envio_s': resumen['segundos'],
+        'envio_por_s': round(resumen['enviados'] / resumen['segundos'], 1) if resumen['segundos'] else None,
+        'enviados': resumen['enviados'],
+        'fallidos': resumen['fallidos'],
+        'reintentos': resumen['reintentos'],
+        'conexiones_abiertas': resumen['conexiones'],
+        'sesiones_servidor': len(servidor.sesiones),
+        'recibidos_servidor': len(servidor.recibidos),
+        'duplicados': duplicados,
+        'pendientes_al_final': conteos['pendientes'] + conteos['enviando'],
+    }
+
+
+def _imprimir(r):
+    print(f"{r['conexiones']:>2} conexiones  {r['mensajes']} mensajes  generación {r['generacion_s']:>6.2f} s "
+          f"({r['generacion_por_s']}/s)  envío {r['envio_s']:>6.2f} s ({r['envio_por_s']}/s)  "
+          f"enviados {r['enviados']}  fallidos {r['fallidos']}  reintentos {r['reintentos']}  "
+          f"conexiones abiertas {r['conexiones_abiertas']}  duplicados {r['duplicados']}", flush=True)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--mensajes', type=int, default=MENSAJES_POR_DEFECTO)
+    parser.add_argument('--conexiones', type=int, nargs='+', default=CONEXIONES_POR_DEFECTO)
+    parser.add_argument('--fallo-cada', type=int, default=0, help='El servidor responde 451 a uno de cada N mensajes')
+    parser.add_argument('--latencia-ms', type=float, default=0, help='Demora del servidor por mensaje')
+    parser.add_argument('--mensajes-por-minuto', type=int, default=0, help='Límite de ritmo del enviador (0 = sin límite)')
+    parser.add_argument('--json', help='Ruta del JSON de resultados (por defecto benchmarks/resultados/correo_<fecha>.json)')
+    args = parser.parse_args(argv)
+
+    try:
+        import aiosmtpd  # noqa: F401
+    except ImportError:
+        parser.error('este benchmark necesita aiosmtpd (pip install aiosmtpd)')
+
+    with tempfile.TemporaryDirectory() as temporal:
+        # El generador importa app.py: que sus carpetas se creen fuera del repositorio
+        os.environ.setdefault('SEGUROS_UIB_DATA_DIR', temporal)
+        from benchmarks import datos_sinteticos
+        remisiones = datos_sinteticos.remisiones(args.mensajes)
+
+        resultados = []
+        for conexiones in args.conexiones:
+            resultado = medir(remisiones, conexiones, args.fallo_cada, args.latencia_ms, args.mensajes_por_minuto)
+            resultados.append(resultado)
+            _imprimir(resultado)
+
+    informe = {
+        'fecha': time.strftime('%Y-%m-%d %H:%M:%S'),
+        'python': sys.version.split()[0],
+        'fallo_cada': args.fallo_cada,
+        'latencia_ms': args.latencia_ms,
+        'resultados': resultados,
+    }
+    ruta_json = args.json or os.path.join(DIRECTORIO_RESULTADOS, f"correo_{time.strftime('%Y%m%d_%H%M%S')}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(ruta_json)), exist_ok=True)
+    with open(ruta_json, 'w', encoding='utf-8') as f:
+        json.dump(informe, f, indent=4, ensure_ascii=False)
+    print(f"Resultados guardados en {ruta_json}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
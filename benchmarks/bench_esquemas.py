@@ -0,0 +1,118 @@
+"""
+Benchmark de los esquemas por entidad (esquemas.ESQUEMAS): memoria de cada
+archivo de datos leído tal cual (columnas de texto como objetos) y con el
+esquema aplicado (categorías), y tiempo de los filtros habituales sobre las
+columnas categóricas (== e isin).
+
+Uso:
+    python -m benchmarks.bench_esquemas
+    python -m benchmarks.bench_esquemas --filas 100000 --directorio /tmp/datos_100k
+
+Los archivos se generan con benchmarks.datos_sinteticos (se reutilizan si ya
+existen en el directorio) y los resultados se guardan en
+benchmarks/resultados/esquemas_<filas>.json.
+"""
+import argparse
+import json
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+RAIZ_REPO = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, RAIZ_REPO)
+
+DIRECTORIO_RESULTADOS = os.path.join(RAIZ_REPO, 'benchmarks', 'resultados')
+FILAS_POR_DEFECTO = 100_000
+REPETICIONES = 20
+
+
+def cronometrar(funcion, repeticiones=REPETICIONES):
+    """Mediana en milisegundos de `repeticiones` llamadas."""
+    tiempos = []
+    for _ in range(repeticiones):
+        inicio = time.perf_counter()
+        funcion()
+        tiempos.append(time.perf_counter() - inicio)
+    return round(statistics.median(tiempos) * 1000, 3)
+
+
+def medir_filtros(objetos, tipado, columna):
+    """Tiempo de la máscara de == e isin sobre la columna, con y sin categorías."""
+    frecuentes = objetos[columna].value_counts().index[:2].tolist()
+    if not frecuentes:
+        return []
+    filtros = {
+        '==': lambda df: df[columna] == frecuentes[0],
+        'isin': lambda df: df[columna].isin(frecuentes),
+    }
+    resultado = []
+    for nombre, filtro in filtros.items():
+        antes = cronometrar(lambda: filtro(objetos))
+        despues = cronometrar(lambda: filtro(tipado))
+        resultado.append({'columna': columna, 'filtro': nombre, 'objetos_ms': antes, 'esquema_ms': despues,
+                          'aceleracion': round(antes / despues, 1) if despues else None})
+    return resultado
+
+
+def medir_entidad(entidad, ruta):
+    import esquemas
+    import excel_io
+
+    objetos = excel_io.leer_excel(ruta)
+    inicio = time.perf_counter()
+    tipado = esquemas.aplicar_esquema(objetos, entidad)
+    segundos_aplicar = time.perf_counter() - inicio
+
+    categoricas = [columna for columna, (tipo, _lista) in esquemas.ESQUEMAS[entidad].items()
+                   if tipo == esquemas.CATEGORIA and columna in objetos.columns]
+    antes, despues = esquemas.memoria_mb(objetos), esquemas.memoria_mb(tipado)
+    filtros = []
+    for columna in categoricas:
+        filtros.extend(medir_filtros(objetos, tipado, columna))
+    return {
+        'entidad': entidad,
+        'filas': len(objetos),
+        'memoria_objetos_mb': antes,
+        'memoria_esquema_mb': despues,
+        'reduccion_pct': round(100 * (1 - despues / antes), 1) if antes else None,
+        'aplicar_esquema_s': round(segundos_aplicar, 3),
+        'filtros': filtros,
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--filas', type=int, default=FILAS_POR_DEFECTO)
+    parser.add_argument('--directorio', help='Directorio de datos (por defecto uno temporal)')
+    args = parser.parse_args(argv)
+
+    with tempfile.TemporaryDirectory() as temporal:
+        directorio = os.path.abspath(args.directorio or temporal)
+        os.environ.setdefault('SEGUROS_UIB_DATA_DIR', directorio)
+        os.environ.setdefault('PROGRAMADOR_ACTIVO', '0')
+        from benchmarks import datos_sinteticos
+
+        print(f"Generando datos ({args.filas} filas) en {directorio}...")
+        rutas = datos_sinteticos.generar(directorio, args.filas)
+        resultados = []
+        for entidad, ruta in rutas.items():
+            medida = medir_entidad(entidad, ruta)
+            resultados.append(medida)
+            print(f"{entidad:<13} {medida['memoria_objetos_mb']:>8.1f} MB -> {medida['memoria_esquema_mb']:>8.1f} MB "
+                  f"(-{medida['reduccion_pct']}%)  esquema en {medida['aplicar_esquema_s']:.2f} s")
+            for filtro in medida['filtros']:
+                print(f"    {filtro['columna']:<24} {filtro['filtro']:<5} {filtro['objetos_ms']:>8.2f} ms -> "
+                      f"{filtro['esquema_ms']:>8.2f} ms  x{filtro['aceleracion']}")
+
+    os.makedirs(DIRECTORIO_RESULTADOS, exist_ok=True)
+    ruta_json = os.path.join(DIRECTORIO_RESULTADOS, f'esquemas_{args.filas}.json')
+    with open(ruta_json, 'w', encoding='utf-8') as f:
+        json.dump(resultados, f, indent=4, ensure_ascii=False)
+    print(f"Resultados en {ruta_json}")
+    return resultados
+
+
+if __name__ == '__main__':
+    main()
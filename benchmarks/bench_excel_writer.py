@@ -0,0 +1,92 @@
+"""
+Benchmark de escritura de Excel: compara el df.to_excel por defecto de pandas
+(openpyxl) con los motores del escritor central (excel_io.guardar_excel).
+
+Uso:
+    python -m benchmarks.bench_excel_writer
+    python -m benchmarks.bench_excel_writer --filas 10000 100000 --json resultados.json
+
+Para cada tamaño mide el tiempo de escritura y el pico de memoria asignada
+por Python (tracemalloc) sobre una cartera sintética (benchmarks.datos_sinteticos).
+"""
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import excel_io  # noqa: E402
+from benchmarks import datos_sinteticos  # noqa: E402
+
+FILAS_POR_DEFECTO = [10_000, 100_000, 300_000]
+
+
+def _escribir_pandas(df, ruta):
+    df.to_excel(ruta, index=False)
+
+
+def _escritor_central(motor):
+    def escribir(df, ruta):
+        excel_io.guardar_excel(df, ruta, datos_sinteticos.modulo_app().TIPOS_COLUMNAS_EXCEL, motor=motor)
+    return escribir
+
+
+def variantes():
+    resultado = {'pandas_openpyxl': _escribir_pandas}
+    for motor in excel_io.MOTORES_DISPONIBLES:
+        resultado[f'central_{motor}'] = _escritor_central(motor)
+    return resultado
+
+
+def medir(escribir, df, directorio):
+    ruta = os.path.join(directorio, 'bench.xlsx')
+
+    inicio = time.perf_counter()
+    escribir(df, ruta)
+    segundos = time.perf_counter() - inicio
+    tamano = os.path.getsize(ruta)
+
+    # El pico de memoria se mide en una segunda pasada: tracemalloc ralentiza la escritura
+    tracemalloc.start()
+    escribir(df, ruta)
+    _actual, pico = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    os.remove(ruta)
+
+    return {'segundos': round(segundos, 3), 'pico_memoria_mb': round(pico / 1024 ** 2, 1), 'tamano_mb': round(tamano / 1024 ** 2, 2)}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--filas', type=int, nargs='+', default=FILAS_POR_DEFECTO)
+    parser.add_argument('--variantes', nargs='+', help='Subconjunto de variantes a medir')
+    parser.add_argument('--json', help='Ruta donde guardar los resultados en JSON')
+    args = parser.parse_args(argv)
+
+    todas = variantes()
+    seleccion = {k: v for k, v in todas.items() if not args.variantes or k in args.variantes}
+    resultados = []
+    with tempfile.TemporaryDirectory() as directorio:
+        # El generador importa app.py: que sus carpetas se creen en el temporal
+        os.environ.setdefault('SEGUROS_UIB_DATA_DIR', directorio)
+        for filas in args.filas:
+            df = datos_sinteticos.cartera(filas)
+            for nombre, escribir in seleccion.items():
+                medida = medir(escribir, df, directorio)
+                medida.update({'variante': nombre, 'filas': filas})
+                resultados.append(medida)
+                print(f"{filas:>8} filas  {nombre:<22} {medida['segundos']:>8.2f} s  "
+                      f"{medida['pico_memoria_mb']:>8.1f} MB pico  {medida['tamano_mb']:>7.2f} MB archivo")
+
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump(resultados, f, indent=4, ensure_ascii=False)
+    return resultados
+
+
+if __name__ == '__main__':
+    main()
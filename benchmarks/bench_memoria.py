@@ -0,0 +1,219 @@
+"""
+Benchmark de memoria del servidor de producción: arranca gunicorn con
+gunicorn.conf.py y 1, 4 y 8 workers, con y sin modo preload, calienta las
+páginas principales en todos los workers y mide la memoria de cada proceso.
+
+Uso:
+    python -m benchmarks.bench_memoria
+    python -m benchmarks.bench_memoria --filas 100000 --workers 1 4 8 --modos preload clasico
+
+Para cada proceso se lee /proc/<pid>/smaps_rollup (solo Linux):
+- RSS: memoria residente, contando dos veces las páginas compartidas.
+- USS: memoria privada del proceso (lo que se libera si termina).
+- PSS: las páginas compartidas se reparten entre los procesos que las usan;
+  la suma de PSS es la memoria total real del servidor.
+"""
+import argparse
+import http.cookiejar
+import json
+import os
+import shutil
+import signal
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+
+RAIZ_REPO = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, RAIZ_REPO)
+
+DIRECTORIO_RESULTADOS = os.path.join(RAIZ_REPO, 'benchmarks', 'resultados')
+FILAS_POR_DEFECTO = [100_000]
+WORKERS_POR_DEFECTO = [1, 4, 8]
+MODOS = {'preload': '1', 'clasico': '0'}
+PETICIONES_POR_WORKER = 3
+ESPERA_ARRANQUE_S = 180
+
+# Páginas que cargan los datos de solo lectura frecuente
+RUTAS_CALENTAMIENTO = ['/', '/cartera/visualizar', '/vencimientos/visualizar', '/cobros',
+                       '/remision/nueva', '/api/opciones']
+
+
+def puerto_libre():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def memoria_proceso(pid):
+    """{'rss_mb', 'pss_mb', 'uss_mb'} de un proceso según /proc/<pid>/smaps_rollup."""
+    valores = {}
+    with open(f'/proc/{pid}/smaps_rollup', 'r') as f:
+        for linea in f:
+            partes = linea.split()
+            if len(partes) >= 3 and partes[2] == 'kB':
+                valores[partes[0].rstrip(':')] = int(partes[1])
+    uss = valores.get('Private_Clean', 0) + valores.get('Private_Dirty', 0)
+    return {
+        'rss_mb': round(valores.get('Rss', 0) / 1024, 1),
+        'pss_mb': round(valores.get('Pss', 0) / 1024, 1),
+        'uss_mb': round(uss / 1024, 1),
+    }
+
+
+def hijos(pid):
+    try:
+        with open(f'/proc/{pid}/task/{pid}/children', 'r') as f:
+            return [int(p) for p in f.read().split()]
+    except OSError:
+        return []
+
+
+def _abrir(opener, url, datos=None, timeout=900):
+    cuerpo = urllib.parse.urlencode(datos).encode() if datos is not None else None
+    with opener.open(url, data=cuerpo, timeout=timeout) as respuesta:
+        respuesta.read()
+        return respuesta.status
+
+
+def _esperar_servidor(base, proceso):
+    limite = time.monotonic() + ESPERA_ARRANQUE_S
+    while time.monotonic() < limite:
+        if proceso.poll() is not None:
+            raise RuntimeError(f'gunicorn terminó al arrancar (código {proceso.returncode})')
+        try:
+            if _abrir(urllib.request.build_opener(), f'{base}/login', timeout=5) == 200:
+                return
+        except (urllib.error.URLError, ConnectionError, socket.timeout):
+            time.sleep(0.2)
+    raise RuntimeError('gunicorn no respondió a tiempo')
+
+
+def medir(datos, workers, modo, peticiones_por_worker):
+    """Arranca gunicorn sobre una copia de `datos`, calienta y mide la memoria."""
+    with tempfile.TemporaryDirectory() as directorio:
+        copia = os.path.join(directorio, 'datos')
+        shutil.copytree(datos, copia)
+        puerto = puerto_libre()
+        archivo_pid = os.path.join(directorio, 'gunicorn.pid')
+        entorno = dict(os.environ,
+                       GUNICORN_BIND=f'127.0.0.1:{puerto}',
+                       GUNICORN_WORKERS=str(workers),
+                       GUNICORN_PRELOAD=MODOS[modo],
+                       SEGUROS_UIB_DATA_DIR=copia,
+                       PROMETHEUS_MULTIPROC_DIR=os.path.join(directorio, 'metricas'))
+        comando = [sys.executable, '-m', 'gunicorn', '-c', os.path.join(RAIZ_REPO, 'gunicorn.conf.py'),
+                   '--pid', archivo_pid, '--timeout', '600']
+        base = f'http://127.0.0.1:{puerto}'
+
+        inicio = time.perf_counter()
+        proceso = subprocess.Popen(comando, cwd=RAIZ_REPO, env=entorno,
+                                   stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        try:
+            _esperar_servidor(base, proceso)
+            arranque_s = time.perf_counter() - inicio
+
+            opener = urllib.request.build_opener(urllib.request.HTTPCookieProcessor(http.cookiejar.CookieJar()))
+            _abrir(opener, f'{base}/login', {'username': 'admin', 'password': '1234'})
+
+            # Peticiones concurrentes para que las atiendan todos los workers
+            inicio = time.perf_counter()
+            urls = [f'{base}{ruta}' for ruta in RUTAS_CALENTAMIENTO for _ in range(workers * peticiones_por_worker)]
+            with ThreadPoolExecutor(max_workers=workers) as ejecutor:
+                estados = list(ejecutor.map(lambda url: _abrir(opener, url), urls))
+            calentamiento_s = time.perf_counter() - inicio
+            errores = sum(1 for estado in estados if estado != 200)
+
+            with open(archivo_pid, 'r') as f:
+                maestro = int(f.read().strip())
+            memoria_maestro = memoria_proceso(maestro)
+            memoria_workers = [memoria_proceso(pid) for pid in hijos(maestro)]
+        finally:
+            proceso.send_signal(signal.SIGTERM)
+            try:
+                proceso.wait(timeout=60)
+            except subprocess.TimeoutExpired:
+                proceso.kill()
+
+    n = len(memoria_workers) or 1
+    return {
+        'modo': modo,
+        'workers': workers,
+        'arranque_s': round(arranque_s, 2),
+        'calentamiento_s': round(calentamiento_s, 2),
+        'peticiones_con_error': errores,
+        'maestro_rss_mb': memoria_maestro['rss_mb'],
+        'worker_rss_mb': round(sum(m['rss_mb'] for m in memoria_workers) / n, 1),
+        'worker_uss_mb': round(sum(m['uss_mb'] for m in memoria_workers) / n, 1),
+        'total_pss_mb': round(memoria_maestro['pss_mb'] + sum(m['pss_mb'] for m in memoria_workers), 1),
+    }
+
+
+def _imprimir(filas, r):
+    print(f"{filas:>9} filas  {r['modo']:<8} {r['workers']:>2} workers  "
+          f"arranque {r['arranque_s']:>6.2f} s  calentamiento {r['calentamiento_s']:>6.2f} s  "
+          f"maestro RSS {r['maestro_rss_mb']:>6.1f} MB  worker RSS {r['worker_rss_mb']:>6.1f} MB  "
+          f"worker USS {r['worker_uss_mb']:>6.1f} MB  total PSS {r['total_pss_mb']:>7.1f} MB"
+          + (f"  ({r['peticiones_con_error']} peticiones con error)" if r['peticiones_con_error'] else ''), flush=True)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--filas', type=int, nargs='+', default=FILAS_POR_DEFECTO)
+    parser.add_argument('--workers', type=int, nargs='+', default=WORKERS_POR_DEFECTO)
+    parser.add_argument('--modos', nargs='+', choices=sorted(MODOS), default=list(MODOS))
+    parser.add_argument('--peticiones-por-worker', type=int, default=PETICIONES_POR_WORKER)
+    parser.add_argument('--datos-dir', help='Carpeta donde generar (y reutilizar) los datos sintéticos')
+    parser.add_argument('--json', help='Ruta del JSON de resultados (por defecto benchmarks/resultados/memoria_<fecha>.json)')
+    args = parser.parse_args(argv)
+
+    if not os.path.exists('/proc/self/smaps_rollup'):
+        parser.error('este benchmark necesita Linux (/proc/<pid>/smaps_rollup)')
+
+    directorio_temporal = None
+    datos_dir = args.datos_dir
+    if not datos_dir:
+        directorio_temporal = tempfile.TemporaryDirectory()
+        datos_dir = directorio_temporal.name
+    # El generador importa app.py: que sus carpetas se creen fuera del repositorio
+    os.environ['SEGUROS_UIB_DATA_DIR'] = os.path.join(datos_dir, '_app')
+
+    from benchmarks import datos_sinteticos
+
+    resultados = []
+    try:
+        for filas in args.filas:
+            datos = os.path.abspath(os.path.join(datos_dir, f'filas_{filas}'))
+            print(f"Generando datos sintéticos ({filas} filas) en {datos}", flush=True)
+            datos_sinteticos.generar(datos, filas)
+            for modo in args.modos:
+                for workers in args.workers:
+                    resultado = medir(datos, workers, modo, args.peticiones_por_worker)
+                    resultado['filas'] = filas
+                    resultados.append(resultado)
+                    _imprimir(filas, resultado)
+    finally:
+        if directorio_temporal is not None:
+            directorio_temporal.cleanup()
+
+    informe = {
+        'fecha': time.strftime('%Y-%m-%d %H:%M:%S'),
+        'python': sys.version.split()[0],
+        'plataforma': sys.platform,
+        'resultados': resultados,
+    }
+    ruta_json = args.json or os.path.join(DIRECTORIO_RESULTADOS, f"memoria_{time.strftime('%Y%m%d_%H%M%S')}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(ruta_json)), exist_ok=True)
+    with open(ruta_json, 'w', encoding='utf-8') as f:
+        json.dump(informe, f, indent=4, ensure_ascii=False)
+    print(f"Resultados guardados en {ruta_json}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
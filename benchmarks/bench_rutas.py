@@ -0,0 +1,308 @@
+"""
+Benchmark de rutas: mide la latencia (p50/p95) y el pico de memoria (RSS)
+de las páginas principales con datos sintéticos de distintos tamaños.
+
+Uso:
+    python -m benchmarks.bench_rutas --filas 1000 10000
+    python -m benchmarks.bench_rutas --filas 1000 10000 --guardar-baseline
+    python -m benchmarks.bench_rutas --filas 1000 10000 --baseline otro_baseline.json --tolerancia 0.25
+    python -m benchmarks.bench_rutas --filas 100000 1000000 --sin-comparar
+
+Cada ruta se mide en un proceso aparte (para que el pico de RSS sea el de
+esa ruta) sobre una copia del juego de datos, a través del cliente de
+pruebas de Flask con sesión iniciada. La primera petición (caches en frío)
+se reporta por separado y no entra en los percentiles. El programador de
+tareas está apagado salvo en control_con_programador, que mide /control con
+su hilo corriendo como en producción.
+
+Los resultados se guardan en JSON y se comparan contra el baseline
+(benchmarks/resultados/baseline.json, versionado en el repositorio y medido
+con --filas 1000 10000 --repeticiones 10): el proceso termina con código 1
+si alguna ruta empeora más que la tolerancia indicada o falla, y con código
+2 si el baseline no existe o no tiene ninguna de las rutas y tamaños
+medidos. Los tiempos dependen de la máquina: para comparar en otra, primero
+se genera su baseline con --guardar-baseline (y se versiona si es la de
+referencia). --sin-comparar solo mide.
+"""
+import argparse
+import io
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+RAIZ_REPO = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, RAIZ_REPO)
+
+FILAS_POR_DEFECTO = [1_000, 10_000, 100_000, 1_000_000]
+REPETICIONES_POR_DEFECTO = 10
+DIRECTORIO_RESULTADOS = os.path.join(RAIZ_REPO, 'benchmarks', 'resultados')
+BASELINE_POR_DEFECTO = os.path.join(DIRECTORIO_RESULTADOS, 'baseline.json')
+
+# Empeoramiento relativo tolerado y diferencia mínima (ms / MB) para
+# considerar una regresión, de modo que el ruido en rutas muy rápidas no cuente
+TOLERANCIA_POR_DEFECTO = 0.20
+MINIMO_MS = 5.0
+MINIMO_MB = 10.0
+
+RUTAS = {
+    'inicio': ('GET', '/'),
+    'control': ('GET', '/control'),
+    'cobros': ('GET', '/cobros'),
+    'cartera_visualizar': ('GET', '/cartera/visualizar'),
+    'vencimientos_visualizar': ('GET', '/vencimientos/visualizar'),
+    'procesar_reporte_maestro': ('POST', '/procesar_reporte_maestro'),
+    'control_con_programador': ('GET', '/control'),
+}
+
+# Rutas que se miden con el hilo del programador activo, como en producción:
+# detecta fallas que solo aparecen con sus tareas corriendo junto a las peticiones
+RUTAS_CON_PROGRAMADOR = {'control_con_programador'}
+
+# Rutas que modifican los archivos de datos: se restauran antes de cada petición
+RUTAS_CON_ESCRITURA = {'procesar_reporte_maestro': ('cartera', 'vencimientos')}
+
+
+def pico_rss_mb():
+    """Pico de memoria residente del proceso en MB, o None si no se puede medir."""
+    try:
+        import resource
+    except ImportError:  # Windows
+        return None
+    pico = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux lo reporta en KB y macOS en bytes
+    return round(pico / (1024 ** 2 if sys.platform == 'darwin' else 1024), 1)
+
+
+def percentil(valores, p):
+    return round(float(np.percentile(valores, p)), 2) if valores else None
+
+
+# --- Medición de una ruta (proceso hijo) ---
+def medir_ruta(nombre, datos, repeticiones, salida):
+    """
+    Copia el juego de datos, apunta la app a la copia, inicia sesión y
+    ejecuta la ruta `repeticiones` + 1 veces. Escribe el resultado en `salida`.
+    """
+    with tempfile.TemporaryDirectory() as directorio:
+        copia = os.path.join(directorio, 'datos')
+        shutil.copytree(datos, copia)
+        os.environ['SEGUROS_UIB_DATA_DIR'] = copia
+        # Sin el hilo del programador (salvo en RUTAS_CON_PROGRAMADOR): sus tareas correrían durante la medición
+        os.environ['PROGRAMADOR_ACTIVO'] = '1' if nombre in RUTAS_CON_PROGRAMADOR else '0'
+
+        from benchmarks import datos_sinteticos
+        import app as modulo_app
+
+        rss_inicial = pico_rss_mb()
+        cliente = modulo_app.create_app().test_client()
+        respuesta = cliente.post('/login', data={'username': 'admin', 'password': '1234'})
+        if respuesta.status_code != 302:
+            raise RuntimeError(f'No se pudo iniciar sesión (HTTP {respuesta.status_code})')
+
+        metodo, url = RUTAS[nombre]
+        # Las páginas responden 200; la carga del maestro redirige al inicio
+        estado_esperado = 302 if metodo == 'POST' else 200
+        originales = datos_sinteticos.rutas_archivos(datos)
+        destinos = datos_sinteticos.rutas_archivos(copia)
+        maestro = None
+        if nombre == 'procesar_reporte_maestro':
+            with open(os.path.join(datos, 'reporte_maestro.xlsx'), 'rb') as f:
+                maestro = f.read()
+
+        tiempos = []
+        for _ in range(repeticiones + 1):
+            for archivo in RUTAS_CON_ESCRITURA.get(nombre, ()):
+                shutil.copyfile(originales[archivo], destinos[archivo])
+            if metodo == 'POST':
+                datos_peticion = {'archivo': (io.BytesIO(maestro), 'reporte_maestro.xlsx')}
+                inicio = time.perf_counter()
+                respuesta = cliente.post(url, data=datos_peticion, content_type='multipart/form-data')
+            else:
+                inicio = time.perf_counter()
+                respuesta = cliente.get(url)
+            respuesta.get_data()
+            tiempos.append((time.perf_counter() - inicio) * 1000)
+            if respuesta.status_code != estado_esperado:
+                raise RuntimeError(f'{url} respondió HTTP {respuesta.status_code}')
+
+    resultado = {
+        'ruta': nombre,
+        'url': url,
+        'primera_ms': round(tiempos[0], 2),
+        'p50_ms': percentil(tiempos[1:], 50),
+        'p95_ms': percentil(tiempos[1:], 95),
+        'rss_inicial_mb': rss_inicial,
+        'pico_rss_mb': pico_rss_mb(),
+    }
+    with open(salida, 'w', encoding='utf-8') as f:
+        json.dump(resultado, f)
+
+
+def _medir_en_proceso(nombre, datos, repeticiones):
+    fd, salida = tempfile.mkstemp(suffix='.json')
+    os.close(fd)
+    try:
+        comando = [sys.executable, '-m', 'benchmarks.bench_rutas', '--medir-ruta', nombre,
+                   '--datos', datos, '--repeticiones', str(repeticiones), '--salida', salida]
+        proceso = subprocess.run(comando, cwd=RAIZ_REPO, capture_output=True, text=True)
+        if proceso.returncode != 0:
+            return {'ruta': nombre, 'error': proceso.stderr.strip().splitlines()[-1] if proceso.stderr.strip() else 'error desconocido'}
+        with open(salida, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    finally:
+        os.remove(salida)
+
+
+# --- Comparación con el baseline ---
+def comparar(resultados, baseline, tolerancia=TOLERANCIA_POR_DEFECTO):
+    """
+    Compara cada (ruta, filas) con el baseline. Devuelve la lista de
+    regresiones como (ruta, filas, métrica, valor_baseline, valor_actual).
+    """
+    previos = {(r['ruta'], r['filas']): r for r in baseline.get('resultados', [])}
+    regresiones = []
+    for actual in resultados:
+        previo = previos.get((actual['ruta'], actual['filas']))
+        if previo is None or 'error' in actual or 'error' in previo:
+            continue
+        for metrica, minimo in (('p50_ms', MINIMO_MS), ('p95_ms', MINIMO_MS), ('pico_rss_mb', MINIMO_MB)):
+            antes, ahora = previo.get(metrica), actual.get(metrica)
+            if antes is None or ahora is None:
+                continue
+            if ahora > antes * (1 + tolerancia) and ahora - antes > minimo:
+                regresiones.append((actual['ruta'], actual['filas'], metrica, antes, ahora))
+    return regresiones
+
+
+def sin_referencia(resultados, baseline):
+    """(ruta, filas) medidas que no tienen un valor válido en el baseline."""
+    previos = {(r['ruta'], r['filas']) for r in baseline.get('resultados', []) if 'error' not in r}
+    return [(r['ruta'], r['filas']) for r in resultados if (r['ruta'], r['filas']) not in previos]
+
+
+def _imprimir(resultado):
+    if 'error' in resultado:
+        print(f"{resultado['filas']:>9} filas  {resultado['ruta']:<25} ERROR: {resultado['error']}")
+        return
+    rss = resultado['pico_rss_mb']
+    print(f"{resultado['filas']:>9} filas  {resultado['ruta']:<25} "
+          f"p50 {resultado['p50_ms']:>9.1f} ms  p95 {resultado['p95_ms']:>9.1f} ms  "
+          f"primera {resultado['primera_ms']:>9.1f} ms  pico RSS {rss if rss is not None else '-':>7} MB")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--filas', type=int, nargs='+', default=FILAS_POR_DEFECTO)
+    parser.add_argument('--rutas', nargs='+', choices=sorted(RUTAS), help='Subconjunto de rutas a medir')
+    parser.add_argument('--repeticiones', type=int, default=REPETICIONES_POR_DEFECTO)
+    parser.add_argument('--datos-dir', help='Carpeta donde generar (y reutilizar) los datos sintéticos')
+    parser.add_argument('--json', help='Ruta del JSON de resultados (por defecto benchmarks/resultados/<fecha>.json)')
+    parser.add_argument('--baseline', default=BASELINE_POR_DEFECTO, help='JSON de referencia para detectar regresiones')
+    parser.add_argument('--guardar-baseline', action='store_true', help='Guarda estos resultados como nuevo baseline')
+    parser.add_argument('--sin-comparar', action='store_true', help='Solo mide, sin comparar contra el baseline')
+    parser.add_argument('--tolerancia', type=float, default=TOLERANCIA_POR_DEFECTO)
+    # Uso interno: medición de una ruta en un proceso hijo
+    parser.add_argument('--medir-ruta', help=argparse.SUPPRESS)
+    parser.add_argument('--datos', help=argparse.SUPPRESS)
+    parser.add_argument('--salida', help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+
+    if args.medir_ruta:
+        medir_ruta(args.medir_ruta, args.datos, args.repeticiones, args.salida)
+        return 0
+
+    directorio_temporal = None
+    datos_dir = args.datos_dir
+    if not datos_dir:
+        directorio_temporal = tempfile.TemporaryDirectory()
+        datos_dir = directorio_temporal.name
+    # El generador importa app.py: que sus carpetas se creen fuera del repositorio
+    os.environ['SEGUROS_UIB_DATA_DIR'] = os.path.join(datos_dir, '_app')
+
+    from benchmarks import datos_sinteticos
+    import excel_io
+
+    rutas = args.rutas or list(RUTAS)
+    resultados = []
+    try:
+        for filas in args.filas:
+            datos = os.path.abspath(os.path.join(datos_dir, f'filas_{filas}'))
+            print(f"Generando datos sintéticos ({filas} filas) en {datos}")
+            datos_sinteticos.generar(datos, filas)
+            ruta_maestro = os.path.join(datos, 'reporte_maestro.xlsx')
+            if not os.path.exists(ruta_maestro):
+                excel_io.guardar_excel(datos_sinteticos.reporte_maestro(filas), ruta_maestro)
+
+            for nombre in rutas:
+                resultado = _medir_en_proceso(nombre, datos, args.repeticiones)
+                resultado['filas'] = filas
+                resultados.append(resultado)
+                _imprimir(resultado)
+    finally:
+        if directorio_temporal is not None:
+            directorio_temporal.cleanup()
+
+    informe = {
+        'fecha': time.strftime('%Y-%m-%d %H:%M:%S'),
+        'python': sys.version.split()[0],
+        'plataforma': sys.platform,
+        'repeticiones': args.repeticiones,
+        'resultados': resultados,
+    }
+    ruta_json = args.json or os.path.join(DIRECTORIO_RESULTADOS, f"rutas_{time.strftime('%Y%m%d_%H%M%S')}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(ruta_json)), exist_ok=True)
+    with open(ruta_json, 'w', encoding='utf-8') as f:
+        json.dump(informe, f, indent=4, ensure_ascii=False)
+    print(f"Resultados guardados en {ruta_json}")
+
+    errores = [resultado for resultado in resultados if 'error' in resultado]
+    if args.guardar_baseline:
+        if errores:
+            print(f"ERROR: {len(errores)} ruta(s) fallaron; no se guarda el baseline.", file=sys.stderr)
+            return 1
+        os.makedirs(os.path.dirname(os.path.abspath(args.baseline)), exist_ok=True)
+        shutil.copyfile(ruta_json, args.baseline)
+        print(f"Baseline actualizado: {args.baseline}")
+        return 0
+    if args.sin_comparar:
+        return 1 if errores else 0
+    if not os.path.exists(args.baseline):
+        print(f"\nERROR: no existe el baseline {args.baseline}. Para crearlo:\n"
+              f"  python -m benchmarks.bench_rutas --filas {' '.join(map(str, args.filas))} --guardar-baseline\n"
+              f"o use --sin-comparar para solo medir.", file=sys.stderr)
+        return 2
+
+    with open(args.baseline, 'r', encoding='utf-8') as f:
+        baseline = json.load(f)
+    faltantes = sin_referencia(resultados, baseline)
+    if len(faltantes) == len(resultados):
+        print(f"\nERROR: el baseline {args.baseline} no tiene ninguna de las rutas y tamaños medidos "
+              f"(filas: {' '.join(map(str, args.filas))}); nada que comparar.", file=sys.stderr)
+        return 2
+    if faltantes:
+        print(f"\nSin baseline (no se comparan): {', '.join(f'{ruta} ({filas} filas)' for ruta, filas in faltantes)}")
+
+    codigo_salida = 0
+    if errores:
+        rutas_con_error = ', '.join(f"{r['ruta']} ({r['filas']} filas)" for r in errores)
+        print(f"\nRutas con error: {rutas_con_error}")
+        codigo_salida = 1
+    regresiones = comparar(resultados, baseline, args.tolerancia)
+    if regresiones:
+        print(f"\nRegresiones respecto a {args.baseline} (tolerancia {args.tolerancia:.0%}):")
+        for ruta, filas, metrica, antes, ahora in regresiones:
+            print(f"  {ruta:<25} {filas:>9} filas  {metrica:<12} {antes:>10} -> {ahora:>10}")
+        codigo_salida = 1
+    elif not errores:
+        print(f"Sin regresiones respecto a {args.baseline}.")
+    return codigo_salida
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,362 @@
+"""
+Generador de datos sintéticos para los benchmarks.
+
+Llena remisiones.xlsx, cobros.xlsx, cartera_procesada.xlsx,
+vencimientos_procesados.xlsx y prospectos.xlsx con el orden de columnas
+definido en app.py (ORDEN_COLUMNAS_*) y valores tomados de las listas de
+config/*.json, en la estructura de carpetas que espera la aplicación.
+
+Uso:
+    python -m benchmarks.datos_sinteticos DIRECTORIO --filas 10000
+
+Para usar los archivos con la aplicación, arrancarla con
+SEGUROS_UIB_DATA_DIR=DIRECTORIO.
+"""
+import argparse
+import importlib
+import json
+import os
+import sys
+import time
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import config_manager  # noqa: E402
+import excel_io  # noqa: E402
+
+ARCHIVO_META = 'datos_sinteticos.json'
+
+# Fallback si una lista de config/ está vacía
+VALOR_POR_DEFECTO = 'SIN DATO'
+
+
+def modulo_app():
+    """
+    Módulo app importado de forma diferida: solo se necesita por sus
+    constantes de columnas, y así quien use el generador puede fijar antes
+    SEGUROS_UIB_DATA_DIR.
+    """
+    return importlib.import_module('app')
+
+
+def _opciones(nombre_lista):
+    valores = config_manager.get_list(nombre_lista)
+    if nombre_lista == 'vendedores':
+        valores = [v.get('nombre') if isinstance(v, dict) else v for v in valores]
+    return np.array([v for v in valores if v] or [VALOR_POR_DEFECTO], dtype=object)
+
+
+def _elegir(rng, nombre_lista, filas):
+    return rng.choice(_opciones(nombre_lista), filas)
+
+
+def _fechas(rng, filas, desde, hasta):
+    """Fechas aleatorias (DatetimeIndex) entre `desde` y `hasta` días respecto a hoy."""
+    hoy = pd.Timestamp(datetime.now().date())
+    return hoy + pd.to_timedelta(rng.integers(desde, hasta, filas), unit='D')
+
+
+def _secuencia(prefijo, filas, digitos=5):
+    return prefijo + pd.Series(np.arange(1, filas + 1)).astype(str).str.zfill(digitos)
+
+
+def _polizas(filas):
+    return pd.Series(np.arange(filas) + 10_000_000).astype(str)
+
+
+def _clientes(rng, filas):
+    """Nombre y NIT de cliente; cada cliente tiene en promedio 3 pólizas."""
+    ids = pd.Series(rng.integers(0, max(filas // 3, 1), filas))
+    return 'CLIENTE SINTETICO ' + ids.astype(str) + ' S.A.S.', (ids + 800_000_000).astype(str)
+
+
+def remisiones(filas, semilla=0):
+    """DataFrame con el esquema de remisiones.xlsx."""
+    modulo = modulo_app()
+    rng = np.random.default_rng(semilla)
+    tomador, nit = _clientes(rng, filas)
+    registro = _fechas(rng, filas, -730, 1) + pd.to_timedelta(rng.integers(0, 86_400, filas), unit='s')
+    inicio = _fechas(rng, filas, -365, 60)
+    prima = rng.integers(200_000, 80_000_000, filas).astype(float)
+    porcentaje = rng.choice([10.0, 12.5, 15.0, 17.5, 20.0], filas)
+    comision = prima * porcentaje / 100.0
+    vendedor = _elegir(rng, 'vendedores', filas)
+    porcentaje_vendedor = rng.choice([0.0, 10.0, 15.0, 20.0], filas)
+    co_corretaje = np.where(porcentaje_vendedor > 0, 'si', 'no')
+    comision_tpp = np.where(co_corretaje == 'si', comision * porcentaje_vendedor / 100.0, 0.0)
+    negocio_nuevo = rng.random(filas) < 0.4
+    forma_pago = _elegir(rng, 'forma_pago', filas)
+    periodicidad = _elegir(rng, 'periodicidad_pago', filas)
+    no_si = lambda mascara: np.where(mascara, 'si', 'no')  # noqa: E731
+
+    df = pd.DataFrame({
+        'consecutivo': _secuencia(f"UIB-{datetime.now():%y}-", filas),
+        'estado': np.where(rng.random(filas) < 0.7, 'Creado', 'Pendiente'),
+        'fecha_registro': registro.strftime('%d/%m/%Y %H:%M:%S'),
+        'renovacion': no_si(~negocio_nuevo),
+        'negocio_nuevo': no_si(negocio_nuevo),
+        'renovable': no_si(rng.random(filas) < 0.8),
+        'modificacion': 'no',
+        'anexo_checkbox': 'no',
+        'policy_number_modified': 'no',
+        'fecha_recepcion': registro.strftime('%Y-%m-%d'),
+        'tomador': tomador,
+        'nit': nit,
+        'aseguradora': _elegir(rng, 'aseguradoras', filas),
+        'ramo': _elegir(rng, 'ramos', filas),
+        'poliza': _polizas(filas),
+        'old_policy_number': '',
+        'anexo': '',
+        'categorias_grupo': '',
+        'categorias_grupo_otro': '',
+        'fecha_inicio': inicio.strftime('%Y-%m-%d'),
+        'fecha_fin': (inicio + pd.DateOffset(years=1)).strftime('%Y-%m-%d'),
+        'fecha_limite_pago': (inicio + pd.Timedelta(days=30)).strftime('%Y-%m-%d'),
+        'tipo_moneda': _elegir(rng, 'tipo_moneda', filas),
+        'prima_neta': prima,
+        'porcentaje_comision_valor': porcentaje,
+        'Comision$': comision,
+        'vendedor': vendedor,
+        'porcentaje_vendedor': porcentaje_vendedor,
+        'co_corretaje_opcion': co_corretaje,
+        'co_corretaje_nombre': np.where(co_corretaje == 'si', vendedor, ''),
+        'co_corretaje_porcentaje': 0.0,
+        'ComisionTPP': comision_tpp,
+        'ComisionUIB': comision - comision_tpp,
+        'uib': comision - comision_tpp,
+        'gastos_adicionales': '',
+        'forma_pago': forma_pago,
+        'numero_cuotas': np.where(forma_pago == 'Contado', 1, rng.choice([1, 4, 12], filas)),
+        'periodicidad_pago': periodicidad,
+        'observaciones': '',
+        'riesgos_adicionales': '',
+        'analista_responsable': _elegir(rng, 'analistas', filas),
+        'archivos': '',
+        'numero_remision_manual': np.where(rng.random(filas) < 0.5, _secuencia('R', filas, 7), ''),
+    })
+    return df[modulo.ORDEN_COLUMNAS_EXCEL_REMISIONES]
+
+
+def cobros(filas, semilla=0):
+    """
+    DataFrame con el esquema de cobros.xlsx: cuotas consecutivas de pólizas
+    financiadas, repartidas alrededor del mes en curso.
+    """
+    modulo = modulo_app()
+    rng = np.random.default_rng(semilla + 1)
+    total_cuotas = rng.choice([1, 4, 12], filas)
+    n_cuota = (rng.integers(0, 12, filas) % total_cuotas) + 1
+    periodicidad = np.select([total_cuotas == 12, total_cuotas == 4], ['Mensual', 'Trimestral'], 'Anual')
+    meses_por_cuota = np.select([total_cuotas == 12, total_cuotas == 4], [1, 3], 12)
+    inicio = _fechas(rng, filas, -400, 60)
+    vencimiento = inicio + pd.to_timedelta((n_cuota - 1) * meses_por_cuota * 30, unit='D')
+    polizas = rng.integers(0, max(filas // 4, 1), filas)
+    tomador, nit = _clientes(rng, filas)
+    cobrado = (vencimiento < pd.Timestamp(datetime.now().date())) & (rng.random(filas) < 0.8)
+    ids = pd.Series(rng.integers(0, 16 ** 10, filas, dtype=np.int64)).map('{:010X}'.format)
+
+    df = pd.DataFrame({
+        'ID_COBRO': ids,
+        'CONSECUTIVO_REMISION': _secuencia(f"UIB-{datetime.now():%y}-", filas),
+        'Tomador': tomador,
+        'NIT_CC': nit,
+        'Aseguradora': _elegir(rng, 'aseguradoras', filas),
+        'Ramo': _elegir(rng, 'ramos', filas),
+        'N_Poliza': pd.Series(polizas + 10_000_000).astype(str),
+        'N_Cuota': n_cuota,
+        'Total_Cuotas': total_cuotas,
+        'Fecha_Vencimiento_Cuota': vencimiento.strftime('%Y-%m-%d'),
+        'Fecha_Inicio_Vigencia': inicio.strftime('%Y-%m-%d'),
+        'Fecha_Fin_Vigencia': (inicio + pd.DateOffset(years=1)).strftime('%Y-%m-%d'),
+        'Estado': np.where(cobrado, 'Cobrado', 'Pendiente'),
+        'Tipo_Movimiento': np.where(rng.random(filas) < 0.85, 'Cobro', 'Pago'),
+        'Periodicidad': periodicidad,
+    })
+    return df[modulo.ORDEN_COLUMNAS_COBROS]
+
+
+def cartera(filas, semilla=0):
+    """DataFrame con el esquema de cartera_procesada.xlsx (ya procesada)."""
+    modulo = modulo_app()
+    rng = np.random.default_rng(semilla + 2)
+    prima = rng.integers(200_000, 50_000_000, filas).astype(float)
+    porcentaje = rng.choice([10.0, 12.5, 15.0, 20.0], filas)
+    comision = prima * porcentaje / 100.0
+    retencion = comision * 0.11
+    reteica = comision * 0.0014
+    neto = comision - retencion - reteica
+    vendedor = _elegir(rng, 'vendedores', filas)
+    nombres, _nit = _clientes(rng, filas)
+
+    df = pd.DataFrame({
+        'ID_CARTERA': np.arange(1, filas + 1),
+        'FECHA CREACIÓN': _fechas(rng, filas, -1000, 1).strftime('%d/%m/%Y'),
+        'N_FACTURA_Manual': np.where(rng.random(filas) < 0.3, _secuencia('FE', filas, 7), ''),
+        'NÚMERO PÓLIZA': _polizas(filas),
+        'ASEGURADORA': _elegir(rng, 'aseguradoras', filas),
+        'NOMBRES CLIENTE': nombres,
+        'PRIMA NETA': prima,
+        'COMISIÓN': comision,
+        'PORCENTAJE DE COMISIÓN': porcentaje,
+        'VENDEDOR': vendedor,
+        'Retencion_Calc': retencion,
+        'Reteica_Calc': reteica,
+        'Valor_Comision_UIB_Neto_Calc': neto,
+        'Intermediario_Original': vendedor,
+        'Porc_Com_Intermediario_Original': porcentaje,
+        'Valor_Comision_Intermediario_Calc': neto * porcentaje / 100.0,
+        'Clasificacion_Manual': '',
+        'Line_of_Business_Manual': '',
+    })
+    return df[modulo.ORDEN_COLUMNAS_EXCEL_CARTERA]
+
+
+def vencimientos(filas, semilla=0):
+    """DataFrame con el esquema de vencimientos_procesados.xlsx."""
+    modulo = modulo_app()
+    rng = np.random.default_rng(semilla + 3)
+    fecha_fin = _fechas(rng, filas, -200, 200)
+    nombres, _nit = _clientes(rng, filas)
+
+    df = pd.DataFrame({
+        'ID_VENCIMIENTO': np.arange(1, filas + 1),
+        'FECHA FIN': fecha_fin.strftime('%Y-%m-%d'),
+        'Fecha_inicio_seguimiento': (fecha_fin - pd.Timedelta(days=30)).strftime('%Y-%m-%d'),
+        'NÚMERO PÓLIZA': _polizas(filas),
+        'NOMBRES CLIENTE': nombres,
+        'ASEGURADORA': _elegir(rng, 'aseguradoras', filas),
+        'RAMO PRINCIPAL': _elegir(rng, 'ramos', filas),
+        'Responsable': _elegir(rng, 'responsable_vencimientos', filas),
+        'Estado': _elegir(rng, 'estado_vencimientos', filas),
+        'Observaciones_adicionales': '',
+        'Remision_Asociada': '',
+    })
+    return df[modulo.ORDEN_COLUMNAS_VENCIMIENTOS]
+
+
+def prospectos(filas, semilla=0):
+    """DataFrame con el esquema de prospectos.xlsx."""
+    modulo = modulo_app()
+    rng = np.random.default_rng(semilla + 4)
+    cotizacion = _fechas(rng, filas, -365, 1)
+    prima = rng.integers(500_000, 100_000_000, filas).astype(float)
+    porcentaje = rng.choice([10.0, 12.5, 15.0, 20.0], filas)
+    es_tpp = rng.random(filas) < 0.2
+    porcentaje_tpp = np.where(es_tpp, rng.choice([10.0, 15.0, 20.0], filas), 0.0)
+    comision = prima * porcentaje / 100.0
+    nombres, _nit = _clientes(rng, filas)
+
+    df = pd.DataFrame({
+        'ID_PROSPECTO': pd.Series(rng.integers(0, 16 ** 8, filas, dtype=np.int64)).map('{:08X}'.format),
+        'Nombre Cliente': nombres,
+        'Responsable Tecnico': _elegir(rng, 'responsable_tecnico', filas),
+        'Responsable Comercial': _elegir(rng, 'responsable_comercial', filas),
+        'Fecha de Cotizacion': cotizacion.strftime('%Y-%m-%d'),
+        'Fecha inicio poliza': (cotizacion + pd.Timedelta(days=30)).strftime('%Y-%m-%d'),
+        'es_TPP': np.where(es_tpp, 'si', 'no'),
+        'Nombre_TPP': np.where(es_tpp, _elegir(rng, 'vendedores', filas), ''),
+        'Porcentaje_comision_TPP': porcentaje_tpp,
+        'Ramo': _elegir(rng, 'ramos', filas),
+        'Aseguradora': _elegir(rng, 'aseguradoras', filas),
+        'Prima': prima,
+        'Comision %': porcentaje,
+        'Comision $': comision - comision * porcentaje_tpp / 100.0,
+        'Estado': _elegir(rng, 'estado_prospecto', filas),
+        'Observaciones': '',
+        'Fecha Creacion': cotizacion.strftime('%Y-%m-%d %H:%M:%S'),
+    })
+    return df[modulo.ORDEN_COLUMNAS_PROSPECTOS]
+
+
+def reporte_maestro(filas, semilla=0):
+    """
+    DataFrame con el formato del reporte maestro que se sube en
+    /procesar_reporte_maestro (columnas de cartera y de vencimientos).
+    """
+    modulo = modulo_app()
+    rng = np.random.default_rng(semilla + 5)
+    prima = rng.integers(200_000, 50_000_000, filas).astype(float)
+    porcentaje = rng.choice([10.0, 12.5, 15.0, 20.0], filas)
+    nombres, _nit = _clientes(rng, filas)
+
+    df = pd.DataFrame({
+        'NÚMERO PÓLIZA': _polizas(filas),
+        'ASEGURADORA': _elegir(rng, 'aseguradoras', filas),
+        'NOMBRES CLIENTE': nombres,
+        'PRIMA NETA': prima,
+        'COMISIÓN': prima * porcentaje / 100.0,
+        'PORCENTAJE DE COMISIÓN': pd.Series(porcentaje).map('{:g}%'.format),
+        'FECHA CREACIÓN': _fechas(rng, filas, -1000, 1).strftime('%d/%m/%Y'),
+        'VENDEDOR': _elegir(rng, 'vendedores', filas),
+        'FECHA FIN': _fechas(rng, filas, -200, 200).strftime('%d/%m/%Y'),
+        'RAMO PRINCIPAL': _elegir(rng, 'ramos', filas),
+        'ESTADO': np.where(rng.random(filas) < 0.9, 'Vigente', 'Cancelada'),
+    })
+    columnas = list(dict.fromkeys(modulo.COLUMNAS_A_EXTRAER_CARTERA + modulo.COLUMNAS_A_EXTRAER_VENCIMIENTOS + ['ESTADO']))
+    return df[columnas]
+
+
+def rutas_archivos(directorio):
+    """Ruta de cada archivo de datos dentro de un directorio de datos de la app."""
+    modulo = modulo_app()
+    return {
+        'remisiones': os.path.join(directorio, os.path.basename(modulo.EXCEL_FILE)),
+        'cobros': os.path.join(directorio, modulo.COBROS_FILENAME),
+        'cartera': os.path.join(directorio, modulo.CARTERA_DATA_DIR_NAME, modulo.CARTERA_PROCESADA_FILENAME),
+        'vencimientos': os.path.join(directorio, modulo.VENCIMIENTOS_DATA_DIR_NAME, modulo.VENCIMIENTOS_PROCESADOS_FILENAME),
+        'prospectos': os.path.join(directorio, modulo.PROSPECTOS_DATA_DIR_NAME, modulo.PROSPECTOS_FILENAME),
+    }
+
+
+GENERADORES = {
+    'remisiones': remisiones,
+    'cobros': cobros,
+    'cartera': cartera,
+    'vencimientos': vencimientos,
+    'prospectos': prospectos,
+}
+
+
+def generar(directorio, filas, semilla=0, reutilizar=True):
+    """
+    Escribe los cinco archivos de datos con `filas` registros cada uno en
+    `directorio`. Si ya hay un juego generado con los mismos parámetros se
+    reutiliza (a 1M de filas la generación tarda varios minutos).
+    Devuelve un dict con la ruta de cada archivo.
+    """
+    rutas = rutas_archivos(directorio)
+    ruta_meta = os.path.join(directorio, ARCHIVO_META)
+    meta = {'filas': filas, 'semilla': semilla}
+    if reutilizar and os.path.exists(ruta_meta) and all(os.path.exists(r) for r in rutas.values()):
+        with open(ruta_meta, 'r', encoding='utf-8') as f:
+            if json.load(f) == meta:
+                return rutas
+
+    modulo = modulo_app()
+    for nombre, generador in GENERADORES.items():
+        inicio = time.perf_counter()
+        os.makedirs(os.path.dirname(rutas[nombre]), exist_ok=True)
+        excel_io.guardar_excel(generador(filas, semilla), rutas[nombre], modulo.TIPOS_COLUMNAS_EXCEL)
+        print(f"  {nombre:<13} {filas:>9} filas  {time.perf_counter() - inicio:>7.1f} s")
+    with open(ruta_meta, 'w', encoding='utf-8') as f:
+        json.dump(meta, f)
+    return rutas
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('directorio')
+    parser.add_argument('--filas', type=int, default=10_000)
+    parser.add_argument('--semilla', type=int, default=0)
+    args = parser.parse_args(argv)
+
+    os.environ.setdefault('SEGUROS_UIB_DATA_DIR', os.path.abspath(args.directorio))
+    generar(args.directorio, args.filas, args.semilla, reutilizar=False)
+
+
+if __name__ == '__main__':
+    main()
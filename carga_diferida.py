@@ -0,0 +1,55 @@
+"""
+Importación diferida de módulos pesados (pandas, numpy, openpyxl...).
+
+    pd = modulo_diferido('pandas')
+
+devuelve enseguida un módulo vacío que se ejecuta de verdad la primera vez
+que se usa uno de sus atributos (pd.DataFrame, pd.read_excel...). Así
+importar app.py no paga los cientos de milisegundos de pandas, lo que
+acelera las herramientas y benchmarks que solo usan sus constantes.
+
+La carga diferida de importlib no es segura entre hilos en Python 3.11: si
+dos hilos usan el módulo por primera vez a la vez, uno puede quedarse con un
+módulo a medio ejecutar (sin pd.DataFrame) para siempre. Por eso
+create_app() llama a precargar() sin argumentos, que carga todos los módulos
+diferidos, antes de que arranque cualquier hilo (peticiones, programador de
+tareas, envío de correos).
+"""
+import importlib
+import importlib.util
+import sys
+
+# Nombres pedidos con carga diferida, para precargar()
+_diferidos = []
+
+
+def modulo_diferido(nombre):
+    """
+    Módulo `nombre` con carga diferida. Si ya está importado se devuelve tal
+    cual; si no está instalado se devuelve None (igual que un import opcional
+    dentro de try/except ImportError).
+    """
+    if nombre in sys.modules:
+        return sys.modules[nombre]
+    spec = importlib.util.find_spec(nombre)
+    if spec is None:
+        return None
+    if nombre not in _diferidos:
+        _diferidos.append(nombre)
+    loader = importlib.util.LazyLoader(spec.loader)
+    spec.loader = loader
+    modulo = importlib.util.module_from_spec(spec)
+    sys.modules[nombre] = modulo
+    loader.exec_module(modulo)
+    return modulo
+
+
+def precargar(*nombres):
+    """
+    Carga completamente los módulos indicados (diferidos o no); sin
+    argumentos, todos los que se pidieron con modulo_diferido().
+    """
+    for nombre in nombres or list(_diferidos):
+        modulo = importlib.import_module(nombre)
+        # Acceder a cualquier atributo ejecuta el módulo si estaba diferido
+        getattr(modulo, '__name__')
@@ -0,0 +1,290 @@
+import os
+from bisect import insort
+from datetime import datetime
+
+import excel_io
+import metricas
+from carga_diferida import modulo_diferido
+from indice_polizas import normalizar_poliza
+
+pd = modulo_diferido('pandas')
+
+# Buckets de periodo relativos al mes en curso
+BUCKET_ANTERIOR = 'anterior'   # vence antes del primer día del mes actual
+BUCKET_ACTUAL = 'actual'       # vence dentro del mes actual
+BUCKET_SIGUIENTE = 'siguiente' # vence después del mes actual
+
+# Clave comodín para agrupar todas las periodicidades de un bucket
+TODAS = '*'
+
+
+def _texto(valor, por_defecto=''):
+    if valor is None or (isinstance(valor, float) and pd.isna(valor)):
+        return por_defecto
+    return str(valor).strip()
+
+
+def normalizar_tipo_movimiento(valor):
+    """
+    Devuelve 'Cobro' o 'Pago' según el Tipo_Movimiento del registro
+    (vacío se interpreta como 'Cobro', igual que en los registros antiguos).
+    """
+    texto = _texto(valor, 'Cobro').lower() or 'cobro'
+    if 'cobro' in texto:
+        return 'Cobro'
+    if 'pago' in texto:
+        return 'Pago'
+    return None
+
+
+class CobrosIndex:
+    """
+    Índice en memoria de cobros.xlsx agrupado por
+    (Tipo_Movimiento, Estado, bucket de periodo, Periodicidad).
+
+    Cada bucket es una lista ordenada por Fecha_Vencimiento_Cuota, de modo que
+    los conteos de los KPIs son len() y la paginación es un simple slice.
+    El índice se reconstruye cuando cambia el archivo en disco (escrituras de
+    otros workers) y se reagrupa sin releer el archivo al cambiar de mes.
+    """
+
+    def __init__(self, ruta_archivo):
+        self.ruta_archivo = ruta_archivo
+        self._lock = metricas.LockMedido('indice_cobros')
+        self._firma = None
+        self._mes = None
+        self._secuencia = 0
+        self._registros = {}
+        self._buckets = {}
+        self._por_poliza = {}
+        self._primeras_cuotas = {}
+
+    # --- Estado del archivo ---
+    def firma_archivo(self):
+        """Devuelve (mtime_ns, tamaño) del archivo, o None si no existe."""
+        try:
+            st = os.stat(self.ruta_archivo)
+        except OSError:
+            return None
+        return (st.st_mtime_ns, st.st_size)
+
+    def invalidar(self):
+        with self._lock:
+            self._firma = None
+
+    def sincronizar(self, hoy=None):
+        """
+        Garantiza que el índice refleje el archivo actual y el mes en curso.
+        Solo relee cobros.xlsx si su firma cambió.
+        """
+        hoy = hoy or datetime.now()
+        mes = (hoy.year, hoy.month)
+        with self._lock:
+            firma = self.firma_archivo()
+            metricas.registrar_cache('indice_cobros', firma is not None and firma == self._firma)
+            if firma is None:
+                self._limpiar()
+                self._mes = mes
+                return
+            if firma != self._firma:
+                self._cargar(firma, mes)
+            elif mes != self._mes:
+                # Cambio de mes: solo se reasignan los buckets de periodo
+                self._mes = mes
+                self._reagrupar()
+
+    def _limpiar(self):
+        self._firma = None
+        self._registros = {}
+        self._buckets = {}
+        self._por_poliza = {}
+        self._primeras_cuotas = {}
+
+    def _cargar(self, firma, mes):
+        df = excel_io.leer_excel(self.ruta_archivo)
+        self._limpiar()
+        self._mes = mes
+        self._secuencia = 0
+        for registro in df.to_dict(orient='records'):
+            self._registrar(registro)
+        self._firma = firma
+
+    def _registrar(self, registro):
+        registro = dict(registro)
+        registro['ID_COBRO'] = _texto(registro.get('ID_COBRO'))
+        if not registro['ID_COBRO']:
+            return
+        # Las cuotas sin fecha válida quedan en el índice por ID pero fuera de los buckets
+        fecha = pd.to_datetime(registro.get('Fecha_Vencimiento_Cuota'), errors='coerce')
+        registro['Fecha_Vencimiento_Cuota'] = fecha
+        registro['Periodicidad'] = _texto(registro.get('Periodicidad'), 'Mensual') or 'Mensual'
+        registro['Tipo_Movimiento'] = _texto(registro.get('Tipo_Movimiento'), 'Cobro') or 'Cobro'
+        registro['Estado'] = _texto(registro.get('Estado'))
+        anterior = self._registros.get(registro['ID_COBRO'])
+        if anterior is not None:
+            self._retirar(*anterior)
+            self._por_poliza.get(normalizar_poliza(anterior[1].get('N_Poliza')), set()).discard(registro['ID_COBRO'])
+        self._secuencia += 1
+        orden = (fecha, self._secuencia)
+        self._registros[registro['ID_COBRO']] = (orden, registro)
+        self._por_poliza.setdefault(normalizar_poliza(registro.get('N_Poliza')), set()).add(registro['ID_COBRO'])
+        self._insertar(orden, registro)
+
+    def _bucket_periodo(self, fecha):
+        ano, mes = self._mes
+        if (fecha.year, fecha.month) < (ano, mes):
+            return BUCKET_ANTERIOR
+        if (fecha.year, fecha.month) == (ano, mes):
+            return BUCKET_ACTUAL
+        return BUCKET_SIGUIENTE
+
+    def _claves(self, registro):
+        tipo = normalizar_tipo_movimiento(registro['Tipo_Movimiento'])
+        if tipo is None or pd.isna(registro['Fecha_Vencimiento_Cuota']):
+            return []
+        bucket = self._bucket_periodo(registro['Fecha_Vencimiento_Cuota'])
+        estado = registro['Estado']
+        return [
+            (tipo, estado, bucket, registro['Periodicidad']),
+            (tipo, estado, bucket, TODAS),
+        ]
+
+    def _insertar(self, orden, registro):
+        claves = self._claves(registro)
+        for clave in claves:
+            insort(self._buckets.setdefault(clave, []), (orden, registro['ID_COBRO']))
+        self._descartar_vistas(claves)
+
+    def _retirar(self, orden, registro):
+        claves = self._claves(registro)
+        for clave in claves:
+            bucket = self._buckets.get(clave)
+            if bucket:
+                bucket.remove((orden, registro['ID_COBRO']))
+        self._descartar_vistas(claves)
+
+    def _descartar_vistas(self, claves):
+        for tipo, _estado, _bucket, periodicidad in claves:
+            self._primeras_cuotas.pop((tipo, periodicidad), None)
+
+    def _reagrupar(self):
+        self._buckets = {}
+        self._primeras_cuotas = {}
+        for orden, registro in self._registros.values():
+            for clave in self._claves(registro):
+                self._buckets.setdefault(clave, []).append((orden, registro['ID_COBRO']))
+        for bucket in self._buckets.values():
+            bucket.sort()
+
+    # --- Mantenimiento incremental tras escrituras propias ---
+    def _aplicar(self, firma_previa, cambio):
+        """
+        Aplica un cambio incremental solo si el índice estaba al día con el
+        archivo antes de la escritura; si otro proceso escribió en medio, se
+        invalida y el siguiente sincronizar() reconstruye desde disco.
+        """
+        with self._lock:
+            if self._firma is None or firma_previa != self._firma:
+                self._firma = None
+                return
+            cambio()
+            self._firma = self.firma_archivo()
+
+    def agregar(self, nuevos_registros, firma_previa):
+        """Incorpora cuotas recién guardadas en cobros.xlsx."""
+        def cambio():
+            for registro in nuevos_registros:
+                self._registrar(registro)
+        self._aplicar(firma_previa, cambio)
+
+    def actualizar_estado(self, ids_cobro, nuevo_estado, firma_previa):
+        """Mueve las cuotas indicadas al bucket del nuevo estado."""
+        def cambio():
+            for id_cobro in ids_cobro:
+                entrada = self._registros.get(str(id_cobro))
+                if entrada is None:
+                    continue
+                orden, registro = entrada
+                self._retirar(orden, registro)
+                registro['Estado'] = nuevo_estado
+                self._insertar(orden, registro)
+        self._aplicar(firma_previa, cambio)
+
+    # --- Consultas ---
+    def obtener(self, id_cobro):
+        """Registro indexado de una cuota, o None si el ID no existe."""
+        with self._lock:
+            entrada = self._registros.get(_texto(id_cobro))
+            return entrada[1] if entrada else None
+
+    def ids_por_poliza(self, n_poliza, tipo=None):
+        """
+        IDs de las cuotas de una póliza, en el orden del archivo. Con `tipo`
+        ('Cobro' o 'Pago') solo las de ese Tipo_Movimiento.
+        """
+        with self._lock:
+            ids = self._por_poliza.get(normalizar_poliza(n_poliza), ())
+            if tipo is not None:
+                ids = [id_cobro for id_cobro in ids
+                       if normalizar_tipo_movimiento(self._registros[id_cobro][1].get('Tipo_Movimiento')) == tipo]
+            return sorted(ids, key=lambda id_cobro: self._registros[id_cobro][0][1])
+
+    def contar(self, tipo, estado, bucket, periodicidad=TODAS):
+        with self._lock:
+            return len(self._buckets.get((tipo, estado, bucket, periodicidad), ()))
+
+    def registros(self, tipo, estado, bucket, periodicidad=TODAS, inicio=0, fin=None):
+        """Registros de un bucket (ordenados por vencimiento), opcionalmente paginados."""
+        with self._lock:
+            entradas = self._buckets.get((tipo, estado, bucket, periodicidad), [])
+            return [self._registros[id_cobro][1] for _orden, id_cobro in entradas[inicio:fin]]
+
+    def _ids_primeras_cuotas(self, tipo, periodicidad):
+        """
+        IDs de la primera cuota pendiente (desde el mes actual) de cada póliza
+        (Tomador, N_Poliza) con la periodicidad indicada. Se cachea hasta que
+        cambie alguno de los buckets de los que depende.
+        """
+        clave = (tipo, periodicidad)
+        metricas.registrar_cache('primeras_cuotas', clave in self._primeras_cuotas)
+        if clave not in self._primeras_cuotas:
+            vistas = set()
+            unicas = []
+            for bucket in (BUCKET_ACTUAL, BUCKET_SIGUIENTE):
+                for _orden, id_cobro in self._buckets.get((tipo, 'Pendiente', bucket, periodicidad), []):
+                    registro = self._registros[id_cobro][1]
+                    poliza = (_texto(registro.get('Tomador')), _texto(registro.get('N_Poliza')))
+                    if poliza not in vistas:
+                        vistas.add(poliza)
+                        unicas.append(id_cobro)
+            self._primeras_cuotas[clave] = unicas
+        return self._primeras_cuotas[clave]
+
+    def kpis(self, tipo):
+        """KPIs del panel de cobros para una sección ('Cobro' o 'Pago')."""
+        with self._lock:
+            return {
+                'Cobrado Mes Actual': self.contar(tipo, 'Cobrado', BUCKET_ACTUAL),
+                'Mensual': self.contar(tipo, 'Pendiente', BUCKET_ACTUAL),
+                'Trimestral': len(self._ids_primeras_cuotas(tipo, 'Trimestral')),
+                'Anual': len(self._ids_primeras_cuotas(tipo, 'Anual')),
+                'Pendientes Mes Anterior': self.contar(tipo, 'Pendiente', BUCKET_ANTERIOR),
+            }
+
+    def seleccion(self, tipo, periodicidad_seleccionada, inicio=0, fin=None):
+        """
+        Devuelve (total, registros) de la tabla para la tarjeta KPI
+        seleccionada, leyendo solo la página pedida del bucket.
+        """
+        buckets_directos = {
+            'Cobrado Mes Actual': ('Cobrado', BUCKET_ACTUAL),
+            'Mensual': ('Pendiente', BUCKET_ACTUAL),
+            'Pendientes Mes Anterior': ('Pendiente', BUCKET_ANTERIOR),
+        }
+        with self._lock:
+            if periodicidad_seleccionada in buckets_directos:
+                estado, bucket = buckets_directos[periodicidad_seleccionada]
+                total = self.contar(tipo, estado, bucket)
+                return total, self.registros(tipo, estado, bucket, inicio=inicio, fin=fin)
+            ids = self._ids_primeras_cuotas(tipo, periodicidad_seleccionada)
+            return len(ids), [self._registros[id_cobro][1] for id_cobro in ids[inicio:fin]]
@@ -0,0 +1,262 @@
+"""
+Cálculo de comisiones de remisiones, prospectos y cartera sobre columnas
+completas (una operación por columna, no una por fila), compartido por el
+registro de remisiones, los formularios de prospectos y la carga maestra de
+cartera.
+
+Las fórmulas aceptan tanto valores sueltos (un formulario) como Series (un
+archivo completo):
+- remisión: Comision$ = prima neta x % comisión; si hay co-corretaje con un
+  vendedor distinto de UIB, ComisionTPP = Comision$ x % del vendedor; la
+  ComisionUIB (y uib) es el resto;
+- prospecto: Comision $ = prima x % comisión, menos la parte del TPP si
+  es_TPP = 'si';
+- cartera: retención (11%) y reteica (0,14%) sobre la COMISIÓN; la comisión
+  UIB neta es el resto y la del intermediario, su porcentaje de esa neta.
+
+MotorComisiones recalcula los archivos cuando cambia la comisión de un
+vendedor en config/vendedores.json (el % del vendedor de las remisiones y el
+% TPP de los prospectos). Solo se reemplaza el % de las filas que tenían la
+tasa anterior del vendedor (o ninguno): un % distinto se escribió a mano en
+esa remisión o prospecto, se conserva y se informa aparte. vista_previa()
+devuelve las filas que cambiarían sin escribir nada; aplicar() guarda cada
+archivo una sola vez. El
+porcentaje del intermediario de la cartera viene del archivo maestro, no de
+la lista de vendedores: la cartera solo se recalcula cuando se piden todas
+las comisiones (sin vendedores).
+"""
+import config_manager
+import esquemas
+import excel_io
+import metricas
+from carga_diferida import modulo_diferido
+
+pd = modulo_diferido('pandas')
+np = modulo_diferido('numpy')
+
+UIB = 'UIB CORREDORES DE SEGUROS S.A.'
+RETENCION = 0.11
+RETEICA = 0.0014
+# Diferencia a partir de la cual un valor guardado se considera distinto del recalculado
+TOLERANCIA = 0.005
+LIMITE_DIFERENCIAS = 200
+
+
+# --- Fórmulas ---
+def comisiones_remision(prima_neta, porcentaje_comision, porcentaje_vendedor, vendedor, co_corretaje):
+    """Comision$, ComisionTPP, ComisionUIB y uib de una remisión (o de columnas de remisiones)."""
+    comision = prima_neta * porcentaje_comision / 100.0
+    con_tpp = (vendedor != UIB) & (porcentaje_vendedor > 0) & (co_corretaje == 'si')
+    comision_tpp = np.where(con_tpp, comision * porcentaje_vendedor / 100.0, 0.0)
+    comision_uib = comision - comision_tpp
+    return {'Comision$': comision, 'ComisionTPP': comision_tpp, 'ComisionUIB': comision_uib, 'uib': comision_uib}
+
+
+def comision_prospecto(prima, porcentaje_comision, es_tpp, porcentaje_tpp):
+    """Comision $ de un prospecto (o de columnas de prospectos): sin la parte del TPP si es_tpp."""
+    comision = prima * porcentaje_comision / 100.0
+    return np.where(es_tpp, comision - comision * porcentaje_tpp / 100.0, comision)
+
+
+def comisiones_cartera(comision, porcentaje_intermediario):
+    """Retención, reteica, comisión UIB neta y comisión del intermediario de la cartera."""
+    retencion = comision * RETENCION
+    reteica = comision * RETEICA
+    neta = comision - retencion - reteica
+    return {'Retencion_Calc': retencion, 'Reteica_Calc': reteica, 'Valor_Comision_UIB_Neto_Calc': neta,
+            'Valor_Comision_Intermediario_Calc': neta * porcentaje_intermediario / 100.0}
+
+
+def tasas_vendedores():
+    """Comisión (%) de cada vendedor de config/vendedores.json: {nombre: porcentaje}."""
+    tasas = {}
+    for vendedor in config_manager.get_list('vendedores'):
+        if not isinstance(vendedor, dict) or not str(vendedor.get('nombre', '')).strip():
+            continue
+        try:
+            tasas[vendedor['nombre'].strip()] = float(str(vendedor.get('comision') or 0).replace(',', '.'))
+        except ValueError:
+            print(f"ADVERTENCIA: comisión inválida para el vendedor '{vendedor['nombre']}': {vendedor.get('comision')!r}")
+    return tasas
+
+
+def _texto(serie):
+    return serie.astype(object).where(serie.notna(), '').astype(str).str.strip()
+
+
+def _vacios(serie):
+    return (_texto(serie) == '').to_numpy()
+
+
+class MotorComisiones:
+    """Recalcula y guarda las comisiones de los archivos de remisiones, prospectos y cartera."""
+
+    # Entidad -> (columna clave, columnas recalculadas)
+    COLUMNAS = {
+        'remisiones': ('consecutivo', ['porcentaje_vendedor', 'Comision$', 'ComisionTPP', 'ComisionUIB', 'uib']),
+        'prospectos': ('ID_PROSPECTO', ['Porcentaje_comision_TPP', 'Comision $']),
+        'cartera': ('ID_CARTERA', ['Retencion_Calc', 'Reteica_Calc', 'Valor_Comision_UIB_Neto_Calc',
+                                   'Valor_Comision_Intermediario_Calc']),
+    }
+    # Columna con el vendedor cuya comisión se aplica
+    VENDEDOR = {'remisiones': 'vendedor', 'prospectos': 'Nombre_TPP'}
+    # Columna con el % del vendedor que se toma de la lista (si no se cambió a mano)
+    PORCENTAJE = {'remisiones': 'porcentaje_vendedor', 'prospectos': 'Porcentaje_comision_TPP'}
+    # Columnas que lee cada cálculo además de la clave
+    ENTRADAS = {
+        'remisiones': ['prima_neta', 'porcentaje_comision_valor', 'porcentaje_vendedor', 'vendedor', 'co_corretaje_opcion'],
+        'prospectos': ['Prima', 'Comision %', 'es_TPP', 'Nombre_TPP', 'Porcentaje_comision_TPP'],
+        'cartera': ['COMISIÓN', 'Porc_Com_Intermediario_Original'],
+    }
+
+    def __init__(self):
+        self._instantaneas = {}
+        self.tipos_columnas = None
+        self.limpiar_moneda = None
+        self._lock = metricas.LockMedido('comisiones')
+
+    def configurar(self, tipos_columnas, limpiar_moneda, **instantaneas):
+        """Instantáneas de cada entidad (remisiones=, prospectos=, cartera=) y formato de los .xlsx."""
+        self.tipos_columnas = tipos_columnas
+        self.limpiar_moneda = limpiar_moneda
+        self._instantaneas.update(instantaneas)
+
+    def _numeros(self, serie):
+        """Columna como float (0 si está vacía); cada valor de texto distinto se limpia una vez."""
+        if pd.api.types.is_numeric_dtype(serie):
+            return serie.astype(float).fillna(0.0)
+        codigos, unicos = pd.factorize(serie.astype(object))
+        limpios = np.array([self.limpiar_moneda(valor) for valor in unicos] + [0.0], dtype=float)
+        return pd.Series(np.nan_to_num(limpios[codigos]), index=serie.index)
+
+    # --- Cálculo por entidad ---
+    def _porcentajes(self, entidad, df, tasas, referencias):
+        """
+        (% a usar, máscara de % manuales) de remisiones o prospectos. El % de
+        la fila se reemplaza por la tasa del vendedor si está vacío o es igual
+        a su tasa de referencia (la anterior al cambio); si no, es un %
+        escrito a mano y se conserva.
+        """
+        columna = self.PORCENTAJE[entidad]
+        vendedor = _texto(df[self.VENDEDOR[entidad]])
+        guardado = self._numeros(df[columna])
+        tasa = vendedor.map(tasas).astype(float)
+        referencia = vendedor.map(referencias).astype(float)
+        aplica = tasa.notna().to_numpy()
+        if entidad == 'prospectos':
+            aplica = aplica & (_texto(df['es_TPP']).str.lower() == 'si').to_numpy()
+        manual = aplica & ~_vacios(df[columna]) & ~np.isclose(guardado.to_numpy(), referencia.to_numpy(),
+                                                                 atol=TOLERANCIA)
+        return guardado.where(~aplica | manual, tasa), manual
+
+    def _recalcular(self, entidad, df, tasas, referencias):
+        """
+        (valores nuevos de las columnas recalculadas de todas las filas, con el
+        índice de df; máscara de filas con % manual).
+        """
+        if entidad == 'remisiones':
+            porcentaje, manual = self._porcentajes(entidad, df, tasas, referencias)
+            nuevos = comisiones_remision(self._numeros(df['prima_neta']), self._numeros(df['porcentaje_comision_valor']),
+                                         porcentaje, _texto(df['vendedor']), _texto(df['co_corretaje_opcion']).str.lower())
+            return pd.DataFrame({'porcentaje_vendedor': porcentaje, **nuevos}, index=df.index), manual
+        if entidad == 'prospectos':
+            es_tpp = (_texto(df['es_TPP']).str.lower() == 'si').to_numpy()
+            porcentaje, manual = self._porcentajes(entidad, df, tasas, referencias)
+            comision = comision_prospecto(self._numeros(df['Prima']), self._numeros(df['Comision %']),
+                                          es_tpp, porcentaje)
+            return pd.DataFrame({'Porcentaje_comision_TPP': porcentaje, 'Comision $': comision}, index=df.index), manual
+        nuevos = comisiones_cartera(self._numeros(df['COMISIÓN']), self._numeros(df['Porc_Com_Intermediario_Original']))
+        return pd.DataFrame(nuevos, index=df.index), np.zeros(len(df), dtype=bool)
+
+    def _comparar(self, entidad, df, tasas, referencias, alcance):
+        """
+        (nuevos, máscara de filas que cambian, diferencias, manuales) de una
+        entidad, sin escribir. Solo se comparan las filas de la máscara
+        `alcance`; `manuales` son las filas cuyo % escrito a mano difiere de
+        la tasa actual del vendedor y se conserva.
+        """
+        clave, columnas = self.COLUMNAS[entidad]
+        nuevos, manual = self._recalcular(entidad, df, tasas, referencias)
+        cambia = np.column_stack([
+            ~np.isclose(self._numeros(df[columna]).to_numpy() if columna in df.columns else np.zeros(len(df)),
+                        nuevos[columna].to_numpy(dtype=float), atol=TOLERANCIA)
+            for columna in columnas])
+        cambia &= alcance[:, None]
+        filas = cambia.any(axis=1)
+        diferencias = []
+        for posicion in np.flatnonzero(filas)[:LIMITE_DIFERENCIAS]:
+            diferencias.append({
+                'clave': df[clave].iat[posicion],
+                'cambios': [{'columna': columna,
+                             'antes': df[columna].iat[posicion] if columna in df.columns else None,
+                             'despues': round(float(nuevos[columna].iat[posicion]), 2)}
+                            for columna, cambio in zip(columnas, cambia[posicion]) if cambio],
+            })
+        manuales = []
+        if entidad in self.PORCENTAJE:
+            columna = self.PORCENTAJE[entidad]
+            tasa = _texto(df[self.VENDEDOR[entidad]]).map(tasas).astype(float).to_numpy()
+            manual &= alcance & ~np.isclose(self._numeros(df[columna]).to_numpy(), tasa, atol=TOLERANCIA)
+            for posicion in np.flatnonzero(manual)[:LIMITE_DIFERENCIAS]:
+                manuales.append({'clave': df[clave].iat[posicion], 'vendedor': df[self.VENDEDOR[entidad]].iat[posicion],
+                                 'porcentaje': df[columna].iat[posicion], 'tasa': float(tasa[posicion])})
+        return nuevos, filas, diferencias, (int(manual.sum()), manuales)
+
+    def _entidades(self, vendedores):
+        # La cartera no depende de la lista de vendedores
+        return [entidad for entidad in self.COLUMNAS if entidad in self._instantaneas
+                and (vendedores is None or entidad != 'cartera')]
+
+    def _procesar(self, vendedores, anteriores, escribir):
+        tasas = tasas_vendedores()
+        if vendedores is not None:
+            tasas = {nombre: tasa for nombre, tasa in tasas.items() if nombre in set(vendedores)}
+        # % que se reemplaza por la tasa nueva: la tasa anterior del vendedor o, sin ella, la actual
+        referencias = {nombre: (anteriores or {}).get(nombre, tasa) for nombre, tasa in tasas.items()}
+        resultado = {}
+        for entidad in self._entidades(vendedores):
+            instantanea = self._instantaneas[entidad]
+            clave, columnas = self.COLUMNAS[entidad]
+            df = instantanea.vista()
+            faltantes = [columna for columna in [clave] + self.ENTRADAS[entidad] if columna not in df.columns]
+            if df.empty or faltantes:
+                resultado[entidad] = {'filas': 0, 'total': len(df), 'diferencias': [], 'faltantes': faltantes,
+                                      'manuales': 0, 'filas_manuales': []}
+                continue
+            if vendedores is None:
+                alcance = np.ones(len(df), dtype=bool)
+            else:
+                alcance = _texto(df[self.VENDEDOR[entidad]]).isin(list(tasas)).to_numpy()
+            nuevos, filas, diferencias, (manuales, filas_manuales) = self._comparar(entidad, df, tasas, referencias,
+                                                                                   alcance)
+            if escribir and filas.any():
+                df = esquemas.sin_categorias(df)
+                for columna in columnas:
+                    if columna not in df.columns:
+                        df[columna] = np.nan
+                    valores = df[columna].to_numpy(dtype=object).copy()
+                    valores[filas] = nuevos[columna].to_numpy(dtype=float)[filas]
+                    df[columna] = pd.Series(valores, index=df.index).infer_objects()
+                excel_io.guardar_excel(df, instantanea.ruta_archivo, self.tipos_columnas)
+            resultado[entidad] = {'filas': int(filas.sum()), 'total': len(df), 'diferencias': diferencias,
+                                  'faltantes': [], 'manuales': manuales, 'filas_manuales': filas_manuales}
+        return resultado
+
+    def vista_previa(self, vendedores=None, anteriores=None):
+        """
+        Filas cuyas comisiones cambiarían con las tasas actuales de los
+        `vendedores` (todos los de la lista y la cartera si es None), sin
+        escribir. `anteriores` {vendedor: tasa antes del cambio} indica qué %
+        guardados venían de la lista; sin ella se compara con la tasa actual.
+        Devuelve {entidad: {'filas', 'total', 'diferencias', 'faltantes',
+        'manuales', 'filas_manuales'}}.
+        """
+        return self._procesar(vendedores, anteriores, escribir=False)
+
+    def aplicar(self, vendedores=None, anteriores=None):
+        """Recalcula como vista_previa() y guarda cada archivo con cambios una sola vez."""
+        with self._lock:
+            return self._procesar(vendedores, anteriores, escribir=True)
+
+
+motor_comisiones = MotorComisiones()
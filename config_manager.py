@@ -1,50 +1,120 @@
-import os
+import copy
+import hashlib
 import json
+import os
+import threading
+import uuid
 
 # Define la ruta base del directorio de configuración
 CONFIG_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'config')
+os.makedirs(CONFIG_DIR, exist_ok=True)
 
-def get_list(list_name):
+# Copia en memoria de las listas: nombre -> (firma del archivo, datos).
+# Cada lectura solo hace un os.stat del archivo; se vuelve a parsear el JSON
+# cuando cambia su firma (mtime, tamaño), lo que también recoge los cambios
+# guardados por otros workers de gunicorn sin reiniciar.
+_cache = {}
+_lock = threading.Lock()
+_version = 0
+_suscriptores = []
+_observadores = []
+
+
+def _ruta(list_name):
+    return os.path.join(CONFIG_DIR, f"{list_name}.json")
+
+
+def _firma(filepath):
+    """Devuelve (mtime_ns, tamaño) del archivo, o None si no existe."""
+    try:
+        st = os.stat(filepath)
+    except OSError:
+        return None
+    return (st.st_mtime_ns, st.st_size)
+
+
+def _notificar(list_name):
+    for callback in list(_suscriptores):
+        try:
+            callback(list_name, _version)
+        except Exception as e:
+            print(f"Error al notificar el cambio de la lista '{list_name}': {e}")
+
+
+def _cargar(list_name, firma):
     """
-    Carga y devuelve una lista desde un archivo JSON en el directorio de configuración.
+    Devuelve los datos de la lista para la firma dada, releyendo el archivo
+    solo si cambió desde la última lectura.
     """
-    # Asegurarse de que el directorio de configuración exista
-    if not os.path.exists(CONFIG_DIR):
-        os.makedirs(CONFIG_DIR)
+    global _version
+    with _lock:
+        previo = _cache.get(list_name)
+        acierto = previo is not None and previo[0] == firma
+        for callback in _observadores:
+            callback(acierto)
+        if acierto:
+            return previo[1], False
+        try:
+            with open(_ruta(list_name), 'r', encoding='utf-8') as f:
+                datos = json.load(f)
+        except (json.JSONDecodeError, FileNotFoundError):
+            # Si hay un error de decodificación o el archivo no se encuentra,
+            # devolver una lista vacía para evitar que la aplicación falle.
+            datos = []
+        _cache[list_name] = (firma, datos)
+        cambio = previo is not None
+        if cambio:
+            _version += 1
+    if cambio:
+        _notificar(list_name)
+    return datos, cambio
+
 
-    filepath = os.path.join(CONFIG_DIR, f"{list_name}.json")
+def get_list(list_name):
+    """
+    Devuelve una lista del directorio de configuración desde la copia en
+    memoria (una copia, para que quien la use pueda modificarla).
+    """
+    firma = _firma(_ruta(list_name))
 
     # Si el archivo no existe, crearlo con una lista vacía
-    if not os.path.exists(filepath):
+    if firma is None:
         save_list(list_name, [])
         return []
 
-    try:
-        with open(filepath, 'r', encoding='utf-8') as f:
-            return json.load(f)
-    except (json.JSONDecodeError, FileNotFoundError):
-        # Si hay un error de decodificación o el archivo no se encuentra,
-        # devolver una lista vacía para evitar que la aplicación falle.
-        return []
+    datos, _cambio = _cargar(list_name, firma)
+    return copy.deepcopy(datos)
+
 
 def save_list(list_name, data):
     """
     Guarda una lista en un archivo JSON en el directorio de configuración.
+    Se escribe en un temporal que luego reemplaza al archivo, para que los
+    demás workers nunca lean un JSON a medio escribir.
     """
-    # Asegurarse de que el directorio de configuración exista
-    if not os.path.exists(CONFIG_DIR):
-        os.makedirs(CONFIG_DIR)
-
-    filepath = os.path.join(CONFIG_DIR, f"{list_name}.json")
+    global _version
+    os.makedirs(CONFIG_DIR, exist_ok=True)
+    filepath = _ruta(list_name)
+    ruta_temporal = os.path.join(CONFIG_DIR, f".{list_name}.{uuid.uuid4().hex[:8]}.tmp")
     try:
-        with open(filepath, 'w', encoding='utf-8') as f:
+        with open(ruta_temporal, 'w', encoding='utf-8') as f:
             # Usar indent=4 para que el JSON sea legible
             # ensure_ascii=False para guardar correctamente caracteres como tildes
             json.dump(data, f, indent=4, ensure_ascii=False)
-        return True
+        os.replace(ruta_temporal, filepath)
     except Exception as e:
         print(f"Error al guardar la lista '{list_name}': {e}")
         return False
+    finally:
+        if os.path.exists(ruta_temporal):
+            os.remove(ruta_temporal)
+
+    with _lock:
+        _cache[list_name] = (_firma(filepath), copy.deepcopy(data))
+        _version += 1
+    _notificar(list_name)
+    return True
+
 
 def get_all_list_names():
     """
@@ -56,4 +126,71 @@ def get_all_list_names():
 
     # Listar todos los archivos, filtrar por .json y quitar la extensión
     files = [f.replace('.json', '') for f in os.listdir(CONFIG_DIR) if f.endswith('.json')]
-    return sorted(files)
\ No newline at end of file
+    return sorted(files)
+
+
+def version():
+    """
+    Número de versión de las listas en este proceso: aumenta cada vez que se
+    guarda una lista o se detecta que otro proceso cambió alguna.
+    """
+    return _version
+
+
+def _firmas():
+    """Firma actual de cada lista existente: [(nombre, firma)]."""
+    firmas = []
+    for list_name in get_all_list_names():
+        firma = _firma(_ruta(list_name))
+        if firma is not None:
+            firmas.append((list_name, firma))
+    return firmas
+
+
+def _calcular_huella(firmas):
+    texto = '|'.join(f"{list_name}:{firma[0]}:{firma[1]}" for list_name, firma in firmas)
+    return hashlib.sha1(texto.encode('utf-8')).hexdigest()[:16]
+
+
+def huella():
+    """
+    Huella de todas las listas sin leerlas (solo un os.stat por archivo):
+    cambia cuando se modifica cualquiera de ellas.
+    """
+    return _calcular_huella(_firmas())
+
+
+def snapshot():
+    """
+    Devuelve (huella, listas) con todas las listas de configuración,
+    sincronizadas con los archivos. La huella depende solo de la firma de
+    los archivos, así que es la misma en todos los workers para el mismo
+    contenido (sirve como ETag).
+    """
+    firmas = _firmas()
+    listas = {}
+    for list_name, firma in firmas:
+        listas[list_name], _cambio = _cargar(list_name, firma)
+    return _calcular_huella(firmas), copy.deepcopy(listas)
+
+
+def suscribir(callback):
+    """
+    Registra una función callback(list_name, version) que se llama cuando
+    cambia una lista: al guardarla en este proceso o al detectar en la
+    siguiente lectura que otro proceso la modificó.
+    """
+    if callback not in _suscriptores:
+        _suscriptores.append(callback)
+    return callback
+
+
+def observar_consultas(callback):
+    """
+    Registra una función callback(acierto) que se llama en cada lectura de
+    una lista: acierto=True si se sirvió de la copia en memoria sin releer
+    el archivo (p. ej. para contarlas en las métricas de la aplicación).
+    """
+    if callback not in _observadores:
+        _observadores.append(callback)
+    return callback
@@ -0,0 +1,487 @@
+"""
+Combinación de correspondencia por correo con plantillas/plantilla_correo.txt.
+
+1. Generación: la plantilla se compila una vez (se separa en texto fijo y
+   campos {Campo}) y se vuelve a compilar solo si el archivo cambia. Para
+   cada remisión o vencimiento se arma un mensaje RFC 5322 y se guarda como
+   .eml en la bandeja de salida (BANDEJA_CORREO_DIR/pendientes). El asunto
+   es la línea "Ref.:" de la plantilla.
+2. Envío: EnviadorSMTP vacía la bandeja en segundo plano con un número
+   limitado de conexiones SMTP simultáneas, cada una reutilizada para varios
+   mensajes, un límite de mensajes por minuto y reintentos con espera
+   creciente ante errores temporales (4xx, desconexiones). Los rechazos
+   definitivos (5xx) pasan directamente a fallidos/ con un .error al lado.
+
+Carpetas de la bandeja: pendientes/ -> enviando/ -> enviados/ o fallidos/.
+Un mensaje se toma moviéndolo a enviando/ (os.replace es atómico), así dos
+procesos que vacíen la misma bandeja nunca envían dos veces el mismo. Los
+límites de conexiones y de mensajes por minuto son por proceso.
+
+Configuración (variables de entorno): SMTP_HOST, SMTP_PORT, SMTP_USUARIO,
+SMTP_CLAVE, SMTP_STARTTLS, CORREO_REMITENTE, SMTP_CONEXIONES,
+SMTP_MENSAJES_POR_MINUTO y SMTP_REINTENTOS. Para probar sin red basta un
+servidor SMTP local (p. ej. aiosmtpd, ver benchmarks/bench_correo.py).
+
+Vaciar la bandeja desde la línea de comandos:
+    python -m correo_masivo
+"""
+import os
+import smtplib
+import string
+import threading
+import time
+import uuid
+from datetime import datetime
+from email import message_from_bytes, policy
+from email.message import EmailMessage
+from email.utils import formatdate, make_msgid, parseaddr
+
+from werkzeug.utils import secure_filename
+
+import metricas
+from carga_diferida import modulo_diferido
+
+pd = modulo_diferido('pandas')
+
+CARPETAS_BANDEJA = ('pendientes', 'enviando', 'enviados', 'fallidos')
+EXTENSION = '.eml'
+
+ASUNTO_POR_DEFECTO = 'Ref.: {Consecutivo} | {Tomador} | Póliza: {Ramo} No {Poliza}'
+PREFIJO_ASUNTO = 'Ref.:'
+
+# Campos de la plantilla -> columna de cada origen de datos. Las columnas
+# también se pueden usar directamente por su nombre ({tomador}). 'correo' es
+# el "Correo del Tomador" del formulario de remisiones; los vencimientos no lo
+# tienen en su archivo y la ruta /correo/lote lo agrega desde la remisión
+# asociada.
+ORIGENES = {
+    'remisiones': {
+        'clave': 'consecutivo',
+        'correo': 'correo',
+        'campos': {'Consecutivo': 'consecutivo', 'Tomador': 'tomador', 'Ramo': 'ramo',
+                   'Poliza': 'poliza', 'Aseguradora': 'aseguradora', 'Nit': 'nit'},
+    },
+    'vencimientos': {
+        'clave': 'NÚMERO PÓLIZA',
+        'correo': 'correo',
+        'campos': {'Consecutivo': 'Remision_Asociada', 'Tomador': 'NOMBRES CLIENTE', 'Ramo': 'RAMO PRINCIPAL',
+                   'Poliza': 'NÚMERO PÓLIZA', 'Aseguradora': 'ASEGURADORA', 'FechaFin': 'FECHA FIN'},
+    },
+}
+
+MAXIMO_CORREOS_LOTE = int(os.environ.get('CORREO_MAXIMO_LOTE', '5000'))
+
+# Un mensaje .error con más de esto se recorta
+LONGITUD_MAXIMA_ERROR = 2000
+# Un mensaje que lleva más de esto en enviando/ quedó de un proceso que terminó
+ABANDONADO_S = 600
+# Los enviados se guardan este número de días (ver purgar_enviados)
+RETENCION_ENVIADOS_DIAS = int(os.environ.get('CORREO_RETENCION_DIAS', '90'))
+
+
+def _texto(valor):
+    if valor is None or (not isinstance(valor, str) and pd.isna(valor)):
+        return ''
+    if isinstance(valor, datetime):
+        return valor.strftime('%Y-%m-%d')
+    return str(valor).strip()
+
+
+class PlantillaCorreo:
+    """Plantilla {Campo} compilada a una lista de (texto fijo, campo)."""
+
+    def __init__(self, texto):
+        self.partes = [(literal, campo) for literal, campo, _formato, _conversion in string.Formatter().parse(texto)]
+        self.campos = {campo for _, campo in self.partes if campo}
+
+    def renderizar(self, valores):
+        """Texto con cada {Campo} reemplazado por su valor (vacío si no existe)."""
+        return ''.join(literal + (valores.get(campo, '') if campo is not None else '')
+                       for literal, campo in self.partes)
+
+
+_cache_plantillas = {}
+_lock_plantillas = threading.Lock()
+
+
+def cargar_plantilla(ruta):
+    """
+    (cuerpo, asunto) compilados de la plantilla en `ruta`. Se compila de nuevo
+    solo si cambió la firma del archivo (mtime, tamaño).
+    """
+    st = os.stat(ruta)
+    firma = (st.st_mtime_ns, st.st_size)
+    with _lock_plantillas:
+        guardada = _cache_plantillas.get(ruta)
+        acierto = guardada is not None and guardada[0] == firma
+        metricas.registrar_cache('plantilla_correo', acierto)
+        if acierto:
+            return guardada[1]
+    with open(ruta, 'r', encoding='utf-8') as f:
+        texto = f.read()
+    linea_asunto = next((linea.strip() for linea in texto.splitlines() if linea.strip().startswith(PREFIJO_ASUNTO)),
+                        ASUNTO_POR_DEFECTO)
+    compiladas = (PlantillaCorreo(texto), PlantillaCorreo(linea_asunto))
+    with _lock_plantillas:
+        _cache_plantillas[ruta] = (firma, compiladas)
+    return compiladas
+
+
+def direccion_valida(direccion):
+    _nombre, correo = parseaddr(direccion or '')
+    return correo if '@' in correo and ' ' not in correo else None
+
+
+class BandejaCorreo:
+    """Bandeja de salida de archivos .eml en disco."""
+
+    def __init__(self, app=None):
+        self.directorio = None
+        self.ruta_plantilla = None
+        self.remitente = None
+        self.enviador = None
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.configurar(app.config['BANDEJA_CORREO_DIR'], app.config['PLANTILLA_CORREO_FILE'])
+        self.enviador = EnviadorSMTP.desde_entorno(self)
+        app.extensions['bandeja_correo'] = self
+
+    def configurar(self, directorio, ruta_plantilla, remitente=None):
+        self.directorio = directorio
+        self.ruta_plantilla = ruta_plantilla
+        self.remitente = remitente or os.environ.get('CORREO_REMITENTE', 'notificaciones@uiblatam.com')
+        for carpeta in CARPETAS_BANDEJA:
+            os.makedirs(self.ruta(carpeta), exist_ok=True)
+
+    def ruta(self, carpeta, nombre=''):
+        return os.path.join(self.directorio, carpeta, nombre)
+
+    def listar(self, carpeta):
+        try:
+            return sorted(n for n in os.listdir(self.ruta(carpeta)) if n.endswith(EXTENSION))
+        except OSError:
+            return []
+
+    def conteos(self):
+        return {carpeta: len(self.listar(carpeta)) for carpeta in CARPETAS_BANDEJA}
+
+    # --- Generación ---
+    def crear_mensaje(self, destinatario, asunto, cuerpo, referencia=''):
+        mensaje = EmailMessage()
+        mensaje['From'] = self.remitente
+        mensaje['To'] = destinatario
+        mensaje['Subject'] = asunto
+        mensaje['Date'] = formatdate(localtime=True)
+        # Con el dominio explícito make_msgid no consulta el nombre del equipo
+        mensaje['Message-ID'] = make_msgid(domain=self.remitente.rpartition('@')[2] or 'localhost')
+        if referencia:
+            mensaje['X-UIB-Referencia'] = referencia
+        mensaje.set_content(cuerpo)
+        return mensaje
+
+    def guardar(self, mensaje, referencia=''):
+        """Escribe el mensaje en pendientes/ (primero en un temporal) y devuelve su nombre."""
+        nombre = f"{time.strftime('%Y%m%d%H%M%S')}_{secure_filename(referencia) or 'correo'}_{uuid.uuid4().hex[:8]}{EXTENSION}"
+        ruta = self.ruta('pendientes', nombre)
+        ruta_temporal = f'{ruta}.tmp'
+        with open(ruta_temporal, 'wb') as f:
+            f.write(mensaje.as_bytes(policy=policy.SMTP))
+        os.replace(ruta_temporal, ruta)
+        return nombre
+
+    def generar(self, df, origen, destinatario_por_defecto=''):
+        """
+        Un .eml por fila de `df` (remisiones o vencimientos, según `origen`).
+        Las filas sin correo válido usan `destinatario_por_defecto`; si
+        tampoco hay, se omiten. Devuelve (mensajes escritos, claves omitidas).
+        """
+        definicion = ORIGENES[origen]
+        cuerpo, asunto = cargar_plantilla(self.ruta_plantilla)
+        fecha = datetime.now().strftime('%d de %B de %Y')
+        por_defecto = direccion_valida(destinatario_por_defecto)
+        escritos, omitidos = 0, []
+        for fila in df.to_dict('records'):
+            valores = {str(columna): _texto(valor) for columna, valor in fila.items()}
+            valores.update({campo: valores.get(columna, '') for campo, columna in definicion['campos'].items()})
+            valores['Fecha'] = fecha
+            referencia = valores.get(definicion['clave'], '')
+            destinatario = direccion_valida(valores.get(definicion['correo'])) or por_defecto
+            if not destinatario:
+                omitidos.append(referencia)
+                continue
+            mensaje = self.crear_mensaje(destinatario, asunto.renderizar(valores).removeprefix(PREFIJO_ASUNTO).strip(),
+                                         cuerpo.renderizar(valores), referencia)
+            self.guardar(mensaje, referencia)
+            escritos += 1
+        return escritos, omitidos
+
+    # --- Envío ---
+    def recuperar_abandonados(self, antiguedad_s=ABANDONADO_S):
+        """Devuelve a pendientes/ los mensajes que quedaron en enviando/ de un proceso que terminó."""
+        limite = time.time() - antiguedad_s
+        for nombre in self.listar('enviando'):
+            ruta = self.ruta('enviando', nombre)
+            try:
+                if os.path.getmtime(ruta) < limite:
+                    os.replace(ruta, self.ruta('pendientes', nombre))
+            except OSError:
+                pass
+
+    def purgar_enviados(self, dias=RETENCION_ENVIADOS_DIAS):
+        """Borra los enviados de hace más de `dias` días; retorna cuántos."""
+        limite = time.time() - dias * 86400
+        borrados = 0
+        for nombre in self.listar('enviados'):
+            ruta = self.ruta('enviados', nombre)
+            try:
+                if os.path.getmtime(ruta) < limite:
+                    os.remove(ruta)
+                    borrados += 1
+            except OSError:
+                pass
+        return borrados
+
+    def tomar(self):
+        """Mueve el siguiente pendiente a enviando/ y devuelve su nombre, o None si no quedan."""
+        for nombre in self.listar('pendientes'):
+            try:
+                os.replace(self.ruta('pendientes', nombre), self.ruta('enviando', nombre))
+            except FileNotFoundError:
+                continue  # Lo tomó otro hilo o proceso
+            # La fecha de modificación marca cuándo se tomó (ver recuperar_abandonados)
+            os.utime(self.ruta('enviando', nombre))
+            return nombre
+        return None
+
+    def leer(self, nombre):
+        with open(self.ruta('enviando', nombre), 'rb') as f:
+            return f.read()
+
+    def marcar(self, nombre, carpeta, error=None):
+        os.replace(self.ruta('enviando', nombre), self.ruta(carpeta, nombre))
+        if error is not None:
+            with open(self.ruta(carpeta, nombre) + '.error', 'w', encoding='utf-8') as f:
+                f.write(str(error)[:LONGITUD_MAXIMA_ERROR])
+
+    def errores(self, limite=50):
+        """[(nombre, error)] de los últimos mensajes fallidos."""
+        resultado = []
+        for nombre in reversed(self.listar('fallidos')[-limite:]):
+            try:
+                with open(self.ruta('fallidos', nombre) + '.error', 'r', encoding='utf-8') as f:
+                    resultado.append((nombre, f.read()))
+            except OSError:
+                resultado.append((nombre, ''))
+        return resultado
+
+    def reintentar_fallidos(self):
+        """Devuelve los fallidos a pendientes/; retorna cuántos."""
+        movidos = 0
+        for nombre in self.listar('fallidos'):
+            try:
+                os.replace(self.ruta('fallidos', nombre), self.ruta('pendientes', nombre))
+            except FileNotFoundError:
+                continue
+            try:
+                os.remove(self.ruta('fallidos', nombre) + '.error')
+            except OSError:
+                pass
+            movidos += 1
+        return movidos
+
+
+class _Limitador:
+    """Reparte los envíos para no pasar de `por_minuto` mensajes por minuto entre todos los hilos."""
+
+    def __init__(self, por_minuto):
+        self.intervalo = 60.0 / por_minuto if por_minuto > 0 else 0.0
+        self._siguiente = 0.0
+        self._lock = threading.Lock()
+
+    def esperar(self):
+        if not self.intervalo:
+            return
+        with self._lock:
+            ahora = time.monotonic()
+            turno = max(ahora, self._siguiente)
+            self._siguiente = turno + self.intervalo
+        if turno > ahora:
+            time.sleep(turno - ahora)
+
+
+class _Resumen:
+    """Contadores de un vaciado de la bandeja, compartidos por los hilos de envío."""
+
+    CLAVES = ('enviados', 'fallidos', 'reintentos', 'conexiones')
+
+    def __init__(self):
+        self._valores = dict.fromkeys(self.CLAVES, 0)
+        self._lock = threading.Lock()
+
+    def sumar(self, clave):
+        with self._lock:
+            self._valores[clave] += 1
+
+    def como_dict(self):
+        with self._lock:
+            return dict(self._valores)
+
+
+class EnviadorSMTP:
+    """Vacía la bandeja hacia un servidor SMTP con conexiones reutilizadas, límite de ritmo y reintentos."""
+
+    def __init__(self, bandeja, host='localhost', puerto=25, usuario='', clave='', starttls=False,
+                 conexiones=2, mensajes_por_minuto=0, reintentos=3, espera_reintento_s=2.0,
+                 mensajes_por_conexion=100, timeout_s=30):
+        self.bandeja = bandeja
+        self.host = host
+        self.puerto = puerto
+        self.usuario = usuario
+        self.clave = clave
+        self.starttls = starttls
+        self.conexiones = max(1, conexiones)
+        self.mensajes_por_minuto = mensajes_por_minuto
+        self.reintentos = reintentos
+        self.espera_reintento_s = espera_reintento_s
+        self.mensajes_por_conexion = mensajes_por_conexion
+        self.timeout_s = timeout_s
+        self._hilo = None
+        self._lock = threading.Lock()
+        self.ultimo_resumen = None
+
+    @classmethod
+    def desde_entorno(cls, bandeja):
+        return cls(
+            bandeja,
+            host=os.environ.get('SMTP_HOST', 'localhost'),
+            puerto=int(os.environ.get('SMTP_PORT', '25')),
+            usuario=os.environ.get('SMTP_USUARIO', ''),
+            clave=os.environ.get('SMTP_CLAVE', ''),
+            starttls=os.environ.get('SMTP_STARTTLS', '0') == '1',
+            conexiones=int(os.environ.get('SMTP_CONEXIONES', '2')),
+            mensajes_por_minuto=int(os.environ.get('SMTP_MENSAJES_POR_MINUTO', '60')),
+            reintentos=int(os.environ.get('SMTP_REINTENTOS', '3')),
+        )
+
+    def _conectar(self):
+        conexion = smtplib.SMTP(self.host, self.puerto, timeout=self.timeout_s)
+        if self.starttls:
+            conexion.starttls()
+        if self.usuario:
+            conexion.login(self.usuario, self.clave)
+        return conexion
+
+    @staticmethod
+    def _cerrar(conexion):
+        if conexion is None:
+            return
+        try:
+            conexion.quit()
+        except (smtplib.SMTPException, OSError):
+            conexion.close()
+
+    def _enviar(self, nombre, estado, limitador, resumen):
+        """Envía un mensaje tomado de la bandeja, con reintentos. `estado` guarda la conexión del hilo."""
+        mensaje = message_from_bytes(self.bandeja.leer(nombre), policy=policy.SMTP)
+        ultimo_error = None
+        for intento in range(self.reintentos + 1):
+            if intento:
+                resumen.sumar('reintentos')
+                time.sleep(self.espera_reintento_s * 2 ** (intento - 1))
+            limitador.esperar()
+            try:
+                if estado['conexion'] is None or estado['enviados'] >= self.mensajes_por_conexion:
+                    self._cerrar(estado['conexion'])
+                    estado['conexion'], estado['enviados'] = None, 0
+                    estado['conexion'] = self._conectar()
+                    resumen.sumar('conexiones')
+                estado['conexion'].send_message(mensaje)
+                estado['enviados'] += 1
+            except smtplib.SMTPRecipientsRefused as e:
+                ultimo_error = e
+                break  # Todos los destinatarios rechazados: no se reintenta
+            except smtplib.SMTPResponseException as e:
+                ultimo_error = e
+                if 500 <= e.smtp_code < 600:
+                    break  # Rechazo definitivo; la conexión sigue sirviendo
+                if e.smtp_code == 421:
+                    # El servidor cierra la conexión; en los demás 4xx se reintenta por la misma
+                    self._cerrar(estado['conexion'])
+                    estado['conexion'] = None
+            except (smtplib.SMTPException, OSError) as e:
+                ultimo_error = e
+                self._cerrar(estado['conexion'])
+                estado['conexion'] = None
+            else:
+                # Fuera del try del envío: un error al mover el archivo no debe reenviar el correo
+                resumen.sumar('enviados')
+                metricas.registrar_correo('enviado')
+                try:
+                    self.bandeja.marcar(nombre, 'enviados')
+                except OSError as e:
+                    print(f"Correo {nombre} enviado, pero no se pudo mover a enviados/: {e}")
+                return
+        print(f"No se pudo enviar el correo {nombre}: {type(ultimo_error).__name__} - {ultimo_error}")
+        self.bandeja.marcar(nombre, 'fallidos', f'{type(ultimo_error).__name__}: {ultimo_error}')
+        resumen.sumar('fallidos')
+        metricas.registrar_correo('fallido')
+
+    def _trabajar(self, limitador, resumen):
+        estado = {'conexion': None, 'enviados': 0}
+        try:
+            while True:
+                nombre = self.bandeja.tomar()
+                if nombre is None:
+                    return
+                try:
+                    self._enviar(nombre, estado, limitador, resumen)
+                except OSError as e:
+                    # El archivo desapareció o no se pudo mover: se deja para recuperar_abandonados
+                    print(f"Error al procesar el correo {nombre} de la bandeja: {e}")
+        finally:
+            self._cerrar(estado['conexion'])
+
+    def drenar(self):
+        """
+        Envía todos los pendientes con hasta `conexiones` hilos y devuelve el
+        resumen {'enviados', 'fallidos', 'reintentos', 'conexiones', 'segundos'}.
+        """
+        inicio = time.perf_counter()
+        self.bandeja.recuperar_abandonados()
+        limitador = _Limitador(self.mensajes_por_minuto)
+        resumen = _Resumen()
+        hilos = [threading.Thread(target=self._trabajar, args=(limitador, resumen), name=f'correo-{i}', daemon=True)
+                 for i in range(self.conexiones)]
+        for hilo in hilos:
+            hilo.start()
+        for hilo in hilos:
+            hilo.join()
+        resumen = dict(resumen.como_dict(), segundos=round(time.perf_counter() - inicio, 2))
+        self.ultimo_resumen = dict(resumen, fecha=datetime.now().strftime('%Y-%m-%d %H:%M:%S'))
+        return resumen
+
+    def en_curso(self):
+        with self._lock:
+            return self._hilo is not None and self._hilo.is_alive()
+
+    def drenar_en_segundo_plano(self):
+        """Inicia drenar() en un hilo aparte. Devuelve False si ya había un envío en curso."""
+        with self._lock:
+            if self._hilo is not None and self._hilo.is_alive():
+                return False
+            self._hilo = threading.Thread(target=self.drenar, name='correo-bandeja', daemon=True)
+            self._hilo.start()
+            return True
+
+
+bandeja_correo = BandejaCorreo()
+
+
+if __name__ == '__main__':
+    # Como script este módulo es __main__: la bandeja configurada es la de correo_masivo
+    import app as modulo_app
+    import correo_masivo
+    modulo_app.create_app()
+    print(correo_masivo.bandeja_correo.enviador.drenar())
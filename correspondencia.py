@@ -0,0 +1,177 @@
+"""
+Cartas de correspondencia (nuevo negocio y renovación) a partir de las
+remisiones.
+
+La vista previa genera una carta; el modo por lotes genera muchas de una vez
+(p. ej. la correspondencia de renovaciones de fin de mes):
+- las remisiones se buscan todas juntas en la instantánea de remisiones.xlsx,
+  por lista de consecutivos (índice por consecutivo) o con los mismos filtros
+  del panel de control;
+- cada carta se renderiza con la plantilla ya compilada por Jinja, repartiendo
+  los bloques de cartas entre los hilos de un pool;
+- el ZIP se arma al vuelo y se envía por partes a medida que se agregan las
+  cartas, sin tener el archivo completo en memoria.
+"""
+import os
+import threading
+import zipfile
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+from werkzeug.utils import secure_filename
+
+from carga_diferida import modulo_diferido
+
+pd = modulo_diferido('pandas')
+
+TIPOS_PLANTILLA = {'nuevo_negocio': 'Nuevo Negocio', 'renovacion': 'Renovación'}
+
+# Campos del formulario de correspondencia que no están en remisiones.xlsx;
+# en el modo por lotes se aplican a todas las cartas
+CAMPOS_FORMULARIO = ('sr_sra', 'correo', 'valor_a_pagar', 'garantias', 'link_de_pago')
+
+# Cartas que se renderizan y comprimen por bloque: es lo único que se tiene
+# en memoria a la vez mientras se envía el ZIP
+CARTAS_POR_BLOQUE = 32
+MAXIMO_CARTAS_LOTE = int(os.environ.get('CORRESPONDENCIA_MAXIMO_LOTE', '5000'))
+HILOS_RENDER = int(os.environ.get('CORRESPONDENCIA_HILOS', str(min(4, os.cpu_count() or 1))))
+
+# Se crea al primer uso, dentro del worker (no en el maestro de gunicorn antes del fork)
+_ejecutor = None
+_lock_ejecutor = threading.Lock()
+
+
+def _obtener_ejecutor():
+    global _ejecutor
+    with _lock_ejecutor:
+        if _ejecutor is None:
+            _ejecutor = ThreadPoolExecutor(max_workers=HILOS_RENDER, thread_name_prefix='correspondencia')
+        return _ejecutor
+
+
+def formatear_fecha(valor):
+    """'2024-05-31' o '31/05/2024' -> '31 de mayo de 2024' (según el locale)."""
+    if valor is None or valor == '' or pd.isna(valor):
+        return ""
+    try:
+        # Primero con barras, luego con guiones
+        try:
+            dt = datetime.strptime(str(valor), '%d/%m/%Y')
+        except ValueError:
+            dt = datetime.strptime(str(valor), '%Y-%m-%d')
+        return dt.strftime('%d de %B de %Y')
+    except (ValueError, TypeError):
+        return valor  # Se deja el valor original si el formato no es el esperado
+
+
+def descripcion_archivos(archivos):
+    """Nombres cortos de los adjuntos de la remisión, separados por ' - '."""
+    if not archivos:
+        return ''
+    # Solo el nombre base del archivo, sin ruta ni extensión
+    return ' - '.join(os.path.splitext(os.path.basename(f))[0].split('_')[-1] for f in str(archivos).split(','))
+
+
+def contexto_carta(remision, fecha=None):
+    """Variables de la plantilla de la carta para una remisión (con los campos del formulario ya aplicados)."""
+    return {
+        'empresa': remision.get('tomador'),
+        'sr_sra': remision.get('sr_sra'),
+        'correo': remision.get('correo'),
+        'fecha': fecha or datetime.now().strftime('%d de %B de %Y'),
+        'consecutivo': remision.get('consecutivo'),
+        'ref_asunto': f"{remision.get('consecutivo', '')} | {remision.get('tomador', '')} | {remision.get('ramo', '')} No {remision.get('poliza', '')}",
+        'aseguradora': remision.get('aseguradora'),
+        'fecha_inicio': formatear_fecha(remision.get('fecha_inicio')),
+        'fecha_terminacion': formatear_fecha(remision.get('fecha_fin')),
+        'ramo': remision.get('ramo'),
+        'poliza': remision.get('poliza'),
+        'descripcion': descripcion_archivos(remision.get('archivos', '')),
+        'valor_a_pagar': remision.get('valor_a_pagar'),
+        'garantias': remision.get('garantias'),
+        'fecha_de_pago': formatear_fecha(remision.get('fecha_limite_pago')),
+        'link_de_pago': remision.get('link_de_pago'),
+    }
+
+
+def leer_consecutivos(texto):
+    """Consecutivos de un texto separado por comas, espacios o saltos de línea, sin repetidos."""
+    return list(dict.fromkeys(texto.replace(',', ' ').split()))
+
+
+def filtrar_remisiones(df, aseguradora='', ramo='', estado='', vence=''):
+    """
+    Remisiones que cumplen los filtros del panel de control; `vence` es un
+    mes 'AAAA-MM' de fecha_fin (la correspondencia de renovaciones del mes).
+    """
+    mascara = pd.Series(True, index=df.index)
+    if aseguradora:
+        mascara &= df['aseguradora'] == aseguradora
+    if ramo:
+        mascara &= df['ramo'] == ramo
+    if estado:
+        mascara &= df['estado'] == estado
+    if vence:
+        mascara &= df['fecha_fin'].astype(str).str.startswith(vence)
+    return df[mascara]
+
+
+def nombre_archivo_carta(consecutivo, tipo_plantilla):
+    return f"{secure_filename(str(consecutivo)) or 'sin_consecutivo'}_{tipo_plantilla}.html"
+
+
+class _SalidaZip:
+    """Destino de zipfile que acumula lo escrito hasta que el generador lo envía."""
+
+    def __init__(self):
+        self._partes = []
+
+    def write(self, datos):
+        self._partes.append(bytes(datos))
+        return len(datos)
+
+    def flush(self):
+        pass
+
+    def vaciar(self):
+        datos = b''.join(self._partes)
+        self._partes = []
+        return datos
+
+
+def generar_zip(plantilla, remisiones, tipo_plantilla, campos_formulario=None, faltantes=None,
+                cartas_por_bloque=CARTAS_POR_BLOQUE):
+    """
+    Genera por partes un ZIP con una carta HTML por remisión.
+
+    `plantilla` es el Template de Jinja ya compilado y `remisiones` el
+    DataFrame con las remisiones a incluir. Las cartas de cada bloque se
+    renderizan en paralelo en el pool y se agregan al ZIP en el orden del
+    DataFrame. Si hay `faltantes` se agrega faltantes.txt con ellos.
+    """
+    campos_formulario = campos_formulario or {}
+    fecha = datetime.now().strftime('%d de %B de %Y')
+    fecha_zip = datetime.now().timetuple()[:6]
+    ejecutor = _obtener_ejecutor()
+
+    def renderizar(remision):
+        remision.update(campos_formulario)
+        return nombre_archivo_carta(remision.get('consecutivo'), tipo_plantilla), \
+            plantilla.render(**contexto_carta(remision, fecha))
+
+    salida = _SalidaZip()
+    # zipfile admite destinos sin seek(): escribe los tamaños de cada entrada
+    # después de su contenido (data descriptor)
+    with zipfile.ZipFile(salida, 'w', compression=zipfile.ZIP_DEFLATED) as archivo_zip:
+        for inicio in range(0, len(remisiones), cartas_por_bloque):
+            bloque = remisiones.iloc[inicio:inicio + cartas_por_bloque]
+            # Vacíos en lugar de NaN, para que las cartas no muestren "nan"
+            registros = bloque.astype(object).where(bloque.notna(), '').to_dict('records')
+            for nombre, html in ejecutor.map(renderizar, registros):
+                archivo_zip.writestr(zipfile.ZipInfo(nombre, fecha_zip), html.encode('utf-8'),
+                                     compress_type=zipfile.ZIP_DEFLATED)
+            yield salida.vaciar()
+        if faltantes:
+            archivo_zip.writestr(zipfile.ZipInfo('faltantes.txt', fecha_zip),
+                                 'Consecutivos no encontrados en remisiones.xlsx:\n' + '\n'.join(faltantes) + '\n')
+    yield salida.vaciar()
@@ -0,0 +1,206 @@
+"""
+Cubo de producción: totales pre-agregados de remisiones y cartera por mes,
+ramo, aseguradora, vendedor y analista, para los gráficos y la consulta
+/api/cubo.
+
+Cada origen (una instantánea) declara qué columnas son sus dimensiones, su
+fecha y sus medidas (prima neta, comisión, comisión UIB, comisión TPP, uib);
+cada fila suma su aporte a la celda (origen, mes, ramo, aseguradora,
+vendedor, analista) y se cuenta en `registros`. Las celdas se mantienen de
+forma incremental cuando cambia el archivo (instantaneas.AportesPorFila),
+así que una consulta solo agrega celdas ya calculadas, sin leer ni
+convertir las filas de los archivos.
+
+Las dimensiones que un origen no tiene (cartera no tiene ramo ni analista)
+quedan vacías (None).
+"""
+import metricas
+from carga_diferida import modulo_diferido
+from instantaneas import AportesPorFila
+
+pd = modulo_diferido('pandas')
+np = modulo_diferido('numpy')
+
+DIMENSIONES = ('mes', 'ramo', 'aseguradora', 'vendedor', 'analista')
+MEDIDAS = ('prima_neta', 'comision', 'comision_uib', 'comision_tpp', 'uib', 'registros')
+MEDIDAS_SUMADAS = MEDIDAS[:-1]
+LIMITE_FILAS = 500
+
+
+def _valores(serie):
+    """Valores de texto de una dimensión (None si la celda está vacía)."""
+    texto = serie.astype(object).where(serie.notna(), None)
+    return [(valor.strip() or None) if isinstance(valor, str) else (None if valor is None else str(valor))
+            for valor in texto.tolist()]
+
+
+class OrigenCubo:
+    """Cómo se lee un origen: columnas de dimensiones, fecha, medidas y filtro de filas."""
+
+    def __init__(self, nombre, instantanea, clave, fecha, dimensiones, medidas, formato_fecha=None,
+                 filtro=None):
+        self.nombre = nombre
+        self.instantanea = instantanea
+        self.clave = clave
+        self.fecha = fecha
+        self.formato_fecha = formato_fecha
+        self.dimensiones = dimensiones    # dimensión del cubo -> columna
+        self.medidas = medidas            # medida del cubo -> columna
+        self.filtro = filtro              # (columna, valor) sin distinguir mayúsculas, o None
+        self.firma = None
+        self.aportes = AportesPorFila()
+
+    @property
+    def columnas(self):
+        columnas = [self.clave, self.fecha, *self.dimensiones.values(), *self.medidas.values()]
+        if self.filtro:
+            columnas.append(self.filtro[0])
+        return list(dict.fromkeys(columnas))
+
+
+class CuboProduccion:
+    def __init__(self, limpiar_moneda):
+        self.limpiar_moneda = limpiar_moneda
+        self._lock = metricas.LockMedido('cubo_produccion')
+        self._origenes = {}
+        self._celdas = {}        # (origen, mes, ramo, aseguradora, vendedor, analista) -> medidas
+        self._tabla = None       # DataFrame de las celdas, se arma al consultar tras un cambio
+
+    def agregar(self, nombre, instantanea, clave, fecha, dimensiones, medidas, formato_fecha=None, filtro=None):
+        """
+        Agrega un origen al cubo. `dimensiones` y `medidas` van de los nombres
+        del cubo (DIMENSIONES sin 'mes', MEDIDAS sin 'registros') a las
+        columnas del archivo; la fecha (columna `fecha`) da el mes. Con
+        `filtro` = (columna, valor) solo cuentan las filas con ese valor.
+        """
+        self._origenes[nombre] = OrigenCubo(nombre, instantanea, clave, fecha, dimensiones, medidas,
+                                            formato_fecha, filtro)
+
+    @property
+    def origenes(self):
+        return list(self._origenes)
+
+    # --- Mantenimiento ---
+    def sincronizar(self):
+        """Pone al día las celdas de los orígenes cuyo archivo cambió. True si hubo cambios."""
+        cambios = False
+        with self._lock:
+            for origen in self._origenes.values():
+                firma = origen.instantanea.firma_archivo()
+                metricas.registrar_cache('cubo_produccion', firma is not None and firma == origen.firma)
+                if firma == origen.firma:
+                    continue
+                if firma is None:
+                    self._vaciar(origen)
+                else:
+                    df = origen.instantanea.vista()
+                    faltantes = [columna for columna in origen.columnas if columna not in df.columns]
+                    if faltantes:
+                        print(f"ADVERTENCIA: el cubo omite '{origen.nombre}', faltan columnas: {', '.join(faltantes)}.")
+                        self._vaciar(origen)
+                    else:
+                        origen.aportes.actualizar(df[origen.columnas], origen.clave,
+                                                  lambda filas, origen=origen: self._calcular(origen, filas),
+                                                  self._sumar, self._retirar)
+                origen.firma = firma
+                self._tabla = None
+                cambios = True
+        return cambios
+
+    def _vaciar(self, origen):
+        for clave, (_huella, aporte) in list(origen.aportes.filas.items()):
+            self._retirar(clave, aporte)
+        origen.aportes.limpiar()
+
+    def _calcular(self, origen, df):
+        """Aporte de cada fila: (celda, medidas) o None si la fila no cuenta."""
+        opciones = {'format': origen.formato_fecha} if origen.formato_fecha else {'dayfirst': True}
+        fecha = pd.to_datetime(df[origen.fecha], errors='coerce', **opciones)
+        cuenta = fecha.notna().to_numpy()
+        if origen.filtro:
+            columna, valor = origen.filtro
+            cuenta = cuenta & (df[columna].astype(str).str.strip().str.lower() == valor.lower()).to_numpy()
+        meses = fecha.dt.strftime('%Y-%m').tolist()
+
+        valores = np.zeros((len(df), len(MEDIDAS)))
+        for i, medida in enumerate(MEDIDAS_SUMADAS):
+            columna = origen.medidas.get(medida)
+            if columna is not None:
+                valores[:, i] = np.nan_to_num(df[columna].map(self.limpiar_moneda).to_numpy(dtype=float))
+        valores[:, -1] = 1
+        dimensiones = [_valores(df[origen.dimensiones[d]]) if d in origen.dimensiones else [None] * len(df)
+                       for d in DIMENSIONES[1:]]
+
+        aportes = []
+        for i, mes in enumerate(meses):
+            if not cuenta[i]:
+                aportes.append(None)
+                continue
+            celda = (origen.nombre, mes, *(valores_dimension[i] for valores_dimension in dimensiones))
+            aportes.append((celda, valores[i]))
+        return aportes
+
+    def _sumar(self, _clave, aporte, signo=1):
+        if aporte is None:
+            return
+        celda, medidas = aporte
+        acumulado = self._celdas.get(celda)
+        if acumulado is None:
+            acumulado = self._celdas[celda] = np.zeros(len(MEDIDAS))
+        acumulado += signo * medidas
+        if acumulado[-1] <= 0:
+            del self._celdas[celda]
+
+    def _retirar(self, clave, aporte):
+        self._sumar(clave, aporte, signo=-1)
+
+    def _obtener_tabla(self):
+        self.sincronizar()
+        with self._lock:
+            if self._tabla is None:
+                celdas = list(self._celdas.items())
+                tabla = pd.DataFrame([celda for celda, _medidas in celdas], columns=('origen',) + DIMENSIONES)
+                medidas = np.array([medidas for _celda, medidas in celdas]).reshape(len(celdas), len(MEDIDAS))
+                for i, medida in enumerate(MEDIDAS):
+                    tabla[medida] = medidas[:, i]
+                self._tabla = tabla
+            return self._tabla
+
+    # --- Consultas ---
+    def consultar(self, origen, por, filtros=None, desde=None, hasta=None, orden='comision_uib', limite=LIMITE_FILAS):
+        """
+        Medidas del origen agregadas por las dimensiones `por`, con `filtros`
+        {dimensión: valor} y los meses de `desde` a `hasta` ('AAAA-MM',
+        inclusive). Filas ordenadas de mayor a menor por `orden` si es una
+        medida, o de forma ascendente si es una de las dimensiones de `por`
+        (p. ej. 'mes'). Devuelve {'filas': [...], 'totales': {...}, 'hay_mas': bool}.
+        """
+        tabla = self._obtener_tabla()
+        mascara = (tabla['origen'] == origen).to_numpy()
+        if desde:
+            mascara = mascara & (tabla['mes'] >= desde).to_numpy()
+        if hasta:
+            mascara = mascara & (tabla['mes'] <= hasta).to_numpy()
+        for dimension, valor in (filtros or {}).items():
+            mascara = mascara & (tabla[dimension].isna() if valor is None else tabla[dimension] == valor).to_numpy()
+        seleccion = tabla[mascara]
+
+        totales = {medida: float(seleccion[medida].sum()) for medida in MEDIDAS}
+        if por:
+            agrupado = seleccion.groupby(list(por), dropna=False, sort=False)[list(MEDIDAS)].sum().reset_index()
+        else:
+            agrupado = pd.DataFrame([totales])
+        if orden in MEDIDAS:
+            agrupado = agrupado.sort_values([orden] + list(por), ascending=[False] + [True] * len(por),
+                                             na_position='last', kind='stable')
+        else:
+            agrupado = agrupado.sort_values(list(dict.fromkeys([orden] + list(por))), na_position='last', kind='stable')
+        filas = []
+        for registro in agrupado.head(limite).to_dict(orient='records'):
+            fila = {dimension: (None if pd.isna(registro[dimension]) else registro[dimension]) for dimension in por}
+            fila.update({medida: round(float(registro[medida]), 2) for medida in MEDIDAS})
+            fila['registros'] = int(fila['registros'])
+            filas.append(fila)
+        totales = {medida: round(valor, 2) for medida, valor in totales.items()}
+        totales['registros'] = int(totales['registros'])
+        return {'filas': filas, 'totales': totales, 'hay_mas': len(agrupado) > limite}
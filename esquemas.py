@@ -0,0 +1,216 @@
+"""
+Claves de los archivos de datos (números de póliza, NIT, consecutivos e IDs)
+con un tipo canónico, para que las búsquedas las comparen tal cual en lugar
+de convertirlas en cada petición.
+
+Las claves se normalizan una sola vez, al entrar: al escribir un archivo
+(excel_io.guardar_excel, que por eso puede cambiar cómo quedan guardados
+los valores: mayúsculas, sin espacios ni '.0') y al leer un reporte subido
+(excel_io.leer_carga). Al leer los archivos de datos se confía en lo
+guardado; un archivo escrito antes de esta normalización la recibe en su
+siguiente guardado. Tipos:
+- POLIZA: texto de normalizar_poliza (sin espacios, en mayúsculas, sin el
+  '.0' de los números que Excel guardó como decimales);
+- TEXTO: identificadores de texto (consecutivo, ID_COBRO, ID_PROSPECTO,
+  NIT), sin espacios ni '.0'; vacío es '';
+- ENTERO: identificadores numéricos (ID_CARTERA, ID_VENCIMIENTO) como Int64.
+
+Las claves de texto se leen como texto (dtype=str), así Excel no convierte un
+número de póliza largo en decimal al leerlo.
+
+Además, cada entidad declara en ESQUEMAS el tipo de sus demás columnas,
+que se aplica al cargar las instantáneas (instantaneas.py):
+- CATEGORIA: textos con pocos valores distintos (aseguradora, ramo, estado,
+  vendedor...) como Categorical. Las categorías son las de la lista de
+  config/*.json indicada más los valores que traiga el archivo, ordenadas;
+  ocupan una fracción de la memoria de la columna de objetos y los filtros
+  (==, isin) comparan códigos enteros. Incluyen '' para que fillna('')
+  siga funcionando.
+- MONEDA: valores en dinero como float64 si llegaron como texto numérico
+  (las columnas que ya son numéricas se dejan como están).
+Las fechas se guardan como texto AAAA-MM-DD y las páginas las muestran así:
+cada vista las convierte donde las necesita.
+
+Una columna categórica no admite valores fuera de sus categorías: antes de
+modificar filas de una instantánea para guardarlas se usa sin_categorias().
+"""
+import re
+
+import config_manager
+from carga_diferida import modulo_diferido
+from indice_polizas import normalizar_poliza
+
+pd = modulo_diferido('pandas')
+np = modulo_diferido('numpy')
+
+POLIZA = 'poliza'
+TEXTO = 'texto'
+ENTERO = 'entero'
+
+# Columna -> tipo de clave, en todos los archivos donde aparezca
+CLAVES = {
+    # Remisiones
+    'consecutivo': TEXTO, 'nit': TEXTO, 'poliza': POLIZA, 'old_policy_number': POLIZA,
+    # Cartera y vencimientos
+    'ID_CARTERA': ENTERO, 'ID_VENCIMIENTO': ENTERO, 'NÚMERO PÓLIZA': POLIZA,
+    # Cobros
+    'ID_COBRO': TEXTO, 'CONSECUTIVO_REMISION': TEXTO, 'NIT_CC': TEXTO, 'N_Poliza': POLIZA,
+    # Prospectos
+    'ID_PROSPECTO': TEXTO,
+}
+
+# dtype de lectura de las claves de texto (pandas ignora las columnas que no están)
+DTYPE_LECTURA = {columna: str for columna, tipo in CLAVES.items() if tipo != ENTERO}
+
+_ENTERO_CON_DECIMALES_CERO = re.compile(r'^(-?\d+)\.0+$')
+
+
+def normalizar_texto(valor):
+    """Identificador de texto canónico ('' si está vacío)."""
+    if valor is None:
+        return ''
+    if isinstance(valor, float):
+        if valor != valor:  # NaN
+            return ''
+        if valor.is_integer():
+            return str(int(valor))
+    texto = str(valor).strip()
+    if texto.lower() in ('nan', 'none', 'nat'):
+        return ''
+    coincidencia = _ENTERO_CON_DECIMALES_CERO.match(texto)
+    return coincidencia.group(1) if coincidencia else texto
+
+
+def normalizar_columna(serie, tipo):
+    """Columna con el tipo canónico de su clave; cada valor distinto se convierte una vez."""
+    if tipo == ENTERO:
+        return pd.to_numeric(serie, errors='coerce').round().astype('Int64')
+    normalizar = normalizar_poliza if tipo == POLIZA else normalizar_texto
+    codigos, unicos = pd.factorize(serie)
+    if not len(unicos):
+        return pd.Series('', index=serie.index, dtype=object)
+    canonicos = np.array([normalizar(valor) for valor in unicos] + [''], dtype=object)
+    # factorize marca los vacíos con -1, que apunta al '' agregado al final
+    return pd.Series(canonicos[codigos], index=serie.index, dtype=object)
+
+
+def normalizar_claves(df):
+    """
+    DataFrame con las columnas clave en su tipo canónico. No modifica el
+    original; si no hay claves que tocar devuelve el mismo objeto.
+    """
+    columnas = [columna for columna in df.columns if columna in CLAVES]
+    if not columnas:
+        return df
+    df = df.copy(deep=False)
+    for columna in columnas:
+        df[columna] = normalizar_columna(df[columna], CLAVES[columna])
+    return df
+
+
+CATEGORIA = 'categoria'
+MONEDA = 'moneda'
+
+# Entidad -> {columna: (tipo, lista de config/ que siembra las categorías o None)}
+ESQUEMAS = {
+    'cartera': {
+        'ASEGURADORA': (CATEGORIA, 'aseguradoras'), 'VENDEDOR': (CATEGORIA, 'vendedores'),
+        'Intermediario_Original': (CATEGORIA, 'vendedores'),
+        'PRIMA NETA': (MONEDA, None), 'COMISIÓN': (MONEDA, None), 'Valor_Comision_UIB_Neto_Calc': (MONEDA, None),
+        'Valor_Comision_Intermediario_Calc': (MONEDA, None),
+    },
+    'vencimientos': {
+        'ASEGURADORA': (CATEGORIA, 'aseguradoras'), 'RAMO PRINCIPAL': (CATEGORIA, 'ramos'),
+        'Responsable': (CATEGORIA, 'responsable_vencimientos'), 'Estado': (CATEGORIA, 'estado_vencimientos'),
+    },
+    'remisiones': {
+        'estado': (CATEGORIA, None), 'aseguradora': (CATEGORIA, 'aseguradoras'), 'ramo': (CATEGORIA, 'ramos'),
+        'vendedor': (CATEGORIA, 'vendedores'), 'co_corretaje_nombre': (CATEGORIA, 'vendedores'),
+        'tipo_moneda': (CATEGORIA, 'tipo_moneda'), 'forma_pago': (CATEGORIA, 'forma_pago'),
+        'periodicidad_pago': (CATEGORIA, 'periodicidad_pago'), 'analista_responsable': (CATEGORIA, 'analistas'),
+        'renovacion': (CATEGORIA, None), 'negocio_nuevo': (CATEGORIA, None), 'renovable': (CATEGORIA, None),
+        'modificacion': (CATEGORIA, None), 'anexo_checkbox': (CATEGORIA, None),
+        'policy_number_modified': (CATEGORIA, None), 'co_corretaje_opcion': (CATEGORIA, None),
+        'prima_neta': (MONEDA, None), 'Comision$': (MONEDA, None), 'ComisionTPP': (MONEDA, None),
+        'ComisionUIB': (MONEDA, None), 'uib': (MONEDA, None),
+    },
+    'cobros': {
+        'Aseguradora': (CATEGORIA, 'aseguradoras'), 'Ramo': (CATEGORIA, 'ramos'), 'Estado': (CATEGORIA, None),
+        'Tipo_Movimiento': (CATEGORIA, None), 'Periodicidad': (CATEGORIA, 'periodicidad_pago'),
+    },
+    'prospectos': {
+        'Responsable Tecnico': (CATEGORIA, 'responsable_tecnico'),
+        'Responsable Comercial': (CATEGORIA, 'responsable_comercial'),
+        'es_TPP': (CATEGORIA, None), 'Nombre_TPP': (CATEGORIA, 'vendedores'), 'Ramo': (CATEGORIA, 'ramos'),
+        'Aseguradora': (CATEGORIA, 'aseguradoras'), 'Estado': (CATEGORIA, 'estado_prospecto'),
+        'Prima': (MONEDA, None), 'Comision $': (MONEDA, None),
+    },
+}
+
+
+def valores_lista(nombre_lista):
+    """Valores de una lista de config/ (de vendedores, el nombre)."""
+    valores = []
+    for elemento in config_manager.get_list(nombre_lista):
+        if isinstance(elemento, dict):
+            elemento = elemento.get('nombre')
+        if elemento:
+            valores.append(str(elemento))
+    return valores
+
+
+def columna_categorica(serie, semilla=()):
+    """Columna como Categorical con las categorías de `semilla`, las del archivo y ''."""
+    if isinstance(serie.dtype, pd.CategoricalDtype):
+        serie = serie.astype(object)
+    observados = serie.dropna().unique().tolist()
+    categorias = sorted(set(semilla).union(observados, ['']), key=str)
+    return pd.Series(pd.Categorical(serie, categories=categorias), index=serie.index, name=serie.name)
+
+
+def columna_moneda(serie):
+    """float64 si la columna es texto numérico; si no, la misma columna."""
+    if serie.dtype != object:
+        return serie
+    numeros = pd.to_numeric(serie, errors='coerce')
+    if numeros[serie.notna() & (serie.astype(str).str.strip() != '')].isna().any():
+        return serie
+    return numeros.astype('float64')
+
+
+def aplicar_esquema(df, entidad):
+    """
+    DataFrame con los tipos declarados para la entidad en ESQUEMAS (las
+    columnas que no existan se omiten). No modifica el original.
+    """
+    esquema = ESQUEMAS[entidad]
+    columnas = [columna for columna in df.columns if columna in esquema]
+    if not columnas:
+        return df
+    df = df.copy(deep=False)
+    semillas = {}
+    for columna in columnas:
+        tipo, lista = esquema[columna]
+        if tipo == CATEGORIA:
+            if lista and lista not in semillas:
+                semillas[lista] = valores_lista(lista)
+            df[columna] = columna_categorica(df[columna], semillas.get(lista, ()))
+        elif tipo == MONEDA:
+            df[columna] = columna_moneda(df[columna])
+    return df
+
+
+def sin_categorias(df):
+    """Copia superficial con las columnas categóricas como texto (object), para modificar filas."""
+    categoricas = [columna for columna, tipo in df.dtypes.items() if isinstance(tipo, pd.CategoricalDtype)]
+    if not categoricas:
+        return df
+    df = df.copy(deep=False)
+    for columna in categoricas:
+        df[columna] = df[columna].astype(object)
+    return df
+
+
+def memoria_mb(df):
+    """Memoria del DataFrame en MB, contando el contenido de los textos."""
+    return round(df.memory_usage(deep=True).sum() / 1024 ** 2, 2)
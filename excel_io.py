@@ -0,0 +1,263 @@
+import os
+import tempfile
+import time
+import uuid
+
+import esquemas
+import perfilado
+from carga_diferida import modulo_diferido
+
+# Se cargan al primer uso (ver carga_diferida.py)
+pd = modulo_diferido('pandas')
+openpyxl = modulo_diferido('openpyxl')
+# Sin xlsxwriter (None) se usa openpyxl en modo write_only
+xlsxwriter = modulo_diferido('xlsxwriter')
+
+# Tamaño de bloque para generar y enviar exportaciones
+FILAS_POR_BLOQUE = 1000
+BYTES_POR_BLOQUE = 64 * 1024
+
+# Motor de escritura: xlsxwriter (constant_memory) si está instalado, si no
+# openpyxl en modo write_only. Se puede forzar con EXCEL_WRITER_ENGINE.
+MOTORES_DISPONIBLES = ('xlsxwriter', 'openpyxl') if xlsxwriter is not None else ('openpyxl',)
+MOTOR_EXCEL = os.environ.get('EXCEL_WRITER_ENGINE', MOTORES_DISPONIBLES[0])
+if MOTOR_EXCEL not in MOTORES_DISPONIBLES:
+    print(f"ADVERTENCIA: motor de Excel '{MOTOR_EXCEL}' no disponible, se usará '{MOTORES_DISPONIBLES[0]}'.")
+    MOTOR_EXCEL = MOTORES_DISPONIBLES[0]
+
+# Formato numérico y ancho por defecto de cada tipo de columna
+FORMATOS_POR_TIPO = {
+    'moneda': ('#,##0', 16),
+    'decimal': ('#,##0.00', 14),
+    'porcentaje': ('0.0"%"', 12),
+    'entero': ('0', 10),
+    'fecha': ('yyyy-mm-dd', 12),
+    'texto': (None, 18),
+}
+FORMATO_FECHA_HORA = 'yyyy-mm-dd hh:mm:ss'
+ANCHO_MAXIMO = 50
+
+
+def iterar_filas(df, filas_por_bloque=FILAS_POR_BLOQUE):
+    """
+    Recorre el DataFrame fila a fila como listas de valores nativos de Python
+    (NaN/NaT como None). La conversión se hace por bloques y de forma
+    vectorizada, sin copiar el DataFrame completo a objetos.
+    """
+    for inicio in range(0, len(df), filas_por_bloque):
+        bloque = df.iloc[inicio:inicio + filas_por_bloque]
+        valores = bloque.astype(object).where(bloque.notna(), None)
+        yield from valores.values.tolist()
+
+
+def generar_csv(df, filas_por_bloque=FILAS_POR_BLOQUE):
+    """
+    Genera el CSV del DataFrame por bloques de filas, para enviarlo como
+    respuesta en streaming sin construir el archivo completo en memoria.
+    El primer bloque incluye el BOM UTF-8 para que Excel respete las tildes.
+    """
+    yield '\ufeff'
+    if df.empty:
+        yield df.to_csv(index=False)
+        return
+    for inicio in range(0, len(df), filas_por_bloque):
+        bloque = df.iloc[inicio:inicio + filas_por_bloque]
+        yield bloque.to_csv(index=False, header=(inicio == 0))
+
+
+def _columnas_con_formato(df, tipos_columnas):
+    """
+    Devuelve, por cada columna del DataFrame, (formato_numerico, ancho) según
+    el tipo declarado en `tipos_columnas` (nombre de columna -> tipo).
+    """
+    tipos_columnas = tipos_columnas or {}
+    resultado = []
+    for col in df.columns:
+        formato, ancho = FORMATOS_POR_TIPO.get(tipos_columnas.get(col, 'texto'), FORMATOS_POR_TIPO['texto'])
+        resultado.append((formato, min(max(ancho, len(str(col)) + 2), ANCHO_MAXIMO)))
+    return resultado
+
+
+def escribir_xlsx_write_only(df, destino, nombre_hoja='Sheet1', tipos_columnas=None, filas_por_bloque=FILAS_POR_BLOQUE):
+    """
+    Escribe el DataFrame con openpyxl en modo write_only: las filas se vuelcan
+    a disco a medida que se añaden, por lo que la memoria usada no depende del
+    tamaño del libro.
+    """
+    wb = openpyxl.Workbook(write_only=True)
+    ws = wb.create_sheet(title=nombre_hoja)
+    formatos = _columnas_con_formato(df, tipos_columnas)
+    for idx, (_formato, ancho) in enumerate(formatos, start=1):
+        ws.column_dimensions[openpyxl.utils.get_column_letter(idx)].width = ancho
+
+    encabezado = []
+    for col in df.columns:
+        celda = openpyxl.cell.WriteOnlyCell(ws, value=str(col))
+        celda.font = openpyxl.styles.Font(bold=True)
+        encabezado.append(celda)
+    ws.append(encabezado)
+
+    columnas_formateadas = [idx for idx, (formato, _ancho) in enumerate(formatos) if formato]
+    for valores in iterar_filas(df, filas_por_bloque):
+        for idx in columnas_formateadas:
+            if isinstance(valores[idx], (int, float)) and not isinstance(valores[idx], bool):
+                celda = openpyxl.cell.WriteOnlyCell(ws, value=valores[idx])
+                celda.number_format = formatos[idx][0]
+                valores[idx] = celda
+        ws.append(valores)
+    wb.save(destino)
+
+
+def escribir_xlsx_constant_memory(df, destino, nombre_hoja='Sheet1', tipos_columnas=None):
+    """
+    Escribe el DataFrame con xlsxwriter en modo constant_memory: cada fila se
+    vuelca a disco al pasar a la siguiente, por lo que se escribe fila a fila
+    (pandas escribe por columnas y no es compatible con este modo).
+    """
+    wb = xlsxwriter.Workbook(destino, {
+        'constant_memory': True,
+        'strings_to_numbers': False,
+        'strings_to_formulas': False,
+        'strings_to_urls': False,
+        'default_date_format': FORMATO_FECHA_HORA,
+    })
+    try:
+        ws = wb.add_worksheet(nombre_hoja)
+        formatos_cache = {}
+        for idx, (formato, ancho) in enumerate(_columnas_con_formato(df, tipos_columnas)):
+            if formato and formato not in formatos_cache:
+                formatos_cache[formato] = wb.add_format({'num_format': formato})
+            ws.set_column(idx, idx, ancho, formatos_cache.get(formato))
+
+        ws.write_row(0, 0, [str(col) for col in df.columns], wb.add_format({'bold': True}))
+        for fila_idx, valores in enumerate(iterar_filas(df), start=1):
+            ws.write_row(fila_idx, 0, valores)
+    finally:
+        wb.close()
+
+
+@perfilado.instrumentar('escritura Excel')
+def guardar_excel(df, ruta, tipos_columnas=None, nombre_hoja='Sheet1', motor=None):
+    """
+    Escritor central de los archivos de datos (.xlsx) de la aplicación.
+
+    Usa el motor más rápido disponible, aplica el formato numérico y el ancho
+    de cada columna según `tipos_columnas` y escribe primero en un temporal
+    junto a `ruta` que luego la reemplaza en una sola operación, de modo que
+    un fallo a mitad de escritura nunca deja el Excel original a medio guardar.
+    """
+    motor = motor or MOTOR_EXCEL
+    # Las claves (pólizas, NIT, IDs) se guardan ya normalizadas
+    df = esquemas.normalizar_claves(df)
+    directorio, nombre = os.path.split(ruta)
+    base, extension = os.path.splitext(nombre)
+    ruta_temporal = os.path.join(directorio, f".{base}.{uuid.uuid4().hex[:8]}.tmp{extension}")
+    try:
+        if motor == 'xlsxwriter':
+            escribir_xlsx_constant_memory(df, ruta_temporal, nombre_hoja=nombre_hoja, tipos_columnas=tipos_columnas)
+        else:
+            escribir_xlsx_write_only(df, ruta_temporal, nombre_hoja=nombre_hoja, tipos_columnas=tipos_columnas)
+        os.replace(ruta_temporal, ruta)
+    finally:
+        if os.path.exists(ruta_temporal):
+            os.remove(ruta_temporal)
+
+
+def eliminar_temporales(directorios, antiguedad_s=3600):
+    """
+    Borra los temporales de escritura atómica ('.nombre.xxxx.tmp.xlsx',
+    'archivo.tmp') que quedaron de un proceso que terminó a mitad de un
+    guardado. Solo los de más de `antiguedad_s` segundos, para no tocar un
+    guardado en curso. No entra en subcarpetas. Devuelve cuántos borró.
+    """
+    limite = time.time() - antiguedad_s
+    borrados = 0
+    for directorio in directorios:
+        try:
+            nombres = os.listdir(directorio)
+        except OSError:
+            continue
+        for nombre in nombres:
+            if not (nombre.endswith('.tmp') or (nombre.startswith('.') and '.tmp.' in nombre)):
+                continue
+            ruta = os.path.join(directorio, nombre)
+            try:
+                if os.path.isfile(ruta) and os.path.getmtime(ruta) < limite:
+                    os.remove(ruta)
+                    borrados += 1
+            except OSError:
+                pass
+    return borrados
+
+
+@perfilado.instrumentar('lectura Excel')
+def leer_excel(origen, **kwargs):
+    """
+    Lector central de los archivos de datos (.xlsx) de la aplicación. Las
+    columnas clave se leen como texto y se entregan tal como están guardadas:
+    guardar_excel ya las escribió normalizadas (ver esquemas.py). Los
+    argumentos adicionales se pasan a pd.read_excel.
+    """
+    kwargs['dtype'] = {**esquemas.DTYPE_LECTURA, **(kwargs.get('dtype') or {})}
+    return pd.read_excel(origen, **kwargs)
+
+
+def leer_carga(origen, **kwargs):
+    """
+    Lector de los archivos que llegan de fuera (reportes y plantillas
+    subidos): como leer_excel, con las columnas clave normalizadas al entrar.
+    """
+    return esquemas.normalizar_claves(leer_excel(origen, **kwargs))
+
+
+def contar_filas(ruta):
+    """
+    Filas de datos (sin encabezado) de la primera hoja, leyendo solo la
+    dimensión declarada en el libro. Los libros escritos por openpyxl en modo
+    write_only no la declaran y en ese caso se recorren las filas.
+    """
+    wb = openpyxl.load_workbook(ruta, read_only=True)
+    try:
+        ws = wb.worksheets[0]
+        filas = ws.max_row
+        if filas is None:
+            filas = sum(1 for _fila in ws.iter_rows(values_only=True))
+        return max(filas - 1, 0)
+    finally:
+        wb.close()
+
+
+def leer_y_eliminar(ruta, bytes_por_bloque=BYTES_POR_BLOQUE):
+    """
+    Devuelve el contenido de un archivo temporal por bloques y lo elimina al
+    terminar (o si el cliente cancela la descarga).
+    """
+    try:
+        with open(ruta, 'rb') as f:
+            while True:
+                bloque = f.read(bytes_por_bloque)
+                if not bloque:
+                    break
+                yield bloque
+    finally:
+        if os.path.exists(ruta):
+            os.remove(ruta)
+
+
+def generar_xlsx(df, nombre_hoja='Sheet1', tipos_columnas=None):
+    """
+    Genera un .xlsx con el motor de escritura en memoria constante sobre un
+    archivo temporal en disco y lo devuelve por bloques, sin mantener el libro
+    completo en memoria.
+    """
+    fd, ruta_temporal = tempfile.mkstemp(suffix='.xlsx')
+    os.close(fd)
+    try:
+        if MOTOR_EXCEL == 'xlsxwriter':
+            escribir_xlsx_constant_memory(df, ruta_temporal, nombre_hoja=nombre_hoja, tipos_columnas=tipos_columnas)
+        else:
+            escribir_xlsx_write_only(df, ruta_temporal, nombre_hoja=nombre_hoja, tipos_columnas=tipos_columnas)
+    except Exception:
+        os.remove(ruta_temporal)
+        raise
+    return leer_y_eliminar(ruta_temporal)
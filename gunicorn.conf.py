@@ -0,0 +1,92 @@
+"""
+Configuración de gunicorn para producción:
+    gunicorn -c gunicorn.conf.py
+
+La aplicación se crea con la fábrica de app.py (app:create_app()).
+
+Modo preload (por defecto): la app se importa, se inicializa y se
+precalienta (app.precalentar_datos: pandas, listas de configuración,
+instantáneas de cartera, vencimientos y remisiones, índice de cobros) una
+sola vez en el proceso maestro, en create_app, antes de crear el primer
+worker (when_ready solo congela el recolector). Los workers se crean con
+fork y comparten esas páginas de memoria (copy-on-write) en lugar de cargar
+y guardar cada uno lo mismo. El maestro no vuelve a leer archivos al crear o reemplazar un worker: cada worker, al
+arrancar, pone al día en segundo plano lo que haya cambiado desde entonces
+(tarea '@arranque' del programador) y relee por su cuenta un archivo cuando
+su firma cambia. Con GUNICORN_MAX_REQUESTS los workers se reciclan cada
+cierto número de peticiones y vuelven a compartir la copia del maestro.
+GUNICORN_PRELOAD=0 vuelve al modo en que cada worker carga la app (y la
+precalienta en create_app antes de atender peticiones).
+
+El programador de tareas (programador.py) corre en un hilo de cada worker,
+creado después del fork; las tareas que tocan archivos compartidos las
+ejecuta solo el worker líder (lock de archivo en la carpeta de datos).
+
+También prepara la carpeta compartida de métricas de Prometheus para que
+/metrics sume los contadores de todos los workers (ver metricas.py).
+Benchmark de memoria: python -m benchmarks.bench_memoria
+"""
+import gc
+import os
+import shutil
+import tempfile
+
+wsgi_app = 'app:create_app()'
+bind = os.environ.get('GUNICORN_BIND', '0.0.0.0:5000')
+workers = int(os.environ.get('GUNICORN_WORKERS', '4'))
+preload_app = os.environ.get('GUNICORN_PRELOAD', '1') != '0'
+max_requests = int(os.environ.get('GUNICORN_MAX_REQUESTS', '0'))
+max_requests_jitter = max_requests // 10
+
+# Debe definirse antes de que la app importe prometheus_client, que con
+# preload ocurre en el maestro al cargar esta configuración
+os.environ.setdefault('PROMETHEUS_MULTIPROC_DIR', os.path.join(tempfile.gettempdir(), 'seguros_uib_metricas'))
+
+
+def _preparar_carpeta_metricas():
+    # Los archivos de una ejecución anterior sumarían contadores viejos. Solo
+    # una vez por maestro: gunicorn vuelve a leer este archivo al recibir HUP.
+    if os.environ.get('_SEGUROS_UIB_METRICAS_PREPARADAS') == '1':
+        return
+    carpeta = os.environ['PROMETHEUS_MULTIPROC_DIR']
+    shutil.rmtree(carpeta, ignore_errors=True)
+    os.makedirs(carpeta, exist_ok=True)
+    os.environ['_SEGUROS_UIB_METRICAS_PREPARADAS'] = '1'
+
+
+_preparar_carpeta_metricas()
+
+if preload_app:
+    # Como recomienda la documentación del módulo gc para servidores con fork:
+    # sin recolecciones en el maestro, gc.freeze() antes de los forks y el
+    # recolector activo de nuevo en los workers. Así el recolector de los
+    # workers no recorre (ni escribe en) los objetos heredados del maestro.
+    gc.disable()
+
+
+def when_ready(server):
+    if not preload_app:
+        return
+    # create_app ya precalentó los datos al cargar la app en el maestro. Una
+    # sola recolección antes de congelar: lo que quede lo heredan todos los workers
+    gc.collect()
+    gc.freeze()
+
+
+def pre_fork(server, worker):
+    if preload_app:
+        # Lo que el maestro haya creado después de when_ready (poco) también queda congelado
+        gc.freeze()
+
+
+def post_fork(server, worker):
+    if preload_app:
+        gc.enable()
+        # El hilo del programador de tareas nace en el worker, no en el maestro
+        from programador import programador
+        programador.iniciar()
+
+
+def child_exit(server, worker):
+    from prometheus_client import multiprocess
+    multiprocess.mark_process_dead(worker.pid)
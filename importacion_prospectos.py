@@ -0,0 +1,239 @@
+"""
+Importación masiva de prospectos desde un Excel (.xlsx/.xls) o CSV.
+
+Todas las filas se validan por columnas (una operación por regla, no una por
+fila) contra las columnas de prospectos.xlsx y las listas de config/
+(responsables, estados, ramos, aseguradoras y vendedores para el TPP); la
+Comision $ del lote se calcula con comisiones.comision_prospecto, con el
+descuento del TPP. Si el TPP no trae porcentaje se usa la comisión del
+vendedor en config/vendedores.json, como en el formulario.
+
+validar() devuelve los prospectos listos para guardar y el reporte de
+errores por fila (número de fila del archivo, columna, valor y motivo); la
+ruta /prospectos/importar guarda el lote completo en una sola escritura de
+prospectos.xlsx, o solo las filas válidas si así se pide.
+"""
+import uuid
+from datetime import datetime
+
+import comisiones
+import esquemas
+import excel_io
+from carga_diferida import modulo_diferido
+
+pd = modulo_diferido('pandas')
+np = modulo_diferido('numpy')
+
+EXTENSIONES = ('.xlsx', '.xls', '.csv')
+MAXIMO_FILAS = 5000
+LIMITE_ERRORES = 1000
+# Columnas que no vienen en el archivo: se generan al importar
+GENERADAS = ('ID_PROSPECTO', 'Comision $', 'Fecha Creacion')
+# Las mismas que pide el formulario de prospectos
+OBLIGATORIAS = ('Nombre Cliente', 'Responsable Tecnico', 'Responsable Comercial', 'Fecha de Cotizacion', 'Prima',
+                'Comision %', 'Estado')
+# Columna -> lista de config/ con los valores permitidos
+LISTAS = {
+    'Responsable Tecnico': 'responsable_tecnico', 'Responsable Comercial': 'responsable_comercial',
+    'Estado': 'estado_prospecto', 'Ramo': 'ramos', 'Aseguradora': 'aseguradoras', 'Nombre_TPP': 'vendedores',
+}
+FECHAS = ('Fecha de Cotizacion', 'Fecha inicio poliza')
+PORCENTAJES = ('Comision %', 'Porcentaje_comision_TPP')
+SI = ('si', 'sí')
+NO = ('', 'no')
+
+
+def _clave(texto):
+    """Texto comparable: sin espacios de más y sin distinguir mayúsculas."""
+    return ' '.join(str(texto).split()).casefold()
+
+
+def _claves(serie):
+    return serie.str.replace(r'\s+', ' ', regex=True).str.strip().str.casefold()
+
+
+def _texto(serie):
+    return serie.astype(object).where(serie.notna(), '').astype(str).str.strip()
+
+
+def _numero(serie):
+    """
+    Números de una columna: valores numéricos o texto con $, puntos de miles
+    y coma decimal ('$1.500.000', '12,5'). NaN si está vacío o no es un número.
+    """
+    if pd.api.types.is_numeric_dtype(serie):
+        return serie.astype(float)
+    texto = _texto(serie).str.replace('$', '', regex=False).str.replace(' ', '', regex=False)
+    miles = texto.str.fullmatch(r'-?\d{1,3}(\.\d{3})+(,\d+)?')
+    texto = texto.where(~miles, texto.str.replace('.', '', regex=False)).str.replace(',', '.', regex=False)
+    return pd.to_numeric(texto.where(texto != ''), errors='coerce')
+
+
+def _fecha(serie):
+    """Fechas como texto AAAA-MM-DD (fechas de Excel, AAAA-MM-DD o dd/mm/AAAA); NaT si no se reconoce."""
+    fecha = pd.to_datetime(serie.astype(object), errors='coerce', format='ISO8601')
+    return fecha.fillna(pd.to_datetime(_texto(serie), errors='coerce', format='%d/%m/%Y'))
+
+
+def leer_archivo(archivo):
+    """DataFrame con el contenido del archivo subido (Excel o CSV con , o ; como separador)."""
+    if archivo.filename.lower().endswith('.csv'):
+        return pd.read_csv(archivo, dtype=str, sep=None, engine='python', encoding='utf-8-sig', keep_default_na=False)
+    return excel_io.leer_carga(archivo)
+
+
+class _Reporte:
+    """Errores por fila del archivo; `invalidas` marca las filas con al menos uno."""
+
+    def __init__(self, filas):
+        self._reglas = []
+        self.total_errores = 0
+        self.invalidas = np.zeros(filas, dtype=bool)
+
+    def agregar(self, mascara, columna, valores, mensaje):
+        mascara = np.asarray(mascara, dtype=bool)
+        self.invalidas |= mascara
+        posiciones = np.flatnonzero(mascara)
+        self.total_errores += len(posiciones)
+        if len(posiciones):
+            self._reglas.append((posiciones, columna, valores, mensaje))
+
+    def errores(self):
+        """Los primeros LIMITE_ERRORES errores, en el orden de las filas del archivo."""
+        if not self._reglas:
+            return []
+        posiciones = np.concatenate([regla[0] for regla in self._reglas])
+        reglas = np.concatenate([np.full(len(regla[0]), i) for i, regla in enumerate(self._reglas)])
+        errores = []
+        for i in np.lexsort((reglas, posiciones))[:LIMITE_ERRORES]:
+            posicion = posiciones[i]
+            _posiciones, columna, valores, mensaje = self._reglas[reglas[i]]
+            valor = valores.iat[posicion]
+            # Fila 1 del archivo: encabezados
+            errores.append({'fila': int(posicion) + 2, 'columna': columna,
+                            'valor': '' if pd.isna(valor) else str(valor), 'error': mensaje})
+        return errores
+
+
+def validar(df, columnas, listas, tasas_vendedores):
+    """
+    Valida el archivo leído y calcula la Comision $. `columnas` son las de
+    prospectos.xlsx (ORDEN_COLUMNAS_PROSPECTOS), `listas` {nombre de lista:
+    valores} y `tasas_vendedores` {vendedor: comisión %}.
+
+    Devuelve un diccionario con 'prospectos' (DataFrame de las filas válidas
+    con las columnas de prospectos.xlsx, sin ID ni fecha de creación),
+    'errores' (los primeros LIMITE_ERRORES), 'total_errores', 'filas',
+    'filas_validas', 'faltantes' (columnas que no trae el archivo) e
+    'ignoradas' (columnas que no son de prospectos). Con columnas faltantes no
+    se valida ninguna fila.
+    """
+    esperadas = [columna for columna in columnas if columna not in GENERADAS]
+    por_clave = {_clave(columna): columna for columna in esperadas}
+    df = df.rename(columns=lambda columna: por_clave.get(_clave(columna), columna))
+    df = df.dropna(how='all').reset_index(drop=True)
+    resultado = {
+        'filas': len(df),
+        'faltantes': [columna for columna in OBLIGATORIAS if columna not in df.columns],
+        'ignoradas': [str(columna) for columna in df.columns if columna not in esperadas],
+        'errores': [], 'total_errores': 0, 'filas_validas': 0, 'prospectos': None,
+    }
+    if resultado['faltantes'] or df.empty:
+        return resultado
+    for columna in esperadas:
+        if columna not in df.columns:
+            df[columna] = ''
+
+    reporte = _Reporte(len(df))
+    salida = pd.DataFrame(index=df.index)
+    textos = {columna: _texto(df[columna]) for columna in esperadas if columna not in FECHAS + PORCENTAJES + ('Prima',)}
+
+    for columna in OBLIGATORIAS:
+        if columna in textos:
+            reporte.agregar(textos[columna] == '', columna, df[columna], 'Valor obligatorio.')
+
+    marca = _claves(textos['es_TPP'])
+    es_tpp = marca.isin(SI).to_numpy()
+    reporte.agregar(~marca.isin(SI + NO), 'es_TPP', df['es_TPP'], "Use 'si' o 'no'.")
+
+    # Valores de las listas de configuración, escritos como en la lista (el TPP solo si es_TPP es si)
+    for columna, nombre_lista in LISTAS.items():
+        permitidos = {_clave(valor): valor for valor in listas.get(nombre_lista, [])}
+        canonicos = _claves(textos[columna]).map(permitidos)
+        invalidos = (textos[columna] != '') & canonicos.isna()
+        if columna == 'Nombre_TPP':
+            invalidos &= es_tpp
+        reporte.agregar(invalidos, columna, df[columna], f"No está en la lista '{nombre_lista}'.")
+        textos[columna] = canonicos.fillna(textos[columna])
+
+    for columna in FECHAS:
+        fecha = _fecha(df[columna])
+        vacia = _texto(df[columna]) == ''
+        if columna in OBLIGATORIAS:
+            reporte.agregar(vacia, columna, df[columna], 'Valor obligatorio.')
+        reporte.agregar(~vacia & fecha.isna(), columna, df[columna], 'Fecha inválida (use AAAA-MM-DD o dd/mm/AAAA).')
+        salida[columna] = fecha.dt.strftime('%Y-%m-%d').fillna('')
+
+    prima = _numero(df['Prima'])
+    reporte.agregar(prima.isna(), 'Prima', df['Prima'], 'La prima debe ser un número.')
+    reporte.agregar(prima < 0, 'Prima', df['Prima'], 'La prima no puede ser negativa.')
+    porcentaje = _numero(df['Comision %'])
+    reporte.agregar(porcentaje.isna(), 'Comision %', df['Comision %'], 'La comisión % debe ser un número.')
+    reporte.agregar((porcentaje < 0) | (porcentaje > 100), 'Comision %', df['Comision %'],
+                    'La comisión % debe estar entre 0 y 100.')
+
+    # TPP: sin porcentaje se toma la comisión del vendedor
+    reporte.agregar(es_tpp & (textos['Nombre_TPP'] == ''), 'Nombre_TPP', df['Nombre_TPP'],
+                    'Obligatorio cuando es_TPP es si.')
+    porcentaje_tpp = _numero(df['Porcentaje_comision_TPP'])
+    sin_porcentaje = _texto(df['Porcentaje_comision_TPP']) == ''
+    porcentaje_tpp = porcentaje_tpp.fillna(textos['Nombre_TPP'].map(tasas_vendedores).where(sin_porcentaje))
+    reporte.agregar(es_tpp & porcentaje_tpp.isna(), 'Porcentaje_comision_TPP', df['Porcentaje_comision_TPP'],
+                    'El porcentaje TPP debe ser un número.')
+    reporte.agregar(es_tpp & ((porcentaje_tpp < 0) | (porcentaje_tpp > 100)), 'Porcentaje_comision_TPP',
+                    df['Porcentaje_comision_TPP'], 'El porcentaje TPP debe estar entre 0 y 100.')
+    porcentaje_tpp = porcentaje_tpp.where(es_tpp)
+
+    for columna, textos_columna in textos.items():
+        salida[columna] = textos_columna
+    salida['es_TPP'] = np.where(es_tpp, 'si', 'no')
+    salida['Nombre_TPP'] = salida['Nombre_TPP'].where(es_tpp, '')
+    salida['Prima'] = prima
+    salida['Comision %'] = porcentaje
+    salida['Porcentaje_comision_TPP'] = porcentaje_tpp
+    # La misma fila repetida en el archivo
+    repetida = salida.astype(str).duplicated(keep='first').to_numpy()
+    reporte.agregar(repetida, 'Nombre Cliente', df['Nombre Cliente'], 'Fila repetida en el archivo.')
+
+    salida['Comision $'] = comisiones.comision_prospecto(prima.fillna(0.0), porcentaje.fillna(0.0), es_tpp,
+                                                         porcentaje_tpp.fillna(0.0))
+    validas = ~reporte.invalidas
+    resultado.update({
+        'prospectos': salida.loc[validas, [columna for columna in columnas if columna in salida.columns]],
+        'errores': reporte.errores(),
+        'total_errores': reporte.total_errores,
+        'filas_validas': int(validas.sum()),
+    })
+    return resultado
+
+
+def agregar_prospectos(existentes, nuevos, columnas):
+    """
+    Prospectos existentes más los nuevos, con ID_PROSPECTO (8 caracteres,
+    sin repetir los existentes) y Fecha Creacion, en el orden de `columnas`.
+    """
+    nuevos = nuevos.copy()
+    usados = set(existentes['ID_PROSPECTO'].astype(str)) if 'ID_PROSPECTO' in existentes.columns else set()
+    identificadores = []
+    while len(identificadores) < len(nuevos):
+        identificador = uuid.uuid4().hex[:8].upper()
+        if identificador not in usados:
+            usados.add(identificador)
+            identificadores.append(identificador)
+    nuevos['ID_PROSPECTO'] = identificadores
+    nuevos['Fecha Creacion'] = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+    if existentes.empty:
+        # concat con un DataFrame vacío cambia de comportamiento en pandas (FutureWarning)
+        return nuevos.reset_index(drop=True).reindex(columns=columnas)
+    existentes = esquemas.sin_categorias(existentes)
+    return pd.concat([existentes, nuevos], ignore_index=True).reindex(columns=columnas)
@@ -0,0 +1,114 @@
+"""
+Índice por número de póliza de remisiones (poliza y old_policy_number),
+vencimientos, cartera (NÚMERO PÓLIZA) y cobros (N_Poliza).
+
+El número se normaliza una sola vez al indexar (normalizar_poliza): sin
+espacios, en mayúsculas y sin el '.0' que agrega Excel cuando la columna se
+lee como número. Cada origen se indexa sobre su instantánea y el índice se
+rehace cuando el archivo cambia (toda escritura o carga reemplaza el
+archivo); cobros usa el índice por póliza de cobros_index, que se actualiza
+con cada escritura. Buscar una póliza es una consulta a un diccionario en
+lugar de recorrer y comparar el archivo completo.
+"""
+import re
+
+from carga_diferida import modulo_diferido
+
+pd = modulo_diferido('pandas')
+
+VALORES_VACIOS = {'', 'NAN', 'NONE', 'N/A', 'NAT'}
+_ENTERO_CON_DECIMALES_CERO = re.compile(r'^(\d+)\.0+$')
+
+
+def normalizar_poliza(valor):
+    """Clave canónica de un número de póliza ('' si no hay número)."""
+    if valor is None:
+        return ''
+    if isinstance(valor, float):
+        if valor != valor:  # NaN
+            return ''
+        if valor.is_integer():
+            return str(int(valor))
+    texto = str(valor).strip().upper()
+    if texto in VALORES_VACIOS:
+        return ''
+    coincidencia = _ENTERO_CON_DECIMALES_CERO.match(texto)
+    return coincidencia.group(1) if coincidencia else texto
+
+
+def registros_json(df):
+    """Filas de un DataFrame como dicts serializables (fechas AAAA-MM-DD, vacíos como None)."""
+    df = df.copy()
+    for columna in df.columns:
+        if pd.api.types.is_datetime64_any_dtype(df[columna]):
+            df[columna] = df[columna].dt.strftime('%Y-%m-%d')
+    return df.astype(object).where(df.notna(), None).to_dict('records')
+
+
+class IndicePolizas:
+    def __init__(self, indice_cobros=None):
+        self.indice_cobros = indice_cobros
+        self._origenes = {}
+
+    def agregar(self, nombre, instantanea, columnas):
+        """Indexa la instantánea `nombre` por las columnas de número de póliza indicadas."""
+        self._origenes[nombre] = (instantanea, tuple(columnas))
+
+    @property
+    def origenes(self):
+        return list(self._origenes) + (['cobros'] if self.indice_cobros is not None else [])
+
+    def _agrupar(self, origen):
+        instantanea, columnas = self._origenes[origen]
+        return instantanea.agrupar(columnas, normalizar_poliza)
+
+    def posiciones(self, origen, poliza):
+        """Posiciones de las filas de la póliza en el archivo del origen."""
+        _, grupos = self._agrupar(origen)
+        return list(grupos.get(normalizar_poliza(poliza), ()))
+
+    def filas(self, origen, polizas):
+        """
+        Copia de las filas de varias pólizas (en el orden pedido) y la lista
+        de pólizas sin filas.
+        """
+        df, grupos = self._agrupar(origen)
+        posiciones, faltantes = [], []
+        for poliza in polizas:
+            encontradas = grupos.get(normalizar_poliza(poliza))
+            if encontradas:
+                posiciones.extend(encontradas)
+            else:
+                faltantes.append(poliza)
+        return df.iloc[posiciones].copy(), faltantes
+
+    def para_actualizar(self, origen, poliza):
+        """
+        (copia completa del DataFrame, posiciones de la póliza) tomadas de la
+        misma lectura, para modificar esas filas y guardar el archivo.
+        """
+        df, grupos = self._agrupar(origen)
+        return df.copy(), list(grupos.get(normalizar_poliza(poliza), ()))
+
+    def precalentar(self):
+        """Arma los índices de los orígenes cuyos archivos existen."""
+        for origen in self._origenes:
+            try:
+                self._agrupar(origen)
+            except FileNotFoundError:
+                pass
+
+    def buscar(self, poliza):
+        """{origen: [registros]} de la póliza en todos los orígenes (los archivos que no existen se omiten)."""
+        resultado = {}
+        for origen in self._origenes:
+            try:
+                filas, _ = self.filas(origen, [poliza])
+            except FileNotFoundError:
+                filas = None
+            resultado[origen] = registros_json(filas) if filas is not None else []
+        if self.indice_cobros is not None:
+            self.indice_cobros.sincronizar()
+            cuotas = [self.indice_cobros.obtener(id_cobro) for id_cobro in self.indice_cobros.ids_por_poliza(poliza)]
+            resultado['cobros'] = registros_json(pd.DataFrame([c for c in cuotas if c is not None]))
+        return resultado
@@ -0,0 +1,198 @@
+"""
+Copias en memoria de los Excel que las páginas leen en casi todas las
+peticiones (cartera y vencimientos procesados, remisiones).
+
+Cada instantánea guarda el DataFrame leído junto con la firma del archivo
+(mtime, tamaño) y solo relee el archivo cuando la firma cambia, ya sea por
+una escritura de este worker o de otro. vista() devuelve una copia diferida
+del DataFrame: con el copy-on-write de pandas (activado en create_app) no
+copia datos y comparte la memoria de la instantánea hasta que quien la
+recibe modifica algo; entonces solo se copia lo modificado y la instantánea
+queda intacta. obtener() devuelve una copia completa, para las rutas que
+editan filas antes de guardar el archivo.
+
+Con gunicorn en modo preload (gunicorn.conf.py) las instantáneas se cargan
+una vez en el proceso maestro antes de crear los workers, que las comparten
+en memoria (copy-on-write) en lugar de leer y guardar cada uno la suya; por
+eso las lecturas usan vista() y no una copia por petición.
+
+Si se indica la entidad (`esquema`), al leer el archivo se aplican los tipos
+declarados en esquemas.ESQUEMAS (categorías para los textos repetidos).
+"""
+import os
+import threading
+
+import esquemas
+import excel_io
+import metricas
+from carga_diferida import modulo_diferido
+
+pd = modulo_diferido('pandas')
+
+
+class InstantaneaExcel:
+    """DataFrame de un archivo Excel, releído solo cuando el archivo cambia."""
+
+    def __init__(self, nombre, ruta_archivo, esquema=None, **opciones_lectura):
+        self.nombre = nombre
+        self.ruta_archivo = ruta_archivo
+        self.esquema = esquema
+        self.opciones_lectura = opciones_lectura
+        self._lock = threading.Lock()
+        self._firma = None
+        self._df = None
+        self._indices = {}
+
+    def firma_archivo(self):
+        """Devuelve (mtime_ns, tamaño) del archivo, o None si no existe."""
+        try:
+            st = os.stat(self.ruta_archivo)
+        except OSError:
+            return None
+        return (st.st_mtime_ns, st.st_size)
+
+    def sincronizar(self):
+        """
+        Relee el archivo si su firma cambió desde la última lectura.
+        Devuelve True si la instantánea se (re)cargó o se descartó.
+        """
+        with self._lock:
+            firma = self.firma_archivo()
+            metricas.registrar_cache(f'instantanea_{self.nombre}', firma is not None and firma == self._firma)
+            if firma == self._firma:
+                return False
+            self._df = self._leer() if firma is not None else None
+            self._firma = firma
+            self._indices = {}
+            return True
+
+    def _leer(self):
+        df = excel_io.leer_excel(self.ruta_archivo, **self.opciones_lectura)
+        return esquemas.aplicar_esquema(df, self.esquema) if self.esquema else df
+
+    def vista(self):
+        """
+        DataFrame actual del archivo como copia diferida (copy-on-write): leerlo
+        no copia nada y modificarlo no altera la instantánea. Lanza
+        FileNotFoundError si el archivo no existe, igual que leerlo directamente.
+        """
+        self.sincronizar()
+        with self._lock:
+            df = self._df
+        if df is None:
+            raise FileNotFoundError(self.ruta_archivo)
+        return df.copy(deep=False)
+
+    def obtener(self):
+        """Copia del DataFrame actual del archivo, para modificarla (ver vista())."""
+        return self.vista().copy()
+
+    def buscar(self, columna, valores):
+        """
+        Filas cuyo valor en `columna` está en `valores`, en el orden pedido,
+        y la lista de valores sin fila. Usa un índice valor -> posición que se
+        construye una vez por lectura del archivo y solo copia las filas
+        encontradas. Si un valor se repite en el archivo gana la última fila.
+        """
+        self.sincronizar()
+        with self._lock:
+            df = self._df
+            if df is None:
+                raise FileNotFoundError(self.ruta_archivo)
+            indice = self._indices.get(columna)
+            if indice is None:
+                indice = {valor: posicion for posicion, valor in enumerate(df[columna].tolist())}
+                self._indices[columna] = indice
+        posiciones, faltantes = [], []
+        for valor in valores:
+            posicion = indice.get(valor)
+            if posicion is None:
+                faltantes.append(valor)
+            else:
+                posiciones.append(posicion)
+        return df.iloc[posiciones].copy(), faltantes
+
+    def agrupar(self, columnas, normalizar):
+        """
+        (DataFrame como en vista(), {clave: [posiciones]}) con la clave
+        `normalizar(valor)` de cada fila en cualquiera de `columnas` (las que
+        existan); las claves vacías no se indexan. El índice se arma una vez
+        por lectura del archivo.
+        """
+        self.sincronizar()
+        with self._lock:
+            df = self._df
+            if df is None:
+                raise FileNotFoundError(self.ruta_archivo)
+            llave = (tuple(columnas), normalizar)
+            grupos = self._indices.get(llave)
+            if grupos is None:
+                grupos = {}
+                for columna in columnas:
+                    if columna not in df.columns:
+                        continue
+                    for posicion, valor in enumerate(df[columna].tolist()):
+                        clave = normalizar(valor)
+                        if clave:
+                            grupos.setdefault(clave, []).append(posicion)
+                if len(columnas) > 1:
+                    # Una fila con la misma clave en dos columnas se cuenta una vez
+                    grupos = {clave: sorted(set(posiciones)) for clave, posiciones in grupos.items()}
+                self._indices[llave] = grupos
+        return df.copy(deep=False), grupos
+
+    def invalidar(self):
+        with self._lock:
+            self._firma = None
+            self._df = None
+            self._indices = {}
+
+
+class AportesPorFila:
+    """
+    Aporte de cada fila de una instantánea a un acumulado (totales, tablas
+    mensuales), para mantenerlo de forma incremental cuando cambia el archivo.
+
+    Cada fila se identifica por el valor de su columna clave (más su número
+    de aparición, por si se repite) y lleva una huella (hash) de sus
+    columnas. Al actualizar, solo las filas nuevas, modificadas o eliminadas
+    restan su aporte anterior y suman el nuevo; el resto no se recalcula.
+    """
+
+    def __init__(self):
+        self.filas = {}   # clave -> (huella, aporte)
+        self.orden = {}   # clave -> posición en el archivo
+
+    def limpiar(self):
+        self.filas = {}
+        self.orden = {}
+
+    def actualizar(self, df, columna_clave, calcular, sumar, retirar):
+        """
+        Aplica los cambios de `df` (solo las columnas que importan al
+        acumulado). calcular(df_filas) devuelve el aporte de cada fila;
+        sumar(clave, aporte) y retirar(clave, aporte) lo agregan y lo quitan.
+        Devuelve el número de filas recalculadas o eliminadas.
+        """
+        df = df.reset_index(drop=True)
+        valores = df[columna_clave].astype(str)
+        claves = (valores + '#' + df.groupby(valores, sort=False).cumcount().astype(str)).tolist()
+        huellas = pd.util.hash_pandas_object(df, index=False).tolist()
+
+        previas = self.filas
+        cambiadas = [posicion for posicion, (clave, huella) in enumerate(zip(claves, huellas))
+                     if previas.get(clave, (None,))[0] != huella]
+        vigentes = set(claves)
+        eliminadas = [clave for clave in previas if clave not in vigentes]
+        for clave in eliminadas:
+            retirar(clave, previas.pop(clave)[1])
+        if cambiadas:
+            for posicion, aporte in zip(cambiadas, calcular(df.iloc[cambiadas])):
+                clave = claves[posicion]
+                anterior = previas.get(clave)
+                if anterior is not None:
+                    retirar(clave, anterior[1])
+                previas[clave] = (huellas[posicion], aporte)
+                sumar(clave, aporte)
+        self.orden = {clave: posicion for posicion, clave in enumerate(claves)}
+        return len(cambiadas) + len(eliminadas)
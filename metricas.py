@@ -0,0 +1,232 @@
+"""
+Métricas de la aplicación en formato Prometheus, expuestas en /metrics.
+
+Con varios workers de gunicorn cada proceso tiene sus propios contadores:
+para que se sumen correctamente hay que definir PROMETHEUS_MULTIPROC_DIR
+(una carpeta vacía compartida) antes de arrancar. gunicorn.conf.py la
+prepara y marca los workers que terminan. Sin esa variable (python app.py)
+se usa el registro normal de un solo proceso.
+
+/metrics pide autenticación: el scraper de Prometheus envía
+"Authorization: Bearer <METRICS_TOKEN>" (bearer_token en la configuración del
+job) y un administrador con sesión iniciada puede abrirla desde el navegador.
+Para dejarla sin autenticación hay que definir METRICS_PUBLICO=1 a propósito.
+
+Las tasas de acierto de las caches se calculan en Prometheus a partir de
+uib_cache_consultas_total, p. ej.:
+    sum by (cache) (rate(uib_cache_consultas_total{resultado="acierto"}[5m]))
+      / sum by (cache) (rate(uib_cache_consultas_total[5m]))
+"""
+import hmac
+import os
+import threading
+import time
+
+from flask import Response, abort, g, request, session
+from prometheus_client import (CONTENT_TYPE_LATEST, REGISTRY, CollectorRegistry, Counter, Histogram,
+                               generate_latest, multiprocess)
+from prometheus_client.core import GaugeMetricFamily
+
+import excel_io
+
+MULTIPROCESO = bool(os.environ.get('PROMETHEUS_MULTIPROC_DIR'))
+
+# /metrics expone nombres de endpoints, tamaños de archivos y locks: exige la
+# cabecera "Authorization: Bearer <METRICS_TOKEN>" o una sesión de administrador.
+# METRICS_PUBLICO=1 la deja abierta (solo si el puerto no es accesible desde fuera).
+TOKEN_METRICAS = os.environ.get('METRICS_TOKEN', '')
+METRICAS_PUBLICAS = os.environ.get('METRICS_PUBLICO', '0') == '1'
+
+BUCKETS_PETICION = (0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+BUCKETS_CARGA_MAESTRA = (1, 2.5, 5, 10, 30, 60, 120, 300, 600)
+BUCKETS_LOCK = (0.0001, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1, 5)
+BUCKETS_TAREA = (0.1, 0.5, 1, 5, 10, 30, 60, 300, 900)
+
+PETICIONES = Counter(
+    'uib_http_peticiones_total', 'Peticiones HTTP atendidas.',
+    ['endpoint', 'metodo', 'estado'])
+DURACION_PETICION = Histogram(
+    'uib_http_duracion_segundos', 'Duración de las peticiones HTTP.',
+    ['endpoint'], buckets=BUCKETS_PETICION)
+DURACION_CARGA_MAESTRA = Histogram(
+    'uib_carga_maestra_duracion_segundos', 'Duración del procesamiento del reporte maestro.',
+    buckets=BUCKETS_CARGA_MAESTRA)
+FILAS_CARGA_MAESTRA = Counter(
+    'uib_carga_maestra_filas_total', 'Filas procesadas en las cargas del reporte maestro.',
+    ['modulo', 'tipo'])
+ESPERA_LOCK = Histogram(
+    'uib_lock_espera_segundos', 'Tiempo de espera para adquirir los locks internos.',
+    ['lock'], buckets=BUCKETS_LOCK)
+CONSULTAS_CACHE = Counter(
+    'uib_cache_consultas_total', 'Consultas a las caches en memoria, por resultado.',
+    ['cache', 'resultado'])
+CORREOS = Counter(
+    'uib_correos_total', 'Correos de la bandeja de salida procesados, por resultado.',
+    ['resultado'])
+TAREAS = Counter(
+    'uib_tareas_programadas_total', 'Ejecuciones de las tareas del programador, por resultado.',
+    ['tarea', 'resultado'])
+DURACION_TAREA = Histogram(
+    'uib_tarea_programada_duracion_segundos', 'Duración de las tareas del programador.',
+    ['tarea'], buckets=BUCKETS_TAREA)
+
+# Endpoints que no se cuentan como tráfico de la aplicación
+ENDPOINTS_EXCLUIDOS = {'static', 'metricas'}
+
+
+def registrar_cache(cache, acierto):
+    """Cuenta una consulta a una cache: acierto si se sirvió sin recalcular."""
+    CONSULTAS_CACHE.labels(cache, 'acierto' if acierto else 'fallo').inc()
+
+
+def registrar_correo(resultado):
+    """Cuenta un correo de la bandeja de salida: 'enviado' o 'fallido'."""
+    CORREOS.labels(resultado).inc()
+
+
+def registrar_tarea(tarea, resultado, segundos):
+    """Cuenta una ejecución de una tarea del programador: 'ok' o 'error'."""
+    TAREAS.labels(tarea, resultado).inc()
+    DURACION_TAREA.labels(tarea).observe(segundos)
+
+
+def registrar_carga_maestra(segundos, filas_leidas):
+    DURACION_CARGA_MAESTRA.observe(segundos)
+    FILAS_CARGA_MAESTRA.labels('maestro', 'leidas').inc(filas_leidas)
+
+
+def registrar_filas_carga(modulo, nuevas, actualizadas):
+    FILAS_CARGA_MAESTRA.labels(modulo, 'nuevas').inc(nuevas)
+    FILAS_CARGA_MAESTRA.labels(modulo, 'actualizadas').inc(actualizadas)
+
+
+class LockMedido:
+    """
+    threading.RLock que registra en uib_lock_espera_segundos el tiempo que
+    cada hilo espera para adquirirlo. Se usa igual que un RLock.
+    """
+
+    def __init__(self, nombre):
+        self._lock = threading.RLock()
+        self._espera = ESPERA_LOCK.labels(nombre)
+
+    def acquire(self, blocking=True, timeout=-1):
+        if self._lock.acquire(blocking=False):
+            self._espera.observe(0)
+            return True
+        if not blocking:
+            return False
+        inicio = time.perf_counter()
+        adquirido = self._lock.acquire(timeout=timeout)
+        self._espera.observe(time.perf_counter() - inicio)
+        return adquirido
+
+    def release(self):
+        self._lock.release()
+
+    def __enter__(self):
+        self.acquire()
+        return self
+
+    def __exit__(self, *exc):
+        self.release()
+
+
+class ColectorArchivos:
+    """
+    Filas y tamaño de los archivos de datos, calculados al momento de cada
+    consulta a /metrics. Las filas se cuentan solo cuando cambia el archivo.
+    """
+
+    def __init__(self, archivos):
+        self.archivos = archivos
+        self._lock = threading.Lock()
+        self._filas = {}
+
+    def _contar_filas(self, ruta, firma):
+        with self._lock:
+            previo = self._filas.get(ruta)
+            registrar_cache('filas_archivos', previo is not None and previo[0] == firma)
+            if previo is None or previo[0] != firma:
+                self._filas[ruta] = (firma, excel_io.contar_filas(ruta))
+            return self._filas[ruta][1]
+
+    def _familias(self):
+        return (GaugeMetricFamily('uib_archivo_datos_filas', 'Filas de datos de cada archivo Excel.', labels=['archivo']),
+                GaugeMetricFamily('uib_archivo_datos_bytes', 'Tamaño en bytes de cada archivo Excel.', labels=['archivo']))
+
+    def describe(self):
+        # Evita que el registro llame a collect() (y lea los archivos) al registrarse
+        return list(self._familias())
+
+    def collect(self):
+        filas, tamano = self._familias()
+        for nombre, ruta in self.archivos.items():
+            try:
+                st = os.stat(ruta)
+            except OSError:
+                continue
+            tamano.add_metric([nombre], st.st_size)
+            try:
+                filas.add_metric([nombre], self._contar_filas(ruta, (st.st_mtime_ns, st.st_size)))
+            except Exception as e:
+                print(f"Error al contar filas de {ruta}: {e}")
+        yield filas
+        yield tamano
+
+
+class Metricas:
+    """Registra las métricas de cada petición y expone /metrics en la app."""
+
+    def __init__(self):
+        self._colector_archivos = None
+
+    def init_app(self, app, archivos_datos):
+        # En modo de un solo proceso el colector se registra una vez en el registro global
+        if self._colector_archivos is None:
+            self._colector_archivos = ColectorArchivos(archivos_datos)
+            if not MULTIPROCESO:
+                REGISTRY.register(self._colector_archivos)
+        else:
+            self._colector_archivos.archivos = archivos_datos
+        app.before_request(self._iniciar)
+        app.after_request(self._registrar_estado)
+        app.teardown_request(self._finalizar)
+        app.add_url_rule('/metrics', 'metricas', self.exponer)
+        app.extensions['metricas'] = self
+
+    def _iniciar(self):
+        g._metricas_inicio = time.perf_counter()
+
+    def _finalizar(self, error=None):
+        inicio = g.pop('_metricas_inicio', None)
+        endpoint = request.endpoint or 'sin_endpoint'
+        if inicio is None or endpoint in ENDPOINTS_EXCLUIDOS:
+            return
+        estado = getattr(g, '_metricas_estado', None) or (500 if error is not None else 200)
+        PETICIONES.labels(endpoint, request.method, str(estado)).inc()
+        DURACION_PETICION.labels(endpoint).observe(time.perf_counter() - inicio)
+
+    def _autorizado(self):
+        if METRICAS_PUBLICAS or session.get('admin_logged_in'):
+            return True
+        cabecera = request.headers.get('Authorization', '')
+        return bool(TOKEN_METRICAS) and hmac.compare_digest(cabecera.encode(), f'Bearer {TOKEN_METRICAS}'.encode())
+
+    def _registrar_estado(self, response):
+        g._metricas_estado = response.status_code
+        return response
+
+    def exponer(self):
+        if not self._autorizado():
+            abort(401)
+        if MULTIPROCESO:
+            registro = CollectorRegistry()
+            multiprocess.MultiProcessCollector(registro)
+            registro.register(self._colector_archivos)
+        else:
+            registro = REGISTRY
+        return Response(generate_latest(registro), content_type=CONTENT_TYPE_LATEST)
+
+
+metricas = Metricas()
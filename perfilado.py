@@ -0,0 +1,243 @@
+import cProfile
+import io
+import os
+import pstats
+import random
+import threading
+import time
+import uuid
+from collections import deque
+from functools import wraps
+
+from flask import before_render_template, g, has_request_context, request, session, template_rendered
+
+from carga_diferida import modulo_diferido
+
+np = modulo_diferido('numpy')
+pd = modulo_diferido('pandas')
+
+# Fases en las que se reparte el tiempo de una petición. El cómputo es el
+# resto: tiempo total menos lectura/escritura de archivos y renderizado.
+FASE_IO = 'io'
+FASE_RENDER = 'render'
+FASE_COMPUTO = 'computo'
+
+# Límites superiores (ms) de los intervalos del histograma por endpoint
+LIMITES_HISTOGRAMA_MS = (10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000)
+
+# Peticiones que se conservan por endpoint (ventana móvil) y en total
+VENTANA_POR_ENDPOINT = 500
+PETICIONES_RECIENTES = 300
+
+# Fracción de peticiones a las que se les captura un perfil de cProfile.
+# Un administrador puede forzarlo en cualquier petición con ?perfilar=1.
+MUESTREO_CPROFILE = float(os.environ.get('PERFILADO_MUESTREO_CPROFILE', '0') or 0)
+LINEAS_CPROFILE = 40
+
+ACTIVO = os.environ.get('PERFILADO_ACTIVO', '1') != '0'
+
+
+def _peticion_actual():
+    """Datos de perfilado de la petición en curso, o None fuera de una petición."""
+    if not ACTIVO or not has_request_context():
+        return None
+    return g.get('_perfil_peticion')
+
+
+def registrar_span(nombre, fase, duracion_ms, archivo=None, filas=None, bytes_=None):
+    """Añade un intervalo medido a la petición en curso (no hace nada fuera de una)."""
+    peticion = _peticion_actual()
+    if peticion is None:
+        return
+    peticion['spans'].append({
+        'nombre': nombre,
+        'fase': fase,
+        'ms': round(duracion_ms, 2),
+        'archivo': os.path.basename(archivo) if archivo else None,
+        'filas': filas,
+        'bytes': bytes_,
+    })
+
+
+def _describir(args, kwargs, resultado):
+    """Archivo, filas y bytes involucrados en una llamada de lectura o escritura."""
+    candidatos = list(args) + list(kwargs.values()) + [resultado]
+    archivo = next((a for a in candidatos if isinstance(a, (str, os.PathLike))), None)
+    df = next((a for a in candidatos if isinstance(a, pd.DataFrame)), None)
+    bytes_ = None
+    if archivo is not None and os.path.isfile(archivo):
+        bytes_ = os.path.getsize(archivo)
+    return {
+        'archivo': os.fspath(archivo) if archivo is not None else None,
+        'filas': len(df) if df is not None else None,
+        'bytes_': bytes_,
+    }
+
+
+def instrumentar(nombre, fase=FASE_IO):
+    """
+    Decorador para funciones de acceso a datos: dentro de una petición
+    registra un span con la duración, el archivo, las filas del DataFrame
+    leído o escrito y el tamaño del archivo.
+    """
+    def decorador(func):
+        @wraps(func)
+        def envoltura(*args, **kwargs):
+            if _peticion_actual() is None:
+                return func(*args, **kwargs)
+            inicio = time.perf_counter()
+            resultado = func(*args, **kwargs)
+            duracion_ms = (time.perf_counter() - inicio) * 1000
+            registrar_span(nombre, fase, duracion_ms, **_describir(args, kwargs, resultado))
+            return resultado
+        return envoltura
+    return decorador
+
+
+class EstadisticasEndpoint:
+    """Ventana móvil de las últimas peticiones de un endpoint."""
+
+    def __init__(self, ventana=VENTANA_POR_ENDPOINT):
+        self.total_peticiones = 0
+        self._muestras = deque(maxlen=ventana)
+
+    def agregar(self, peticion):
+        self.total_peticiones += 1
+        self._muestras.append((peticion['total_ms'], peticion['io_ms'], peticion['render_ms'], peticion['computo_ms']))
+
+    def resumen(self):
+        muestras = np.array(self._muestras, dtype=float)
+        totales = muestras[:, 0]
+        conteos = np.histogram(totales, bins=(0,) + LIMITES_HISTOGRAMA_MS + (np.inf,))[0]
+        return {
+            'total_peticiones': self.total_peticiones,
+            'en_ventana': len(totales),
+            'p50_ms': round(float(np.percentile(totales, 50)), 1),
+            'p95_ms': round(float(np.percentile(totales, 95)), 1),
+            'max_ms': round(float(totales.max()), 1),
+            'io_ms': round(float(muestras[:, 1].mean()), 1),
+            'render_ms': round(float(muestras[:, 2].mean()), 1),
+            'computo_ms': round(float(muestras[:, 3].mean()), 1),
+            'histograma': conteos.tolist(),
+        }
+
+
+class Perfilador:
+    """
+    Perfilado por petición: mide el tiempo total y lo reparte entre
+    lectura/escritura de Excel (funciones decoradas con instrumentar),
+    renderizado de plantillas (señales de Jinja de Flask) y cómputo.
+    Mantiene en memoria del proceso un histograma móvil por endpoint y las
+    peticiones recientes con sus spans, para la página de rendimiento del
+    panel de administración.
+    """
+
+    def __init__(self, app=None, muestreo_cprofile=MUESTREO_CPROFILE):
+        self.muestreo_cprofile = muestreo_cprofile
+        self._lock = threading.Lock()
+        self._endpoints = {}
+        self._recientes = deque(maxlen=PETICIONES_RECIENTES)
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        if not ACTIVO:
+            return
+        app.before_request(self._iniciar)
+        app.after_request(self._registrar_estado)
+        app.teardown_request(self._finalizar)
+        before_render_template.connect(self._inicio_render, app, weak=False)
+        template_rendered.connect(self._fin_render, app, weak=False)
+        app.extensions['perfilador'] = self
+
+    # --- Ciclo de la petición ---
+    def _iniciar(self):
+        if request.endpoint == 'static':
+            return
+        g._perfil_peticion = {
+            'id': uuid.uuid4().hex[:8],
+            'inicio': time.perf_counter(),
+            'fecha': time.strftime('%Y-%m-%d %H:%M:%S'),
+            'endpoint': request.endpoint or '(sin endpoint)',
+            'metodo': request.method,
+            'ruta': request.full_path.rstrip('?'),
+            'estado': None,
+            'spans': [],
+            'renders': [],
+            'perfil': None,
+        }
+        forzado = request.args.get('perfilar') == '1' and session.get('admin_logged_in')
+        if forzado or (self.muestreo_cprofile and random.random() < self.muestreo_cprofile):
+            g._perfil_cprofile = cProfile.Profile()
+            g._perfil_cprofile.enable()
+
+    def _registrar_estado(self, response):
+        peticion = _peticion_actual()
+        if peticion is not None:
+            peticion['estado'] = response.status_code
+        return response
+
+    def _finalizar(self, error=None):
+        peticion = _peticion_actual()
+        if peticion is None:
+            return
+        g._perfil_peticion = None
+        total_ms = (time.perf_counter() - peticion.pop('inicio')) * 1000
+
+        perfilador_c = g.pop('_perfil_cprofile', None)
+        if perfilador_c is not None:
+            perfilador_c.disable()
+            salida = io.StringIO()
+            pstats.Stats(perfilador_c, stream=salida).sort_stats('cumulative').print_stats(LINEAS_CPROFILE)
+            peticion['perfil'] = salida.getvalue()
+
+        io_ms = sum(s['ms'] for s in peticion['spans'] if s['fase'] == FASE_IO)
+        render_ms = sum(s['ms'] for s in peticion['spans'] if s['fase'] == FASE_RENDER)
+        peticion.pop('renders')
+        peticion.update({
+            'estado': peticion['estado'] or (500 if error is not None else None),
+            'total_ms': round(total_ms, 1),
+            'io_ms': round(io_ms, 1),
+            'render_ms': round(render_ms, 1),
+            'computo_ms': round(max(total_ms - io_ms - render_ms, 0.0), 1),
+        })
+        with self._lock:
+            self._endpoints.setdefault(peticion['endpoint'], EstadisticasEndpoint()).agregar(peticion)
+            self._recientes.append(peticion)
+
+    # --- Renderizado de plantillas ---
+    def _inicio_render(self, sender, template, context, **extra):
+        peticion = _peticion_actual()
+        if peticion is not None:
+            peticion['renders'].append(time.perf_counter())
+
+    def _fin_render(self, sender, template, context, **extra):
+        peticion = _peticion_actual()
+        if peticion is not None and peticion['renders']:
+            duracion_ms = (time.perf_counter() - peticion['renders'].pop()) * 1000
+            registrar_span(f'render {template.name}', FASE_RENDER, duracion_ms)
+
+    # --- Consultas para el panel ---
+    def resumen_endpoints(self):
+        """Resumen de cada endpoint, del más lento (p95) al más rápido."""
+        with self._lock:
+            filas = [dict(endpoint=nombre, **estadisticas.resumen()) for nombre, estadisticas in self._endpoints.items()]
+        return sorted(filas, key=lambda fila: fila['p95_ms'], reverse=True)
+
+    def mas_lentas(self, limite=25):
+        """Las peticiones recientes más lentas."""
+        with self._lock:
+            recientes = list(self._recientes)
+        return sorted(recientes, key=lambda p: p['total_ms'], reverse=True)[:limite]
+
+    def obtener(self, id_peticion):
+        with self._lock:
+            return next((p for p in self._recientes if p['id'] == id_peticion), None)
+
+    def reiniciar(self):
+        with self._lock:
+            self._endpoints = {}
+            self._recientes.clear()
+
+
+perfilador = Perfilador()
@@ -0,0 +1,440 @@
+"""
+Programador de tareas periódicas dentro de la aplicación (mantenimiento:
+cambio de día y de mes de los índices, precalentar caches, limpieza de
+archivos), para que ese trabajo no se haga dentro de las peticiones.
+
+Cada tarea tiene una especificación tipo cron de 5 campos (minuto, hora, día
+del mes, mes, día de la semana; con *, */n, a-b, a-b/n y listas), p. ej.
+'5 0 * * *' todos los días a las 00:05, o '@arranque' para correr una vez
+cuando inicia el worker (después de un despliegue o de un reciclado).
+
+Cada worker de gunicorn tiene su propio hilo, que cada INTERVALO_S segundos
+revisa qué tareas tocan. El hilo se crea dentro del worker (en post_fork o en
+la primera petición), nunca en el proceso maestro. Hay dos clases de tarea:
+- por proceso: ponen al día la memoria del worker (índices, calendario,
+  instantáneas), así que corren en todos los workers;
+- únicas (unica=True): trabajan sobre los archivos compartidos y corren solo
+  en el líder, el worker que tiene el lock exclusivo de .programador.lock en
+  la carpeta de datos. Si el líder termina el sistema operativo libera el
+  lock y otro worker lo toma en su siguiente revisión.
+
+El historial de ejecuciones (programador_historial.jsonl) y las solicitudes
+de ejecución manual del panel de administración (programador_solicitudes.json)
+también son archivos de esa carpeta, para que todos los workers los vean:
+cada worker atiende una solicitud en su siguiente revisión, o solo el líder
+si la tarea es única. Los workers agregan líneas al historial con el lock
+compartido de .programador_historial.lock y el líder lo recorta con el lock
+exclusivo, así ninguna línea se escribe en el archivo que se está reemplazando.
+
+PROGRAMADOR_ACTIVO=0 desactiva los hilos (p. ej. en benchmarks).
+"""
+import json
+import os
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+
+import metricas
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+ARRANQUE = '@arranque'
+INTERVALO_S = float(os.environ.get('PROGRAMADOR_INTERVALO_S', '10'))
+HISTORIAL_MAXIMO = 500
+
+ARCHIVO_LOCK = '.programador.lock'
+ARCHIVO_HISTORIAL = 'programador_historial.jsonl'
+ARCHIVO_LOCK_HISTORIAL = '.programador_historial.lock'
+ARCHIVO_SOLICITUDES = 'programador_solicitudes.json'
+
+# Campos de la especificación cron: nombre, mínimo y máximo (el 7 también es domingo)
+CAMPOS_CRON = (('minuto', 0, 59), ('hora', 0, 23), ('día del mes', 1, 31), ('mes', 1, 12),
+               ('día de la semana', 0, 7))
+
+
+class EspecificacionCron:
+    """
+    Especificación de 5 campos tipo cron. El día de la semana va de 0
+    (domingo) a 6. Como en cron, si se restringen el día del mes y el de la
+    semana a la vez basta con que coincida uno de los dos.
+    """
+
+    def __init__(self, texto):
+        self.texto = texto
+        campos = texto.split()
+        if len(campos) != len(CAMPOS_CRON):
+            raise ValueError(f"La especificación '{texto}' debe tener 5 campos: minuto hora día mes día_semana")
+        minutos, horas, dias, meses, dias_semana = (self._leer_campo(valor, *campo)
+                                                    for valor, campo in zip(campos, CAMPOS_CRON))
+        self.minutos = sorted(minutos)
+        self.horas = sorted(horas)
+        self.dias = dias
+        self.meses = meses
+        self.dias_semana = {dia % 7 for dia in dias_semana}
+        self._cualquier_dia = campos[2] == '*' or campos[4] == '*'
+        self.siguiente(datetime(2000, 1, 1))  # Falla si la fecha no existe nunca (p. ej. 31 de febrero)
+
+    @staticmethod
+    def _leer_campo(valor, nombre, minimo, maximo):
+        valores = set()
+        for parte in valor.split(','):
+            rango, _, paso = parte.partition('/')
+            try:
+                paso = int(paso) if paso else 1
+                if rango == '*':
+                    inicio, fin = minimo, maximo
+                elif '-' in rango:
+                    inicio, fin = (int(x) for x in rango.split('-', 1))
+                else:
+                    # '5/15' = desde el 5, cada 15
+                    inicio = int(rango)
+                    fin = maximo if paso != 1 else inicio
+            except ValueError:
+                raise ValueError(f"Valor no válido para el {nombre}: '{parte}'") from None
+            if paso < 1 or not minimo <= inicio <= fin <= maximo:
+                raise ValueError(f"Valor fuera de rango para el {nombre}: '{parte}' ({minimo}-{maximo})")
+            valores.update(range(inicio, fin + 1, paso))
+        return valores
+
+    def _coincide_dia(self, fecha):
+        dia_semana = (fecha.weekday() + 1) % 7
+        if self._cualquier_dia:
+            return fecha.day in self.dias and dia_semana in self.dias_semana
+        return fecha.day in self.dias or dia_semana in self.dias_semana
+
+    def siguiente(self, desde):
+        """Primer minuto posterior a `desde` que cumple la especificación."""
+        inicio = desde.replace(second=0, microsecond=0) + timedelta(minutes=1)
+        fecha = inicio.date()
+        # Cinco años alcanzan para cualquier especificación válida (29 de febrero)
+        for _ in range(5 * 366):
+            if fecha.month in self.meses and self._coincide_dia(fecha):
+                for hora in self.horas:
+                    for minuto in self.minutos:
+                        candidato = datetime(fecha.year, fecha.month, fecha.day, hora, minuto)
+                        if candidato >= inicio:
+                            return candidato
+            fecha += timedelta(days=1)
+        raise ValueError(f"La especificación '{self.texto}' no corresponde a ninguna fecha")
+
+
+class Tarea:
+    def __init__(self, nombre, especificacion, funcion, descripcion='', unica=False):
+        self.nombre = nombre
+        self.especificacion = especificacion
+        self.cron = None if especificacion == ARRANQUE else EspecificacionCron(especificacion)
+        self.funcion = funcion
+        self.descripcion = descripcion
+        self.unica = unica
+        self.lock = threading.Lock()  # Una ejecución a la vez en cada proceso
+
+    def siguiente(self, desde):
+        return self.cron.siguiente(desde) if self.cron is not None else None
+
+
+class Programador:
+    def __init__(self):
+        self.tareas = {}
+        self.directorio = None
+        self.activo = False
+        self._lock = threading.Lock()
+        self._pid = None              # Proceso en el que corre el hilo
+        self._detener = threading.Event()
+        self._descriptor_lider = None  # Descriptor de .programador.lock mientras este proceso es el líder
+        self._proximas = {}
+        self._inicio = 0.0
+        self._atendidas = {}
+        self._firma_solicitudes = None
+
+    # --- Configuración ---
+    def init_app(self, app):
+        self.configurar(app.config['PROGRAMADOR_DIR'], app.config['PROGRAMADOR_ACTIVO'])
+        app.before_request(self._antes_de_peticion)
+        app.extensions['programador'] = self
+
+    def configurar(self, directorio, activo=True):
+        self.directorio = directorio
+        self.activo = activo
+        os.makedirs(directorio, exist_ok=True)
+
+    def registrar(self, nombre, especificacion, funcion, descripcion='', unica=False):
+        """Agrega una tarea; `funcion` no recibe argumentos y puede devolver un texto con el resultado."""
+        self.tareas[nombre] = Tarea(nombre, especificacion, funcion, descripcion, unica)
+
+    def ruta(self, nombre):
+        return os.path.join(self.directorio, nombre)
+
+    # --- Hilo de cada worker ---
+    def _antes_de_peticion(self):
+        if self._pid != os.getpid():
+            self.iniciar()
+
+    def iniciar(self):
+        """Inicia el hilo del programador en este proceso (una vez por proceso)."""
+        if not self.activo:
+            return False
+        with self._lock:
+            if self._pid == os.getpid():
+                return False
+            if self._descriptor_lider is not None:
+                # Heredado de otro proceso con fork: el lock no es de este
+                os.close(self._descriptor_lider)
+                self._descriptor_lider = None
+            self._pid = os.getpid()
+            self._detener = threading.Event()
+        threading.Thread(target=self._bucle, name='programador', daemon=True).start()
+        return True
+
+    def detener(self):
+        """Detiene el hilo de este proceso y suelta el liderazgo."""
+        with self._lock:
+            self._detener.set()
+            self._pid = None
+            if self._descriptor_lider is not None:
+                os.close(self._descriptor_lider)
+                self._descriptor_lider = None
+
+    def _bucle(self):
+        detener = self._detener
+        self._inicio = time.time()
+        ahora = datetime.now()
+        self._proximas = {nombre: tarea.siguiente(ahora) for nombre, tarea in self.tareas.items()}
+        self._revisar_liderazgo()
+        for tarea in list(self.tareas.values()):
+            if tarea.cron is None:
+                self._ejecutar_si_corresponde(tarea, 'arranque')
+        while not detener.wait(INTERVALO_S):
+            try:
+                self.revisar()
+            except Exception as e:
+                print(f"Error en el programador de tareas: {type(e).__name__} - {e}")
+
+    def revisar(self, ahora=None):
+        """Ejecuta las tareas que tocan y las solicitudes manuales pendientes."""
+        self._revisar_liderazgo()
+        ahora = ahora or datetime.now()
+        for nombre, tarea in list(self.tareas.items()):
+            proxima = self._proximas.get(nombre)
+            if proxima is not None and ahora >= proxima:
+                # Si se saltaron varias (proceso suspendido) se ejecuta una sola vez
+                self._proximas[nombre] = tarea.siguiente(ahora)
+                self._ejecutar_si_corresponde(tarea, 'programada')
+        for nombre in self._solicitudes_nuevas():
+            self._ejecutar_si_corresponde(self.tareas[nombre], 'manual')
+
+    def _ejecutar_si_corresponde(self, tarea, origen):
+        if tarea.unica and not self.es_lider:
+            return
+        self.ejecutar(tarea.nombre, origen)
+
+    def ejecutar(self, nombre, origen='manual'):
+        """Ejecuta la tarea en este proceso y la anota en el historial; None si ya estaba en curso."""
+        tarea = self.tareas[nombre]
+        if not tarea.lock.acquire(blocking=False):
+            return None
+        inicio = datetime.now()
+        inicio_s = time.perf_counter()
+        try:
+            detalle = tarea.funcion()
+            resultado = 'ok'
+        except Exception as e:
+            detalle = f'{type(e).__name__} - {e}'
+            resultado = 'error'
+            print(f"Error en la tarea programada '{nombre}': {detalle}")
+        finally:
+            tarea.lock.release()
+        segundos = time.perf_counter() - inicio_s
+        metricas.registrar_tarea(nombre, resultado, segundos)
+        entrada = {
+            'tarea': nombre,
+            'inicio': inicio.strftime('%Y-%m-%d %H:%M:%S'),
+            'segundos': round(segundos, 3),
+            'resultado': resultado,
+            'detalle': detalle if isinstance(detalle, str) else '',
+            'origen': origen,
+            'pid': os.getpid(),
+        }
+        self._anotar(entrada)
+        return entrada
+
+    # --- Liderazgo ---
+    @property
+    def es_lider(self):
+        return self._descriptor_lider is not None and self._pid == os.getpid()
+
+    def _revisar_liderazgo(self):
+        """Toma el lock de líder si está libre; el líder renueva su latido en el archivo."""
+        if self._descriptor_lider is None:
+            descriptor = os.open(self.ruta(ARCHIVO_LOCK), os.O_RDWR | os.O_CREAT, 0o644)
+            try:
+                if fcntl is not None:
+                    fcntl.flock(descriptor, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                else:
+                    msvcrt.locking(descriptor, msvcrt.LK_NBLCK, 1)
+            except OSError:
+                os.close(descriptor)
+                return False
+            self._descriptor_lider = descriptor
+            print(f"Programador de tareas: el proceso {os.getpid()} es el líder (tareas únicas)")
+        datos = json.dumps({'pid': os.getpid(), 'latido': time.time()}).encode()
+        os.ftruncate(self._descriptor_lider, 0)
+        os.lseek(self._descriptor_lider, 0, os.SEEK_SET)
+        os.write(self._descriptor_lider, datos)
+        return True
+
+    def lider(self):
+        """{'pid', 'latido', 'activo'} del último líder según el archivo de lock, o None si nunca hubo."""
+        try:
+            with open(self.ruta(ARCHIVO_LOCK), 'r', encoding='utf-8') as f:
+                datos = json.loads(f.read() or 'null')
+        except (OSError, ValueError):
+            return None
+        if not datos:
+            return None
+        return {'pid': datos['pid'],
+                'latido': datetime.fromtimestamp(datos['latido']).strftime('%Y-%m-%d %H:%M:%S'),
+                'activo': self._lock_tomado()}
+
+    def _lock_tomado(self):
+        """True si algún proceso (este incluido) tiene el lock de líder."""
+        if self.es_lider:
+            return True
+        # Se prueba con otro descriptor y se suelta enseguida: si se pudo
+        # tomar, el líder terminó y ningún worker lo ha reemplazado aún
+        descriptor = os.open(self.ruta(ARCHIVO_LOCK), os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            if fcntl is not None:
+                fcntl.flock(descriptor, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                fcntl.flock(descriptor, fcntl.LOCK_UN)
+            else:
+                msvcrt.locking(descriptor, msvcrt.LK_NBLCK, 1)
+                msvcrt.locking(descriptor, msvcrt.LK_UNLCK, 1)
+            return False
+        except OSError:
+            return True
+        finally:
+            os.close(descriptor)
+
+    # --- Solicitudes manuales ---
+    def solicitar(self, nombre):
+        """Pide ejecutar la tarea; los workers la atienden en su siguiente revisión."""
+        if nombre not in self.tareas:
+            raise KeyError(nombre)
+        with self._lock:
+            solicitudes = self._leer_solicitudes()
+            solicitudes[nombre] = time.time()
+            ruta = self.ruta(ARCHIVO_SOLICITUDES)
+            ruta_temporal = f'{ruta}.{uuid.uuid4().hex[:8]}.tmp'
+            with open(ruta_temporal, 'w', encoding='utf-8') as f:
+                json.dump(solicitudes, f)
+            os.replace(ruta_temporal, ruta)
+
+    def _leer_solicitudes(self):
+        try:
+            with open(self.ruta(ARCHIVO_SOLICITUDES), 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def _solicitudes_nuevas(self):
+        try:
+            estado = os.stat(self.ruta(ARCHIVO_SOLICITUDES))
+        except OSError:
+            return []
+        firma = (estado.st_mtime_ns, estado.st_size)
+        if firma == self._firma_solicitudes:
+            return []
+        self._firma_solicitudes = firma
+        nuevas = []
+        for nombre, instante in self._leer_solicitudes().items():
+            tarea = self.tareas.get(nombre)
+            if tarea is None or instante <= self._atendidas.get(nombre, self._inicio):
+                continue
+            if tarea.unica and not self.es_lider:
+                continue
+            self._atendidas[nombre] = instante
+            nuevas.append(nombre)
+        return nuevas
+
+    # --- Historial ---
+    @contextmanager
+    def _lock_historial(self, exclusivo):
+        """Lock entre procesos del historial: compartido para agregar líneas, exclusivo para recortarlo."""
+        descriptor = os.open(self.ruta(ARCHIVO_LOCK_HISTORIAL), os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            if fcntl is not None:
+                fcntl.flock(descriptor, fcntl.LOCK_EX if exclusivo else fcntl.LOCK_SH)
+            else:
+                # msvcrt no tiene lock compartido: en Windows las escrituras se turnan
+                msvcrt.locking(descriptor, msvcrt.LK_LOCK, 1)
+            try:
+                yield
+            finally:
+                if fcntl is not None:
+                    fcntl.flock(descriptor, fcntl.LOCK_UN)
+                else:
+                    msvcrt.locking(descriptor, msvcrt.LK_UNLCK, 1)
+        finally:
+            os.close(descriptor)
+
+    def _anotar(self, entrada):
+        ruta = self.ruta(ARCHIVO_HISTORIAL)
+        with self._lock_historial(exclusivo=False):
+            # Una línea por escritura en modo 'a': las de varios procesos no se mezclan
+            with open(ruta, 'a', encoding='utf-8') as f:
+                f.write(json.dumps(entrada, ensure_ascii=False) + '\n')
+            recortar = self.es_lider and os.path.getsize(ruta) > HISTORIAL_MAXIMO * 400
+        if recortar:
+            self._recortar_historial()
+
+    def _recortar_historial(self):
+        ruta = self.ruta(ARCHIVO_HISTORIAL)
+        # Con el lock exclusivo ningún worker está agregando una línea que se perdería con el reemplazo
+        with self._lock_historial(exclusivo=True):
+            with open(ruta, 'r', encoding='utf-8') as f:
+                lineas = f.readlines()[-HISTORIAL_MAXIMO:]
+            ruta_temporal = f'{ruta}.{uuid.uuid4().hex[:8]}.tmp'
+            with open(ruta_temporal, 'w', encoding='utf-8') as f:
+                f.writelines(lineas)
+            os.replace(ruta_temporal, ruta)
+
+    def historial(self, limite=100):
+        """Últimas ejecuciones de todos los workers, de la más reciente a la más antigua."""
+        try:
+            with open(self.ruta(ARCHIVO_HISTORIAL), 'r', encoding='utf-8') as f:
+                lineas = f.readlines()[-limite:]
+        except OSError:
+            return []
+        entradas = []
+        for linea in reversed(lineas):
+            try:
+                entradas.append(json.loads(linea))
+            except ValueError:
+                continue  # Línea a medio escribir
+        return entradas
+
+    # --- Estado para el panel ---
+    def estado(self):
+        ahora = datetime.now()
+        ultimas = {}
+        for entrada in self.historial(HISTORIAL_MAXIMO):
+            ultimas.setdefault(entrada['tarea'], entrada)
+        return [{
+            'nombre': tarea.nombre,
+            'especificacion': tarea.especificacion,
+            'descripcion': tarea.descripcion,
+            'unica': tarea.unica,
+            'proxima': self._proximas.get(tarea.nombre, tarea.siguiente(ahora)) if self._pid == os.getpid()
+                       else tarea.siguiente(ahora),
+            'en_curso': tarea.lock.locked(),
+            'ultima': ultimas.get(tarea.nombre),
+        } for tarea in self.tareas.values()]
+
+
+programador = Programador()
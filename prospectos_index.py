@@ -0,0 +1,199 @@
+"""
+Índice del listado de prospectos (/prospectos/visualizar): orden, filtros y
+KPIs sin recorrer prospectos.xlsx en cada petición.
+
+Por cada lectura del archivo (instantánea de prospectos) se arman:
+- los órdenes del listado (más recientes por Fecha Creacion, mayor comisión,
+  cliente), como permutaciones de las filas que se calculan la primera vez
+  que se piden;
+- un código entero por fila para cada columna filtrable (Estado,
+  responsables, ramo, aseguradora) y la Fecha de Cotizacion como fecha, así
+  un filtro es una comparación sobre un arreglo y la página, un slice del
+  orden ya filtrado.
+
+Los KPIs (comisión de los prospectos ganados en el mes de Fecha inicio
+poliza y los ramos que más aportan) se mantienen de forma incremental con
+instantaneas.AportesPorFila: cuando cambia el archivo solo las filas nuevas,
+modificadas o eliminadas cambian los totales por mes y ramo.
+"""
+from datetime import date
+
+import metricas
+from carga_diferida import modulo_diferido
+from instantaneas import AportesPorFila
+
+pd = modulo_diferido('pandas')
+np = modulo_diferido('numpy')
+
+# Parámetro de la URL -> columna
+FILTROS = {
+    'estado': 'Estado', 'responsable_tecnico': 'Responsable Tecnico', 'responsable_comercial': 'Responsable Comercial',
+    'ramo': 'Ramo', 'aseguradora': 'Aseguradora',
+}
+FECHA_FILTRO = 'Fecha de Cotizacion'
+# Orden del listado -> (columna, ascendente)
+ORDENES = {'reciente': ('Fecha Creacion', False), 'comision': ('Comision $', False), 'cliente': ('Nombre Cliente', True)}
+POR_PAGINA = 20
+TOP_RAMOS = 3
+COLUMNAS_KPI = ['ID_PROSPECTO', 'Estado', 'Fecha inicio poliza', 'Ramo', 'Comision $']
+
+
+def _texto(serie):
+    return serie.astype(object).where(serie.notna(), '').astype(str).str.strip()
+
+
+def _enteros(serie):
+    """Valores en pesos como en la página: numéricos, sin decimales y 0 si faltan."""
+    return pd.to_numeric(serie, errors='coerce').fillna(0).astype(int)
+
+
+class IndiceProspectos:
+    def __init__(self, instantanea):
+        self.instantanea = instantanea
+        self._lock = metricas.LockMedido('indice_prospectos')
+        self._aportes = AportesPorFila()
+        self._limpiar()
+
+    def _limpiar(self):
+        self._firma = None
+        self._df = None
+        self._ordenes = {}
+        self._codigos = {}    # columna -> (códigos por fila, {valor: código})
+        self._fechas = None   # Fecha de Cotizacion por fila (datetime64)
+        self._clientes = None
+        self._aportes.limpiar()
+        self._ganados = {}    # (año, mes) -> {ramo: comisión}
+
+    # --- Mantenimiento ---
+    def sincronizar(self):
+        """Pone el índice al día con el archivo de prospectos. True si hubo cambios."""
+        with self._lock:
+            firma = self.instantanea.firma_archivo()
+            metricas.registrar_cache('indice_prospectos', firma is not None and firma == self._firma)
+            if firma == self._firma:
+                return False
+            if firma is None:
+                self._limpiar()
+                return True
+            df = self.instantanea.vista().reset_index(drop=True)
+            self._df = df
+            self._ordenes = {}
+            self._codigos = {}
+            for columna in FILTROS.values():
+                if columna in df.columns:
+                    codigos, valores = pd.factorize(_texto(df[columna]))
+                    self._codigos[columna] = (codigos, {valor: codigo for codigo, valor in enumerate(valores)})
+            self._fechas = (pd.to_datetime(df[FECHA_FILTRO], errors='coerce').to_numpy()
+                            if FECHA_FILTRO in df.columns else None)
+            self._clientes = _texto(df['Nombre Cliente']).str.casefold() if 'Nombre Cliente' in df.columns else None
+            if all(columna in df.columns for columna in COLUMNAS_KPI):
+                self._aportes.actualizar(df[COLUMNAS_KPI], 'ID_PROSPECTO', self._calcular, self._sumar, self._retirar)
+            else:
+                self._aportes.limpiar()
+                self._ganados = {}
+            self._firma = firma
+            return True
+
+    def _calcular(self, df):
+        """Aporte de cada fila a los KPIs: (mes, ramo, comisión) si está ganado, o None."""
+        fecha = pd.to_datetime(df['Fecha inicio poliza'], errors='coerce')
+        ganado = ((df['Estado'].astype(object) == 'Ganado') & fecha.notna()).to_numpy()
+        comision = _enteros(df['Comision $']).to_numpy()
+        ramos = df['Ramo'].astype(object).where(df['Ramo'].notna(), None).tolist()
+        return [((f.year, f.month), ramo, int(valor)) if cuenta else None
+                for f, ramo, valor, cuenta in zip(fecha, ramos, comision, ganado)]
+
+    def _sumar(self, _clave, aporte, signo=1):
+        if aporte is None:
+            return
+        mes, ramo, comision = aporte
+        ramos = self._ganados.setdefault(mes, {})
+        total, filas = ramos.get(ramo, (0, 0))
+        total, filas = total + signo * comision, filas + signo
+        if filas <= 0:
+            ramos.pop(ramo, None)
+            if not ramos:
+                del self._ganados[mes]
+        else:
+            ramos[ramo] = (total, filas)
+
+    def _retirar(self, clave, aporte):
+        self._sumar(clave, aporte, signo=-1)
+
+    def _orden(self, nombre):
+        """Permutación de las filas para el orden pedido (se calcula una vez por lectura)."""
+        orden = self._ordenes.get(nombre)
+        if orden is None:
+            df = self._df
+            columna, ascendente = ORDENES[nombre]
+            if columna not in df.columns:
+                # Archivos sin Fecha Creacion: los IDs más altos primero
+                columna, ascendente = 'ID_PROSPECTO', False
+            if columna == 'Fecha Creacion':
+                valores = pd.to_datetime(df[columna], errors='coerce')
+            elif columna == 'Comision $':
+                valores = _enteros(df[columna])
+            else:
+                valores = _texto(df[columna]).str.casefold()
+            orden = valores.reset_index(drop=True).sort_values(ascending=ascendente, kind='stable',
+                                                               na_position='last').index.to_numpy()
+            self._ordenes[nombre] = orden
+        return orden
+
+    # --- Consultas ---
+    def pagina(self, filtros=None, desde=None, hasta=None, buscar='', orden='reciente', pagina=1,
+               por_pagina=POR_PAGINA):
+        """
+        Prospectos de la página pedida con los filtros {parámetro de FILTROS:
+        valor}, Fecha de Cotizacion entre `desde` y `hasta` (fechas,
+        inclusive) y `buscar` en el nombre del cliente. Devuelve (filas,
+        paginación) con la paginación en el formato de /control.
+        """
+        self.sincronizar()
+        with self._lock:
+            df = self._df
+            if df is None or df.empty:
+                return [], {'page': 1, 'per_page': por_pagina, 'total_pages': 0, 'total_records': 0,
+                            'has_prev': False, 'has_next': False}
+            mascara = np.ones(len(df), dtype=bool)
+            for parametro, valor in (filtros or {}).items():
+                columna = FILTROS[parametro]
+                if not valor:
+                    continue
+                if columna not in self._codigos:
+                    mascara[:] = False
+                    continue
+                codigos, por_valor = self._codigos[columna]
+                mascara &= codigos == por_valor.get(valor, -2)
+            if (desde or hasta) and self._fechas is not None:
+                if desde:
+                    mascara &= self._fechas >= np.datetime64(desde)
+                if hasta:
+                    mascara &= self._fechas < np.datetime64(hasta) + np.timedelta64(1, 'D')
+            if buscar and self._clientes is not None:
+                mascara &= self._clientes.str.contains(buscar.casefold(), regex=False).to_numpy()
+            orden = self._orden(orden if orden in ORDENES else 'reciente')
+            seleccion = orden[mascara[orden]]
+
+        total = len(seleccion)
+        total_paginas = (total + por_pagina - 1) // por_pagina
+        pagina = min(max(pagina, 1), max(total_paginas, 1))
+        filas = df.iloc[seleccion[(pagina - 1) * por_pagina:pagina * por_pagina]].copy()
+        filas['Fecha inicio poliza'] = pd.to_datetime(filas['Fecha inicio poliza'], errors='coerce')
+        for columna in ('Prima', 'Comision $'):
+            if columna in filas.columns:
+                filas[columna] = _enteros(filas[columna])
+        paginacion = {'page': pagina, 'per_page': por_pagina, 'total_pages': total_paginas, 'total_records': total,
+                      'has_prev': pagina > 1, 'has_next': pagina < total_paginas}
+        return filas.to_dict(orient='records'), paginacion
+
+    def kpis(self, hoy=None):
+        """Comisión de los prospectos ganados del mes (Fecha inicio poliza) y los TOP_RAMOS ramos con más comisión."""
+        self.sincronizar()
+        hoy = hoy or date.today()
+        with self._lock:
+            ramos = dict(self._ganados.get((hoy.year, hoy.month), {}))
+        recaudo_mes = sum(total for total, _filas in ramos.values())
+        top = sorted(((ramo, total) for ramo, (total, _filas) in ramos.items() if ramo is not None),
+                     key=lambda par: (-par[1], str(par[0])))[:TOP_RAMOS]
+        return recaudo_mes, [{'Ramo': ramo, 'Comision $': total} for ramo, total in top]
@@ -0,0 +1,243 @@
+"""
+Totales mensuales de producción (panel de recaudo) a partir de las remisiones
+creadas.
+
+Por cada mes de fecha_registro se guarda una tabla acumulada por (ramo,
+vendedor TPP) con la ComisionUIB de renovaciones, negocio nuevo y
+modificaciones, el valor uib (gráfico por ramo) y la ComisionTPP. El panel
+suma los meses del rango pedido sobre esa tabla, sin recorrer el archivo de
+remisiones: el costo depende del número de meses, no del de remisiones.
+
+La tabla se mantiene de forma incremental sobre la instantánea de
+remisiones (instantaneas.AportesPorFila): cuando cambia el archivo, solo las
+filas nuevas, modificadas o eliminadas restan su aporte anterior y suman el
+nuevo. Las filas de detalle de cada
+tarjeta se guardan como consecutivos y se leen de la instantánea al mostrar
+el panel.
+"""
+from datetime import date
+
+import metricas
+from carga_diferida import modulo_diferido
+from instantaneas import AportesPorFila
+
+pd = modulo_diferido('pandas')
+np = modulo_diferido('numpy')
+
+# Tarjetas del panel: columna de la remisión marcada con 'si'
+TIPOS = ('renovacion', 'negocio_nuevo', 'modificacion')
+COLUMNAS = ['consecutivo', 'estado', 'fecha_registro', 'renovacion', 'negocio_nuevo', 'modificacion',
+            'uib', 'ramo', 'ComisionUIB', 'co_corretaje_opcion', 'ComisionTPP', 'co_corretaje_nombre']
+VENDEDOR_NO_ESPECIFICADO = 'Vendedor no especificado'
+# Medidas de la tabla: ComisionUIB por tipo, uib, ComisionTPP y número de remisiones
+MEDIDA_UIB = len(TIPOS)
+MEDIDA_TPP = len(TIPOS) + 1
+MEDIDA_FILAS = len(TIPOS) + 2
+MAXIMO_MESES = 60
+TOP_RAMOS = 10
+
+
+def _si(serie):
+    return (serie.astype(str).str.strip().str.lower() == 'si').to_numpy()
+
+
+def meses_entre(desde, hasta):
+    """Meses (año, mes) de `desde` a `hasta`, inclusive."""
+    meses = []
+    anio, mes = desde
+    while (anio, mes) <= hasta:
+        meses.append((anio, mes))
+        anio, mes = (anio + 1, 1) if mes == 12 else (anio, mes + 1)
+    return meses
+
+
+def texto_mes(mes):
+    return f"{mes[0]:04d}-{mes[1]:02d}"
+
+
+class RollupRecaudo:
+    def __init__(self, instantanea, limpiar_moneda):
+        self.instantanea = instantanea
+        self.limpiar_moneda = limpiar_moneda
+        self._lock = metricas.LockMedido('rollup_recaudo')
+        self._aportes_filas = AportesPorFila()
+        self._limpiar()
+
+    def _limpiar(self):
+        self._firma = None
+        self._faltantes = []
+        self._aportes_filas.limpiar()
+        self._meses = {}     # (año, mes) -> {(ramo, vendedor TPP): medidas}
+        self._detalle = {}   # (año, mes) -> {tipo: {clave de fila: consecutivo}}
+
+    # --- Mantenimiento ---
+    def sincronizar(self):
+        """Pone la tabla al día con el archivo de remisiones. True si hubo cambios."""
+        with self._lock:
+            firma = self.instantanea.firma_archivo()
+            metricas.registrar_cache('rollup_recaudo', firma is not None and firma == self._firma)
+            if firma == self._firma:
+                return False
+            if firma is None:
+                self._limpiar()
+                return True
+            self._aplicar(self.instantanea.vista())
+            self._firma = firma
+            return True
+
+    def _aplicar(self, df):
+        self._faltantes = [columna for columna in COLUMNAS if columna not in df.columns]
+        if self._faltantes:
+            faltantes = self._faltantes
+            self._limpiar()
+            self._faltantes = faltantes
+            return
+        self._aportes_filas.actualizar(df[COLUMNAS], 'consecutivo', self._aportes, self._sumar, self._retirar)
+
+    def _aportes(self, df):
+        """Aporte de cada fila: (mes, ramo, vendedor TPP, medidas, tipos, consecutivo) o None si no cuenta."""
+        fecha = pd.to_datetime(df['fecha_registro'], dayfirst=True, errors='coerce')
+        creada = (df['estado'].astype(str).str.strip().str.lower() == 'creado').to_numpy() & fecha.notna().to_numpy()
+        comision_uib = np.nan_to_num(df['ComisionUIB'].map(self.limpiar_moneda).to_numpy(dtype=float))
+        uib = np.nan_to_num(df['uib'].map(self.limpiar_moneda).to_numpy(dtype=float))
+        tpp = np.nan_to_num(df['ComisionTPP'].map(self.limpiar_moneda).to_numpy(dtype=float))
+        marcas = np.column_stack([_si(df[tipo]) for tipo in TIPOS])
+        con_tpp = _si(df['co_corretaje_opcion'])
+        vendedores = df['co_corretaje_nombre'].fillna('').astype(str).str.strip().replace('', VENDEDOR_NO_ESPECIFICADO)
+        ramos = df['ramo'].astype(object).where(df['ramo'].notna(), None)
+
+        aportes = []
+        for i, (f, ramo, vendedor, consecutivo) in enumerate(zip(fecha, ramos, vendedores, df['consecutivo'])):
+            if not creada[i]:
+                aportes.append(None)
+                continue
+            medidas = np.zeros(MEDIDA_FILAS + 1)
+            medidas[:len(TIPOS)] = comision_uib[i] * marcas[i]
+            medidas[MEDIDA_UIB] = uib[i]
+            medidas[MEDIDA_TPP] = tpp[i] if con_tpp[i] else 0.0
+            medidas[MEDIDA_FILAS] = 1
+            tipos = tuple(tipo for tipo, marcado in zip(TIPOS, marcas[i]) if marcado)
+            aportes.append(((f.year, f.month), ramo, vendedor if con_tpp[i] else None, medidas, tipos, consecutivo))
+        return aportes
+
+    def _sumar(self, clave, aporte, signo=1):
+        if aporte is None:
+            return
+        mes, ramo, vendedor, medidas, tipos, consecutivo = aporte
+        grupos = self._meses.setdefault(mes, {})
+        acumulado = grupos.get((ramo, vendedor))
+        if acumulado is None:
+            acumulado = grupos[(ramo, vendedor)] = np.zeros(len(medidas))
+        acumulado += signo * medidas
+        if acumulado[MEDIDA_FILAS] <= 0:
+            # Sin remisiones en el grupo: se quita para que no quede en el gráfico con 0
+            del grupos[(ramo, vendedor)]
+            if not grupos:
+                del self._meses[mes]
+        detalle = self._detalle.setdefault(mes, {})
+        for tipo in tipos:
+            if signo > 0:
+                detalle.setdefault(tipo, {})[clave] = consecutivo
+            else:
+                detalle.get(tipo, {}).pop(clave, None)
+
+    def _retirar(self, clave, aporte):
+        self._sumar(clave, aporte, signo=-1)
+
+    # --- Consultas ---
+    def columnas_faltantes(self):
+        """Columnas requeridas que no tiene remisiones.xlsx (vacío si están todas)."""
+        self.sincronizar()
+        return list(self._faltantes)
+
+    def meses_disponibles(self):
+        """Meses (año, mes) con remisiones creadas, ordenados."""
+        self.sincronizar()
+        with self._lock:
+            return sorted(self._meses)
+
+    def totales(self, desde, hasta):
+        """
+        Totales del rango de meses: ComisionUIB por tipo, uib por ramo,
+        ComisionTPP por vendedor y la serie mensual con el total de cada mes
+        y el del mismo mes del año anterior.
+        """
+        self.sincronizar()
+        meses = meses_entre(desde, hasta)
+        por_tipo = np.zeros(len(TIPOS))
+        por_ramo, por_vendedor, serie = {}, {}, []
+        with self._lock:
+            for mes in meses:
+                total_mes = np.zeros(len(TIPOS))
+                for (ramo, vendedor), medidas in self._meses.get(mes, {}).items():
+                    total_mes += medidas[:len(TIPOS)]
+                    if ramo is not None:
+                        por_ramo[ramo] = por_ramo.get(ramo, 0.0) + medidas[MEDIDA_UIB]
+                    if vendedor is not None:
+                        por_vendedor[vendedor] = por_vendedor.get(vendedor, 0.0) + medidas[MEDIDA_TPP]
+                por_tipo += total_mes
+                anterior = sum(medidas[:len(TIPOS)].sum() for medidas in self._meses.get((mes[0] - 1, mes[1]), {}).values())
+                serie.append({'mes': texto_mes(mes), **dict(zip(TIPOS, total_mes.tolist())),
+                              'total': float(total_mes.sum()), 'total_anio_anterior': float(anterior)})
+
+        ramos = sorted(por_ramo.items(), key=lambda par: (-par[1], str(par[0])))[:TOP_RAMOS]
+        vendedores = [{'vendedor': vendedor, 'comision': comision} for vendedor, comision in sorted(por_vendedor.items())
+                      if vendedor.strip().lower() != 'uib' and comision > 0]
+        return {
+            'por_tipo': dict(zip(TIPOS, por_tipo.tolist())),
+            'total': float(por_tipo.sum()),
+            'ramos': {'labels': [ramo for ramo, _valor in ramos], 'data': [round(valor) for _ramo, valor in ramos]},
+            'tpp_por_vendedor': vendedores,
+            'serie': serie,
+        }
+
+    def detalle(self, tipo, desde, hasta):
+        """Remisiones del tipo creadas en el rango, en el orden del archivo, con ComisionUIB como número."""
+        self.sincronizar()
+        with self._lock:
+            filas = {}
+            for mes in meses_entre(desde, hasta):
+                filas.update(self._detalle.get(mes, {}).get(tipo, {}))
+            orden = self._aportes_filas.orden
+            ordenadas = sorted(filas, key=lambda clave: orden.get(clave, 0))
+            consecutivos = list(dict.fromkeys(filas[clave] for clave in ordenadas))
+        if not consecutivos:
+            return []
+        df, _faltantes = self.instantanea.buscar('consecutivo', consecutivos)
+        df['ComisionUIB'] = df['ComisionUIB'].map(self.limpiar_moneda)
+        return df.to_dict(orient='records')
+
+
+def rango_meses(desde_texto, hasta_texto, hoy=None):
+    """
+    (desde, hasta, error) a partir de dos meses 'AAAA-MM' (el mes actual si
+    faltan). Un rango invertido se ordena y uno de más de MAXIMO_MESES se
+    recorta al final.
+    """
+    hoy = hoy or date.today()
+    actual = (hoy.year, hoy.month)
+    error = None
+
+    def leer(texto):
+        nonlocal error
+        if not texto:
+            return None
+        try:
+            anio, mes = (int(parte) for parte in texto.split('-'))
+            if 1 <= mes <= 12:
+                return (anio, mes)
+        except ValueError:
+            pass
+        error = f"Mes inválido: '{texto}'. Use el formato AAAA-MM."
+        return None
+
+    desde, hasta = leer(desde_texto), leer(hasta_texto)
+    desde = desde or hasta or actual
+    hasta = hasta or desde
+    if desde > hasta:
+        desde, hasta = hasta, desde
+    meses = meses_entre(desde, hasta)
+    if len(meses) > MAXIMO_MESES:
+        desde = meses[-MAXIMO_MESES]
+        error = f"El rango se limitó a los últimos {MAXIMO_MESES} meses."
+    return desde, hasta, error
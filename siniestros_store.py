@@ -0,0 +1,250 @@
+"""
+Registro de siniestros: alta en tiempo constante, listado paginado e
+historial por cliente.
+
+Cada siniestro nuevo es una línea JSON agregada al final de siniestros.jsonl
+(modo 'a', como el historial del programador), sin releer ni reescribir el
+archivo. Los siniestros registrados antes en siniestros.xlsx se leen una vez
+como historial inicial (y de nuevo solo si ese archivo cambia).
+
+Cada worker mantiene en memoria índices por NIT/CC, nombre de cliente y ramo,
+y el orden por fecha del siniestro, como listas ordenadas de (fecha,
+posición): al sincronizar solo se leen las líneas agregadas desde la última
+vez (por cualquier worker), una página del listado es un slice y los rangos
+de fechas se ubican con bisect, así que el costo no crece con los años de
+historial. Los documentos de cada siniestro están en
+CLIENTES_CARPETAS/<cliente>_<nit>/SINIESTROS/<ramo>/<año>.
+"""
+import json
+import os
+import re
+import uuid
+from bisect import bisect_left, bisect_right, insort
+from datetime import datetime
+
+from werkzeug.utils import secure_filename
+
+import excel_io
+import metricas
+
+COLUMNAS = ['ID_SINIESTRO', 'nombre_cliente', 'nit_cc', 'numero_poliza', 'ramo', 'fecha_siniestro',
+            'archivos_adjuntos', 'carpeta', 'fecha_registro']
+POR_PAGINA = 20
+
+
+def normalizar_nit(valor):
+    """NIT/CC comparable: solo letras y dígitos ('900.123.456-7' -> '9001234567')."""
+    return re.sub(r'[^0-9A-Za-z]', '', str(valor or '')).upper()
+
+
+def _clave_cliente(valor):
+    return ' '.join(str(valor or '').split()).casefold()
+
+
+def _texto(valor):
+    if valor is None or (isinstance(valor, float) and valor != valor):
+        return ''
+    return str(valor).strip()
+
+
+def _fecha(valor):
+    """Fecha del siniestro como AAAA-MM-DD ('' si no es una fecha)."""
+    if hasattr(valor, 'strftime'):
+        return valor.strftime('%Y-%m-%d')
+    texto = _texto(valor)[:10]
+    try:
+        return datetime.strptime(texto, '%Y-%m-%d').strftime('%Y-%m-%d')
+    except ValueError:
+        return ''
+
+
+def carpeta_documentos(nombre_cliente, nit_cc, ramo, fecha_siniestro):
+    """Carpeta de los documentos del siniestro, relativa a CLIENTES_CARPETAS."""
+    ano = fecha_siniestro[:4] if fecha_siniestro else 'SIN_FECHA'
+    return os.path.join(f"{secure_filename(nombre_cliente)}_{secure_filename(nit_cc)}", 'SINIESTROS',
+                        secure_filename(ramo), ano)
+
+
+class RegistroSiniestros:
+    def __init__(self, ruta_diario, ruta_excel=None):
+        self.ruta_diario = ruta_diario
+        self.ruta_excel = ruta_excel
+        self._lock = metricas.LockMedido('siniestros')
+        self._limpiar()
+
+    def _limpiar(self):
+        self._firma_excel = None
+        self._diario = None       # (dispositivo, inodo) del archivo leído
+        self._desplazamiento = 0  # bytes del diario ya indexados
+        self._registros = []
+        self._por_id = {}
+        self._orden = []          # (fecha, posición) de todos los siniestros
+        self._por_nit = {}
+        self._por_cliente = {}
+        self._por_ramo = {}
+        self._nombres = {}        # clave de cliente -> nombre como se registró
+
+    # --- Escritura ---
+    def agregar(self, datos):
+        """
+        Agrega un siniestro (nombre_cliente, nit_cc, numero_poliza, ramo,
+        fecha_siniestro AAAA-MM-DD, archivos_adjuntos) al final del diario y
+        lo devuelve con su ID y carpeta de documentos.
+        """
+        registro = {columna: _texto(datos.get(columna)) for columna in COLUMNAS}
+        registro['fecha_siniestro'] = _fecha(datos.get('fecha_siniestro'))
+        registro['ID_SINIESTRO'] = uuid.uuid4().hex[:8].upper()
+        registro['carpeta'] = registro['carpeta'] or carpeta_documentos(
+            registro['nombre_cliente'], registro['nit_cc'], registro['ramo'], registro['fecha_siniestro'])
+        registro['fecha_registro'] = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+        # Una línea por escritura en modo 'a': las de varios procesos no se mezclan
+        with open(self.ruta_diario, 'a', encoding='utf-8') as f:
+            f.write(json.dumps(registro, ensure_ascii=False) + '\n')
+        self.sincronizar()
+        return registro
+
+    # --- Mantenimiento ---
+    def _firma(self, ruta):
+        try:
+            st = os.stat(ruta)
+        except (OSError, TypeError):
+            return None
+        return st
+
+    def sincronizar(self):
+        """
+        Lee lo que otros workers agregaron al diario desde la última vez.
+        Rehace los índices solo si siniestros.xlsx cambió o el diario fue
+        reemplazado. Devuelve el número de siniestros nuevos indexados.
+        """
+        with self._lock:
+            st_excel = self._firma(self.ruta_excel)
+            firma_excel = (st_excel.st_mtime_ns, st_excel.st_size) if st_excel else None
+            st_diario = self._firma(self.ruta_diario)
+            diario = (st_diario.st_dev, st_diario.st_ino) if st_diario else None
+            tamano = st_diario.st_size if st_diario else 0
+
+            reconstruir = (firma_excel != self._firma_excel or diario != self._diario
+                           or tamano < self._desplazamiento)
+            metricas.registrar_cache('siniestros', not reconstruir and tamano == self._desplazamiento)
+            nuevos = 0
+            if reconstruir:
+                self._limpiar()
+                if firma_excel:
+                    nuevos += self._leer_excel()
+                self._firma_excel = firma_excel
+                self._diario = diario
+            if diario and tamano > self._desplazamiento:
+                nuevos += self._leer_diario()
+            return nuevos
+
+    def _leer_excel(self):
+        try:
+            df = excel_io.leer_excel(self.ruta_excel)
+        except Exception as e:
+            print(f"ADVERTENCIA: no se pudo leer {self.ruta_excel}: {e}")
+            return 0
+        for posicion, fila in enumerate(df.to_dict(orient='records')):
+            registro = {columna: _texto(fila.get(columna)) for columna in COLUMNAS}
+            registro['fecha_siniestro'] = _fecha(fila.get('fecha_siniestro'))
+            registro['ID_SINIESTRO'] = registro['ID_SINIESTRO'] or f'XLSX-{posicion + 1}'
+            registro['carpeta'] = registro['carpeta'] or carpeta_documentos(
+                registro['nombre_cliente'], registro['nit_cc'], registro['ramo'], registro['fecha_siniestro'])
+            self._indexar(registro)
+        return len(df)
+
+    def _leer_diario(self):
+        with open(self.ruta_diario, 'rb') as f:
+            f.seek(self._desplazamiento)
+            bloque = f.read()
+        # Solo líneas completas: una a medio escribir se lee en la siguiente sincronización
+        fin = bloque.rfind(b'\n') + 1
+        nuevos = 0
+        for linea in bloque[:fin].splitlines():
+            try:
+                registro = json.loads(linea)
+            except ValueError:
+                print(f"ADVERTENCIA: línea inválida en {self.ruta_diario}: {linea[:80]!r}")
+                continue
+            self._indexar(registro)
+            nuevos += 1
+        self._desplazamiento += fin
+        return nuevos
+
+    def _indexar(self, registro):
+        posicion = len(self._registros)
+        self._registros.append(registro)
+        self._por_id[registro['ID_SINIESTRO']] = posicion
+        clave = (registro.get('fecha_siniestro', ''), posicion)
+        insort(self._orden, clave)
+        cliente = _clave_cliente(registro.get('nombre_cliente'))
+        self._nombres.setdefault(cliente, registro.get('nombre_cliente', ''))
+        for indice, valor in ((self._por_nit, normalizar_nit(registro.get('nit_cc'))),
+                              (self._por_cliente, cliente), (self._por_ramo, registro.get('ramo', ''))):
+            insort(indice.setdefault(valor, []), clave)
+
+    # --- Consultas ---
+    def ramos(self):
+        self.sincronizar()
+        with self._lock:
+            return sorted(ramo for ramo in self._por_ramo if ramo)
+
+    def obtener(self, id_siniestro):
+        self.sincronizar()
+        with self._lock:
+            posicion = self._por_id.get(id_siniestro)
+            return dict(self._registros[posicion]) if posicion is not None else None
+
+    def pagina(self, nit='', ramo='', cliente='', desde='', hasta='', pagina=1, por_pagina=POR_PAGINA):
+        """
+        Siniestros de la página pedida, del más reciente al más antiguo, con
+        los filtros por NIT/CC, ramo, parte del nombre del cliente y fecha del
+        siniestro entre `desde` y `hasta` (AAAA-MM-DD, inclusive). Devuelve
+        (siniestros, paginación) con la paginación en el formato de /control.
+        """
+        self.sincronizar()
+        with self._lock:
+            # Se parte de la lista más corta entre los filtros exactos
+            listas = []
+            if nit:
+                listas.append(self._por_nit.get(normalizar_nit(nit), []))
+            if ramo:
+                listas.append(self._por_ramo.get(ramo, []))
+            if cliente:
+                buscado = _clave_cliente(cliente)
+                coincidencias = [lista for clave, lista in self._por_cliente.items() if buscado in clave]
+                listas.append(sorted(clave for lista in coincidencias for clave in lista)
+                              if len(coincidencias) != 1 else coincidencias[0])
+            listas.sort(key=len)
+            base = listas[0] if listas else self._orden
+            inicio = bisect_left(base, (desde,)) if desde else 0
+            fin = bisect_right(base, (hasta, len(self._registros))) if hasta else len(base)
+            if len(listas) > 1:
+                otras = [set(lista) for lista in listas[1:]]
+                base = [clave for clave in base[inicio:fin] if all(clave in otra for otra in otras)]
+                inicio, fin = 0, len(base)
+
+            total = max(fin - inicio, 0)
+            total_paginas = (total + por_pagina - 1) // por_pagina
+            pagina = min(max(pagina, 1), max(total_paginas, 1))
+            # Más recientes primero: la página se toma desde el final del rango
+            hasta_pos = fin - (pagina - 1) * por_pagina
+            desde_pos = max(hasta_pos - por_pagina, inicio)
+            siniestros = [dict(self._registros[posicion]) for _fecha_clave, posicion
+                          in reversed(base[desde_pos:hasta_pos])] if total else []
+        paginacion = {'page': pagina, 'per_page': por_pagina, 'total_pages': total_paginas, 'total_records': total,
+                      'has_prev': pagina > 1, 'has_next': pagina < total_paginas}
+        return siniestros, paginacion
+
+    def historial_cliente(self, nit):
+        """Todos los siniestros de un NIT/CC, del más reciente al más antiguo."""
+        self.sincronizar()
+        with self._lock:
+            return [dict(self._registros[posicion])
+                    for _fecha_clave, posicion in reversed(self._por_nit.get(normalizar_nit(nit), []))]
+
+    def todos(self):
+        """Todos los siniestros en el orden de registro (para exportar)."""
+        self.sincronizar()
+        with self._lock:
+            return [dict(registro) for registro in self._registros]
@@ -0,0 +1,64 @@
+// Listas de opciones de los formularios (aseguradoras, ramos, vendedores...).
+// Se piden una sola vez a /api/opciones con una URL que incluye la versión de
+// las listas, así el navegador las reutiliza de su cache entre páginas hasta
+// que un administrador cambie alguna lista.
+//
+// Uso en las plantillas:
+//   <select data-opciones="ramos" data-valor="{{ valor_actual }}" data-ordenar>
+//       <option value="">Seleccione...</option>
+//   </select>
+// Las opciones fijas del select (p. ej. "Seleccione...") se conservan y las
+// de la lista se añaden después. Al terminar se dispara en document el
+// evento 'opciones-cargadas' con las listas en event.detail.
+(function () {
+    const script = document.currentScript;
+    const urlOpciones = (script && script.dataset.url) || '/api/opciones';
+    let promesa = null;
+
+    function cargarOpciones() {
+        if (!promesa) {
+            promesa = fetch(urlOpciones, { credentials: 'same-origin' })
+                .then(respuesta => {
+                    if (!respuesta.ok) {
+                        throw new Error('HTTP ' + respuesta.status);
+                    }
+                    return respuesta.json();
+                })
+                .then(datos => datos.listas);
+        }
+        return promesa;
+    }
+
+    function llenarSelect(select, listas) {
+        const items = (listas[select.dataset.opciones] || []).slice();
+        // Los vendedores vienen como {nombre, comision}
+        const texto = item => (item !== null && typeof item === 'object') ? item.nombre : item;
+        if (select.hasAttribute('data-ordenar')) {
+            items.sort((a, b) => (texto(a) < texto(b) ? -1 : texto(a) > texto(b) ? 1 : 0));
+        }
+        const valor = select.dataset.valor;
+        items.forEach(item => {
+            const nombre = texto(item);
+            const opcion = new Option(nombre, nombre, false, valor !== undefined && nombre === valor);
+            if (item !== null && typeof item === 'object') {
+                opcion.dataset.comision = item.comision;
+            }
+            select.add(opcion);
+        });
+    }
+
+    window.cargarOpciones = cargarOpciones;
+
+    document.addEventListener('DOMContentLoaded', function () {
+        const selects = document.querySelectorAll('select[data-opciones]');
+        if (!selects.length) {
+            return;
+        }
+        cargarOpciones()
+            .then(listas => {
+                selects.forEach(select => llenarSelect(select, listas));
+                document.dispatchEvent(new CustomEvent('opciones-cargadas', { detail: listas }));
+            })
+            .catch(err => console.error('No se pudieron cargar las opciones:', err));
+    });
+})();
@@ -0,0 +1,230 @@
+"""
+Calendario en memoria de los vencimientos procesados, por día de FECHA FIN.
+
+Las pólizas se guardan ordenadas por día de vencimiento junto con una serie
+de días ya ordenada para cada grupo que usan los KPIs (sin ramos especiales,
+activas, cumplimiento, grupos de ramos). Como las fechas son absolutas, el
+calendario solo se reconstruye cuando cambia el archivo (carga maestra o
+edición de un registro); las ventanas relativas a hoy (próximos 15, 30, 45
+o 60 días, vencidas, ±100 días) son búsquedas binarias sobre esas series en
+lugar de recorrer todo el DataFrame.
+
+Lo que sí depende del día (días para vencer, alertas y KPIs del panel) se
+arma una vez por día y se guarda: el primer acceso del día o la tarea
+programada de pocos minutos después de medianoche (ver programador.py), y de
+nuevo tras cada carga.
+
+Los días para vencer son días de calendario: 0 = vence hoy.
+"""
+from datetime import datetime
+
+import metricas
+from carga_diferida import modulo_diferido
+
+pd = modulo_diferido('pandas')
+np = modulo_diferido('numpy')
+
+# Ventana por defecto del panel de vencimientos (días antes y después de hoy)
+VENTANA_DIAS = 100
+RAMOS_ESPECIALES = ('CUMPLIMIENTO', 'SERIEDAD DE OFERTA')
+ESTADOS_FINALES = ('renovado', 'no renovado')
+DIAS_CUMPLIMIENTO = 45
+DIAS_GRUPOS_RAMO = 30
+# KPIs por grupo de ramos: etiqueta -> patrón de RAMO PRINCIPAL
+GRUPOS_RAMO = {
+    'AUTOS/VEHÍCULOS': 'AUTOS|VEHICULOS',
+    'COPROPIEDADES': 'COPROPIEDADES',
+    'HOGAR': 'HOGAR',
+    'ARRENDAMIENTO': 'ARRENDAMIENTO',
+}
+
+# Series del calendario
+TODAS = 'todas'
+GENERAL = 'general'                  # sin ramos especiales
+GENERAL_ACTIVAS = 'general_activas'  # sin ramos especiales ni estados finales
+CUMPLIMIENTO = 'cumplimiento'
+
+def _dia(fecha=None):
+    """Día (datetime64[D]) de una fecha, datetime o datetime64; hoy si es None."""
+    if fecha is None:
+        fecha = datetime.now()
+    if isinstance(fecha, datetime):
+        fecha = fecha.date()
+    return np.datetime64(fecha, 'D')
+
+
+def calcular_alertas(dias, estado):
+    """
+    Indicador de cada póliza según los días para vencer y su estado, de forma
+    vectorizada: (clase css, icono, texto, es_critico) como arreglos.
+    """
+    estado = estado.str.lower().to_numpy()
+    renovado = estado == 'renovado'
+    no_renovado = estado == 'no renovado'
+    final = renovado | no_renovado
+
+    condiciones = [renovado, no_renovado, dias <= 10, dias <= 20, dias <= 30]
+    css = np.select(condiciones, ['alerta-renovado', 'alerta-no-renovado', 'alerta-rojo', 'alerta-amarillo',
+                                  'alerta-verde'], 'alerta-azul')
+    icono = np.select(condiciones, ['fas fa-check-double', 'fas fa-ban', 'fas fa-skull-crossbones',
+                                    'fas fa-exclamation-triangle', 'fas fa-calendar-check'], 'fas fa-info-circle')
+    dias_texto = pd.Series(np.abs(dias)).astype(str).to_numpy(dtype=object)
+    texto = np.where(dias < 0, 'Vencido (Hace ' + dias_texto + ' días)', 'Vence en ' + dias_texto + ' días')
+    texto = np.select([renovado, no_renovado], ['Renovado', 'No Renovado'], texto)
+    critico = (dias <= 5) & ~final
+    return css, icono, texto, critico
+
+
+def kpis_ventana(df):
+    """KPIs del panel calculados sobre unas filas ya filtradas (p. ej. por búsqueda)."""
+    dias = df['Dias_Para_Vencer']
+    ramo = df['RAMO PRINCIPAL']
+    general = dias[~ramo.isin(RAMOS_ESPECIALES)]
+    proximos = ramo[dias.between(0, DIAS_GRUPOS_RAMO)]
+    return {
+        'vencer_15_dias': int(general.between(0, 15).sum()),
+        'vencer_30_dias': int(general.between(0, 30).sum()),
+        'vencer_60_dias': int(general.between(0, 60).sum()),
+        'vencidas': int((general < 0).sum()),
+        'cumplimiento': int(((ramo == 'CUMPLIMIENTO') & dias.between(0, DIAS_CUMPLIMIENTO)).sum()),
+    }, [{'ramo': etiqueta, 'count': int(proximos.str.contains(patron, case=False, na=False).sum())}
+        for etiqueta, patron in GRUPOS_RAMO.items()]
+
+
+class CalendarioVencimientos:
+    """Vencimientos ordenados por día de FECHA FIN, con series por grupo para contar ventanas."""
+
+    def __init__(self, instantanea):
+        self.instantanea = instantanea
+        self._lock = metricas.LockMedido('calendario_vencimientos')
+        self._firma = None
+        self._df = None
+        self._dias = None
+        self._series = {}
+        self._vista = None
+
+    # --- Construcción ---
+    def sincronizar(self):
+        """Reconstruye el calendario si cambió el archivo de vencimientos."""
+        with self._lock:
+            firma = self.instantanea.firma_archivo()
+            metricas.registrar_cache('calendario_vencimientos', firma is not None and firma == self._firma)
+            if firma == self._firma:
+                return False
+            if firma is None:
+                self._firma, self._df, self._dias, self._series, self._vista = None, None, None, {}, None
+                return True
+            self._construir(self.instantanea.vista())
+            self._firma = firma
+            self._vista = None
+            return True
+
+    def _construir(self, df):
+        if 'FECHA FIN' not in df.columns:
+            raise ValueError('El archivo de vencimientos no contiene la columna "FECHA FIN".')
+        if 'NOMBRES CLIENTE' in df.columns:
+            df = df.rename(columns={'NOMBRES CLIENTE': 'Tomador'})
+        for columna in ('RAMO PRINCIPAL', 'Estado', 'Tomador'):
+            if columna not in df.columns:
+                df[columna] = ''
+        df['FECHA FIN_dt'] = pd.to_datetime(df['FECHA FIN'], errors='coerce')
+        df = df[df['FECHA FIN_dt'].notna()].sort_values('FECHA FIN_dt', kind='stable').reset_index(drop=True)
+        df['Estado'] = df['Estado'].fillna('').astype(str)
+
+        dias = df['FECHA FIN_dt'].to_numpy(dtype='datetime64[D]')
+        ramo = df['RAMO PRINCIPAL'].fillna('').astype(str)
+        especial = ramo.isin(RAMOS_ESPECIALES).to_numpy()
+        final = df['Estado'].str.lower().isin(ESTADOS_FINALES).to_numpy()
+        # Un subconjunto de un arreglo ordenado sigue ordenado
+        series = {
+            TODAS: dias,
+            GENERAL: dias[~especial],
+            GENERAL_ACTIVAS: dias[~especial & ~final],
+            CUMPLIMIENTO: dias[(ramo == 'CUMPLIMIENTO').to_numpy()],
+        }
+        for etiqueta, patron in GRUPOS_RAMO.items():
+            series[etiqueta] = dias[ramo.str.contains(patron, case=False, na=False).to_numpy()]
+        self._df, self._dias, self._series = df, dias, series
+
+    # --- Consultas por rango ---
+    @staticmethod
+    def _rango(serie, hoy, desde, hasta):
+        inicio = 0 if desde is None else int(np.searchsorted(serie, hoy + desde, 'left'))
+        fin = len(serie) if hasta is None else int(np.searchsorted(serie, hoy + hasta, 'right'))
+        return inicio, max(inicio, fin)
+
+    def contar(self, serie, desde=None, hasta=None, hoy=None):
+        """
+        Pólizas de `serie` que vencen entre hoy+desde y hoy+hasta (días,
+        inclusive; None = sin límite). P. ej. contar(GENERAL, 0, 30) son las
+        que vencen en los próximos 30 días y contar(GENERAL, hasta=-1) las vencidas.
+        """
+        self.sincronizar()
+        with self._lock:
+            arreglo = self._series.get(serie)
+            if arreglo is None:
+                return 0
+            inicio, fin = self._rango(arreglo, _dia(hoy), desde, hasta)
+            return fin - inicio
+
+    def filas(self, desde=None, hasta=None, hoy=None):
+        """Copia de las pólizas que vencen en el rango, con Dias_Para_Vencer, ordenadas por fecha."""
+        self.sincronizar()
+        hoy = _dia(hoy)
+        with self._lock:
+            if self._df is None:
+                return None
+            inicio, fin = self._rango(self._dias, hoy, desde, hasta)
+            df = self._df.iloc[inicio:fin].copy()
+            df['Dias_Para_Vencer'] = (self._dias[inicio:fin] - hoy).astype(int)
+            return df
+
+    # --- Vista del día ---
+    def vista(self, hoy=None):
+        """
+        Datos del panel de vencimientos para el día: las pólizas de la
+        ventana de ±VENTANA_DIAS con alertas, listas para mostrar (de la más
+        lejana a la vencida hace más tiempo), sus KPIs y los KPIs por ramo.
+        Se calcula una vez por día y por versión del archivo. None si no hay archivo.
+        """
+        self.sincronizar()
+        hoy = _dia(hoy)
+        with self._lock:
+            if self._vista is not None and self._vista[0] == (self._firma, hoy):
+                metricas.registrar_cache('vista_vencimientos', True)
+                return self._vista[1]
+        metricas.registrar_cache('vista_vencimientos', False)
+        ventana = self.filas(-VENTANA_DIAS, VENTANA_DIAS, hoy=hoy)
+        if ventana is None:
+            return None
+
+        css, icono, texto, critico = calcular_alertas(ventana['Dias_Para_Vencer'].to_numpy(), ventana['Estado'])
+        ventana['Indicador_Vencimiento_CSS_Class'] = css
+        ventana['Indicador_Vencimiento_Icon'] = icono
+        ventana['Indicador_Vencimiento_Text'] = texto
+        ventana['Indicador_Vencimiento_Is_Critical'] = critico
+        # De mayor a menor número de días para vencer
+        ventana = ventana.iloc[::-1].reset_index(drop=True)
+        ventana['FECHA FIN'] = ventana['FECHA FIN_dt'].dt.strftime('%Y-%m-%d')
+        if 'Fecha_inicio_seguimiento' in ventana.columns:
+            ventana['Fecha_inicio_seguimiento'] = pd.to_datetime(ventana['Fecha_inicio_seguimiento'], errors='coerce').dt.strftime('%Y-%m-%d')
+        ventana = ventana.fillna('')
+
+        kpis = {
+            'vencer_15_dias': self.contar(GENERAL, 0, 15, hoy),
+            'vencer_30_dias': self.contar(GENERAL, 0, 30, hoy),
+            'vencer_60_dias': self.contar(GENERAL, 0, 60, hoy),
+            'vencidas': self.contar(GENERAL, -VENTANA_DIAS, -1, hoy),
+            'cumplimiento': self.contar(CUMPLIMIENTO, 0, DIAS_CUMPLIMIENTO, hoy),
+        }
+        ramos_kpis = [{'ramo': etiqueta, 'count': self.contar(etiqueta, 0, DIAS_GRUPOS_RAMO, hoy)}
+                      for etiqueta in GRUPOS_RAMO]
+        vista = {'filas': ventana, 'registros': ventana.to_dict(orient='records'), 'kpis': kpis, 'ramos_kpis': ramos_kpis}
+        with self._lock:
+            self._vista = ((self._firma, hoy), vista)
+        return vista
+
+    def refrescar(self):
+        """Pone al día el calendario y deja calculada la vista de hoy."""
+        self.sincronizar()
+        self.vista()